@@ -0,0 +1,29 @@
+"""add context_snippet to notes
+
+Revision ID: context_snippet_001
+Revises: add_cached_intents_001, add_scope_cache_001
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'context_snippet_001'
+down_revision: Union[str, Sequence[str], None] = ('add_cached_intents_001', 'add_scope_cache_001')
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.add_column('notes', sa.Column('context_snippet', sa.String(length=200), nullable=True))
+
+    # Backfill existing notes so RAG never has to read full summaries/transcripts
+    op.execute("""
+        UPDATE notes
+        SET context_snippet = left(coalesce(nullif(summary, ''), transcription_text), 200)
+        WHERE context_snippet IS NULL
+    """)
+
+def downgrade() -> None:
+    op.drop_column('notes', 'context_snippet')
@@ -0,0 +1,86 @@
+"""partition integration_logs by month
+
+Revision ID: integration_logs_monthly_001
+Revises: topic_centroids_001
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'integration_logs_monthly_001'
+down_revision: Union[str, None] = 'topic_centroids_001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PREMAKE_MONTHS = 3
+
+def upgrade() -> None:
+    op.rename_table('integration_logs', 'integration_logs_old')
+    op.execute("ALTER TABLE integration_logs_old RENAME CONSTRAINT integration_logs_pkey TO integration_logs_old_pkey")
+
+    # Partition key must be part of the PK
+    op.create_table(
+        'integration_logs',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('integration_id', sa.String(), nullable=True),
+        sa.Column('note_id', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        sa.ForeignKeyConstraint(['integration_id'], ['integrations.id']),
+        sa.ForeignKeyConstraint(['note_id'], ['notes.id'], ondelete='CASCADE'),
+        postgresql_partition_by='RANGE (created_at)'
+    )
+    op.create_index('ix_integration_logs_note_id', 'integration_logs', ['note_id'])
+
+    # One partition per month from the oldest log up to PREMAKE_MONTHS ahead
+    # (same naming as infrastructure.partitions: integration_logs_pYYYYMM)
+    op.execute(f"""
+        DO $$
+        DECLARE m date;
+        BEGIN
+            FOR m IN
+                SELECT generate_series(
+                    date_trunc('month', coalesce((SELECT min(created_at) FROM integration_logs_old), now()) AT TIME ZONE 'UTC'),
+                    date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{PREMAKE_MONTHS} months',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF integration_logs FOR VALUES FROM (%L) TO (%L)',
+                    'integration_logs_p' || to_char(m, 'YYYYMM'),
+                    m::text || ' 00:00:00+00',
+                    (m + interval '1 month')::date::text || ' 00:00:00+00'
+                );
+            END LOOP;
+        END $$;
+    """)
+
+    op.execute("""
+        INSERT INTO integration_logs (id, integration_id, note_id, status, error_message, created_at)
+        SELECT id, integration_id, note_id, status, error_message, coalesce(created_at, now())
+        FROM integration_logs_old
+    """)
+    op.drop_table('integration_logs_old')
+
+def downgrade() -> None:
+    op.rename_table('integration_logs', 'integration_logs_partitioned')
+    op.execute("ALTER TABLE integration_logs_partitioned RENAME CONSTRAINT integration_logs_pkey TO integration_logs_partitioned_pkey")
+    op.create_table(
+        'integration_logs',
+        sa.Column('id', sa.String(), primary_key=True),
+        sa.Column('integration_id', sa.String(), sa.ForeignKey('integrations.id'), nullable=True),
+        sa.Column('note_id', sa.String(), sa.ForeignKey('notes.id'), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    )
+    op.execute("""
+        INSERT INTO integration_logs (id, integration_id, note_id, status, error_message, created_at)
+        SELECT id, integration_id, note_id, status, error_message, created_at FROM integration_logs_partitioned
+    """)
+    op.execute("DROP TABLE integration_logs_partitioned CASCADE")
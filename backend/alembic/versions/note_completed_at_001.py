@@ -0,0 +1,26 @@
+"""notes.completed_at: completion time, the watermark column of incremental topic clustering
+
+Revision ID: note_completed_at_001
+Revises: partition_rebalances_001
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'note_completed_at_001'
+down_revision: Union[str, None] = 'partition_rebalances_001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.add_column('notes', sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True))
+    # Existing watermarks were taken on created_at, so completed notes line up with them
+    op.execute("UPDATE notes SET completed_at = created_at WHERE status = 'COMPLETED'")
+    op.create_index('ix_notes_user_completed_at', 'notes', ['user_id', 'completed_at', 'id'])
+
+def downgrade() -> None:
+    op.drop_index('ix_notes_user_completed_at', table_name='notes')
+    op.drop_column('notes', 'completed_at')
@@ -0,0 +1,28 @@
+"""add note_graph_scores for precomputed personalized PageRank
+
+Revision ID: note_graph_scores_001
+Revises: note_relation_user_001
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'note_graph_scores_001'
+down_revision: Union[str, None] = 'note_relation_user_001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.create_table(
+        'note_graph_scores',
+        sa.Column('user_id', sa.String(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('note_id', sa.String(), sa.ForeignKey('notes.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.Column('computed_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+    )
+
+def downgrade() -> None:
+    op.drop_table('note_graph_scores')
@@ -0,0 +1,64 @@
+"""canonical note_relations edges with a unique key
+
+Revision ID: note_relation_dedupe_001
+Revises: note_graph_scores_001
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'note_relation_dedupe_001'
+down_revision: Union[str, None] = 'note_graph_scores_001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Duplicates grouped by canonical key (min id, max id, type); the lowest id survives.
+# Same merge as the upsert: max strength, max confidence, latest timestamp.
+RANKED = """
+    WITH ranked AS (
+        SELECT
+            id,
+            least(note_id1, note_id2) AS a,
+            greatest(note_id1, note_id2) AS b,
+            coalesce(relation_type, 'related') AS t,
+            min(id) OVER w AS keep_id,
+            max(strength) OVER w AS merged_strength,
+            max(coalesce(confidence, 1.0)) OVER w AS merged_confidence,
+            max(created_at) OVER w AS merged_created_at
+        FROM note_relations
+        WHERE note_id1 IS NOT NULL AND note_id2 IS NOT NULL
+        WINDOW w AS (PARTITION BY least(note_id1, note_id2), greatest(note_id1, note_id2), coalesce(relation_type, 'related'))
+    )
+"""
+
+def upgrade() -> None:
+    # 1. Self-loops carry no information
+    op.execute("DELETE FROM note_relations WHERE note_id1 = note_id2")
+
+    # 2. Survivors take the merged values and canonical orientation
+    #    (no unique index yet, so the rewrite cannot collide)
+    op.execute(RANKED + """
+        UPDATE note_relations r
+        SET note_id1 = ranked.a,
+            note_id2 = ranked.b,
+            relation_type = ranked.t,
+            strength = ranked.merged_strength,
+            confidence = ranked.merged_confidence,
+            created_at = ranked.merged_created_at
+        FROM ranked
+        WHERE r.id = ranked.id AND ranked.id = ranked.keep_id
+    """)
+
+    # 3. Drop the merged duplicates (tasks.graph_compaction does this online, per user, ahead of time)
+    op.execute(RANKED + """
+        DELETE FROM note_relations r
+        USING ranked
+        WHERE r.id = ranked.id AND ranked.id <> ranked.keep_id
+    """)
+
+    op.create_index('uq_note_relations_edge', 'note_relations', ['note_id1', 'note_id2', 'relation_type'], unique=True)
+
+def downgrade() -> None:
+    op.drop_index('uq_note_relations_edge', table_name='note_relations')
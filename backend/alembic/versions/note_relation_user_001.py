@@ -0,0 +1,40 @@
+"""add user_id and adjacency indexes to note_relations
+
+Revision ID: note_relation_user_001
+Revises: context_snippet_001
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'note_relation_user_001'
+down_revision: Union[str, None] = 'context_snippet_001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.add_column('note_relations', sa.Column('user_id', sa.String(), nullable=True))
+    op.create_foreign_key(
+        'fk_note_relations_user_id', 'note_relations', 'users', ['user_id'], ['id'], ondelete='CASCADE'
+    )
+
+    # Backfill owner from the first endpoint (relations never cross users)
+    op.execute("""
+        UPDATE note_relations r
+        SET user_id = n.user_id
+        FROM notes n
+        WHERE n.id = r.note_id1 AND r.user_id IS NULL
+    """)
+
+    # One index per direction so traversal from either endpoint stays in the user's slice
+    op.create_index('ix_note_relations_user_note1', 'note_relations', ['user_id', 'note_id1'])
+    op.create_index('ix_note_relations_user_note2', 'note_relations', ['user_id', 'note_id2'])
+
+def downgrade() -> None:
+    op.drop_index('ix_note_relations_user_note2', table_name='note_relations')
+    op.drop_index('ix_note_relations_user_note1', table_name='note_relations')
+    op.drop_constraint('fk_note_relations_user_id', 'note_relations', type_='foreignkey')
+    op.drop_column('note_relations', 'user_id')
@@ -0,0 +1,31 @@
+"""add partition_rebalances checkpoint table
+
+Revision ID: partition_rebalances_001
+Revises: integration_logs_monthly_001
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'partition_rebalances_001'
+down_revision: Union[str, None] = 'integration_logs_monthly_001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.create_table(
+        'partition_rebalances',
+        sa.Column('table_name', sa.String(), primary_key=True),
+        sa.Column('target_modulus', sa.Integer(), nullable=False),
+        sa.Column('phase', sa.String(), nullable=False),
+        sa.Column('last_key', sa.JSON(), nullable=True),
+        sa.Column('copied_rows', sa.Integer(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+    )
+
+def downgrade() -> None:
+    op.drop_table('partition_rebalances')
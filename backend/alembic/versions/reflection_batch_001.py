@@ -0,0 +1,32 @@
+"""add reflection_batches for Batch API nightly reflection
+
+Revision ID: reflection_batch_001
+Revises: reflection_state_001
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'reflection_batch_001'
+down_revision: Union[str, None] = 'reflection_state_001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.create_table(
+        'reflection_batches',
+        sa.Column('id', sa.String(), primary_key=True),
+        sa.Column('provider_batch_id', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('jobs', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+        sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_reflection_batches_provider_batch_id', 'reflection_batches', ['provider_batch_id'])
+
+def downgrade() -> None:
+    op.drop_index('ix_reflection_batches_provider_batch_id', table_name='reflection_batches')
+    op.drop_table('reflection_batches')
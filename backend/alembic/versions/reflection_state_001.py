@@ -0,0 +1,29 @@
+"""add reflection_states for watermark-based incremental reflection
+
+Revision ID: reflection_state_001
+Revises: note_relation_dedupe_001
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'reflection_state_001'
+down_revision: Union[str, None] = 'note_relation_dedupe_001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.create_table(
+        'reflection_states',
+        sa.Column('user_id', sa.String(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('last_note_id', sa.String(), nullable=True),
+        sa.Column('last_note_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('rolling_summary', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+    )
+
+def downgrade() -> None:
+    op.drop_table('reflection_states')
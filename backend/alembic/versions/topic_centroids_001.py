@@ -0,0 +1,38 @@
+"""add topic_centroids and topic_cluster_states for incremental topic clustering
+
+Revision ID: topic_centroids_001
+Revises: reflection_batch_001
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import VECTOR
+
+# revision identifiers, used by Alembic.
+revision: str = 'topic_centroids_001'
+down_revision: Union[str, None] = 'reflection_batch_001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+def upgrade() -> None:
+    op.create_table(
+        'topic_centroids',
+        sa.Column('user_id', sa.String(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('label', sa.Integer(), primary_key=True),
+        sa.Column('centroid', VECTOR(1536), nullable=True),
+        sa.Column('count', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+    )
+    op.create_table(
+        'topic_cluster_states',
+        sa.Column('user_id', sa.String(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('last_note_id', sa.String(), nullable=True),
+        sa.Column('last_note_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+    )
+
+def downgrade() -> None:
+    op.drop_table('topic_cluster_states')
+    op.drop_table('topic_centroids')
@@ -4,13 +4,17 @@ from fastapi import Request
 import jwt
 import structlog
 from infrastructure.config import settings
+from infrastructure.database import note_write, owner_id_for
 
 logger = structlog.get_logger()
 
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
 class AuthMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         # Initialize default state
         request.state.user_id = None
+        request.state.owner_id = None
         
         auth_header = request.headers.get("Authorization")
         if auth_header and auth_header.startswith("Bearer "):
@@ -26,6 +30,11 @@ class AuthMiddleware(BaseHTTPMiddleware):
                 
                 # Extract user identifier (usually 'sub')
                 user_id = payload.get("sub")
+                # Id of the account, routes get_db to the shard that owns it. Tokens issued
+                # before `uid` existed are resolved by email here, before get_db opens a session.
+                request.state.owner_id = payload.get("uid")
+                if request.state.owner_id is None and user_id:
+                    request.state.owner_id = await owner_id_for(user_id)
                 if user_id:
                     request.state.user_id = user_id
                     # Bind user_id to logging context for this request
@@ -49,4 +58,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
                 )
         
         response = await call_next(request)
+        if request.method not in READ_METHODS and response.status_code < 400:
+            # Read-your-writes: this user's GETs skip the replicas until the write has replayed
+            await note_write(request.state.owner_id)
         return response
@@ -2,10 +2,11 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import func, desc
-from typing import List, Optional
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from collections import Counter
+from datetime import datetime, timedelta, timezone
 
-from infrastructure.database import get_db
+from infrastructure.database import get_db, get_read_db, fan_out, owner_session
 from app.models import User, Plan, Integration, AdminLog, Note
 from app.api.dependencies import get_current_user
 from app.core.security import create_access_token
@@ -52,7 +53,7 @@ async def list_users(
     limit: int = 20,
     search: Optional[str] = None,
     sort_by: str = "created_at",
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     admin: User = Depends(get_admin_user)
 ):
     offset = (page - 1) * limit
@@ -66,25 +67,43 @@ async def list_users(
     else:
         query = query.order_by(desc(User.created_at))
         
-    query = query.offset(offset).limit(limit)
-    result = await db.execute(query)
-    users = result.scalars().all()
+    # Each shard returns its first offset+limit users, the merged page is cut from those
+    query = query.limit(offset + limit)
+
+    async def shard_users(session: AsyncSession) -> List[User]:
+        return (await session.execute(query)).scalars().all()
+
+    if sort_by == 'usage':
+        key = lambda u: u.monthly_usage_seconds or 0
+    else:
+        key = lambda u: u.created_at or datetime.min.replace(tzinfo=timezone.utc) # created_at is tz-aware
+    users = sorted((u for page_users in await fan_out(shard_users, read=True) for u in page_users), key=key, reverse=True)
+    users = users[offset:offset + limit]
     
     # Just return raw users for now, can use Pydantic schema later
     return users
 
+async def _shard_counts(db: AsyncSession) -> Dict[str, int]:
+    return {
+        "users": await db.scalar(select(func.count(User.id))),
+        "pro": await db.scalar(select(func.count(User.id)).where(User.tier == 'pro')),
+        "premium": await db.scalar(select(func.count(User.id)).where(User.tier == 'premium')),
+        "notes": await db.scalar(select(func.count(Note.id))),
+        "integrations": await db.scalar(select(func.count(Integration.id))),
+    }
+
 @router.get("/stats", response_model=AdminStats, summary="Global System Stats", description="High-level business metrics including total users, MRR estimation, and system usage.")
 async def get_stats(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     admin: User = Depends(get_admin_user)
 ):
-    # Total Users
-    total_users = await db.scalar(select(func.count(User.id)))
+    # Counts from every user shard, summed
+    totals = Counter()
+    for counts in await fan_out(_shard_counts, read=True):
+        totals.update({k: v or 0 for k, v in counts.items()})
     
     # MRR (Approximate based on plans)
     # This is a basic estimation. Real MRR should come from Stripe/Payment Provider webhooks.
-    pro_users = await db.scalar(select(func.count(User.id)).where(User.tier == 'pro'))
-    premium_users = await db.scalar(select(func.count(User.id)).where(User.tier == 'premium'))
     
     # Fetch Plan prices
     plans_res = await db.execute(select(Plan))
@@ -94,24 +113,18 @@ async def get_stats(
     pro_price = plans.get('pro').price_monthly_rub if plans.get('pro') else 490
     premium_price = plans.get('premium').price_monthly_rub if plans.get('premium') else 990
     
-    mrr = (pro_users * pro_price) + (premium_users * premium_price)
-          
-    # Total Notes
-    total_notes = await db.scalar(select(func.count(Note.id)))
-    
-    # Active Integrations
-    active_integrations = await db.scalar(select(func.count(Integration.id)))
+    mrr = (totals["pro"] * pro_price) + (totals["premium"] * premium_price)
     
     return {
-        "active_integrations": active_integrations or 0,
-        "total_users": total_users,
+        "active_integrations": totals["integrations"],
+        "total_users": totals["users"],
         "total_mrr_cents": mrr,
-        "total_notes_processed": total_notes
+        "total_notes_processed": totals["notes"]
     }
 
 @router.get("/charts", response_model=AdminCharts, summary="Analytics Charts", description="Time-series data for user growth and integration distribution.")
 async def get_admin_charts(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     admin: User = Depends(get_admin_user)
 ):
     # 1. Growth (Last 7 Days)
@@ -124,8 +137,11 @@ async def get_admin_charts(
     # Let's just fetch users from last 7 days and aggregate in code to be safe and simple.
     
     seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    res = await db.execute(select(User.created_at).where(User.created_at >= seven_days_ago))
-    dates = res.scalars().all()
+    async def shard_signups(session: AsyncSession) -> List[datetime]:
+        res = await session.execute(select(User.created_at).where(User.created_at >= seven_days_ago))
+        return res.scalars().all()
+
+    dates = [d for shard_dates in await fan_out(shard_signups, read=True) for d in shard_dates]
     
     # Aggregate
     growth_map = {}
@@ -145,15 +161,21 @@ async def get_admin_charts(
     # 2. Integrations Share
     # Group by provider
     # select provider, count(*) from integrations group by provider
-    int_res = await db.execute(
-        select(Integration.provider, func.count(Integration.id))
-        .group_by(Integration.provider)
-    )
-    rows = int_res.all() # list of (provider, count)
+    async def shard_providers(session: AsyncSession):
+        int_res = await session.execute(
+            select(Integration.provider, func.count(Integration.id))
+            .group_by(Integration.provider)
+        )
+        return int_res.all() # list of (provider, count)
+
+    providers = Counter()
+    for rows in await fan_out(shard_providers, read=True):
+        for provider, count in rows:
+            providers[provider] += count
     
     integration_data = [
-        ChartDataPoint(name=row[0].replace('_', ' ').capitalize(), value=row[1]) 
-        for row in rows
+        ChartDataPoint(name=provider.replace('_', ' ').capitalize(), value=count) 
+        for provider, count in providers.items()
     ]
     
     return {
@@ -163,7 +185,7 @@ async def get_admin_charts(
 
 @router.get("/plans", summary="List Subscription Plans", description="Retrieve all existing subscription plans and their price/feature configurations.")
 async def get_plans(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     admin: User = Depends(get_admin_user)
 ):
     result = await db.execute(select(Plan))
@@ -214,8 +236,9 @@ async def impersonate_user(
     db: AsyncSession = Depends(get_db),
     admin: User = Depends(get_admin_user)
 ):
-    result = await db.execute(select(User).where(User.id == user_id))
-    target_user = result.scalars().first()
+    async with owner_session(db, user_id) as target_db:
+        result = await target_db.execute(select(User).where(User.id == user_id))
+        target_user = result.scalars().first()
     
     if not target_user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -223,7 +246,7 @@ async def impersonate_user(
     # Generate Token
     # Maybe add a special claim 'impersonator_id'
     access_token = create_access_token(
-        data={"sub": target_user.email, "impersonator": admin.id},
+        data={"sub": target_user.email, "uid": target_user.id, "impersonator": admin.id},
         expires_delta=timedelta(minutes=60) # Short lived
     )
     
@@ -251,7 +274,7 @@ class GrantSubscription(BaseModel):
 
 @router.get("/promocodes", summary="List Promo Codes", description="Retrieve all generated promo codes.")
 async def get_promocodes(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     admin: User = Depends(get_admin_user)
 ):
     result = await db.execute(select(PromoCode).order_by(desc(PromoCode.created_at)))
@@ -305,16 +328,19 @@ async def grant_subscription(
     db: AsyncSession = Depends(get_db),
     admin: User = Depends(get_admin_user)
 ):
-    res = await db.execute(select(User).where(User.id == user_id))
-    user = res.scalars().first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    async with owner_session(db, user_id) as target_db:
+        res = await target_db.execute(select(User).where(User.id == user_id))
+        user = res.scalars().first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
         
-    user.tier = grant.tier
-    user.is_pro = grant.tier in ['pro', 'premium']
-    
-    # Reset cycle start to now
-    user.billing_cycle_start = datetime.utcnow()
+        user.tier = grant.tier
+        user.is_pro = grant.tier in ['pro', 'premium']
+        
+        # Reset cycle start to now
+        user.billing_cycle_start = datetime.utcnow()
+        # The user may live on another shard than the admin, whose audit log is written below
+        await target_db.commit()
     
     # If duration specified, we might want to store expiry somewhere?
     # For now, simplistic implementation: just set it. 
@@ -339,13 +365,15 @@ async def ban_user(
     db: AsyncSession = Depends(get_db),
     admin: User = Depends(get_admin_user)
 ):
-    res = await db.execute(select(User).where(User.id == user_id))
-    user = res.scalars().first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    async with owner_session(db, user_id) as target_db:
+        res = await target_db.execute(select(User).where(User.id == user_id))
+        user = res.scalars().first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
         
-    user.is_active = False
-    # Optionally logout user by revoking tokens? (Not implemented yet globally)
+        user.is_active = False
+        # Optionally logout user by revoking tokens? (Not implemented yet globally)
+        await target_db.commit()
     
     log = AdminLog(admin_id=admin.id, action="BAN_USER", target_id=user.id)
     db.add(log)
@@ -360,7 +388,7 @@ class UpdateSystemPrompt(BaseModel):
 
 @router.get("/prompts", summary="List System Prompts", description="Fetch all AI system prompts used for analysis, transcription, and interactive features.")
 async def list_sys_prompts(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     admin: User = Depends(get_admin_user)
 ):
     from app.models import SystemPrompt
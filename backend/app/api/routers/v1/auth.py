@@ -2,7 +2,7 @@ from infrastructure.rate_limit import limiter
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from infrastructure.database import get_db
+from infrastructure.database import get_db, session_where
 from app.models import User
 from app.schemas import UserCreate, UserLogin, Token, UserResponse, UserUpdate
 from app.api.dependencies import get_current_user
@@ -24,22 +24,26 @@ class ResetPasswordRequest(BaseModel):
 
 @router.post("/signup", summary="User Signup", description="Register a new user account. Triggers a verification email.")
 async def signup(request: Request, user: UserCreate, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User).where(User.email == user.email))
-    if result.scalars().first():
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    # Generate Verification Token
-    verification_token = str(uuid.uuid4())
-    
-    new_user = User(
-        email=user.email,
-        hashed_password=get_password_hash(user.password),
-        is_verified=False, # Require verification
-        verification_token=verification_token
-    )
-    db.add(new_user)
-    await db.commit()
-    await db.refresh(new_user)
+    # The account is created on the shard its id hashes to
+    user_id = str(uuid.uuid4())
+    async with session_where(db, select(User.id).where(User.email == user.email), fallback_user_id=user_id) as db:
+        result = await db.execute(select(User).where(User.email == user.email))
+        if result.scalars().first():
+            raise HTTPException(status_code=400, detail="Email already registered")
+        
+        # Generate Verification Token
+        verification_token = str(uuid.uuid4())
+        
+        new_user = User(
+            id=user_id,
+            email=user.email,
+            hashed_password=get_password_hash(user.password),
+            is_verified=False, # Require verification
+            verification_token=verification_token
+        )
+        db.add(new_user)
+        await db.commit()
+        await db.refresh(new_user)
     
     # Real Email Sending
     from app.services.email import send_email
@@ -59,33 +63,35 @@ async def signup(request: Request, user: UserCreate, db: AsyncSession = Depends(
 
 @router.get("/verify", summary="Verify Email", description="Confirm email address using a token sent during signup.")
 async def verify_email(token: str, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User).where(User.verification_token == token))
-    user = result.scalars().first()
-    
-    if not user:
-        raise HTTPException(status_code=400, detail="Invalid verification token")
-    
-    if user.is_verified:
-        return {"message": "Email already verified"}
-        
-    user.is_verified = True
-    user.verification_token = None
-    await db.commit()
-    
-    return {"message": "Email verified successfully"}
+    async with session_where(db, select(User.id).where(User.verification_token == token)) as db:
+        result = await db.execute(select(User).where(User.verification_token == token))
+        user = result.scalars().first()
+
+        if not user:
+            raise HTTPException(status_code=400, detail="Invalid verification token")
+
+        if user.is_verified:
+            return {"message": "Email already verified"}
+
+        user.is_verified = True
+        user.verification_token = None
+        await db.commit()
+
+        return {"message": "Email verified successfully"}
 
 @router.post("/forgot-password", summary="Forgot Password", description="Request a password reset link to be sent via email.")
 async def forgot_password(request: ForgotPasswordRequest, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User).where(User.email == request.email))
-    user = result.scalars().first()
-    
-    if not user:
-        # Don't reveal if user exists
-        return {"message": "If this email is registered, you will receive a password reset link."}
-    
-    token = str(uuid.uuid4())
-    user.reset_token = token
-    await db.commit()
+    async with session_where(db, select(User.id).where(User.email == request.email)) as db:
+        result = await db.execute(select(User).where(User.email == request.email))
+        user = result.scalars().first()
+        
+        if not user:
+            # Don't reveal if user exists
+            return {"message": "If this email is registered, you will receive a password reset link."}
+        
+        token = str(uuid.uuid4())
+        user.reset_token = token
+        await db.commit()
     
     # Real Email Sending
     from app.services.email import send_email
@@ -103,22 +109,24 @@ async def forgot_password(request: ForgotPasswordRequest, db: AsyncSession = Dep
 
 @router.post("/reset-password", summary="Reset Password", description="Reset password using a token from the forgot-password email.")
 async def reset_password(request: ResetPasswordRequest, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User).where(User.reset_token == request.token))
-    user = result.scalars().first()
-    
-    if not user:
-        raise HTTPException(status_code=400, detail="Invalid or expired reset token")
-        
-    user.hashed_password = get_password_hash(request.new_password)
-    user.reset_token = None
-    await db.commit()
-    
-    return {"message": "Password reset successfully"}
+    async with session_where(db, select(User.id).where(User.reset_token == request.token)) as db:
+        result = await db.execute(select(User).where(User.reset_token == request.token))
+        user = result.scalars().first()
+
+        if not user:
+            raise HTTPException(status_code=400, detail="Invalid or expired reset token")
+
+        user.hashed_password = get_password_hash(request.new_password)
+        user.reset_token = None
+        await db.commit()
+
+        return {"message": "Password reset successfully"}
 
 @router.post("/login", response_model=Token, summary="User Login", description="Authenticate with email and password to receive a JWT access token.")
 async def login(request: Request, user: UserLogin, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User).where(User.email == user.email))
-    db_user = result.scalars().first()
+    async with session_where(db, select(User.id).where(User.email == user.email)) as db:
+        result = await db.execute(select(User).where(User.email == user.email))
+        db_user = result.scalars().first()
     
     if not db_user or not verify_password(user.password, db_user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -128,7 +136,7 @@ async def login(request: Request, user: UserLogin, db: AsyncSession = Depends(ge
         
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": db_user.email}, expires_delta=access_token_expires
+        data={"sub": db_user.email, "uid": db_user.id}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -4,11 +4,12 @@ from sqlalchemy.future import select
 from sqlalchemy import or_, update, func
 from typing import List
 
-from infrastructure.database import get_db
+from infrastructure.database import get_db, get_read_db
 from app.models import User, Note, TIER_LIMITS, Integration, IntegrationLog
 from app.schemas import NoteResponse, NoteUpdate, AskRequest, AskResponse, RelatedNote, ReplyRequest, NoteCreate, NotesListResponse
 from pydantic import BaseModel
 from app.services.ai_service import ai_service
+from app.core.rag_service import rag_service
 from app.api.dependencies import get_current_user
 from typing import Optional
 from datetime import datetime, timezone, timedelta
@@ -189,10 +190,10 @@ async def upload_note(
     try:
         # Check if Redis is available, otherwise run inline
         if settings.CELERY_BROKER_URL:
-             process_transcribe.delay(new_note.id)
+             process_transcribe.delay(new_note.id, new_note.user_id)
         else:
              print("[Warning] No Celery Broker. Running task synchronously.")
-             process_transcribe(new_note.id) 
+             process_transcribe(new_note.id, new_note.user_id) 
     except Exception as e:
         print(f"[Upload Error] Failed to queue task: {e}")
 
@@ -224,7 +225,7 @@ async def create_text_note(
     
     # Trigger Analysis immediately (skip transcription)
     from workers.analyze_tasks import process_analyze
-    process_analyze.delay(new_note.id)
+    process_analyze.delay(new_note.id, new_note.user_id)
     
     return new_note
 
@@ -232,11 +233,16 @@ async def attach_integration_status(db: AsyncSession, notes: List[Note]):
     if not notes:
         return
     note_ids = [n.id for n in notes]
-    result = await db.execute(
+    query = (
         select(IntegrationLog, Integration.provider)
         .join(Integration, IntegrationLog.integration_id == Integration.id)
         .where(IntegrationLog.note_id.in_(note_ids))
     )
+    # Logs are written after their note: monthly partitions older than the oldest note are pruned
+    created = [n.created_at for n in notes if n.created_at]
+    if len(created) == len(notes):
+        query = query.where(IntegrationLog.created_at >= min(created))
+    result = await db.execute(query)
     logs = result.all()
     status_map = {}
     for log, provider in logs:
@@ -257,7 +263,7 @@ async def get_notes(
     limit: int = 100, 
     q: Optional[str] = None,
     current_user: User = Depends(get_current_user), 
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     query = select(Note).where(Note.user_id == current_user.id)
     count_query = select(func.count(Note.id)).where(Note.user_id == current_user.id)
@@ -427,7 +433,7 @@ async def transcribe_audio_only(
 async def get_note_detail(
     note_id: str,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     result = await db.execute(select(Note).where(Note.id == note_id, Note.user_id == current_user.id))
     note = result.scalars().first()
@@ -440,7 +446,7 @@ async def get_note_detail(
 async def get_related_notes(
     note_id: str,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     # 1. Fetch Source Note
     result = await db.execute(select(Note).where(Note.id == note_id, Note.user_id == current_user.id))
@@ -500,6 +506,7 @@ async def delete_note(
     
     db.delete(note)
     await db.commit()
+    await rag_service.evict_recent_notes(current_user.id, [note_id])
     return None
 
 class BatchDeleteRequest(BaseModel):
@@ -528,6 +535,7 @@ async def delete_notes_batch(
         await db.delete(note)
         
     await db.commit()
+    await rag_service.evict_recent_notes(current_user.id, [note.id for note in notes])
     return None
 
 @router.put("/{note_id}", response_model=NoteResponse, summary="Update Note", description="Modify note metadata (title, summary, tags). Automatically regenerates semantic embeddings if content changes.")
@@ -562,11 +570,14 @@ async def update_note(
         
     # Re-calculate embedding if semantic content changed
     if needs_reembedding:
+        note.context_snippet = rag_service.build_context_snippet(note.summary, note.transcription_text)
         search_content = f"{note.title or ''} {note.summary or ''} {note.transcription_text or ''} {' '.join(note.tags or [])}"
         note.embedding = await ai_service.generate_embedding(search_content)
         
     await db.commit()
     await db.refresh(note)
+    if needs_reembedding:
+        await rag_service.evict_recent_notes(current_user.id, [note_id])
     return note
 
 @router.post("/{note_id}/extract-health", summary="Extract Health Metrics", description="AI-driven extraction of health and biometric data from the note text. Saves results to health_data JSON.")
@@ -659,6 +670,7 @@ async def edit_note(
     note.title = req.title
     note.summary = req.summary
     note.action_items = req.action_items
+    note.context_snippet = rag_service.build_context_snippet(note.summary, note.transcription_text)
     
     # Update Embedding for semantic search continuity
     search_content = f"{note.title} {note.summary} {note.transcription_text or ''}"
@@ -671,6 +683,7 @@ async def edit_note(
 
     await db.commit()
     await db.refresh(note)
+    await rag_service.evict_recent_notes(current_user.id, [note_id])
     return note
 
 @router.post("/{note_id}/reply", response_model=NoteResponse, summary="Reply to AI Clarification", description="Submit a response to an AI-generated clarification question. Creates a follow-up note for analysis.")
@@ -716,6 +729,6 @@ async def reply_to_clarification(
 
     # 4. Trigger Analysis
     from workers.analyze_tasks import process_analyze
-    process_analyze.delay(new_note.id)
+    process_analyze.delay(new_note.id, new_note.user_id)
 
     return new_note
@@ -6,7 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 import httpx
 from datetime import timedelta
 import os
-from infrastructure.database import get_db
+from infrastructure.database import get_db, session_where
 from infrastructure.config import settings
 from app.models import User
 from app.core.security import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
@@ -150,34 +150,37 @@ async def auth_callback(request: Request, provider: str, code: str, db: AsyncSes
         raise HTTPException(status_code=400, detail="Could not retrieve email from provider")
 
     # 3. Create or Update User
-    result = await db.execute(select(User).where(User.email == user_email))
-    db_user = result.scalars().first()
+    user_id = str(uuid.uuid4()) # Id of a new account, decides its shard
+    async with session_where(db, select(User.id).where(User.email == user_email), fallback_user_id=user_id) as db:
+        result = await db.execute(select(User).where(User.email == user_email))
+        db_user = result.scalars().first()
     
-    if not db_user:
-        db_user = User(
-            email=user_email,
-            hashed_password=None, # OAuth users don't have passwords
-            oauth_accounts={provider: "linked"}
-        )
-        db.add(db_user)
-        await db.commit()
-        await db.refresh(db_user)
-    else:
-        # Update existing user to link this provider if not linked
-        current_accounts = db_user.oauth_accounts or {}
-        if provider not in current_accounts:
-            current_accounts[provider] = "linked"
-            db_user.oauth_accounts = current_accounts
-            # Force update (SQLAlchemy sometimes misses JSON updates)
-            # In asyncpg/sqlalchemy syncing json changes can be tricky, re-assigning often helps
-            from sqlalchemy import update
-            await db.execute(update(User).where(User.id == db_user.id).values(oauth_accounts=current_accounts))
+        if not db_user:
+            db_user = User(
+                id=user_id,
+                email=user_email,
+                hashed_password=None, # OAuth users don't have passwords
+                oauth_accounts={provider: "linked"}
+            )
+            db.add(db_user)
             await db.commit()
+            await db.refresh(db_user)
+        else:
+            # Update existing user to link this provider if not linked
+            current_accounts = db_user.oauth_accounts or {}
+            if provider not in current_accounts:
+                current_accounts[provider] = "linked"
+                db_user.oauth_accounts = current_accounts
+                # Force update (SQLAlchemy sometimes misses JSON updates)
+                # In asyncpg/sqlalchemy syncing json changes can be tricky, re-assigning often helps
+                from sqlalchemy import update
+                await db.execute(update(User).where(User.id == db_user.id).values(oauth_accounts=current_accounts))
+                await db.commit()
 
     # 4. Create Session Token (Our JWT)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     my_access_token = create_access_token(
-        data={"sub": db_user.email}, expires_delta=access_token_expires
+        data={"sub": db_user.email, "uid": db_user.id}, expires_delta=access_token_expires
     )
     
     # Redirect back to frontend with token in URL param
@@ -9,7 +9,7 @@ from fastapi import APIRouter, Depends, HTTPException, Request, Form
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
-from infrastructure.database import get_db
+from infrastructure.database import get_db, session_where
 from app.models import User, UserTier, Plan
 from app.api.dependencies import get_current_user
 from infrastructure.config import settings
@@ -216,31 +216,34 @@ async def payment_webhook(
         # Ideally we'd re-verify promo.
         pass
 
-    # 4. Update User
-    result = await db.execute(select(User).where(User.email == email))
-    user = result.scalars().first()
-    
-    if user:
-        if target_tier == "pro":
-            user.tier = UserTier.PRO
-        elif target_tier == "premium":
-             user.tier = UserTier.PREMIUM
-        
-        user.billing_cycle_start = datetime.utcnow()
-        user.monthly_usage_seconds = 0
-        
-        # Increment Promo Usage
-        if promo_code:
-            from app.models import PromoCode
-            p_res = await db.execute(select(PromoCode).where(PromoCode.code == promo_code))
-            promo = p_res.scalars().first()
-            if promo:
-                promo.times_used += 1
+    # 4. Update User (on the shard that owns the account; plans and promo codes stay on `db`)
+    async with session_where(db, select(User.id).where(User.email == email)) as user_db:
+        result = await user_db.execute(select(User).where(User.email == email))
+        user = result.scalars().first()
+
+        if user:
+            if target_tier == "pro":
+                user.tier = UserTier.PRO
+            elif target_tier == "premium":
+                 user.tier = UserTier.PREMIUM
+
+            user.billing_cycle_start = datetime.utcnow()
+            user.monthly_usage_seconds = 0
+
+            # Increment Promo Usage
+            if promo_code:
+                from app.models import PromoCode
+                p_res = await db.execute(select(PromoCode).where(PromoCode.code == promo_code))
+                promo = p_res.scalars().first()
+                if promo:
+                    promo.times_used += 1
+
+            await user_db.commit()
+            if user_db is not db:
+                await db.commit()
+            logger.info(f"Upgraded user {email} to {target_tier}")
+            return {"status": "ok"}
 
-        await db.commit()
-        logger.info(f"Upgraded user {email} to {target_tier}")
-        return {"status": "ok"}
-    
     return {"status": "user_not_found"}
 
 # Dev Helper: Simulate Webhook (only for local testing)
@@ -253,18 +256,19 @@ async def dev_upgrade_user(
     if settings.ENVIRONMENT != "development":
         raise HTTPException(status_code=403)
         
-    result = await db.execute(select(User).where(User.email == email))
-    user = result.scalars().first()
-    if user:
-        if tier.lower() == "pro":
-            user.tier = UserTier.PRO
-        elif tier.lower() == "premium":
-            user.tier = UserTier.PREMIUM
-        else:
-            user.tier = UserTier.FREE
-            
-        user.monthly_usage_seconds = 0
-        user.billing_cycle_start = datetime.utcnow()
-        await db.commit()
-        return {"status": "upgraded", "tier": user.tier}
+    async with session_where(db, select(User.id).where(User.email == email)) as db:
+        result = await db.execute(select(User).where(User.email == email))
+        user = result.scalars().first()
+        if user:
+            if tier.lower() == "pro":
+                user.tier = UserTier.PRO
+            elif tier.lower() == "premium":
+                user.tier = UserTier.PREMIUM
+            else:
+                user.tier = UserTier.FREE
+
+            user.monthly_usage_seconds = 0
+            user.billing_cycle_start = datetime.utcnow()
+            await db.commit()
+            return {"status": "upgraded", "tier": user.tier}
     return {"status": "error"}
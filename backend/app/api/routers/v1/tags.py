@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import text
 from typing import List
-from infrastructure.database import get_db
+from infrastructure.database import get_db, get_read_db
 from app.models import User, Note
 from app.schemas import TagUsage, TagMergeRequest
 from app.api.dependencies import get_current_user
@@ -14,7 +14,7 @@ router = APIRouter(
 @router.get("", response_model=List[TagUsage], summary="List All Tags", description="Retrieve all unique tags used by the user across their notes, along with usage counts.")
 async def get_tags(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     # PostgreSQL specific query to count tags in a JSONB array
     sql = text("""
@@ -5,7 +5,7 @@ from sqlalchemy import func, desc, case
 from typing import List, Optional, Dict
 from datetime import datetime, timedelta, timezone
 
-from infrastructure.database import get_db
+from infrastructure.database import get_db, get_read_db
 from app.models import User, Note, IntegrationLog, Plan, UserTier
 from app.api.dependencies import get_current_user
 from pydantic import BaseModel
@@ -27,7 +27,7 @@ class UserStats(BaseModel):
 
 @router.get("/stats", response_model=UserStats, summary="Get Personal Stats", description="Fetch aggregated productivity metrics, transcription usage, and subscription status for the current user.")
 async def get_user_stats(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     # 1. Basic Counts
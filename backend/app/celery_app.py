@@ -17,7 +17,11 @@ celery = Celery(
         "tasks.cleanup_memory",
         "tasks.cleanup_cache",
         "tasks.proactive",
-        "tasks.reflection"
+        "tasks.reflection",
+        "tasks.graph_rank",
+        "tasks.graph_compaction",
+        "tasks.graph_metrics",
+        "tasks.partition_maintenance"
     ]
 )
 
@@ -67,6 +71,30 @@ celery.conf.beat_schedule = {
         "task": "reflection.trigger_batched",
         "schedule": crontab(hour=1, minute=0), # Run at 1:00 AM
     },
+    "reflection-debounce-dispatch": {
+        "task": "reflection.dispatch_due",
+        "schedule": 30.0, # Seconds; bounds how late a settled burst is picked up
+    },
+    "reflection-batch-poll": {
+        "task": "reflection.poll_batches",
+        "schedule": crontab(minute="*/10"), # Applies finished Batch API reflections
+    },
+    "graph-scores-daily": {
+        "task": "graph.trigger_scores",
+        "schedule": crontab(hour=2, minute=0), # After nightly reflection adds relations
+    },
+    "graph-size-metrics": {
+        "task": "metrics.collect_graph_size",
+        "schedule": crontab(minute="*/15"), # pg_class estimates, no table scans
+    },
+    "topic-clusters-nightly": {
+        "task": "cluster_notes_trigger",
+        "schedule": crontab(hour=2, minute=15), # MiniBatchKMeans over notes added since the last run
+    },
+    "partition-maintenance-daily": {
+        "task": "partitions.maintain",
+        "schedule": crontab(hour=2, minute=45), # Premake next months, drop expired ones
+    },
     "cleanup-memory-weekly": {
         "task": "cleanup_memory",
         "schedule": crontab(day_of_week="0", hour=3, minute=0), # Every Sunday at 3:00
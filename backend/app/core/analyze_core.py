@@ -3,18 +3,24 @@ from loguru import logger
 from sqlalchemy.future import select
 from sqlalchemy import desc, update
 from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
 import datetime
 import json
 import hashlib
 
 from app.models import Note, User, CachedAnalysis, CachedIntent
 from app.services.ai_service import ai_service
-from .rag_service import rag_service
+from .rag_service import rag_service, CONTEXT_DB_QUERIES
+from infrastructure import database
 from infrastructure.monitoring import monitor
 
 class AnalyzeCore:
-    async def _check_intent_cache(self, text: str, user_id: str, db: AsyncSession) -> Optional[Dict[str, Any]]:
-        """Checks if a simple command has a cached action result."""
+    async def _check_intent_cache(self, text: str, user_id: str, db: Optional[AsyncSession] = None) -> Optional[Dict[str, Any]]:
+        """
+        Checks if a simple command has a cached action result.
+        Without a session the lookup runs on its own pooled connection, so it can
+        overlap with the semantic lookup on the caller's session.
+        """
         # 1. Classification (Simple regex for example)
         intent = None
         params = {}
@@ -32,13 +38,16 @@ class AnalyzeCore:
         intent_key = hashlib.sha256(key_raw.encode()).hexdigest()
         
         # 3. Lookup
-        res = await db.execute(
-            select(CachedIntent).where(
-                CachedIntent.user_id == user_id,
-                CachedIntent.intent_key == intent_key,
-                CachedIntent.expires_at > datetime.datetime.now(datetime.timezone.utc)
-            )
+        stmt = select(CachedIntent).where(
+            CachedIntent.user_id == user_id,
+            CachedIntent.intent_key == intent_key,
+            CachedIntent.expires_at > datetime.datetime.now(datetime.timezone.utc)
         )
+        if db is None:
+            async with database.AsyncSessionLocal(user_id=user_id) as session:
+                res = await session.execute(stmt)
+        else:
+            res = await db.execute(stmt)
         entry = res.scalars().first()
         if entry:
             logger.info(f"Intent Cache Hit: {intent_key}")
@@ -46,6 +55,22 @@ class AnalyzeCore:
             return entry.action_json
         return None
 
+    async def _check_semantic_cache(self, text: str, user_id: str, db: AsyncSession) -> tuple[Optional[Dict[str, Any]], List[float]]:
+        """Looks up a near-duplicate analysis. Returns the cached result (if any) and the text embedding."""
+        current_embedding = await ai_service.generate_embedding(text)
+        cache_res = await db.execute(
+            select(CachedAnalysis)
+            .where(
+                CachedAnalysis.user_id == user_id,
+                CachedAnalysis.embedding.cosine_distance(current_embedding) < 0.1,
+                CachedAnalysis.expires_at > datetime.datetime.now(datetime.timezone.utc)
+            )
+            .order_by(CachedAnalysis.embedding.cosine_distance(current_embedding))
+            .limit(1)
+        )
+        cached_entry = cache_res.scalars().first()
+        return (cached_entry.result if cached_entry else None), current_embedding
+
     async def _save_intent_cache(self, text: str, user_id: str, analysis: Dict[str, Any], db: AsyncSession):
         """Saves simple intent results to cache (TTL 7 days)."""
         intent = analysis.get("intent")
@@ -66,7 +91,7 @@ class AnalyzeCore:
         db.add(new_cache)
 
     async def analyze_step(self, note: Note, user: Optional[User], db: AsyncSession, memory_service: Any) -> tuple[Dict[str, Any], bool]:
-        """Orchestrates RAG context, multiple cache levels, and DeepSeek analysis."""
+        """Orchestrates cache levels, lazy RAG context, and DeepSeek analysis."""
         user_bio = (user.bio or "") if user else ""
         
         # 1. Identity & Style Context
@@ -77,39 +102,32 @@ class AnalyzeCore:
             v_prefs = json.dumps(user.volatile_preferences, indent=2)
             user_bio += f"\n\nVolatile focus: {v_prefs} (Use if relevant to intent)."
 
-        # 2. Memory Context (RAG)
-        hierarchical_context = await rag_service.build_hierarchical_context(note, db, memory_service)
-        
         cache_hit = False
         analysis = None
-        
-        # 3. Intent Cache (Fastest)
-        intent_cached = await self._check_intent_cache(note.transcription_text, note.user_id, db)
+
+        # 2. Intent (Fastest) and Semantic (Contextual) caches, looked up concurrently
+        intent_cached, (semantic_cached, current_embedding) = await asyncio.gather(
+            self._check_intent_cache(note.transcription_text, note.user_id),
+            self._check_semantic_cache(note.transcription_text, note.user_id, db),
+        )
         if intent_cached:
             analysis = intent_cached
             cache_hit = True
-        
-        # 4. Semantic Cache (Contextual)
-        if not cache_hit:
-            current_embedding = await ai_service.generate_embedding(note.transcription_text)
-            cache_res = await db.execute(
-                select(CachedAnalysis)
-                .where(
-                    CachedAnalysis.user_id == note.user_id,
-                    CachedAnalysis.embedding.cosine_distance(current_embedding) < 0.1,
-                    CachedAnalysis.expires_at > datetime.datetime.now(datetime.timezone.utc)
-                )
-                .order_by(CachedAnalysis.embedding.cosine_distance(current_embedding))
-                .limit(1)
-            )
-            cached_entry = cache_res.scalars().first()
-            if cached_entry:
-                analysis = cached_entry.result
-                cache_hit = True
-                monitor.track_cache_hit("semantic")
+            hit_type = "intent"
+        elif semantic_cached:
+            analysis = semantic_cached
+            cache_hit = True
+            hit_type = "semantic"
+            monitor.track_cache_hit("semantic")
 
-        # 5. DeepSeek Call (Fallback)
-        if not cache_hit:
+        if cache_hit:
+            # Context is only needed for the LLM prompt, so a hit skips retrieval entirely
+            monitor.track_context_skipped(hit_type, db_queries=CONTEXT_DB_QUERIES)
+        else:
+            # 3. Memory Context (RAG) + DeepSeek Call (Fallback)
+            hierarchical_context = await rag_service.build_hierarchical_context(
+                note, db, memory_service, query_vector=current_embedding
+            )
             target_lang = user.target_language if user else "Original"
             analysis = await ai_service.analyze_text(
                 note.transcription_text,
@@ -120,12 +138,11 @@ class AnalyzeCore:
             # Save levels
             await self._save_intent_cache(note.transcription_text, note.user_id, analysis, db)
             
-            emb = await ai_service.generate_embedding(note.transcription_text)
             ttl = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=30)
-            db.add(CachedAnalysis(user_id=note.user_id, embedding=emb, result=analysis, expires_at=ttl))
+            db.add(CachedAnalysis(user_id=note.user_id, embedding=current_embedding, result=analysis, expires_at=ttl))
             monitor.track_cache_miss("all")
 
-        # 6. Apply & Finalize
+        # 4. Apply & Finalize
         self._apply_analysis_to_note(note, analysis)
         
         # Emotional snapshot
@@ -141,6 +158,7 @@ class AnalyzeCore:
     def _apply_analysis_to_note(self, note: Note, analysis: Dict[str, Any]):
         note.title = analysis.get("title", "Untitled")
         note.summary = analysis.get("summary")
+        note.context_snippet = rag_service.build_context_snippet(note.summary, note.transcription_text)
         note.action_items = analysis.get("action_items", [])
         note.tags = analysis.get("tags", [])
         # Requirement: Emotion used only for tone/empathy, not logic. 
@@ -1,4 +1,68 @@
+import asyncio
+import time
+from typing import Any, Optional
 from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from loguru import logger
 from infrastructure.config import settings
 
 bot = Bot(token=settings.TELEGRAM_BOT_TOKEN) if settings.TELEGRAM_BOT_TOKEN else None
+
+class TelegramSendQueue:
+    """
+    Outbound queue for bulk notifications, drained by one sender at most `rate` messages/s
+    (Telegram allows ~30/s per bot). A 429 pauses the whole queue for the advised retry_after
+    and the message is retried. Use as `async with TelegramSendQueue(bot) as q: q.put(...)`;
+    leaving the block waits until everything queued has been sent or given up on.
+    """
+    def __init__(self, telegram_bot: Any, rate: float = 25.0, max_retries: int = 3):
+        self.bot = telegram_bot
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.max_retries = max_retries
+        self.sent = 0
+        self.failed = 0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._next_send = 0.0
+
+    async def __aenter__(self):
+        self._worker = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+
+    def put(self, **message: Any):
+        """Queues one bot.send_message call (keyword arguments as for send_message)."""
+        self._queue.put_nowait(message)
+
+    async def _run(self):
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._send(message)
+            finally:
+                self._queue.task_done()
+
+    async def _send(self, message: dict):
+        for attempt in range(self.max_retries + 1):
+            delay = self._next_send - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_send = time.monotonic() + self.interval
+            try:
+                await self.bot.send_message(**message)
+                self.sent += 1
+                return
+            except TelegramRetryAfter as e:
+                logger.warning(f"Telegram flood limit, pausing {e.retry_after}s (attempt {attempt + 1})")
+                self._next_send = time.monotonic() + e.retry_after
+            except Exception as e:
+                logger.error(f"Telegram send to {message.get('chat_id')} failed: {e}")
+                break
+        self.failed += 1
@@ -0,0 +1,187 @@
+from typing import List, Dict, Any, Optional, Set, Tuple
+from loguru import logger
+from sqlalchemy import func, delete, update, union_all, tuple_
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+import datetime
+
+from app.models import NoteRelation
+
+class GraphService:
+    """
+    Write path for the note relation graph.
+    Edges are undirected and stored once under a canonical key:
+    (min(note ids), max(note ids), relation_type), enforced by a unique index.
+    """
+
+    @staticmethod
+    def canonical_key(note_id1: str, note_id2: str, relation_type: Optional[str]) -> Tuple[str, str, str]:
+        a, b = (note_id1, note_id2) if note_id1 <= note_id2 else (note_id2, note_id1)
+        return a, b, relation_type or "related"
+
+    @staticmethod
+    def merge_confidence(c1: Optional[float], c2: Optional[float]) -> float:
+        """
+        The better-supported proposal wins. Re-proposing an edge is not new evidence, so
+        confidence must not creep up with every reflection run that sees the same pair.
+        """
+        c1 = 1.0 if c1 is None else c1
+        c2 = 1.0 if c2 is None else c2
+        return max(c1, c2)
+
+    def merge_edges(self, edges: List[Dict[str, Any]]) -> Dict[Tuple[str, str, str], Dict[str, Any]]:
+        """Collapses edges onto canonical keys: max strength, max confidence, latest timestamp."""
+        merged: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        for e in edges:
+            key = self.canonical_key(e["note_id1"], e["note_id2"], e.get("relation_type"))
+            row = merged.get(key)
+            if row is None:
+                merged[key] = {
+                    **e,
+                    "note_id1": key[0], "note_id2": key[1], "relation_type": key[2],
+                    "strength": e.get("strength") or 0.0,
+                    "confidence": 1.0 if e.get("confidence") is None else e["confidence"],
+                }
+                continue
+            row["strength"] = max(row["strength"], e.get("strength") or 0.0)
+            row["confidence"] = self.merge_confidence(row["confidence"], e.get("confidence"))
+            if e.get("created_at") and (row.get("created_at") is None or e["created_at"] > row["created_at"]):
+                row["created_at"] = e["created_at"]
+        return merged
+
+    async def get_degrees(self, db: AsyncSession, user_id: str, node_ids: List[str]) -> Dict[str, int]:
+        """Current degrees of all given nodes in one grouped query (both index directions)."""
+        if not node_ids:
+            return {}
+        ids = list(set(node_ids))
+        endpoints = union_all(
+            select(NoteRelation.note_id1.label("node_id"))
+            .where(NoteRelation.user_id == user_id, NoteRelation.note_id1.in_(ids)),
+            select(NoteRelation.note_id2.label("node_id"))
+            .where(NoteRelation.user_id == user_id, NoteRelation.note_id2.in_(ids)),
+        ).subquery("endpoints")
+        res = await db.execute(select(endpoints.c.node_id, func.count()).group_by(endpoints.c.node_id))
+        return {node_id: count for node_id, count in res.all()}
+
+    async def get_existing_keys(self, db: AsyncSession, user_id: str,
+                                edges: List[Dict[str, Any]]) -> Set[Tuple[str, str, str]]:
+        """Canonical keys of the proposed edges that are already stored, in one query."""
+        keys = list({self.canonical_key(e["note_id1"], e["note_id2"], e.get("relation_type")) for e in edges})
+        if not keys:
+            return set()
+        res = await db.execute(
+            select(NoteRelation.note_id1, NoteRelation.note_id2, NoteRelation.relation_type)
+            .where(
+                NoteRelation.user_id == user_id,
+                tuple_(NoteRelation.note_id1, NoteRelation.note_id2, NoteRelation.relation_type).in_(keys),
+            )
+        )
+        return {tuple(row) for row in res.all()}
+
+    def enforce_degree_cap(self, edges: List[Dict[str, Any]], degrees: Dict[str, int],
+                           max_degree: int = 10,
+                           existing: Optional[Set[Tuple[str, str, str]]] = None) -> List[Dict[str, Any]]:
+        """
+        Keeps edges (in proposal order) while both endpoints stay under max_degree.
+        Accepted edges count towards the running degrees; a pair proposed twice counts once.
+        Edges in `existing` are already part of `degrees`: they are updates, always kept and
+        never counted again.
+        """
+        degrees = dict(degrees)
+        accepted, seen = [], set(existing or ())
+        for e in edges:
+            n1, n2 = e["note_id1"], e["note_id2"]
+            key = self.canonical_key(n1, n2, e.get("relation_type"))
+            if key in seen:
+                accepted.append(e)
+                continue
+            if degrees.get(n1, 0) >= max_degree or degrees.get(n2, 0) >= max_degree:
+                continue
+            degrees[n1] = degrees.get(n1, 0) + 1
+            degrees[n2] = degrees.get(n2, 0) + 1
+            seen.add(key)
+            accepted.append(e)
+        return accepted
+
+    async def upsert_relations(self, db: AsyncSession, user_id: str, edges: List[Dict[str, Any]]) -> int:
+        """
+        Inserts edges with INSERT ... ON CONFLICT on the canonical key.
+        An existing edge keeps the stronger strength and confidence and has its TTL refreshed.
+        Self-loops are dropped. Returns the number of distinct edges written.
+        """
+        now = datetime.datetime.utcnow()
+        rows = []
+        for row in self.merge_edges([e for e in edges if e["note_id1"] != e["note_id2"]]).values():
+            rows.append({
+                "user_id": user_id,
+                "note_id1": row["note_id1"],
+                "note_id2": row["note_id2"],
+                "relation_type": row["relation_type"],
+                "strength": float(row["strength"]),
+                "confidence": float(row["confidence"]),
+                "source": row.get("source") or "inferred",
+                "created_at": now,
+            })
+        if not rows:
+            return 0
+
+        stmt = pg_insert(NoteRelation).values(rows)
+        current, new = NoteRelation.__table__.c, stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[current.note_id1, current.note_id2, current.relation_type],
+            set_={
+                "strength": func.greatest(current.strength, new.strength),
+                "confidence": func.greatest(func.coalesce(current.confidence, 1.0), func.coalesce(new.confidence, 1.0)),
+                "created_at": new.created_at,
+                "user_id": func.coalesce(current.user_id, new.user_id),
+            }
+        )
+        await db.execute(stmt)
+        logger.debug(f"Upserted {len(rows)} note relations for {user_id}")
+        return len(rows)
+
+    async def compact_user_relations(self, db: AsyncSession, user_id: str) -> Tuple[int, int]:
+        """
+        Merges a user's duplicate edges onto one survivor per canonical key (lowest id) and
+        rewrites survivors into canonical orientation. Returns (merged_groups, deleted_rows).
+        """
+        res = await db.execute(
+            select(
+                NoteRelation.id, NoteRelation.note_id1, NoteRelation.note_id2, NoteRelation.relation_type,
+                NoteRelation.strength, NoteRelation.confidence, NoteRelation.created_at
+            )
+            .where(NoteRelation.user_id == user_id)
+            .order_by(NoteRelation.id)
+        )
+        groups: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+        for rid, n1, n2, r_type, strength, confidence, created_at in res.all():
+            if not n1 or not n2:
+                continue
+            groups.setdefault(self.canonical_key(n1, n2, r_type), []).append({
+                "id": rid, "note_id1": n1, "note_id2": n2, "relation_type": r_type,
+                "strength": strength, "confidence": confidence, "created_at": created_at,
+            })
+
+        doomed, rewrites = [], []
+        for key, rows in groups.items():
+            survivor = rows[0]
+            if len(rows) == 1 and (survivor["note_id1"], survivor["note_id2"], survivor["relation_type"]) == key:
+                continue
+            merged = self.merge_edges(rows)[key]
+            doomed.extend(r["id"] for r in rows[1:])
+            rewrites.append({
+                "id": survivor["id"],
+                "note_id1": key[0], "note_id2": key[1], "relation_type": key[2],
+                "strength": merged["strength"], "confidence": merged["confidence"],
+                "created_at": merged.get("created_at") or survivor["created_at"],
+            })
+
+        # Duplicates go first so survivors can take their canonical key without colliding
+        if doomed:
+            await db.execute(delete(NoteRelation).where(NoteRelation.id.in_(doomed)))
+        if rewrites:
+            await db.execute(update(NoteRelation), rewrites) # Bulk UPDATE by primary key
+        return len(rewrites), len(doomed)
+
+graph_service = GraphService()
@@ -45,6 +45,7 @@ class IntentDetectionService:
     def _apply_analysis_to_note(self, note: Note, analysis: Dict[str, Any]):
         note.title = analysis.get("title", "Untitled Note")
         note.summary = analysis.get("summary")
+        note.context_snippet = rag_service.build_context_snippet(note.summary, note.transcription_text)
         note.action_items = analysis.get("action_items", [])
         note.calendar_events = analysis.get("calendar_events", [])
         note.tags = analysis.get("tags", [])
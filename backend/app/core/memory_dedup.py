@@ -0,0 +1,43 @@
+from typing import Any, List, Optional, Sequence
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from common import vector_ops
+
+SIMILARITY_BLOCK_ROWS = 512 # Rows of the similarity matrix materialized at once
+
+def candidate_groups(embeddings: Sequence[Optional[Any]], threshold: float = 0.85,
+                     max_group_size: int = 8) -> List[List[int]]:
+    """
+    Groups near-duplicate embeddings before any LLM call.
+    Pairwise cosine similarity is computed blockwise over a normalized float32 matrix;
+    pairs >= threshold are linked and connected components become candidate groups.
+    Components larger than max_group_size are split, most similar to the anchor first.
+    Returns groups of input indices (size >= 2); missing or zero vectors are never grouped.
+    """
+    matrix, valid = vector_ops.stack_valid(embeddings)
+    n = len(valid)
+    if n < 2:
+        return []
+    matrix = vector_ops.normalize(matrix)
+
+    rows, cols = vector_ops.pairs_above(matrix, threshold, block_rows=SIMILARITY_BLOCK_ROWS)
+    if not len(rows):
+        return []
+
+    graph = sparse.coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    linked = np.zeros(n, dtype=bool)
+    linked[rows] = linked[cols] = True
+
+    groups: List[List[int]] = []
+    for label in np.unique(labels[linked]):
+        members = np.flatnonzero(labels == label)
+        if len(members) > max_group_size:
+            order = np.argsort(-(matrix[members] @ matrix[members[0]]), kind="stable")
+            members = members[order]
+        for i in range(0, len(members), max_group_size):
+            chunk = members[i:i + max_group_size]
+            if len(chunk) >= 2:
+                groups.append([int(valid[j]) for j in chunk])
+    return groups
@@ -1,20 +1,61 @@
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Dict, Set
 from loguru import logger
 from sqlalchemy.future import select
-from sqlalchemy import desc
+from sqlalchemy import desc, func, bindparam, Float, cast, literal, true, all_, union_all
+from sqlalchemy.dialects.postgresql import array
 from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
 import math
+import time
 import datetime
 
 from app.services.ai_service import ai_service
-from app.models import Note, NoteEmbedding, LongTermMemory
-from infrastructure.redis_client import short_term_memory
+from app.models import Note, NoteEmbedding, NoteRelation, NoteGraphScore, LongTermMemory
+from app.core.types import ContextNote, HierarchicalContext
+from app.core.topic_clusters import assign_topic
+from infrastructure import database
+from infrastructure.redis_client import short_term_memory, graph_adjacency_cache
 from infrastructure.config import settings
+from infrastructure.monitoring import monitor
+
+CONTEXT_SNIPPET_CHARS = 200
+# DB round-trips per hierarchical context build: short-term, vector, graph, long-term
+CONTEXT_DB_QUERIES = 4
 
 class RagService:
+    GRAPH_MAX_DEGREE = 10
+
+    @staticmethod
+    def build_context_snippet(summary: Optional[str], transcription_text: Optional[str]) -> Optional[str]:
+        """Short text stored on the note at analysis time and used by RAG instead of full content."""
+        source = summary or transcription_text
+        return source[:CONTEXT_SNIPPET_CHARS] if source else None
+
+    @staticmethod
+    def _snippet_column():
+        """Precomputed snippet, falling back to a SQL-side prefix for notes analyzed before it existed."""
+        return func.coalesce(
+            Note.context_snippet,
+            func.left(func.coalesce(func.nullif(Note.summary, ""), Note.transcription_text), CONTEXT_SNIPPET_CHARS)
+        ).label("snippet")
+
+    @staticmethod
+    def _temporal_score_column(importance_col, created_at_col, similarity=None):
+        """
+        SQL-side ranking expression:
+        Score = similarity * importance * exp(-days_since_created / decay_constant)
+        The decay constant is sent as a bound parameter.
+        """
+        decay = bindparam("decay_days", value=float(settings.RAG_TEMPORAL_DECAY_DAYS or 30), type_=Float)
+        age_days = func.extract("epoch", func.now() - created_at_col) / 86400.0
+        score = func.coalesce(importance_col, 5.0) * func.exp(-age_days / decay)
+        if similarity is not None:
+            score = similarity * score
+        return score
+
     def _calculate_temporal_score(self, importance: float, created_at: datetime.datetime) -> float:
         """
-        Calculates a score based on importance and freshness.
+        In-memory equivalent of _temporal_score_column (without similarity).
         Score = importance * exp(-days_since_created / decay_constant)
         """
         if importance is None:
@@ -51,117 +92,227 @@ class RagService:
                 db.add(NoteEmbedding(note_id=note.id, user_id=note.user_id, embedding=vector))
         except Exception as e:
             logger.error(f"Embedding failed for note {note.id}: {e}")
+            return
+
+        # Topic: nearest persisted centroid (O(k)); the periodic MiniBatchKMeans pass refines it
+        try:
+            topic = await assign_topic(db, note.user_id, vector)
+            if topic:
+                note.cluster_id = topic
+        except Exception as e:
+            logger.warning(f"Topic assignment failed for note {note.id}: {e}")
 
-    async def get_medium_term_context(self, user_id: str, note_id: str, text: str, db: AsyncSession) -> dict:
+    def _graph_edge_filters(self, user_id: str) -> tuple:
+        """Graph Filter: Confidence > 0.6 AND Strength > 0.7 (Requirement), TTL: 180 days."""
+        ttl_cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=180)
+        return (
+            NoteRelation.user_id == user_id,
+            NoteRelation.confidence > 0.6,
+            NoteRelation.strength > 0.7,
+            NoteRelation.created_at >= ttl_cutoff,
+        )
+
+    def _graph_walk(self, user_id: str, seed_ids: Set[str], hops: int):
+        """
+        k-hop expansion from the seed notes as a recursive CTE.
+        Each step reads the user's adjacency through the (user_id, note_id1) / (user_id, note_id2)
+        indexes and keeps at most GRAPH_MAX_DEGREE strongest edges per node (LATERAL ... LIMIT).
+        Path score is the product of strength * confidence along the path; cycles and edges back
+        into the seed set are skipped. Returns a subquery of (node_id, score), best path per node.
+        """
+        seeds = list(seed_ids)
+        seed = func.unnest(array(seeds)).table_valued("node_id").alias("seed")
+        walk = select(
+            seed.c.node_id.label("node_id"),
+            literal(0).label("depth"),
+            cast(literal(1.0), Float).label("score"),
+            array([seed.c.node_id]).label("path"),
+        ).cte("graph_walk", recursive=True)
+
+        outgoing = (
+            select(NoteRelation.note_id2.label("neighbor_id"), NoteRelation.strength, NoteRelation.confidence)
+            .where(NoteRelation.note_id1 == walk.c.node_id, *self._graph_edge_filters(user_id))
+            .correlate(walk)
+        )
+        incoming = (
+            select(NoteRelation.note_id1.label("neighbor_id"), NoteRelation.strength, NoteRelation.confidence)
+            .where(NoteRelation.note_id2 == walk.c.node_id, *self._graph_edge_filters(user_id))
+            .correlate(walk)
+        )
+        adjacency = union_all(outgoing, incoming).subquery("adjacency")
+        edge = (
+            select(adjacency)
+            .where(adjacency.c.neighbor_id.not_in(seeds)) # Don't cycle back to start set
+            .order_by(desc(adjacency.c.strength), desc(adjacency.c.confidence))
+            .limit(self.GRAPH_MAX_DEGREE) # Max Degree Constraint
+            .lateral("edge")
+        )
+        walk = walk.union_all(
+            select(
+                edge.c.neighbor_id,
+                walk.c.depth + 1,
+                walk.c.score * func.coalesce(edge.c.strength, 0.0) * func.coalesce(edge.c.confidence, 1.0),
+                walk.c.path.op("||")(edge.c.neighbor_id),
+            )
+            .select_from(walk.join(edge, true()))
+            .where(walk.c.depth < hops, edge.c.neighbor_id != all_(walk.c.path))
+        )
+        return (
+            select(walk.c.node_id, func.max(walk.c.score).label("score"))
+            .where(walk.c.depth > 0)
+            .group_by(walk.c.node_id)
+            .subquery("graph_reached")
+        )
+
+    async def _load_adjacency(self, user_id: str, db: AsyncSession) -> Dict[str, List[list]]:
+        """The user's filtered adjacency list (both directions), strongest edges first."""
+        res = await db.execute(
+            select(NoteRelation.note_id1, NoteRelation.note_id2, NoteRelation.strength, NoteRelation.confidence)
+            .where(*self._graph_edge_filters(user_id))
+            .order_by(desc(NoteRelation.strength), desc(NoteRelation.confidence))
+        )
+        adjacency: Dict[str, List[list]] = {}
+        for n1, n2, strength, confidence in res.all():
+            adjacency.setdefault(n1, []).append([n2, strength, confidence])
+            adjacency.setdefault(n2, []).append([n1, strength, confidence])
+        return adjacency
+
+    async def _expand_graph_cached(self, user_id: str, seed_ids: Set[str], hops: int,
+                                   query_vector: List[float], db: AsyncSession) -> list:
+        """
+        Same expansion as _graph_walk, served from the Redis adjacency list (one HMGET per hop).
+        A cold cache is built from one user-scoped query. Returns (node_id, score, title, snippet, distance) rows.
+        """
+        local: Optional[Dict[str, List[list]]] = None
+        best: Dict[str, float] = {}
+        frontier = {nid: 1.0 for nid in seed_ids}
+
+        for _ in range(hops):
+            if not frontier:
+                break
+            neighbors = None
+            if local is None:
+                try:
+                    neighbors = await graph_adjacency_cache.get_neighbors(user_id, list(frontier))
+                except Exception as e:
+                    logger.warning(f"Adjacency cache unavailable: {e}")
+            if neighbors is None:
+                if local is None:
+                    local = await self._load_adjacency(user_id, db)
+                    try:
+                        await graph_adjacency_cache.store(user_id, local)
+                    except Exception as e:
+                        logger.warning(f"Adjacency cache store failed: {e}")
+                neighbors = {nid: local.get(nid, []) for nid in frontier}
+
+            next_frontier: Dict[str, float] = {}
+            for nid, path_score in frontier.items():
+                edges = [e for e in neighbors.get(nid, []) if e[0] not in seed_ids][:self.GRAPH_MAX_DEGREE]
+                for target, strength, confidence in edges:
+                    score = path_score * (strength or 0.0) * (confidence if confidence is not None else 1.0)
+                    if score > best.get(target, 0.0):
+                        best[target] = score
+                        next_frontier[target] = score
+            frontier = next_frontier
+
+        if not best:
+            return []
+        res = await db.execute(
+            select(Note.id, Note.title, self._snippet_column(), NoteEmbedding.embedding.cosine_distance(query_vector))
+            .outerjoin(NoteEmbedding, (NoteEmbedding.note_id == Note.id) & (NoteEmbedding.user_id == user_id))
+            .where(Note.user_id == user_id, Note.id.in_(list(best)))
+        )
+        return [(nid, best[nid], title, snippet, dist) for nid, title, snippet, dist in res.all()]
+
+    async def get_medium_term_context(self, user_id: str, note_id: str, text: str, db: AsyncSession,
+                                      query_vector: Optional[List[float]] = None, timings: Optional[Dict[str, float]] = None) -> dict:
         """Fetch similar notes via Vector Search + Graph Relations (Medium-Term Memory)."""
         try:
-            from app.models import NoteRelation
-            
             # 1. Vector Search + Temporal Weighting
-            query_vector = await ai_service.generate_embedding(text)
-            # Fetch more candidates to re-rank by temporal score
-            vector_res = await db.execute(
-                select(Note)
-                .join(NoteEmbedding)
-                .where(Note.user_id == user_id, Note.id != note_id)
-                .order_by(NoteEmbedding.embedding.cosine_distance(query_vector))
-                .limit(20)
+            started = time.perf_counter()
+            if query_vector is None:
+                query_vector = await ai_service.generate_embedding(text)
+            # Index-driven candidate pool (ANN on the user's partition), ranked by the final score in SQL
+            distance = NoteEmbedding.embedding.cosine_distance(query_vector)
+            pool = (
+                select(NoteEmbedding.note_id, distance.label("distance"))
+                .where(NoteEmbedding.user_id == user_id, NoteEmbedding.note_id != note_id)
+                .order_by(distance)
+                .limit(settings.RAG_CANDIDATE_POOL)
+                .subquery("vector_pool")
             )
-            candidates = list(vector_res.scalars().all())
-            
-            # Re-rank by Temporal Score
-            candidates.sort(
-                key=lambda n: self._calculate_temporal_score(n.importance_score, n.created_at),
-                reverse=True
+            score = self._temporal_score_column(Note.importance_score, Note.created_at, similarity=1.0 - pool.c.distance)
+            # Graph importance re-rank: precomputed PageRank, joined by primary key
+            graph_weight = bindparam("graph_weight", float(settings.RAG_GRAPH_IMPORTANCE_WEIGHT), type_=Float)
+            score = score * (1.0 + graph_weight * func.coalesce(NoteGraphScore.score, 0.0))
+            # Column projection: only what the context needs, never transcripts/analysis JSON
+            vector_res = await db.execute(
+                select(Note.id, Note.title, self._snippet_column(), Note.created_at, Note.importance_score)
+                .join(pool, pool.c.note_id == Note.id)
+                .outerjoin(NoteGraphScore, (NoteGraphScore.user_id == user_id) & (NoteGraphScore.note_id == Note.id))
+                .where(Note.user_id == user_id)
+                .order_by(desc(score))
+                .limit(5)
             )
-            vector_notes = candidates[:5]
+            vector_notes = [ContextNote(*row) for row in vector_res.all()]
+            if timings is not None:
+                timings["vector"] = (time.perf_counter() - started) * 1000
 
-            # 2. Graph Traversal (1-hop)
+            # 2. Graph Traversal (k-hop, user-scoped adjacency)
+            started = time.perf_counter()
             vector_ids = set([n.id for n in vector_notes])
             graph_notes = []
             
             if vector_ids:
-                # Graph Filter: Confidence > 0.6 AND Strength > 0.7 (Requirement)
-                # TTL: 180 days
-                ttl_cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=180)
-                
-                graph_res = await db.execute(
-                    select(NoteRelation)
-                    .where(
-                        (NoteRelation.note_id1.in_(vector_ids)) | 
-                        (NoteRelation.note_id2.in_(vector_ids)),
-                        NoteRelation.confidence > 0.6,
-                        NoteRelation.strength > 0.7,
-                        NoteRelation.created_at >= ttl_cutoff
+                hops = max(1, settings.RAG_GRAPH_HOPS)
+                if settings.RAG_GRAPH_ADJACENCY_CACHE:
+                    graph_rows = await self._expand_graph_cached(user_id, vector_ids, hops, query_vector, db)
+                else:
+                    walk = self._graph_walk(user_id, vector_ids, hops)
+                    # Reached nodes with their projection and distance in one round-trip (outer join:
+                    # neighbors without embeddings still took a degree slot during expansion)
+                    graph_res = await db.execute(
+                        select(
+                            walk.c.node_id, walk.c.score,
+                            Note.title, self._snippet_column(), NoteEmbedding.embedding.cosine_distance(query_vector)
+                        )
+                        .join(Note, Note.id == walk.c.node_id)
+                        .outerjoin(NoteEmbedding, (NoteEmbedding.note_id == Note.id) & (NoteEmbedding.user_id == user_id))
                     )
-                    .order_by(desc(NoteRelation.strength), desc(NoteRelation.confidence))
-                )
-                relations = graph_res.scalars().all()
-                logger.info(f"Graph traversal: found {len(relations)} connections")
-                
-                # We need embeddings for neighbors to calculate weighted score
-                # Map neighbor_id -> max(strength * confidence)
-                # Max Degree Constraint: 10 edges per source node
+                    graph_rows = graph_res.all()
+                logger.info(f"Graph traversal: reached {len(graph_rows)} notes in {hops} hop(s)")
+
+                # Map neighbor_id -> best path quality (product of strength * confidence)
                 neighbor_map = {}
-                degree_count = {} # source_id -> count
+                neighbor_notes = {}
+                for target, path_score, title, snippet, dist in graph_rows:
+                    if dist is None: continue # Neighbor has no embedding
+                    neighbor_map[target] = max(neighbor_map.get(target, 0.0), path_score or 0.0)
+                    neighbor_notes[target] = (ContextNote(target, title, snippet), dist)
                 
-                for r in relations:
-                    source_id = r.note_id1 if r.note_id1 in vector_ids else r.note_id2
-                    target = r.note_id2 if r.note_id1 in vector_ids else r.note_id1
-                    
-                    if target in vector_ids: continue # Don't cycle back to start set
-                    
-                    # Constraint: Max Degree 10
-                    current_degree = degree_count.get(source_id, 0)
-                    if current_degree >= 10:
-                        continue
-                    degree_count[source_id] = current_degree + 1
-                    
-                    # Score using strength * confidence (Relation Quality)
-                    s = (r.strength or 0) * (r.confidence or 1.0)
-                    
-                    if target not in neighbor_map:
-                        neighbor_map[target] = s
-                    else:
-                        neighbor_map[target] = max(neighbor_map[target], s)
+                candidates_scored = []
+                for target, (n_obj, dist) in neighbor_notes.items():
+                    sim = 1.0 - dist
+                    # Weighted Score: 30% Graph (Quality) + 70% Cosine
+                    final_score = (0.3 * neighbor_map[target]) + (0.7 * sim)
+                    candidates_scored.append((final_score, n_obj))
                 
-                if neighbor_map:
-                    n_ids = list(neighbor_map.keys())
-                    
-                    # Optimization: Query distance directly
-                    nb_res_dist = await db.execute(
-                        select(Note, NoteEmbedding.embedding.cosine_distance(query_vector))
-                        .join(NoteEmbedding)
-                        .where(Note.id.in_(n_ids))
-                    )
-                    
-                    candidates_scored = []
-                    for row in nb_res_dist.all():
-                        n_obj = row[0]
-                        dist = row[1]
-                        sim = 1.0 - dist
-                        rel_score = neighbor_map[n_obj.id]
-                        
-                        # Weighted Score: 30% Graph (Quality) + 70% Cosine
-                        final_score = (0.3 * rel_score) + (0.7 * sim)
-                        candidates_scored.append((final_score, n_obj))
-                    
-                    # Sort by Final Score
-                    candidates_scored.sort(key=lambda x: x[0], reverse=True)
-                    
-                    # Top K=5
-                    graph_notes = [x[1] for x in candidates_scored[:5]]
+                # Sort by Final Score
+                candidates_scored.sort(key=lambda x: x[0], reverse=True)
+                
+                # Top K=5
+                graph_notes = [x[1] for x in candidates_scored[:5]]
+            if timings is not None:
+                timings["graph"] = (time.perf_counter() - started) * 1000
             
             # Formatting
             v_parts = []
             for n in vector_notes:
-                summary = n.summary[:200] if n.summary else (n.transcription_text[:200] if n.transcription_text else "No content")
-                v_parts.append(f"Note: {n.title}\nSummary: {summary}")
+                v_parts.append(f"Note: {n.title}\nSummary: {n.snippet or 'No content'}")
             
             g_parts = []
             for n in graph_notes:
-                summary = n.summary[:200] if n.summary else (n.transcription_text[:200] if n.transcription_text else "No content")
-                g_parts.append(f"Related note: {n.title} - {summary}")
+                g_parts.append(f"Related note: {n.title} - {n.snippet or 'No content'}")
 
             return {
                 "vector": "\n".join(v_parts) if v_parts else "No similar notes found.",
@@ -171,74 +322,166 @@ class RagService:
             logger.error(f"Medium-Term retrieval failed: {e}")
             return {"vector": "", "graph": ""}
 
-    async def get_long_term_memory(self, user_id: str, db: AsyncSession, query_text: Optional[str] = None) -> str:
-        """Fetch top long-term memories with temporal weighting."""
+    async def get_long_term_memory(self, user_id: str, db: AsyncSession, query_text: Optional[str] = None,
+                                   query_vector: Optional[List[float]] = None) -> str:
+        """Fetch top long-term memories, ranked by temporal score in SQL."""
         try:
-            if query_text:
+            filters = (LongTermMemory.user_id == user_id, LongTermMemory.is_archived == False, LongTermMemory.confidence > 0.6)
+            if query_text or query_vector is not None:
                  logger.info(f"Using partition for user_id={user_id} in get_long_term_memory search")
-                 query_vec = await ai_service.generate_embedding(query_text)
-                 result = await db.execute(
-                      select(LongTermMemory)
-                      .where(LongTermMemory.user_id == user_id, LongTermMemory.is_archived == False, LongTermMemory.confidence > 0.6)
-                      .order_by(LongTermMemory.embedding.cosine_distance(query_vec))
-                      .limit(50)
+                 query_vec = query_vector if query_vector is not None else await ai_service.generate_embedding(query_text)
+                 distance = LongTermMemory.embedding.cosine_distance(query_vec)
+                 pool = (
+                      select(LongTermMemory.id, distance.label("distance"))
+                      .where(*filters)
+                      .order_by(distance)
+                      .limit(settings.RAG_CANDIDATE_POOL)
+                      .subquery("memory_pool")
+                 )
+                 score = self._temporal_score_column(LongTermMemory.importance_score, LongTermMemory.created_at, similarity=1.0 - pool.c.distance)
+                 stmt = (
+                      select(LongTermMemory.summary_text, LongTermMemory.importance_score)
+                      .join(pool, pool.c.id == LongTermMemory.id)
+                      .where(LongTermMemory.user_id == user_id)
                  )
-                 candidates = list(result.scalars().all())
             else:
-                   result = await db.execute(
-                       select(LongTermMemory)
-                       .where(LongTermMemory.user_id == user_id, LongTermMemory.is_archived == False, LongTermMemory.confidence > 0.6)
-                       .order_by(desc(LongTermMemory.importance_score), desc(LongTermMemory.created_at))
-                       .limit(20)
-                   )
-                   candidates = list(result.scalars().all())
-
-            # Re-rank by Temporal Score
-            candidates.sort(
-                key=lambda x: self._calculate_temporal_score(x.importance_score, x.created_at),
-                reverse=True
-            )
-            final = candidates[:5]
+                   score = self._temporal_score_column(LongTermMemory.importance_score, LongTermMemory.created_at)
+                   stmt = select(LongTermMemory.summary_text, LongTermMemory.importance_score).where(*filters)
+
+            result = await db.execute(stmt.order_by(desc(score)).limit(5))
+            final = result.all()
 
-            parts = [f"- {s.summary_text} (Score: {s.importance_score})" for s in final]
+            parts = [f"- {summary_text} (Score: {importance})" for summary_text, importance in final]
             return "\n".join(parts) if parts else "No long-term knowledge recorded yet."
         except Exception as e:
             logger.error(f"Long-Term retrieval failed: {e}")
             return ""
 
-    async def build_hierarchical_context(self, note: Note, db: AsyncSession, memory_service: Any = None) -> str:
-        """Aggregates Short, Medium, and Long term memory contexts."""
-        # 1. Short Term (Last 10 Notes)
+    @staticmethod
+    def recent_note_entry(note_id: str, created_at: Optional[datetime.datetime], snippet: Optional[str]) -> Dict[str, Any]:
+        """Ring-buffer entry for the short-term context (date + snippet)."""
+        created_at = created_at or datetime.datetime.now(datetime.timezone.utc)
+        return {"note_id": note_id, "date": created_at.strftime('%Y-%m-%d'), "snippet": snippet or ""}
+
+    @staticmethod
+    def _format_short_term(entries: List[Dict[str, Any]]) -> str:
+        return "\n".join([f"- {e['date']}: {(e.get('snippet') or '')[:100]}" for e in entries])
+
+    async def get_cached_short_term_context(self, user_id: str, note_id: str) -> Optional[str]:
+        """Short-term context from the Redis ring buffer. None on a cold start or Redis failure."""
+        try:
+            recent = await short_term_memory.get_recent_notes(user_id)
+        except Exception as e:
+            logger.warning(f"Recent-notes buffer unavailable: {e}")
+            return None
+        if recent is None:
+            return None
+
+        # Pipeline retries may push the same note twice; the current note is never its own context
+        seen = {note_id}
+        entries = []
+        for entry in recent:
+            if entry.get("note_id") in seen:
+                continue
+            seen.add(entry.get("note_id"))
+            entries.append(entry)
+        return self._format_short_term(entries)
+
+    async def evict_recent_notes(self, user_id: str, note_ids: List[str]):
+        """Keeps edited or deleted notes out of the short-term context."""
+        try:
+            await short_term_memory.evict_recent_notes(user_id, note_ids)
+        except Exception as e:
+            # The buffer expires within its TTL anyway
+            logger.warning(f"Recent-notes buffer eviction failed: {e}")
+
+    async def get_short_term_context(self, user_id: str, note_id: str, db: AsyncSession) -> str:
+        """Last 10 notes (date + snippet) from the DB. Warms the Redis ring buffer on the way out."""
         try:
             st_res = await db.execute(
-                select(Note)
-                .where(Note.user_id == note.user_id, Note.id != note.id)
+                select(Note.id, Note.created_at, self._snippet_column())
+                .where(Note.user_id == user_id, Note.id != note_id)
                 .order_by(desc(Note.created_at))
                 .limit(10)
             )
-            st_notes = st_res.scalars().all()
-            short_term = "\n".join([f"- {n.created_at.strftime('%Y-%m-%d')}: {n.summary[:100] if n.summary else n.transcription_text[:100]}" for n in st_notes])
+            entries = [self.recent_note_entry(nid, created_at, snippet) for nid, created_at, snippet in st_res.all()]
         except Exception as e:
             logger.error(f"Short-term fetch failed: {e}")
-            short_term = ""
-            
-        if not short_term: short_term = "No recent notes."
+            return ""
 
-        # 2. Medium Term (RAG + Graph)
-        mt_data = await self.get_medium_term_context(note.user_id, note.id, note.transcription_text, db)
-        vector_context = mt_data["vector"]
-        graph_context = mt_data["graph"]
+        try:
+            await short_term_memory.warm_recent_notes(user_id, entries)
+        except Exception as e:
+            logger.warning(f"Recent-notes buffer warm failed: {e}")
+        return self._format_short_term(entries)
 
-        # 3. Long Term (Prioritized)
-        long_term = await self.get_long_term_memory(note.user_id, db, query_text=note.transcription_text)
-        if not long_term: long_term = "No long-term knowledge."
+    async def _timed_section(self, name: str, timings: Dict[str, float], user_id: str, coro_fn, *args, **kwargs):
+        """Runs one context section on its own read-only session (replica if fresh) and records its latency."""
+        started = time.perf_counter()
+        try:
+            async with database.read_session(user_id=user_id) as session:
+                return await coro_fn(user_id, *args, session, **kwargs)
+        finally:
+            timings[name] = (time.perf_counter() - started) * 1000
 
-        return (
-            f"Short-term context (Recent 10 notes):\n{short_term}\n\n"
-            f"Recent context (Similar notes):\n{vector_context}\n\n"
-            f"Graph connections:\n{graph_context}\n\n"
-            f"Long-term knowledge (Key memories):\n{long_term}"
+    async def fetch_hierarchical_context(self, note: Note, db: AsyncSession,
+                                         query_vector: Optional[List[float]] = None) -> HierarchicalContext:
+        """
+        Fetches Short, Medium, and Long term sections concurrently.
+        Medium-term runs on the caller's session; short and long-term each get a
+        separate pooled connection, so the DB work is pipelined instead of serialized.
+        Pass query_vector when the caller already embedded the note text.
+        """
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        # One embedding for both vector searches
+        if query_vector is None and note.transcription_text:
+            try:
+                query_vector = await ai_service.generate_embedding(note.transcription_text)
+            except Exception as e:
+                logger.error(f"Context embedding failed: {e}")
+        timings["embedding"] = (time.perf_counter() - started) * 1000
+
+        async def medium():
+            return await self.get_medium_term_context(
+                note.user_id, note.id, note.transcription_text, db, query_vector=query_vector, timings=timings
+            )
+
+        async def short_term():
+            section_started = time.perf_counter()
+            cached = await self.get_cached_short_term_context(note.user_id, note.id)
+            if cached is not None:
+                timings["short_term"] = (time.perf_counter() - section_started) * 1000
+                return cached
+            # Cold start: fall back to the DB on a pooled session
+            return await self._timed_section("short_term", timings, note.user_id, self.get_short_term_context, note.id)
+
+        short_term, mt_data, long_term = await asyncio.gather(
+            short_term(),
+            medium(),
+            self._timed_section("long_term", timings, note.user_id, self.get_long_term_memory,
+                                query_text=note.transcription_text, query_vector=query_vector),
         )
+        timings["total"] = (time.perf_counter() - started) * 1000
+
+        for section, ms in timings.items():
+            monitor.track_rag_section(section, ms / 1000)
+        logger.info("RAG context timings (ms): " + ", ".join(f"{k}={v:.1f}" for k, v in timings.items()))
+
+        return HierarchicalContext(
+            short_term=short_term or "No recent notes.",
+            vector=mt_data["vector"],
+            graph=mt_data["graph"],
+            long_term=long_term or "No long-term knowledge.",
+            timings=timings
+        )
+
+    async def build_hierarchical_context(self, note: Note, db: AsyncSession, memory_service: Any = None,
+                                         query_vector: Optional[List[float]] = None) -> str:
+        """Aggregates Short, Medium, and Long term memory contexts into the prompt block."""
+        context = await self.fetch_hierarchical_context(note, db, query_vector=query_vector)
+        return context.render()
 
     async def restore_memory(self, memory_id: str, db: AsyncSession) -> bool:
         """Restores an archived memory record."""
@@ -55,21 +55,21 @@ class SyncService:
                 continue
 
             if integration.provider == "google_maps":
-                sync_google_maps.delay(note.id)
+                sync_google_maps.delay(note.id, user_id=note.user_id)
             elif integration.provider == "yandex_maps":
-                sync_yandex_maps.delay(note.id)
+                sync_yandex_maps.delay(note.id, user_id=note.user_id)
             elif integration.provider in ["apple_reminders", "google_tasks"]:
-                sync_tasks.delay(note.id, integration.provider)
+                sync_tasks.delay(note.id, integration.provider, user_id=note.user_id)
             elif integration.provider in ["gmail", "outlook"]:
-                sync_email.delay(note.id, integration.provider)
+                sync_email.delay(note.id, integration.provider, user_id=note.user_id)
             elif integration.provider == "readwise":
-                sync_readwise.delay(note.id)
+                sync_readwise.delay(note.id, user_id=note.user_id)
             elif integration.provider == "obsidian":
-                sync_obsidian.delay(note.id)
+                sync_obsidian.delay(note.id, user_id=note.user_id)
             elif integration.provider == "yandex_tasks":
-                sync_yandex_tasks.delay(note.id)
+                sync_yandex_tasks.delay(note.id, user_id=note.user_id)
             elif integration.provider in ["2gis", "mapsme"]:
-                sync_maps.delay(note.id, integration.provider)
+                sync_maps.delay(note.id, integration.provider, user_id=note.user_id)
             else:
                 # Direct sync or generic handler?
                 pass
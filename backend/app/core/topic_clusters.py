@@ -0,0 +1,60 @@
+from typing import Any, Optional, Tuple
+import numpy as np
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import TopicCentroid
+from common import vector_ops
+
+def topic_label(label: int) -> str:
+    return f"topic_{label}"
+
+async def assign_topic(db: AsyncSession, user_id: str, embedding: Any) -> Optional[str]:
+    """Nearest persisted centroid for a fresh embedding: one indexed lookup over the user's k rows."""
+    res = await db.execute(
+        select(TopicCentroid.label)
+        .where(TopicCentroid.user_id == user_id)
+        .order_by(TopicCentroid.centroid.cosine_distance(embedding))
+        .limit(1)
+    )
+    label = res.scalars().first()
+    return topic_label(label) if label is not None else None
+
+def update_centroids(
+    X: np.ndarray,
+    centroids: Optional[np.ndarray] = None,
+    counts: Optional[np.ndarray] = None,
+    max_clusters: int = 5,
+    batch_size: int = 1024,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Folds new embeddings into the topic centroids with MiniBatchKMeans.
+    Without centroids the model is bootstrapped from X. Otherwise the persisted centroids seed
+    the first mini-batch weighted by their counts, so old notes keep their pull and only X is
+    processed. Rows and seed centroids are L2-normalized so Euclidean k-means matches the
+    cosine assignment used at analysis time.
+    Returns (centroids, counts, labels of X).
+    """
+    from sklearn.cluster import MiniBatchKMeans
+    X = vector_ops.normalize(X)
+
+    if centroids is None or not len(centroids):
+        k = max(2, min(max_clusters, len(X) // 2))
+        model = MiniBatchKMeans(n_clusters=k, random_state=42, n_init=3, batch_size=batch_size, reassignment_ratio=0.0)
+        labels = model.fit_predict(X)
+        return vector_ops.as_matrix(model.cluster_centers_), np.bincount(labels, minlength=k), labels
+
+    centroids = vector_ops.normalize(centroids) # back onto the unit sphere, as in spherical k-means
+    k = len(centroids)
+    counts = np.maximum(np.asarray(counts if counts is not None else np.ones(k), dtype=np.float64), 1.0)
+    # reassignment_ratio=0 keeps labels stable: a centre is never moved to a random sample
+    model = MiniBatchKMeans(n_clusters=k, init=centroids, n_init=1, random_state=42, batch_size=batch_size, reassignment_ratio=0.0)
+    model.partial_fit(
+        np.vstack([centroids, X[:batch_size]]),
+        sample_weight=np.concatenate([counts, np.ones(len(X[:batch_size]))]),
+    )
+    for start in range(batch_size, len(X), batch_size):
+        model.partial_fit(X[start:start + batch_size])
+    labels = model.predict(X)
+    new_counts = counts.astype(np.int64) + np.bincount(labels, minlength=k)
+    return vector_ops.as_matrix(model.cluster_centers_), new_counts, labels
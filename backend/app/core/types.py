@@ -31,3 +31,33 @@ class AIAnalysisPack(TypedDict):
     empathetic_comment: Optional[str]
     explicit_destination_app: Optional[str]
     explicit_folder: Optional[str]
+
+class ContextNote:
+    """Column-projected view of a Note used for RAG context (no transcript/analysis blobs)."""
+    __slots__ = ("id", "title", "snippet", "created_at", "importance_score")
+
+    def __init__(self, id: str, title: Optional[str], snippet: Optional[str], created_at: Any = None, importance_score: Optional[float] = None):
+        self.id = id
+        self.title = title
+        self.snippet = snippet
+        self.created_at = created_at
+        self.importance_score = importance_score
+
+class HierarchicalContext:
+    """RAG context already split into sections, with per-section timings in ms."""
+    __slots__ = ("short_term", "vector", "graph", "long_term", "timings")
+
+    def __init__(self, short_term: str, vector: str, graph: str, long_term: str, timings: Optional[dict] = None):
+        self.short_term = short_term
+        self.vector = vector
+        self.graph = graph
+        self.long_term = long_term
+        self.timings = timings or {}
+
+    def render(self) -> str:
+        return (
+            f"Short-term context (Recent 10 notes):\n{self.short_term}\n\n"
+            f"Recent context (Similar notes):\n{self.vector}\n\n"
+            f"Graph connections:\n{self.graph}\n\n"
+            f"Long-term knowledge (Key memories):\n{self.long_term}"
+        )
@@ -1,5 +1,5 @@
 from typing import Optional
-from sqlalchemy import Column, String, Boolean, Integer, JSON, LargeBinary, DateTime, ForeignKey, Table, Text, Float
+from sqlalchemy import Column, String, Boolean, Integer, JSON, LargeBinary, DateTime, ForeignKey, Table, Text, Float, Index
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
 import uuid
@@ -99,6 +99,7 @@ class User(Base):
 class NoteRelation(Base):
     __tablename__ = "note_relations"
     id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
     note_id1 = Column(String, ForeignKey("notes.id", ondelete="CASCADE"))
     note_id2 = Column(String, ForeignKey("notes.id", ondelete="CASCADE"))
     relation_type = Column(String)  # "caused", "related", "updated"
@@ -107,6 +108,79 @@ class NoteRelation(Base):
     source = Column(String, default="inferred") # "fact", "inferred", "user"
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+    # User-scoped adjacency: one index per edge direction.
+    # Edges are undirected and stored canonically (note_id1 <= note_id2), one row per type.
+    __table_args__ = (
+        Index("ix_note_relations_user_note1", "user_id", "note_id1"),
+        Index("ix_note_relations_user_note2", "user_id", "note_id2"),
+        Index("uq_note_relations_edge", "note_id1", "note_id2", "relation_type", unique=True),
+    )
+
+class NoteGraphScore(Base):
+    """Precomputed personalized PageRank of a note within its owner's relation graph (0-1, max-normalized)."""
+    __tablename__ = "note_graph_scores"
+
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    note_id = Column(String, ForeignKey("notes.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float, nullable=False)
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ReflectionState(Base):
+    """Per-user reflection watermark on (Note.completed_at, Note.id) and a rolling summary of everything before it."""
+    __tablename__ = "reflection_states"
+
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    last_note_id = Column(String, nullable=True)
+    last_note_at = Column(DateTime(timezone=True), nullable=True)
+    rolling_summary = Column(Text, default="")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ReflectionBatch(Base):
+    """A nightly reflection run submitted to the provider Batch API, applied once it completes."""
+    __tablename__ = "reflection_batches"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    provider_batch_id = Column(String, nullable=False, index=True)
+    status = Column(String, default="submitted") # submitted -> applied | failed | expired | cancelled
+    jobs = Column(JSON, default={}) # user_id -> watermark the prompts were built from
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+class TopicCentroid(Base):
+    """Persisted per-user topic cluster centre; new notes are assigned to the nearest one at analysis time."""
+    __tablename__ = "topic_centroids"
+
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    label = Column(Integer, primary_key=True) # Note.cluster_id == f"topic_{label}"
+    from pgvector.sqlalchemy import VECTOR
+    centroid = Column(VECTOR(1536))
+    count = Column(Integer, default=0) # Notes folded into the centroid so far (MiniBatchKMeans weight)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class TopicClusterState(Base):
+    """
+    Per-user clustering watermark on (Note.completed_at, Note.id): notes completed after it
+    have not been folded into the centroids yet.
+    """
+    __tablename__ = "topic_cluster_states"
+
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    last_note_id = Column(String, nullable=True)
+    last_note_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class PartitionRebalance(Base):
+    """Checkpoint of an online hash-partition rebalance; one row per table being moved to a new modulus."""
+    __tablename__ = "partition_rebalances"
+
+    table_name = Column(String, primary_key=True)
+    target_modulus = Column(Integer, nullable=False)
+    phase = Column(String, nullable=False) # copying, copied, cut_over, done
+    last_key = Column(JSON, nullable=True) # Primary key of the last copied row
+    copied_rows = Column(Integer, default=0)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class NoteStatus:
     PENDING = "PENDING"
     PROCESSING = "PROCESSING"
@@ -124,6 +198,7 @@ class Note(Base):
     title = Column(String, nullable=True)
     transcription_text = Column(Text, nullable=True)
     summary = Column(Text, nullable=True)
+    context_snippet = Column(String(200), nullable=True) # Precomputed RAG snippet (set at analysis time)
     
     audio_url = Column(String, nullable=True) # Legacy URL
     storage_key = Column(String, nullable=True) # S3 Key
@@ -147,6 +222,7 @@ class Note(Base):
     status = Column(String, default=NoteStatus.PENDING) # PENDING, PROCESSING, ANALYZED, COMPLETED, FAILED
     processing_step = Column(String, nullable=True) # For UI progress (e.g. "Transcribing...")
     processing_error = Column(Text, nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True) # Last time the note reached COMPLETED
     
     is_audio_note = Column(Boolean, default=True) # Distinguish between voice and text-only/system notes
     mood = Column(String, nullable=True)
@@ -165,7 +241,7 @@ class Note(Base):
     cluster_id = Column(String, nullable=True) # For topic clustering
 
     user = relationship("User", back_populates="notes")
-    logs = relationship("IntegrationLog", back_populates="note")
+    logs = relationship("IntegrationLog", back_populates="note", passive_deletes=True)
     embedding_data = relationship("NoteEmbedding", uselist=False, back_populates="note")
 
 class NoteEmbedding(Base):
@@ -250,10 +326,16 @@ class IntegrationLog(Base):
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     integration_id = Column(String, ForeignKey("integrations.id")) # Link to integration definition
-    note_id = Column(String, ForeignKey("notes.id"))
+    note_id = Column(String, ForeignKey("notes.id", ondelete="CASCADE"))
     status = Column(String) # SUCCESS, FAILED
     error_message = Column(Text, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Partition key, hence part of the PK; retention drops whole months (tasks.partition_maintenance)
+    created_at = Column(DateTime(timezone=True), primary_key=True, default=lambda: datetime.datetime.now(datetime.timezone.utc), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_integration_logs_note_id", "note_id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
     
     note = relationship("Note", back_populates="logs")
 
@@ -14,6 +14,7 @@ from .llm_client import LLMClient
 from .prompt_builder import PromptBuilder
 from .response_parser import ResponseParser
 from .cache_handler import CacheHandler
+from .batch_client import OpenAIBatchBackend
 
 class AIService:
     """
@@ -26,6 +27,11 @@ class AIService:
         self.cache = CacheHandler(redis_client=self.redis)
         self.parser = ResponseParser()
         self.builder = PromptBuilder()
+        # Provider Batch API; None without an OpenAI key, and batch-mode callers run live instead
+        self.batch: Optional[OpenAIBatchBackend] = (
+            OpenAIBatchBackend(self.client, settings.OPENAI_API_KEY, settings.OPENAI_BATCH_MODEL, settings.OPENAI_BASE_URL)
+            if settings.OPENAI_API_KEY else None
+        )
 
     async def transcribe_audio(self, audio_file_content: bytes) -> Dict[str, str]:
         """Transcribe audio using AssemblyAI API."""
@@ -70,6 +76,7 @@ class AIService:
         try:
             from infrastructure.database import AsyncSessionLocal
             from app.models import SystemPrompt
+            # Global config, kept on the default shard
             async with AsyncSessionLocal() as session:
                 res = await session.execute(select(SystemPrompt).where(SystemPrompt.key == key))
                 prompt = res.scalars().first()
@@ -182,8 +189,20 @@ class AIService:
         res = await self.client.get_completion(messages, model="deepseek-chat")
         return res.choices[0].message.content
 
-    async def get_chat_completion(self, messages: List[Dict[str, str]], model: Optional[str] = None) -> str:
-        res = await self.client.get_completion(messages, model=model or "gpt-4o")
+    async def summarize_notes_day(self, notes_context: str, day: str) -> str:
+        """Map step of the weekly review: a short digest of one day's notes."""
+        base = await self.get_system_prompt(
+            "weekly_review_day",
+            "Summarize these notes from one day in at most 120 words: key events, decisions, open tasks and mood."
+        )
+        messages = [{"role": "system", "content": base}, {"role": "user", "content": f"Day: {day}\n{notes_context}"}]
+        res = await self.client.get_completion(messages, model="deepseek-chat")
+        return res.choices[0].message.content
+
+    async def get_chat_completion(self, messages: List[Dict[str, str]], model: Optional[str] = None, response_format: Optional[str] = None) -> str:
+        """response_format: e.g. "json_object" for structured output."""
+        fmt = {"type": response_format} if response_format else None
+        res = await self.client.get_completion(messages, model=model or "gpt-4o", response_format=fmt)
         return res.choices[0].message.content
 
     async def get_embedding(self, text: str) -> List[float]:
@@ -0,0 +1,85 @@
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+import httpx
+from loguru import logger
+
+# Provider statuses that will not change any more
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+class OpenAIBatchBackend:
+    """
+    Provider Batch API: requests are uploaded as one JSONL file and completed
+    asynchronously (within 24h) at batch pricing, outside the live rate limits.
+    Each request is {"custom_id": str, "messages": [...]}.
+    Talks to the /files and /batches REST endpoints directly: the pinned SDK predates them.
+    """
+    def __init__(self, llm_client: Any, api_key: str, model: str, base_url: str = "https://api.openai.com/v1",
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.llm = llm_client
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.transport = transport
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        async with httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            timeout=60.0,
+            transport=self.transport,
+        ) as client:
+            res = await client.request(method, path, **kwargs)
+            res.raise_for_status()
+            return res
+
+    async def submit(self, requests: List[Dict[str, Any]], metadata: Optional[Dict[str, str]] = None) -> str:
+        lines = [
+            json.dumps({
+                "custom_id": r["custom_id"],
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": r.get("model") or self.model, "messages": r["messages"]},
+            }, ensure_ascii=False)
+            for r in requests
+        ]
+        upload = await self._request(
+            "POST", "/files",
+            files={"file": ("batch.jsonl", "\n".join(lines).encode("utf-8"), "application/jsonl")},
+            data={"purpose": "batch"},
+        )
+        batch = (await self._request("POST", "/batches", json={
+            "input_file_id": upload.json()["id"],
+            "endpoint": "/v1/chat/completions",
+            "completion_window": "24h",
+            "metadata": metadata,
+        })).json()
+        logger.info(f"Submitted LLM batch {batch['id']} with {len(requests)} requests")
+        return batch["id"]
+
+    async def _retrieve(self, batch_id: str) -> Dict[str, Any]:
+        return (await self._request("GET", f"/batches/{batch_id}")).json()
+
+    async def status(self, batch_id: str) -> str:
+        return (await self._retrieve(batch_id))["status"]
+
+    async def results(self, batch_id: str) -> Dict[str, Optional[str]]:
+        """Maps custom_id -> completion text (None for requests that failed inside the batch)."""
+        output_file_id = (await self._retrieve(batch_id)).get("output_file_id")
+        if not output_file_id:
+            return {}
+        content = await self._request("GET", f"/files/{output_file_id}/content")
+        results: Dict[str, Optional[str]] = {}
+        for line in content.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get("response") or {}
+            body = response.get("body") or {}
+            if item.get("error") or response.get("status_code") != 200 or not body.get("choices"):
+                results[item["custom_id"]] = None
+                continue
+            results[item["custom_id"]] = body["choices"][0]["message"]["content"]
+            if body.get("usage"):
+                await self.llm._track_usage(SimpleNamespace(**body["usage"]))
+        return results
@@ -1,7 +1,8 @@
-from typing import Any, Optional
+from typing import Any, Callable, List, Optional
 import datetime
+import time
 from loguru import logger
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, RateLimitError
 from infrastructure.config import settings
 
 class LLMClient:
@@ -14,6 +15,8 @@ class LLMClient:
         self.deepseek_key = settings.DEEPSEEK_API_KEY
         self.deepseek_base = settings.DEEPSEEK_BASE_URL
         self.redis = redis_client
+        # Callbacks fed (latency_seconds, rate_limited) per completion, e.g. adaptive concurrency limiters
+        self.observers: List[Callable[[float, bool], None]] = []
         
         # Initialize clients
         self.openai_client = AsyncOpenAI(api_key=self.openai_key) if self.openai_key else None
@@ -26,17 +29,32 @@ class LLMClient:
         if not client:
             raise RuntimeError("No LLM client configured (missing API keys).")
 
-        response = await client.chat.completions.create(
-            model=model,
-            messages=messages,
-            response_format=response_format,
-            temperature=0.3 if response_format else 0.7
-        )
+        started = time.monotonic()
+        rate_limited = False
+        try:
+            response = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                response_format=response_format,
+                temperature=0.3 if response_format else 0.7
+            )
+        except RateLimitError:
+            rate_limited = True
+            raise
+        finally:
+            self._notify_observers(time.monotonic() - started, rate_limited)
         
         # Track usage
         await self._track_usage(response.usage)
         return response
 
+    def _notify_observers(self, latency: float, rate_limited: bool) -> None:
+        for observer in list(self.observers):
+            try:
+                observer(latency, rate_limited)
+            except Exception as e:
+                logger.warning(f"LLM latency observer failed: {e}")
+
     async def _track_usage(self, usage: Any) -> None:
         """Logs and tracks token usage in Redis."""
         if not usage: return
@@ -34,7 +34,7 @@ class EmailService:
                 raise Exception("Failed to connect Gmail")
             data = resp.json()
             access_token = data.get("access_token")
-            async with AsyncSessionLocal() as db:
+            async with AsyncSessionLocal(user_id=user_id) as db:
                 result = await db.execute(select(Integration).where(Integration.user_id == user_id, Integration.provider == "gmail"))
                 existing = result.scalars().first()
                 if not existing:
@@ -61,7 +61,7 @@ class EmailService:
                 raise Exception("Failed to connect Outlook")
             data = resp.json()
             access_token = data.get("access_token")
-            async with AsyncSessionLocal() as db:
+            async with AsyncSessionLocal(user_id=user_id) as db:
                 result = await db.execute(select(Integration).where(Integration.user_id == user_id, Integration.provider == "outlook"))
                 existing = result.scalars().first()
                 if not existing:
@@ -87,7 +87,7 @@ class EmailService:
             content = {"subject": "Note from VoiceBrain", "body": voice_text}
 
         # 2. pgvector Context Check (RAG)
-        async with AsyncSessionLocal() as db:
+        async with AsyncSessionLocal(user_id=user_id) as db:
             query_vector = await ai_service.generate_embedding(voice_text)
             sim_result = await db.execute(
                 select(Note)
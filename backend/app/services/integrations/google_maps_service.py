@@ -38,7 +38,7 @@ class GoogleMapsService:
             data = resp.json()
             access_token = data.get("access_token")
             
-            async with AsyncSessionLocal() as db:
+            async with AsyncSessionLocal(user_id=user_id) as db:
                 result = await db.execute(
                     select(Integration).where(
                         Integration.user_id == user_id,
@@ -107,7 +107,7 @@ class GoogleMapsService:
 
         # 3. Context Aware RAG
         # Search for similar notes that might already have this or a nearby place
-        async with AsyncSessionLocal() as db:
+        async with AsyncSessionLocal(user_id=user_id) as db:
             query_vector = await ai_service.generate_embedding(voice_text)
             
             # Find similar notes from this user
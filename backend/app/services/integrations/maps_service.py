@@ -18,7 +18,7 @@ class MapsService:
         prompt = "Extract the name of the place mentioned in this text. Return ONLY the name."
         place_name = await ai_service.ask_notes(voice_text, prompt)
         
-        async with AsyncSessionLocal() as db:
+        async with AsyncSessionLocal(user_id=user_id) as db:
             # 2. Context Aware Search
             query_vector = await ai_service.generate_embedding(voice_text)
             sim_result = await db.execute(
@@ -43,7 +43,7 @@ class MapsService:
 
     async def create_or_update_place_mapsme(self, user_id: str, note_id: str, voice_text: str) -> str:
         """Add a bookmark to a local Maps.me KML file."""
-        async with AsyncSessionLocal() as db:
+        async with AsyncSessionLocal(user_id=user_id) as db:
             int_res = await db.execute(select(Integration).where(Integration.user_id == user_id, Integration.provider == "mapsme"))
             integration = int_res.scalars().first()
             if not integration or not integration.mapsme_path:
@@ -12,7 +12,7 @@ from infrastructure.database import AsyncSessionLocal
 class ObsidianService:
     async def connect(self, user_id: str, vault_path: str) -> str:
         """Store Obsidian vault path."""
-        async with AsyncSessionLocal() as db:
+        async with AsyncSessionLocal(user_id=user_id) as db:
             result = await db.execute(select(Integration).where(Integration.user_id == user_id, Integration.provider == "obsidian"))
             existing = result.scalars().first()
             if not existing:
@@ -24,7 +24,7 @@ class ObsidianService:
 
     async def create_or_update_note(self, user_id: str, note_id: str, voice_text: str) -> str:
         """Create or append to a markdown file in the Obsidian vault with smart backlinks."""
-        async with AsyncSessionLocal() as db:
+        async with AsyncSessionLocal(user_id=user_id) as db:
             # 1. Get Vault Path
             int_res = await db.execute(select(Integration).where(Integration.user_id == user_id, Integration.provider == "obsidian"))
             integration = int_res.scalars().first()
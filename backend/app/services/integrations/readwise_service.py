@@ -18,7 +18,7 @@ class ReadwiseService:
 
     async def connect(self, user_id: str, access_token: str) -> str:
         """Store Readwise access token."""
-        async with AsyncSessionLocal() as db:
+        async with AsyncSessionLocal(user_id=user_id) as db:
             result = await db.execute(select(Integration).where(Integration.user_id == user_id, Integration.provider == "readwise"))
             existing = result.scalars().first()
             if not existing:
@@ -44,7 +44,7 @@ class ReadwiseService:
         highlight_text = await self.extract_highlight(voice_text)
         
         # 2. pgvector Context Check
-        async with AsyncSessionLocal() as db:
+        async with AsyncSessionLocal(user_id=user_id) as db:
             query_vector = await ai_service.generate_embedding(voice_text)
             sim_result = await db.execute(
                 select(Note)
@@ -24,7 +24,7 @@ class TasksService:
         # In a real app, we'd exchange the code for a token here.
         access_token = f"apple_token_{code}"
         
-        async with AsyncSessionLocal() as db:
+        async with AsyncSessionLocal(user_id=user_id) as db:
             result = await db.execute(select(Integration).where(Integration.user_id == user_id, Integration.provider == "apple_reminders"))
             existing = result.scalars().first()
             if not existing:
@@ -53,7 +53,7 @@ class TasksService:
                 raise Exception("Failed to connect Google Tasks")
             
             access_token = resp.json().get("access_token")
-            async with AsyncSessionLocal() as db:
+            async with AsyncSessionLocal(user_id=user_id) as db:
                 result = await db.execute(select(Integration).where(Integration.user_id == user_id, Integration.provider == "google_tasks"))
                 existing = result.scalars().first()
                 if not existing:
@@ -87,7 +87,7 @@ class TasksService:
         
         # 2. Context Aware RAG
         # Search for similar existing reminders to avoid duplicates
-        async with AsyncSessionLocal() as db:
+        async with AsyncSessionLocal(user_id=user_id) as db:
             query_vector = await ai_service.generate_embedding(voice_text)
             sim_result = await db.execute(
                 select(Note)
@@ -35,7 +35,7 @@ class YandexMapsService:
             data = resp.json()
             access_token = data.get("access_token")
             
-            async with AsyncSessionLocal() as db:
+            async with AsyncSessionLocal(user_id=user_id) as db:
                 result = await db.execute(
                     select(Integration).where(
                         Integration.user_id == user_id,
@@ -105,7 +105,7 @@ class YandexMapsService:
         lat_lon = geo_data["coords"]
         yandex_url = f"https://yandex.ru/maps/?ll={lat_lon.split(',')[1]}%2C{lat_lon.split(',')[0]}&text={geo_data['address'].replace(' ', '+')}&z=15"
 
-        async with AsyncSessionLocal() as db:
+        async with AsyncSessionLocal(user_id=user_id) as db:
             query_vector = await ai_service.generate_embedding(voice_text)
             
             # Simple RAG check for context (similar to Google flow)
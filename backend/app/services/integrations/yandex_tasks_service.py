@@ -34,7 +34,7 @@ class YandexTasksService:
             
             data = resp.json()
             access_token = data.get("access_token")
-            async with AsyncSessionLocal() as db:
+            async with AsyncSessionLocal(user_id=user_id) as db:
                 result = await db.execute(select(Integration).where(Integration.user_id == user_id, Integration.provider == "yandex_tasks"))
                 existing = result.scalars().first()
                 if not existing:
@@ -64,7 +64,7 @@ class YandexTasksService:
         details = await self.extract_task_details(voice_text)
         
         # 2. Context Aware RAG
-        async with AsyncSessionLocal() as db:
+        async with AsyncSessionLocal(user_id=user_id) as db:
             query_vector = await ai_service.generate_embedding(voice_text)
             sim_result = await db.execute(
                 select(Note)
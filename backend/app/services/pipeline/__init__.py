@@ -1,3 +1,4 @@
+from typing import Optional
 from .orchestrator import PipelineOrchestrator
 from .stages import PipelineStages
 
@@ -9,9 +10,9 @@ class NotePipelineWrapper:
         self._orchestrator = PipelineOrchestrator()
         self.stages = PipelineStages()
 
-    async def process(self, note_id: str):
+    async def process(self, note_id: str, user_id: Optional[str] = None):
         """Standard entry point for processing a note through all stages."""
-        await self._orchestrator.run(note_id)
+        await self._orchestrator.run(note_id, user_id)
 
 # Singleton instance for the project
 pipeline = NotePipelineWrapper()
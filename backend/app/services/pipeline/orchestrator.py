@@ -1,11 +1,13 @@
+from typing import Optional
 from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import OperationalError
 import traceback
+from datetime import datetime, timezone
 
 from app.models import Note, NoteStatus
-from infrastructure.database import AsyncSessionLocal
+from infrastructure.database import note_session, note_write
 from .stages import PipelineStages
 
 class PipelineOrchestrator:
@@ -14,10 +16,10 @@ class PipelineOrchestrator:
     Handles error boundaries and state transitions between stages.
     """
 
-    async def run(self, note_id: str):
+    async def run(self, note_id: str, user_id: Optional[str] = None):
         logger.info(f"[Pipeline] Starting process for note: {note_id}")
         
-        async with AsyncSessionLocal() as db:
+        async with note_session(note_id, user_id) as db:
             try:
                 # 1. Fetch State
                 result = await db.execute(select(Note).where(Note.id == note_id))
@@ -49,10 +51,13 @@ class PipelineOrchestrator:
                         # Sync failure is often non-fatal for local state
                         logger.error(f"[Pipeline] Sync stage warning: {e}")
                         note.status = NoteStatus.COMPLETED
+                        note.completed_at = datetime.now(timezone.utc)
                         note.processing_step = f"Sync Failed (Saved): {str(e)[:50]}"
                         await db.commit()
 
                 logger.info(f"[Pipeline] Successfully processed note: {note_id}")
+                # The user is likely polling this note; keep their reads on the primary
+                await note_write(note.user_id)
 
             except Exception as e:
                 if isinstance(e, (OperationalError, OSError)):
@@ -3,11 +3,13 @@ from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import httpx
+from datetime import datetime, timezone
 
 from app.models import Note, User, NoteStatus
 from infrastructure.storage import storage_client
 from app.core.audio import audio_processor
 from app.core.analyze_core import analyze_core
+from app.core.rag_service import rag_service
 from infrastructure.redis_client import short_term_memory
 from infrastructure.config import settings
 
@@ -64,6 +66,15 @@ class PipelineStages:
         note.status = NoteStatus.ANALYZED
         await db.commit()
 
+        # Feed the recent-notes ring buffer that RAG reads short-term context from.
+        # Best effort: a Redis hiccup must not retry the (already committed) analysis.
+        try:
+            await short_term_memory.push_recent_note(
+                note.user_id, rag_service.recent_note_entry(note.id, note.created_at, note.context_snippet)
+            )
+        except Exception as e:
+            logger.warning(f"Recent-notes buffer push failed for {note.id}: {e}")
+
     @staticmethod
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10),
            retry=retry_if_exception_type((httpx.RequestError, ConnectionError, TimeoutError, OSError)))
@@ -78,6 +89,7 @@ class PipelineStages:
         if not flags.get("all_integrations", True) and not flags.get("sync_enabled", True):
             logger.info(f"Sync skipped for user {note.user_id} due to feature flags")
             note.status = NoteStatus.COMPLETED
+            note.completed_at = datetime.now(timezone.utc)
             note.processing_step = "Sync Skipped (Disabled)"
             await db.commit()
             return
@@ -90,6 +102,7 @@ class PipelineStages:
         await sync_service.sync_note(note, db)
         
         note.status = NoteStatus.COMPLETED
+        note.completed_at = datetime.now(timezone.utc)
         note.processing_step = "Completed"
         await db.commit()
 
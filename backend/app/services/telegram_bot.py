@@ -8,7 +8,7 @@ from aiogram.types import Message
 from sqlalchemy.future import select
 from infrastructure.config import settings
 from app.core.bot import bot
-from infrastructure.database import AsyncSessionLocal
+from infrastructure.database import session_where
 from app.models import User, Note
 from infrastructure.storage import storage_client
 from workers.transcribe_tasks import process_transcribe
@@ -25,7 +25,7 @@ async def cmd_start(message: Message, command: CommandObject):
         return
 
     api_key = command.args
-    async with AsyncSessionLocal() as db:
+    async with session_where(None, select(User.id).where(User.api_key == api_key)) as db:
         result = await db.execute(select(User).where(User.api_key == api_key))
         user = result.scalars().first()
         
@@ -39,7 +39,7 @@ async def cmd_start(message: Message, command: CommandObject):
 
 @dp.message(F.voice)
 async def handle_voice(message: Message):
-    async with AsyncSessionLocal() as db:
+    async with session_where(None, select(User.id).where(User.telegram_chat_id == str(message.chat.id))) as db:
         result = await db.execute(select(User).where(User.telegram_chat_id == str(message.chat.id)))
         user = result.scalars().first()
         
@@ -96,14 +96,14 @@ async def handle_voice(message: Message):
         await db.refresh(new_note)
 
         # 4. Trigger Worker
-        process_transcribe.delay(new_note.id)
+        process_transcribe.delay(new_note.id, new_note.user_id)
         
         # We don't reply more here, the worker will send a follow-up if telegram_chat_id is set.
         
 @dp.message(F.text & ~F.text.startswith("/"))
 async def handle_text(message: Message):
     """Handle text messages (e.g. replies to clarification questions)."""
-    async with AsyncSessionLocal() as db:
+    async with session_where(None, select(User.id).where(User.telegram_chat_id == str(message.chat.id))) as db:
         result = await db.execute(select(User).where(User.telegram_chat_id == str(message.chat.id)))
         user = result.scalars().first()
         if not user:
@@ -131,13 +131,13 @@ async def handle_text(message: Message):
 
         # Trigger pipeline
         from workers.analyze_tasks import process_analyze
-        process_analyze.delay(new_note.id)
+        process_analyze.delay(new_note.id, new_note.user_id)
         
         await message.answer("📝 Learning from your response...")
 
 @dp.message(Command("settings"))
 async def cmd_settings(message: Message):
-    async with AsyncSessionLocal() as db:
+    async with session_where(None, select(User.id).where(User.telegram_chat_id == str(message.chat.id))) as db:
         result = await db.execute(select(User).where(User.telegram_chat_id == str(message.chat.id)))
         user = result.scalars().first()
         if not user:
@@ -161,7 +161,7 @@ async def cmd_toggle(message: Message, command: CommandObject):
 
     key = command.args.strip()
     
-    async with AsyncSessionLocal() as db:
+    async with session_where(None, select(User.id).where(User.telegram_chat_id == str(message.chat.id))) as db:
         result = await db.execute(select(User).where(User.telegram_chat_id == str(message.chat.id)))
         user = result.scalars().first()
         if not user:
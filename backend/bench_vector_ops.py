@@ -0,0 +1,54 @@
+"""
+Microbenchmark: pure-Python cosine loops vs common.vector_ops.
+Usage: python bench_vector_ops.py [--dim 1536] [--rows 2000]
+"""
+import argparse
+import math
+import random
+import time
+from common import vector_ops
+
+def py_cosine(v1, v2):
+    dot = sum(a * b for a, b in zip(v1, v2))
+    norm1 = math.sqrt(sum(a * a for a in v1))
+    norm2 = math.sqrt(sum(b * b for b in v2))
+    return dot / (norm1 * norm2) if norm1 > 0 and norm2 > 0 else 0
+
+def best_of(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def report(name, py_seconds, np_seconds):
+    print(f"{name:<32} python {py_seconds * 1000:10.3f} ms   numpy {np_seconds * 1000:8.3f} ms   x{py_seconds / np_seconds:,.0f}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    vectors = [[rng.uniform(-1, 1) for _ in range(args.dim)] for _ in range(args.rows)]
+    query = vectors[0]
+    matrix = vector_ops.as_matrix(vectors)
+
+    report("cosine (1 pair)",
+           best_of(lambda: py_cosine(query, vectors[1])),
+           best_of(lambda: vector_ops.cosine(query, vectors[1])))
+    report(f"cosine_many (1 x {args.rows})",
+           best_of(lambda: [py_cosine(query, v) for v in vectors], repeat=1),
+           best_of(lambda: vector_ops.cosine_many(query, matrix)))
+    report(f"top_k 10 of {args.rows}",
+           best_of(lambda: sorted(((py_cosine(query, v), i) for i, v in enumerate(vectors)), reverse=True)[:10], repeat=1),
+           best_of(lambda: vector_ops.top_k(vector_ops.cosine_many(query, matrix), 10)))
+    pair_rows = min(args.rows, 200)
+    report(f"pairwise ({pair_rows} x {pair_rows})",
+           best_of(lambda: [[py_cosine(a, b) for b in vectors[:pair_rows]] for a in vectors[:pair_rows]], repeat=1),
+           best_of(lambda: vector_ops.cosine_matrix(matrix[:pair_rows])))
+
+if __name__ == "__main__":
+    main()
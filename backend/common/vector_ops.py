@@ -0,0 +1,95 @@
+"""
+Vector math over contiguous float32 arrays.
+All in-process similarity work (embeddings, centroids, identity gating) goes through here
+instead of per-element Python loops.
+"""
+from typing import Any, Iterator, Optional, Sequence, Tuple
+import numpy as np
+
+DTYPE = np.float32
+PAIR_BLOCK_ROWS = 512 # Rows of a similarity matrix materialized at once
+
+def as_vector(v: Any) -> np.ndarray:
+    """1-D contiguous float32 view/copy of a list, pgvector value or array."""
+    return np.ascontiguousarray(np.asarray(v, dtype=DTYPE).ravel())
+
+def as_matrix(vectors: Any) -> np.ndarray:
+    """2-D contiguous float32 matrix (one row per vector)."""
+    matrix = np.asarray(vectors, dtype=DTYPE)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1) if matrix.size else matrix.reshape(0, 0)
+    return np.ascontiguousarray(matrix)
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    """Rows scaled to unit length; zero rows stay zero."""
+    matrix = as_matrix(matrix)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+def cosine(a: Any, b: Any) -> float:
+    """Cosine similarity of two vectors (0.0 if either is zero)."""
+    a, b = as_vector(a), as_vector(b)
+    denom = float(np.linalg.norm(a)) * float(np.linalg.norm(b))
+    return float(a @ b) / denom if denom > 0 else 0.0
+
+def dot_many(query: Any, matrix: Any) -> np.ndarray:
+    """Dot product of one vector against every row."""
+    return as_matrix(matrix) @ as_vector(query)
+
+def cosine_many(query: Any, matrix: Any) -> np.ndarray:
+    """Cosine similarity of one vector against every row (matrix-versus-many)."""
+    q = as_vector(query)
+    q_norm = float(np.linalg.norm(q))
+    if q_norm == 0:
+        return np.zeros(len(as_matrix(matrix)), dtype=DTYPE)
+    return normalize(matrix) @ (q / q_norm)
+
+def cosine_matrix(a: Any, b: Optional[Any] = None) -> np.ndarray:
+    """Pairwise cosine similarities between the rows of a and b (a with itself by default)."""
+    a_n = normalize(a)
+    return a_n @ (a_n if b is None else normalize(b)).T
+
+def top_k(scores: Any, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first (argpartition, O(n))."""
+    scores = np.asarray(scores)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+def pairs_above(normalized: np.ndarray, threshold: float, block_rows: int = PAIR_BLOCK_ROWS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    All (i, j), i < j, with cosine >= threshold among unit rows.
+    Computed in row blocks so memory stays O(block_rows * n).
+    """
+    rows, cols = [], []
+    for start, block in iter_similarity_blocks(normalized, block_rows):
+        r, c = np.nonzero(block >= threshold)
+        r = r + start
+        upper = c > r
+        rows.append(r[upper])
+        cols.append(c[upper])
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(rows), np.concatenate(cols)
+
+def iter_similarity_blocks(normalized: np.ndarray, block_rows: int = PAIR_BLOCK_ROWS) -> Iterator[Tuple[int, np.ndarray]]:
+    """Yields (first_row, block @ normalized.T) for consecutive row blocks."""
+    for start in range(0, len(normalized), block_rows):
+        yield start, normalized[start:start + block_rows] @ normalized.T
+
+def nearest(query: Any, matrix: Any) -> Tuple[int, float]:
+    """Index and cosine similarity of the closest row."""
+    sims = cosine_many(query, matrix)
+    i = int(np.argmax(sims))
+    return i, float(sims[i])
+
+def stack_valid(vectors: Sequence[Optional[Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Stacks the usable (non-empty, non-zero) vectors; returns (matrix, original indices)."""
+    index = [i for i, v in enumerate(vectors) if v is not None and len(v) > 0]
+    if not index:
+        return np.empty((0, 0), dtype=DTYPE), np.empty(0, dtype=np.int64)
+    matrix = as_matrix([vectors[i] for i in index])
+    nonzero = np.linalg.norm(matrix, axis=1) > 0
+    return matrix[nonzero], np.asarray(index, dtype=np.int64)[nonzero]
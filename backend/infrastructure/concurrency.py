@@ -0,0 +1,102 @@
+import asyncio
+import math
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+from loguru import logger
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit adjusted by AIMD feedback from downstream (LLM) calls.
+    Every `window` samples: if p95 latency and the 429 rate are under target the limit
+    grows by one, otherwise it shrinks multiplicatively. A 429 streak shrinks it early.
+    """
+    def __init__(
+        self,
+        initial: int = 5,
+        min_limit: int = 1,
+        max_limit: int = 20,
+        target_p95: float = 20.0,
+        max_429_rate: float = 0.05,
+        window: int = 20,
+        backoff: float = 0.7,
+        on_change: Optional[Callable[[int], None]] = None,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.target_p95 = target_p95
+        self.max_429_rate = max_429_rate
+        self.window = window
+        self.backoff = backoff
+        self.on_change = on_change
+        self.in_flight = 0
+        self._latencies: deque = deque(maxlen=window)
+        self._rate_limited: deque = deque(maxlen=window)
+        self._cond = asyncio.Condition()
+        if on_change:
+            on_change(self.limit)
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def p95(self) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+
+    def rate_limited_ratio(self) -> float:
+        return sum(self._rate_limited) / len(self._rate_limited) if self._rate_limited else 0.0
+
+    def record(self, latency: float, rate_limited: bool = False):
+        """Feeds one downstream call; adjusts the limit when a decision window is due."""
+        self._latencies.append(latency)
+        self._rate_limited.append(rate_limited)
+
+        # A streak of 429s should not wait for a full window
+        min_429s = max(2, math.ceil(self.max_429_rate * self.window) + 1)
+        if sum(self._rate_limited) >= min_429s:
+            self._set_limit(math.floor(self.limit * self.backoff), "429s")
+            return
+        if len(self._latencies) < self.window:
+            return
+
+        p95 = self.p95()
+        if p95 > self.target_p95 or self.rate_limited_ratio() > self.max_429_rate:
+            self._set_limit(math.floor(self.limit * self.backoff), f"p95 {p95:.1f}s")
+        else:
+            self._set_limit(self.limit + 1, f"p95 {p95:.1f}s")
+
+    def _set_limit(self, new_limit: int, reason: str):
+        new_limit = max(self.min_limit, min(new_limit, self.max_limit))
+        self._latencies.clear()
+        self._rate_limited.clear()
+        if new_limit == self.limit:
+            return
+        logger.info(f"Concurrency {self.limit} -> {new_limit} ({reason})")
+        self.limit = new_limit
+        if self.on_change:
+            self.on_change(new_limit)
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        """Lets queued tasks re-check the limit now instead of on the next release."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        async def _wake():
+            async with self._cond:
+                self._cond.notify_all()
+        loop.create_task(_wake())
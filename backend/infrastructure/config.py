@@ -18,6 +18,57 @@ class Settings(BaseSettings):
     
     # RAG
     RAG_TEMPORAL_DECAY_DAYS: int = 30
+    RAG_CANDIDATE_POOL: int = 200 # ANN candidates scored by the SQL temporal ranking
+    RAG_GRAPH_HOPS: int = 1 # k-hop expansion depth for graph context
+    RAG_GRAPH_ADJACENCY_CACHE: bool = False # Serve graph traversal from a per-user Redis adjacency list
+    RAG_GRAPH_IMPORTANCE_WEIGHT: float = 0.5 # Vector score boost from precomputed PageRank (0 disables)
+    
+    # Reflection
+    REFLECTION_DEBOUNCE_SECONDS: int = 120 # Quiet period after the last note before reflection runs
+    REFLECTION_MAX_WAIT_SECONDS: int = 900 # Upper bound on postponement during a long burst
+    REFLECTION_RUN_LOCK_SECONDS: int = 900 # Per-user run lock; expires if a worker dies mid-run
+    REFLECTION_BATCH_MODE: bool = False # Nightly reflection via the provider Batch API instead of live calls
+    REFLECTION_CONCURRENCY_INITIAL: int = 5 # Starting per-worker concurrency of batch_reflection
+    REFLECTION_CONCURRENCY_MAX: int = 20
+    REFLECTION_TARGET_P95_SECONDS: float = 20.0 # LLM latency target; above it concurrency backs off
+    REFLECTION_MAX_429_RATE: float = 0.05 # Tolerated share of rate-limited LLM calls
+    
+    # Memory self-improvement
+    MEMORY_DEDUP_THRESHOLD: float = 0.85 # Cosine similarity that makes two memories merge candidates
+    MEMORY_DEDUP_MAX_GROUP: int = 8 # Largest candidate group sent to the LLM at once
+    MEMORY_DEDUP_GROUPS_PER_PROMPT: int = 15
+    MEMORY_IMPROVE_MAX_MEMORIES: int = 5000 # Newest active memories considered per run
+    
+    # Topic clustering
+    TOPIC_MAX_CLUSTERS: int = 5
+    TOPIC_STREAM_CHUNK: int = 1000 # Embedding rows fetched per round-trip when updating centroids
+    TOPIC_SETTLE_SECONDS: int = 60 # Notes completed more recently wait for the next run (commit lag, clock skew)
+    
+    # Weekly review
+    WEEKLY_REVIEW_USERS_PER_TASK: int = 50 # Users per fan-out subtask
+    WEEKLY_REVIEW_CONCURRENCY: int = 8 # Users / LLM calls in flight per subtask
+    WEEKLY_REVIEW_PROMPT_MAX_CHARS: int = 12000 # Above this a week is summarized per day first (map-reduce)
+    
+    # Proactive reminders
+    PROACTIVE_LLM_CONCURRENCY: int = 8 # Relevance-scoring LLM calls in flight
+    PROACTIVE_SEND_RATE: float = 25.0 # Telegram messages per second (bot limit is ~30)
+    
+    # Memory archiving (soft forgetting)
+    ARCHIVE_MEMORIES_PER_CALL: int = 10 # Memories compressed per LLM call; one chunk = one call = one commit
+    ARCHIVE_CONCURRENCY: int = 4 # Chunks in flight
+    
+    # Retention cleanup
+    RETENTION_CHUNK_SIZE: int = 500 # Notes per keyset page / DELETE / commit
+    RETENTION_MAX_SECONDS: int = 1800 # Time budget per run; the next run resumes where this one stopped
+    
+    # Time partitioning
+    INTEGRATION_LOG_RETENTION_MONTHS: int = 6 # Older monthly partitions of integration_logs are dropped
+    PARTITION_PREMAKE_MONTHS: int = 3
+    
+    # Online hash-partition rebalancing
+    REBALANCE_BATCH_ROWS: int = 2000 # Rows copied per transaction
+    REBALANCE_PAUSE_SECONDS: float = 0.2 # Sleep between batches to leave I/O for live traffic
+    REBALANCE_LOCK_TIMEOUT_MS: int = 3000 # Cutover gives up (and can be retried) rather than queue writers
     
     # Importance Scoring Weights
     IMP_WEIGHT_BASE: float = 0.6
@@ -64,6 +115,14 @@ class Settings(BaseSettings):
     POSTGRES_HOST: str = "db"
     POSTGRES_PORT: str = "5432"
     POSTGRES_DB: str = "voicebrain_db"
+    # Comma-separated DSNs of additional user shards; DATABASE_URL is shard 0, used for work not tied to a user
+    DATABASE_SHARD_URLS: str = ""
+    DATABASE_SHARD_VNODES: int = 128 # Ring points per shard for consistent hashing of user ids
+    # Read replicas per shard: ';' separates shards (in shard order), ',' the replicas of one shard
+    DATABASE_REPLICA_URLS: str = ""
+    REPLICA_MAX_LAG_SECONDS: float = 5.0 # A replica further behind is skipped, reads fall back to the primary
+    REPLICA_LAG_CHECK_SECONDS: float = 5.0 # How long a sampled replica lag is trusted
+    READ_YOUR_WRITES_SECONDS: int = 10 # After a write, the user's reads stay on the primary this long
     REDIS_URL: str = "redis://redis:6379"
 
     # Celery
@@ -72,6 +131,8 @@ class Settings(BaseSettings):
 
     # External Services
     OPENAI_API_KEY: Optional[str] = None
+    OPENAI_BASE_URL: str = "https://api.openai.com/v1"
+    OPENAI_BATCH_MODEL: str = "gpt-4o" # Model for Batch API requests that don't name one
     ASSEMBLYAI_API_KEY: Optional[str] = None
     DEEPSEEK_API_KEY: Optional[str] = None
     DEEPSEEK_BASE_URL: str = "https://api.deepseek.com"
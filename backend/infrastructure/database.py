@@ -1,14 +1,250 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import asyncio
+import bisect
+import hashlib
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from fastapi import Request
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from infrastructure.config import settings
+from infrastructure.redis_client import recent_writes
+
+T = TypeVar("T")
 
 DATABASE_URL = settings.DATABASE_URL
+# Shard 0 is DATABASE_URL; new shards are appended to DATABASE_SHARD_URLS, never inserted
+SHARD_URLS = [DATABASE_URL] + [url.strip() for url in settings.DATABASE_SHARD_URLS.split(",") if url.strip()]
+REPLICA_URLS = [
+    [url.strip() for url in group.split(",") if url.strip()]
+    for group in settings.DATABASE_REPLICA_URLS.split(";")
+]
+REPLICA_URLS = (REPLICA_URLS + [[] for _ in SHARD_URLS])[:len(SHARD_URLS)]
+
+def _ring_point(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+class ShardRing:
+    """
+    Consistent hashing of user ids onto shards. Each shard owns `vnodes` points of the ring
+    (derived from its position, not its DSN), so appending a shard moves only the users
+    that now hash to it (~1/N) and changing a password in a DSN moves nobody.
+    """
+
+    def __init__(self, shard_count: int, vnodes: int = 128):
+        self.shard_count = shard_count
+        ring = sorted((_ring_point(f"shard-{s}#{v}"), s) for s in range(shard_count) for v in range(vnodes))
+        self._points = [point for point, _ in ring]
+        self._shards = [shard for _, shard in ring]
+
+    def shard_for(self, user_id: Optional[str]) -> int:
+        if user_id is None or self.shard_count == 1:
+            return 0
+        i = bisect.bisect(self._points, _ring_point(str(user_id))) % len(self._points)
+        return self._shards[i]
 
 engine = create_async_engine(DATABASE_URL, echo=True)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+shard_engines = [engine] + [create_async_engine(url, echo=True) for url in SHARD_URLS[1:]]
+ring = ShardRing(len(shard_engines), settings.DATABASE_SHARD_VNODES)
+_session_makers = [sessionmaker(e, class_=AsyncSession, expire_on_commit=False) for e in shard_engines]
+
+class ShardedSessionFactory:
+    """
+    Drop-in for the former single sessionmaker: `AsyncSessionLocal()` opens a session on the
+    default shard, `AsyncSessionLocal(user_id=...)` on the shard that owns the user.
+    """
+
+    def __call__(self, user_id: Optional[str] = None, shard: Optional[int] = None, **kw) -> AsyncSession:
+        return _session_makers[ring.shard_for(user_id) if shard is None else shard](**kw)
+
+AsyncSessionLocal = ShardedSessionFactory()
+
+REPLICA_PROBE_TIMEOUT = 2.0 # A replica that can't answer the lag query this fast is treated as down
+
+# Seconds the replica is behind; 0 when it has replayed everything it received (an idle
+# primary makes pg_last_xact_replay_timestamp() old without any real lag). That shortcut only
+# holds while WAL is streaming: a disconnected replica has replayed all it received and would
+# report 0 forever, so without a streaming WAL receiver the lag is unknown (NULL). `status` is
+# NULL for roles without pg_read_all_stats; the receiver's row still exists while it runs.
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (
+            SELECT 1 FROM pg_stat_wal_receiver WHERE coalesce(status, 'streaming') = 'streaming'
+        ) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+class ReplicaPool:
+    """
+    Read-only engines of one shard: its replicas plus the primary as fallback. Lag is sampled
+    at most every REPLICA_LAG_CHECK_SECONDS per replica; replicas that are unreachable or more
+    than REPLICA_MAX_LAG_SECONDS behind are skipped until the next sample.
+    """
+
+    def __init__(self, primary: AsyncEngine, replicas: List[AsyncEngine]):
+        self.primary = primary
+        self.replicas = replicas
+        self._samples: Dict[int, Tuple[float, Optional[float]]] = {} # replica -> (sampled at, lag or None)
+        self._next = 0
+
+    async def lag(self, i: int) -> Optional[float]:
+        now = time.monotonic()
+        sample = self._samples.get(i)
+        if sample and now - sample[0] < settings.REPLICA_LAG_CHECK_SECONDS:
+            return sample[1]
+
+        async def probe() -> Optional[float]:
+            async with self.replicas[i].connect() as conn:
+                lag = await conn.scalar(REPLICA_LAG_SQL)
+                return None if lag is None else float(lag)
+
+        try:
+            lag = await asyncio.wait_for(probe(), timeout=REPLICA_PROBE_TIMEOUT)
+            if lag is None:
+                logger.warning(f"Replica {i} unavailable for reads: not streaming WAL from the primary")
+        except Exception as e:
+            logger.warning(f"Replica {i} unavailable for reads: {e}")
+            lag = None
+        self._samples[i] = (now, lag)
+        return lag
+
+    async def pick(self) -> AsyncEngine:
+        """Next replica within the lag budget (round-robin), the primary if there is none."""
+        for step in range(len(self.replicas)):
+            i = (self._next + step) % len(self.replicas)
+            lag = await self.lag(i)
+            if lag is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS:
+                self._next = i + 1
+                return self.replicas[i]
+        return self.primary
+
+# postgresql_readonly: every transaction is READ ONLY, also when a read falls back to the primary
+read_pools = [
+    ReplicaPool(
+        primary.execution_options(postgresql_readonly=True),
+        [create_async_engine(url, echo=True, execution_options={"postgresql_readonly": True}) for url in urls],
+    )
+    for primary, urls in zip(shard_engines, REPLICA_URLS)
+]
+
+@asynccontextmanager
+async def read_session(user_id: Optional[str] = None, shard: Optional[int] = None, primary: bool = False):
+    """Read-only session on the owner's shard: a fresh-enough replica, or the primary."""
+    shard = ring.shard_for(user_id) if shard is None else shard
+    pool = read_pools[shard]
+    bind = pool.primary if primary or not pool.replicas else await pool.pick()
+    async with AsyncSessionLocal(shard=shard, bind=bind) as session:
+        yield session
 
 Base = declarative_base()
 
-async def get_db():
-    async with AsyncSessionLocal() as session:
+async def get_db(request: Request = None):
+    """
+    Session on the shard owning the authenticated caller (`uid` claim, put on request.state by
+    AuthMiddleware after verifying the token). Anonymous requests get the default shard.
+    """
+    owner_id = getattr(request.state, "owner_id", None) if request is not None else None
+    async with AsyncSessionLocal(user_id=owner_id) as session:
+        yield session
+
+async def get_read_db(request: Request = None):
+    """
+    Read-only session for GET endpoints, served by a replica of the caller's shard unless the
+    caller wrote within READ_YOUR_WRITES_SECONDS (the write may not have replayed yet) or every
+    replica is lagging.
+    """
+    owner_id = getattr(request.state, "owner_id", None) if request is not None else None
+    async with read_session(user_id=owner_id, primary=await wrote_recently(owner_id)) as session:
+        yield session
+
+def _has_replicas(user_id: Optional[str]) -> bool:
+    return bool(read_pools[ring.shard_for(user_id)].replicas)
+
+async def note_write(user_id: Optional[str]):
+    """Keeps the user's reads on the primary for READ_YOUR_WRITES_SECONDS."""
+    if not user_id or not _has_replicas(user_id):
+        return
+    try:
+        await recent_writes.mark(user_id)
+    except Exception as e:
+        logger.warning(f"Read-your-writes marker not set for {user_id}: {e}")
+
+async def wrote_recently(user_id: Optional[str]) -> bool:
+    if not user_id or not _has_replicas(user_id):
+        return False
+    try:
+        return await recent_writes.wrote_recently(user_id)
+    except Exception as e:
+        # Unknown, so don't risk serving the user stale data
+        logger.warning(f"Read-your-writes check failed for {user_id}: {e}")
+        return True
+
+async def fan_out(query: Callable[[AsyncSession], Awaitable[T]], read: bool = False) -> List[T]:
+    """
+    Runs `query` concurrently on every shard, one session each. Results are in shard order.
+    `read=True` uses read-only sessions, served by replicas where available.
+    """
+    async def run(shard: int) -> T:
+        opened = read_session(shard=shard) if read else AsyncSessionLocal(shard=shard)
+        async with opened as session:
+            return await query(session)
+    return list(await asyncio.gather(*(run(shard) for shard in range(ring.shard_count))))
+
+@asynccontextmanager
+async def session_where(db: Optional[AsyncSession], stmt: Any, fallback_user_id: Optional[str] = None):
+    """
+    For lookups made before the user id is known (email, verification/reset token): yields a
+    session on the shard where `stmt`, a single-column select, finds a row. With one shard that
+    is `db` itself (a new session when None, outside a request). Without a match, the shard
+    owning `fallback_user_id` (a new user's id).
+    """
+    if ring.shard_count == 1 and db is not None:
+        yield db
+        return
+    shard = None
+    if ring.shard_count > 1:
+        hits = await fan_out(lambda session: session.scalar(stmt))
+        shard = next((i for i, hit in enumerate(hits) if hit is not None), None)
+    async with AsyncSessionLocal(user_id=fallback_user_id, shard=shard) as session:
+        yield session
+
+NOTE_BY_ID_SQL = text("SELECT id FROM notes WHERE id = :id")
+
+@asynccontextmanager
+async def note_session(note_id: str, user_id: Optional[str] = None):
+    """
+    Session on the shard holding note `note_id`: the owner's when the caller knows it, found
+    by lookup otherwise (tasks queued before they carried the owner).
+    """
+    if user_id is not None:
+        async with AsyncSessionLocal(user_id=user_id) as session:
+            yield session
+        return
+    async with session_where(None, NOTE_BY_ID_SQL.bindparams(id=note_id)) as session:
+        yield session
+
+OWNER_BY_EMAIL_SQL = text("SELECT id FROM users WHERE email = :email")
+
+async def owner_id_for(email: str) -> Optional[str]:
+    """
+    Id of the user with `email`, searched on every shard. For access tokens issued before
+    they carried `uid`; None with a single shard, where routing doesn't depend on it.
+    """
+    if ring.shard_count == 1:
+        return None
+    hits = await fan_out(lambda session: session.scalar(OWNER_BY_EMAIL_SQL, {"email": email}))
+    return next((hit for hit in hits if hit is not None), None)
+
+@asynccontextmanager
+async def owner_session(db: AsyncSession, user_id: str):
+    """Session on the shard owning `user_id`, for acting on another user's rows (admin tools)."""
+    if ring.shard_count == 1:
+        yield db
+        return
+    async with AsyncSessionLocal(user_id=user_id) as session:
         yield session
@@ -1,4 +1,4 @@
-from prometheus_client import Gauge, Counter
+from prometheus_client import Gauge, Counter, Histogram
 from loguru import logger
 
 # 1. Graph Metrics
@@ -13,6 +13,18 @@ reflection_hit_rate_gauge = Gauge("analysis_cache_hit_rate", "Current analysis c
 db_query_count = Counter("db_queries_total", "Total number of database queries executed")
 reflection_ops_count = Counter("reflection_ops_total", "Total reflection operations triggered")
 
+# 3. RAG Context Latency
+rag_section_seconds = Histogram("rag_context_section_seconds", "Latency of hierarchical context sections", ["section"])
+rag_work_avoided = Counter("rag_context_work_avoided_total", "RAG work skipped because an analysis cache hit", ["cache", "kind"])
+
+# 4. Batch Reflection Throughput
+reflection_concurrency = Gauge("reflection_batch_concurrency", "Current adaptive concurrency limit of batch reflection")
+reflection_throughput = Gauge("reflection_batch_users_per_minute", "Batch reflection throughput (users per minute)")
+
+# 5. Retention Cleanup
+retention_notes_deleted = Counter("retention_notes_deleted_total", "Notes removed by retention cleanup", ["tier"])
+retention_throughput = Gauge("retention_notes_per_second", "Throughput of the last retention cleanup run")
+
 class MemoryMonitor:
     @staticmethod
     def track_cache_hit(cache_type: str = "semantic"):
@@ -51,4 +63,33 @@ class MemoryMonitor:
     def track_reflection_start():
         reflection_ops_count.inc()
 
+    @staticmethod
+    def track_rag_section(section: str, seconds: float):
+        rag_section_seconds.labels(section=section).observe(seconds)
+
+    @staticmethod
+    def track_context_skipped(cache_type: str, db_queries: int):
+        """
+        Records the context-building work a cache hit made unnecessary. No embeddings: the
+        context build reuses the one computed for the semantic cache lookup.
+        """
+        rag_work_avoided.labels(cache=cache_type, kind="db_queries").inc(db_queries)
+        logger.debug(f"Context skipped on {cache_type} hit: {db_queries} queries")
+
+    @staticmethod
+    def update_reflection_concurrency(limit: int):
+        reflection_concurrency.set(limit)
+
+    @staticmethod
+    def update_reflection_throughput(users_per_minute: float):
+        reflection_throughput.set(users_per_minute)
+
+    @staticmethod
+    def track_retention_deleted(tier: str, count: int):
+        retention_notes_deleted.labels(tier=tier).inc(count)
+
+    @staticmethod
+    def update_retention_throughput(notes_per_second: float):
+        retention_throughput.set(notes_per_second)
+
 monitor = MemoryMonitor()
@@ -0,0 +1,341 @@
+"""
+Online rebalancing of HASH (user_id) partitioned tables to a higher modulus.
+
+The table is rebuilt next to the live one as `{table}_next` with the new partition count.
+A row trigger mirrors every write on the live table into it while the existing rows are
+copied in small keyset batches; the checkpoint is committed together with each batch, so an
+interrupted run resumes where it stopped. Cutover is a rename swap under a short lock, and the
+old table stays around as `{table}_retired` until `--cleanup`.
+
+    python -m infrastructure.partition_rebalance note_embeddings --modulus 32
+    python -m infrastructure.partition_rebalance note_embeddings --modulus 32 --cleanup
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from sqlalchemy import JSON, bindparam, text
+
+from infrastructure.config import settings
+from infrastructure.partitions import list_partitions
+
+REBALANCEABLE_TABLES = ("note_embeddings", "long_term_memories")
+PARTITION_KEY = "user_id"
+
+PRIMARY_KEY_SQL = text("""
+    SELECT a.attname
+    FROM pg_index i
+    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+    WHERE i.indrelid = CAST(:table AS regclass) AND i.indisprimary
+    ORDER BY array_position(i.indkey::int2[], a.attnum)
+""")
+
+# Primary and foreign keys; CHECK constraints come along with LIKE ... INCLUDING CONSTRAINTS
+CONSTRAINTS_SQL = text("""
+    SELECT conname, pg_get_constraintdef(oid)
+    FROM pg_constraint
+    WHERE conrelid = CAST(:table AS regclass) AND contype IN ('p', 'f')
+    ORDER BY contype DESC, conname
+""")
+
+# Plain indexes, i.e. not the ones backing a constraint
+INDEXES_SQL = text("""
+    SELECT c.relname, pg_get_indexdef(i.indexrelid)
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE i.indrelid = CAST(:table AS regclass)
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+    ORDER BY c.relname
+""")
+
+ESTIMATE_SQL = text("""
+    SELECT coalesce(sum(greatest(c.reltuples, 0)), 0)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = CAST(:table AS regclass)
+""")
+
+STATE_SQL = text("""
+    SELECT target_modulus, phase, last_key, copied_rows
+    FROM partition_rebalances WHERE table_name = :table
+    FOR UPDATE
+""")
+
+SAVE_STATE_SQL = text("""
+    INSERT INTO partition_rebalances (table_name, target_modulus, phase, last_key, copied_rows)
+    VALUES (:table, :modulus, :phase, :last_key, :copied_rows)
+    ON CONFLICT (table_name) DO UPDATE SET
+        target_modulus = EXCLUDED.target_modulus,
+        phase = EXCLUDED.phase,
+        last_key = EXCLUDED.last_key,
+        copied_rows = EXCLUDED.copied_rows,
+        updated_at = now()
+""").bindparams(bindparam("last_key", type_=JSON))
+
+def index_sql(definition: str, name: str, table: str) -> str:
+    """Re-targets a pg_get_indexdef() definition to another table under another name."""
+    unique = "UNIQUE " if definition.startswith("CREATE UNIQUE") else ""
+    return f'CREATE {unique}INDEX "{name}" ON "{table}"{definition[definition.index(" USING "):]}'
+
+def sync_trigger_sql(table: str, target: str, function: str, primary_key: List[str]) -> List[str]:
+    """
+    AFTER row trigger mirroring writes on `table` into `target`. An UPDATE is a delete + insert,
+    so a changed key (even the partition key) lands in the right partition.
+    """
+    match = " AND ".join(f'"{c}" = OLD."{c}"' for c in primary_key)
+    return [
+        f'''CREATE OR REPLACE FUNCTION "{function}"() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                DELETE FROM "{target}" WHERE {match};
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                INSERT INTO "{target}" SELECT (NEW).* ON CONFLICT DO NOTHING;
+            END IF;
+            RETURN NULL;
+        END
+        $$''',
+        f'CREATE TRIGGER "{function}" AFTER INSERT OR UPDATE OR DELETE ON "{table}" '
+        f'FOR EACH ROW EXECUTE FUNCTION "{function}"()',
+    ]
+
+def copy_batch_sql(table: str, target: str, primary_key: List[str], resume: bool) -> str:
+    """
+    Copies the next `:limit` rows after the `:k0..kN` checkpoint and returns (rows, last key).
+    FOR SHARE makes a concurrent UPDATE/DELETE of these rows wait for the batch to commit,
+    so its trigger always runs after the copy and a stale version can't win.
+    """
+    cols = ", ".join(f'"{c}"' for c in primary_key)
+    where = f"WHERE ({cols}) > ({', '.join(f':k{i}' for i in range(len(primary_key)))})" if resume else ""
+    newest = ", ".join(f'"{c}" DESC' for c in primary_key)
+    return f"""
+        WITH batch AS (
+            SELECT * FROM "{table}" {where} ORDER BY {cols} LIMIT :limit FOR SHARE
+        ), copied AS (
+            INSERT INTO "{target}" SELECT * FROM batch ON CONFLICT DO NOTHING
+        )
+        SELECT (SELECT count(*) FROM batch), {cols} FROM batch ORDER BY {newest} LIMIT 1
+    """
+
+def renamed(name: str, old_prefix: str, new_prefix: str) -> str:
+    return new_prefix + name[len(old_prefix):] if name.startswith(old_prefix) else name
+
+def cutover_sql(table: str, target: str, retired: str, function: str, old_partitions: List[str], new_partitions: List[str]) -> List[str]:
+    """Catalog-only statements: the swap takes as long as acquiring the lock."""
+    statements = [
+        f'DROP TRIGGER "{function}" ON "{table}"',
+        f'ALTER TABLE "{table}" RENAME TO "{retired}"',
+    ]
+    statements += [f'ALTER TABLE "{p}" RENAME TO "{renamed(p, table, retired)}"' for p in old_partitions]
+    statements.append(f'ALTER TABLE "{target}" RENAME TO "{table}"')
+    statements += [f'ALTER TABLE "{p}" RENAME TO "{renamed(p, target, table)}"' for p in new_partitions]
+    return statements
+
+class HashPartitionRebalancer:
+    """
+    Phases, persisted in `partition_rebalances`:
+    copying -> copied -> cut_over -> done. Every step checks the phase first, so re-running
+    the tool after a crash or a failed cutover simply continues.
+    """
+
+    def __init__(self, engine, table: str, modulus: int, batch_rows: Optional[int] = None, pause_seconds: Optional[float] = None):
+        if table not in REBALANCEABLE_TABLES:
+            raise ValueError(f"{table} is not a hash-partitioned table this tool can rebalance")
+        self.engine = engine
+        self.table = table
+        self.modulus = modulus
+        self.target = f"{table}_next"
+        self.retired = f"{table}_retired"
+        self.function = f"{table}_rebalance_sync"
+        self.batch_rows = batch_rows or settings.REBALANCE_BATCH_ROWS
+        self.pause_seconds = settings.REBALANCE_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+
+    async def _state(self, conn) -> Optional[Dict[str, Any]]:
+        row = (await conn.execute(STATE_SQL, {"table": self.table})).mappings().first()
+        if row is None:
+            return None
+        state = dict(row)
+        if state["target_modulus"] != self.modulus and state["phase"] != "done":
+            raise ValueError(f"{self.table} is already being rebalanced to modulus {state['target_modulus']}")
+        return state
+
+    async def _save(self, conn, state: Dict[str, Any]):
+        await conn.execute(SAVE_STATE_SQL, {
+            "table": self.table,
+            "modulus": self.modulus,
+            "phase": state["phase"],
+            "last_key": state["last_key"],
+            "copied_rows": state["copied_rows"],
+        })
+
+    async def _lock_timeout(self, conn):
+        await conn.execute(text(f"SET LOCAL lock_timeout = '{int(settings.REBALANCE_LOCK_TIMEOUT_MS)}ms'"))
+
+    async def _primary_key(self, conn) -> List[str]:
+        return [row[0] for row in (await conn.execute(PRIMARY_KEY_SQL, {"table": self.table})).all()]
+
+    async def run(self) -> Dict[str, Any]:
+        """prepare -> copy -> cutover; stops short of dropping the old table."""
+        state = await self.prepare()
+        if state["phase"] == "copying":
+            state = await self.copy()
+        if state["phase"] == "copied":
+            state = await self.cutover()
+        return state
+
+    async def prepare(self) -> Dict[str, Any]:
+        """Creates `{table}_next` with the new modulus and starts mirroring writes into it."""
+        async with self.engine.begin() as conn:
+            state = await self._state(conn)
+            if state and state["phase"] != "done":
+                return state
+
+            current = len(await list_partitions(conn, self.table))
+            if self.modulus <= current:
+                raise ValueError(f"{self.table} already has {current} partitions, the new modulus must be higher")
+
+            await self._lock_timeout(conn)
+            await conn.execute(text(
+                f'CREATE TABLE "{self.target}" (LIKE "{self.table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                f"PARTITION BY HASH ({PARTITION_KEY})"
+            ))
+            for i in range(self.modulus):
+                await conn.execute(text(
+                    f'CREATE TABLE "{self.target}_p{i}" PARTITION OF "{self.target}" '
+                    f"FOR VALUES WITH (MODULUS {self.modulus}, REMAINDER {i})"
+                ))
+            # Empty table: keys and indexes are built instantly, FK validation has nothing to scan
+            for name, definition in (await conn.execute(CONSTRAINTS_SQL, {"table": self.table})).all():
+                await conn.execute(text(f'ALTER TABLE "{self.target}" ADD CONSTRAINT "{name}_next" {definition}'))
+            for name, definition in (await conn.execute(INDEXES_SQL, {"table": self.table})).all():
+                await conn.execute(text(index_sql(definition, f"{name}_next", self.target)))
+
+            # Waits for in-flight writers; every write committed afterwards is mirrored
+            for statement in sync_trigger_sql(self.table, self.target, self.function, await self._primary_key(conn)):
+                await conn.execute(text(statement))
+
+            state = {"target_modulus": self.modulus, "phase": "copying", "last_key": None, "copied_rows": 0}
+            await self._save(conn, state)
+        logger.info(f"Rebalance {self.table}: {current} -> {self.modulus} partitions, dual-write enabled")
+        return state
+
+    async def copy(self) -> Dict[str, Any]:
+        """Backfills existing rows in keyset batches, one transaction and checkpoint per batch."""
+        async with self.engine.begin() as conn:
+            primary_key = await self._primary_key(conn)
+            total = int((await conn.execute(ESTIMATE_SQL, {"table": self.table})).scalar() or 0)
+
+        started = time.monotonic()
+        copied_this_run = 0
+        while True:
+            async with self.engine.begin() as conn:
+                # Row lock on the checkpoint: a second copier waits instead of interleaving
+                state = await self._state(conn)
+                if state is None or state["phase"] != "copying":
+                    return state
+                resume = state["last_key"] is not None
+                params = {"limit": self.batch_rows}
+                if resume:
+                    params.update({f"k{i}": v for i, v in enumerate(state["last_key"])})
+                row = (await conn.execute(text(copy_batch_sql(self.table, self.target, primary_key, resume)), params)).first()
+
+                if row is None:
+                    state["phase"] = "copied"
+                else:
+                    state["last_key"] = list(row[1:])
+                    state["copied_rows"] += row[0]
+                    copied_this_run += row[0]
+                await self._save(conn, state)
+
+            if state["phase"] == "copied":
+                logger.info(f"Rebalance {self.table}: backfill complete, {state['copied_rows']} rows")
+                return state
+
+            elapsed = time.monotonic() - started
+            percent = f"{100 * state['copied_rows'] / total:.1f}%" if total else "?"
+            logger.info(
+                f"Rebalance {self.table}: {state['copied_rows']}/~{total} rows ({percent}), "
+                f"{copied_this_run / max(elapsed, 1e-6):.0f} rows/s"
+            )
+            await asyncio.sleep(self.pause_seconds)
+
+    async def cutover(self) -> Dict[str, Any]:
+        """
+        Swaps the tables by renaming. Both are complete at this point (backfill done, trigger
+        running), so the exclusive lock is held only for catalog updates. If the lock can't be
+        taken within REBALANCE_LOCK_TIMEOUT_MS the transaction fails and can simply be retried.
+        """
+        async with self.engine.begin() as conn:
+            state = await self._state(conn)
+            if state is None or state["phase"] != "copied":
+                return state
+            await self._lock_timeout(conn)
+            await conn.execute(text(f'LOCK TABLE "{self.table}" IN ACCESS EXCLUSIVE MODE'))
+            old_partitions = await list_partitions(conn, self.table)
+            new_partitions = await list_partitions(conn, self.target)
+            for statement in cutover_sql(self.table, self.target, self.retired, self.function, old_partitions, new_partitions):
+                await conn.execute(text(statement))
+            state["phase"] = "cut_over"
+            await self._save(conn, state)
+        logger.info(f"Rebalance {self.table}: cut over to {self.modulus} partitions, old table kept as {self.retired}")
+        return state
+
+    async def cleanup(self) -> Dict[str, Any]:
+        """Drops the retired table and gives keys and indexes their original names back."""
+        async with self.engine.begin() as conn:
+            state = await self._state(conn)
+            if state is None or state["phase"] != "cut_over":
+                return state
+            await conn.execute(text(f'DROP TABLE IF EXISTS "{self.retired}" CASCADE'))
+            await conn.execute(text(f'DROP FUNCTION IF EXISTS "{self.function}"()'))
+            for name, _ in (await conn.execute(CONSTRAINTS_SQL, {"table": self.table})).all():
+                if name.endswith("_next"):
+                    await conn.execute(text(f'ALTER TABLE "{self.table}" RENAME CONSTRAINT "{name}" TO "{name[:-5]}"'))
+            for name, _ in (await conn.execute(INDEXES_SQL, {"table": self.table})).all():
+                if name.endswith("_next"):
+                    await conn.execute(text(f'ALTER INDEX "{name}" RENAME TO "{name[:-5]}"'))
+            state["phase"] = "done"
+            await self._save(conn, state)
+        logger.info(f"Rebalance {self.table}: {self.retired} dropped")
+        return state
+
+    async def abort(self) -> Optional[Dict[str, Any]]:
+        """Before cutover only: stops mirroring and drops the half-built table."""
+        async with self.engine.begin() as conn:
+            state = await self._state(conn)
+            if state is None or state["phase"] not in ("copying", "copied"):
+                return state
+            await self._lock_timeout(conn)
+            await conn.execute(text(f'DROP TRIGGER IF EXISTS "{self.function}" ON "{self.table}"'))
+            await conn.execute(text(f'DROP FUNCTION IF EXISTS "{self.function}"()'))
+            await conn.execute(text(f'DROP TABLE IF EXISTS "{self.target}" CASCADE'))
+            await conn.execute(text("DELETE FROM partition_rebalances WHERE table_name = :table"), {"table": self.table})
+        logger.info(f"Rebalance {self.table}: aborted")
+        return None
+
+async def main(argv: Optional[List[str]] = None):
+    from infrastructure.database import engine
+
+    parser = argparse.ArgumentParser(description="Online rebalance of a hash-partitioned table to a higher modulus")
+    parser.add_argument("table", choices=REBALANCEABLE_TABLES)
+    parser.add_argument("--modulus", type=int, required=True)
+    parser.add_argument("--batch-rows", type=int, default=None)
+    parser.add_argument("--pause", type=float, default=None, help="Seconds between batches")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--cleanup", action="store_true", help="Drop the retired table after cutover")
+    action.add_argument("--abort", action="store_true", help="Drop the new table before cutover")
+    args = parser.parse_args(argv)
+
+    rebalancer = HashPartitionRebalancer(engine, args.table, args.modulus, args.batch_rows, args.pause)
+    if args.cleanup:
+        state = await rebalancer.cleanup()
+    elif args.abort:
+        state = await rebalancer.abort()
+    else:
+        state = await rebalancer.run()
+    logger.info(f"Rebalance {args.table}: {state}")
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Monthly RANGE partitions on a timestamptz column: naming, creating partitions ahead of time
+and retiring expired months by DETACH + DROP instead of row deletes.
+"""
+import datetime
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+from loguru import logger
+from sqlalchemy import text
+
+@dataclass(frozen=True)
+class MonthlyPartitionPolicy:
+    table: str
+    retention_months: int # Whole months kept before the current one
+    premake_months: int = 3 # Future months created in advance so inserts never miss a partition
+
+LIST_PARTITIONS_SQL = text("""
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN pg_class p ON p.oid = i.inhparent
+    WHERE p.relname = :table AND pg_table_is_visible(p.oid)
+    ORDER BY c.relname
+""")
+
+def month_floor(day: datetime.date) -> datetime.date:
+    return datetime.date(day.year, day.month, 1)
+
+def add_months(month: datetime.date, n: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + n
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table: str, month: datetime.date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+def partition_month(table: str, name: str) -> Optional[datetime.date]:
+    """Month covered by a partition created here, None for anything else attached to the table."""
+    match = re.fullmatch(rf"{re.escape(table)}_p(\d{{4}})(\d{{2}})", name)
+    return datetime.date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+def create_partition_sql(table: str, month: datetime.date) -> str:
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(table, month)}" PARTITION OF "{table}" '
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+    )
+
+def expired_partitions(policy: MonthlyPartitionPolicy, names: List[str], today: datetime.date) -> List[str]:
+    """Partitions whose whole month lies before the retention cutoff."""
+    cutoff = add_months(month_floor(today), -policy.retention_months)
+    return [n for n in names if (m := partition_month(policy.table, n)) is not None and m < cutoff]
+
+async def list_partitions(conn, table: str) -> List[str]:
+    res = await conn.execute(LIST_PARTITIONS_SQL, {"table": table})
+    return [row[0] for row in res.all()]
+
+async def ensure_partitions(conn, policy: MonthlyPartitionPolicy, today: datetime.date) -> List[str]:
+    """Creates the current month and the next `premake_months` if missing. Returns the new names."""
+    existing = set(await list_partitions(conn, policy.table))
+    created = []
+    current = month_floor(today)
+    for i in range(policy.premake_months + 1):
+        month = add_months(current, i)
+        name = partition_name(policy.table, month)
+        if name not in existing:
+            await conn.execute(text(create_partition_sql(policy.table, month)))
+            created.append(name)
+    return created
+
+async def retire_partitions(conn, policy: MonthlyPartitionPolicy, today: datetime.date, concurrently: bool = True) -> List[str]:
+    """
+    Detaches and drops expired months. DETACH ... CONCURRENTLY (PostgreSQL 14+) needs an
+    autocommit connection and does not block readers/writers of the parent.
+    """
+    dropped = []
+    for name in expired_partitions(policy, await list_partitions(conn, policy.table), today):
+        mode = " CONCURRENTLY" if concurrently else ""
+        await conn.execute(text(f'ALTER TABLE "{policy.table}" DETACH PARTITION "{name}"{mode}'))
+        await conn.execute(text(f'DROP TABLE "{name}"'))
+        logger.info(f"Retired partition {name}")
+        dropped.append(name)
+    return dropped
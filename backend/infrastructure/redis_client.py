@@ -1,4 +1,6 @@
 import json
+import time
+import uuid
 from typing import List, Dict, Any, Optional
 import redis.asyncio as redis
 from infrastructure.config import settings
@@ -7,7 +9,8 @@ class ShortTermMemory:
     """
     Manages user short-term memory (last messages/actions) in Redis.
     Structure: Redis List "user:{user_id}:short_term"
-    TTL: 3600 seconds
+    Recent notes ring buffer: Redis List "user:{user_id}:recent_notes"
+    TTL: 12 hours
     """
     def __init__(self):
         self._redis = redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
@@ -35,9 +38,169 @@ class ShortTermMemory:
         items = await self._redis.lrange(key, 0, -1)
         return [json.loads(i) for i in items]
 
+    async def push_recent_note(self, user_id: str, note_data: Dict[str, Any]) -> bool:
+        """
+        Pushes a completed note onto the user's recent-notes ring buffer.
+        Only a warm buffer is extended (LPUSHX): a cold one is rebuilt from the DB
+        on the next read, so a partial buffer never hides older notes.
+        """
+        key = f"user:{user_id}:recent_notes"
+        pushed = await self._redis.lpushx(key, json.dumps(note_data))
+        if pushed:
+            await self._redis.ltrim(key, 0, self.max_size - 1)
+            await self._redis.expire(key, self.ttl)
+        return bool(pushed)
+
+    async def get_recent_notes(self, user_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Returns the recent-notes ring buffer (newest first), or None on a cold start."""
+        key = f"user:{user_id}:recent_notes"
+        items = await self._redis.lrange(key, 0, -1)
+        return [json.loads(i) for i in items] or None
+
+    async def warm_recent_notes(self, user_id: str, notes: List[Dict[str, Any]]):
+        """Rebuilds the ring buffer from notes loaded from the DB (newest first)."""
+        if not notes:
+            return
+        key = f"user:{user_id}:recent_notes"
+        await self._redis.delete(key)
+        await self._redis.rpush(key, *[json.dumps(n) for n in notes[:self.max_size]])
+        await self._redis.expire(key, self.ttl)
+
+    async def evict_recent_notes(self, user_id: str, note_ids: List[str]) -> bool:
+        """
+        Drops the ring buffer if it holds any of the given (edited or deleted) notes; the next
+        read rebuilds it from the DB with current snippets and no gap. Returns whether it did.
+        """
+        key = f"user:{user_id}:recent_notes"
+        ids = set(note_ids)
+        items = await self._redis.lrange(key, 0, -1)
+        if not any(json.loads(i).get("note_id") in ids for i in items):
+            return False
+        await self._redis.delete(key)
+        return True
+
     async def clear(self, user_id: str):
         """Clears short-term memory for a user."""
         key = f"user:{user_id}:short_term"
         await self._redis.delete(key)
 
+class GraphAdjacencyCache:
+    """
+    Per-user note graph adjacency list in Redis.
+    Structure: Redis Hash "user:{user_id}:adjacency" -> node_id: [[neighbor, strength, confidence], ...]
+    Neighbors are pre-filtered and sorted (strength, confidence DESC); the degree cap is applied on read.
+    TTL: 1 hour. Writers invalidate on new relations.
+    """
+    BUILT_FIELD = "__built__"
+
+    def __init__(self, client):
+        self._redis = client
+        self.ttl = 3600
+
+    async def get_neighbors(self, user_id: str, node_ids: List[str]) -> Optional[Dict[str, List[list]]]:
+        """Returns neighbor lists for the given nodes, or None if the user's adjacency is not cached."""
+        key = f"user:{user_id}:adjacency"
+        values = await self._redis.hmget(key, [self.BUILT_FIELD] + list(node_ids))
+        if not values or values[0] is None:
+            return None
+        return {nid: json.loads(v) if v else [] for nid, v in zip(node_ids, values[1:])}
+
+    async def store(self, user_id: str, adjacency: Dict[str, List[list]]):
+        key = f"user:{user_id}:adjacency"
+        mapping = {nid: json.dumps(edges) for nid, edges in adjacency.items()}
+        mapping[self.BUILT_FIELD] = "1"
+        await self._redis.delete(key)
+        await self._redis.hset(key, mapping=mapping)
+        await self._redis.expire(key, self.ttl)
+
+    async def invalidate(self, user_id: str):
+        await self._redis.delete(f"user:{user_id}:adjacency")
+
+class ReflectionScheduler:
+    """
+    Trailing-edge debounce for per-user reflection.
+    Structure: Sorted Set "reflection:schedule" (user_id -> due timestamp)
+               Hash "reflection:burst_start" (user_id -> first unprocessed trigger)
+               String "reflection:running:{user_id}" (run lock holder token)
+    Each trigger pushes the deadline to now + debounce, capped at burst start + max wait.
+    """
+    SCHEDULE_KEY = "reflection:schedule"
+    BURST_KEY = "reflection:burst_start"
+
+    # KEYS: schedule, burst_start | ARGV: user_id, now, debounce, max_wait
+    SCHEDULE_SCRIPT = """
+        redis.call('HSETNX', KEYS[2], ARGV[1], ARGV[2])
+        local first = tonumber(redis.call('HGET', KEYS[2], ARGV[1]))
+        local due = math.min(tonumber(ARGV[2]) + tonumber(ARGV[3]), first + tonumber(ARGV[4]))
+        redis.call('ZADD', KEYS[1], due, ARGV[1])
+        return tostring(due)
+    """
+
+    # KEYS: schedule, burst_start | ARGV: now, limit
+    CLAIM_SCRIPT = """
+        local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+        if #due > 0 then
+            redis.call('ZREM', KEYS[1], unpack(due))
+            redis.call('HDEL', KEYS[2], unpack(due))
+        end
+        return due
+    """
+
+    # KEYS: run lock | ARGV: token (only the holder may release)
+    RELEASE_SCRIPT = """
+        if redis.call('GET', KEYS[1]) == ARGV[1] then
+            return redis.call('DEL', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, client):
+        self._redis = client
+
+    @staticmethod
+    def _run_key(user_id: str) -> str:
+        return f"reflection:running:{user_id}"
+
+    async def acquire_run(self, user_id: str) -> Optional[str]:
+        """Per-user run lock (String, SET NX with TTL). Returns the release token, None if held."""
+        token = uuid.uuid4().hex
+        acquired = await self._redis.set(self._run_key(user_id), token, nx=True, ex=settings.REFLECTION_RUN_LOCK_SECONDS)
+        return token if acquired else None
+
+    async def release_run(self, user_id: str, token: str):
+        await self._redis.eval(self.RELEASE_SCRIPT, 1, self._run_key(user_id), token)
+
+    async def schedule(self, user_id: str, now: Optional[float] = None) -> float:
+        """Registers a trigger; returns the (possibly postponed) due timestamp."""
+        now = time.time() if now is None else now
+        due = await self._redis.eval(
+            self.SCHEDULE_SCRIPT, 2, self.SCHEDULE_KEY, self.BURST_KEY,
+            user_id, now, settings.REFLECTION_DEBOUNCE_SECONDS, settings.REFLECTION_MAX_WAIT_SECONDS
+        )
+        return float(due)
+
+    async def claim_due(self, now: Optional[float] = None, limit: int = 100) -> List[str]:
+        """Atomically pops users whose deadline has passed, so each burst runs exactly once."""
+        now = time.time() if now is None else now
+        return list(await self._redis.eval(self.CLAIM_SCRIPT, 2, self.SCHEDULE_KEY, self.BURST_KEY, now, limit) or [])
+
+class RecentWrites:
+    """
+    Read-your-writes marker.
+    Structure: String "user:{user_id}:last_write", set after each write and expiring after
+    READ_YOUR_WRITES_SECONDS. While it exists the user's reads are served by the primary.
+    """
+
+    def __init__(self, client):
+        self._redis = client
+
+    async def mark(self, user_id: str):
+        await self._redis.set(f"user:{user_id}:last_write", "1", ex=settings.READ_YOUR_WRITES_SECONDS)
+
+    async def wrote_recently(self, user_id: str) -> bool:
+        return bool(await self._redis.exists(f"user:{user_id}:last_write"))
+
 short_term_memory = ShortTermMemory()
+graph_adjacency_cache = GraphAdjacencyCache(short_term_memory._redis)
+reflection_scheduler = ReflectionScheduler(short_term_memory._redis)
+recent_writes = RecentWrites(short_term_memory._redis)
@@ -3,7 +3,7 @@ from botocore.exceptions import NoCredentialsError, ClientError
 import os
 import logging
 import shutil
-from typing import Union, BinaryIO
+from typing import Union, BinaryIO, List
 from infrastructure.config import settings
 
 # Configuration (In a real app, use settings.py/pydantic)
@@ -12,6 +12,7 @@ AWS_ACCESS_KEY_ID = settings.AWS_ACCESS_KEY_ID
 AWS_SECRET_ACCESS_KEY = settings.AWS_SECRET_ACCESS_KEY
 S3_ENDPOINT_URL = settings.S3_ENDPOINT_URL # For MinIO or Cloudflare R2
 S3_REGION_NAME = settings.S3_REGION_NAME
+S3_DELETE_BATCH = 1000 # DeleteObjects limit
 
 logger = logging.getLogger(__name__)
 
@@ -126,5 +127,29 @@ class StorageClient:
         except ClientError as e:
             logger.error(e)
 
+    async def delete_files(self, file_keys: List[str]) -> List[str]:
+        """
+        Bulk delete (S3 DeleteObjects, up to 1000 keys per request).
+        Returns the keys that could not be deleted.
+        """
+        if self.is_mock:
+            for key in file_keys:
+                await self.delete_file(key)
+            return []
+
+        failed: List[str] = []
+        for start in range(0, len(file_keys), S3_DELETE_BATCH):
+            batch = file_keys[start:start + S3_DELETE_BATCH]
+            try:
+                response = self.s3_client.delete_objects(
+                    Bucket=S3_BUCKET_NAME,
+                    Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True}
+                )
+                failed.extend(err["Key"] for err in response.get("Errors", []))
+            except ClientError as e:
+                logger.error(e)
+                failed.extend(batch)
+        return failed
+
 # Global Instance
 storage_client = StorageClient()
@@ -1,30 +1,94 @@
 from celery import shared_task
 from loguru import logger
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import delete, update, select, func
+from sqlalchemy import delete, update, select, and_, bindparam
 from asgiref.sync import async_to_sync
+from typing import Dict, List, Tuple
+import asyncio
+import json
 
-from infrastructure.database import AsyncSessionLocal
+from infrastructure.database import AsyncSessionLocal, ring
 from app.models import Note, LongTermMemory, NoteRelation
 from app.services.ai_service import ai_service
-from infrastructure.monitoring import monitor
+from app.services.ai_service.response_parser import ResponseParser
+from infrastructure.config import settings
 
-async def generate_ultra_summary(text: str) -> str:
-    """Generate a highly compressed summary (50-100 words)."""
+ULTRA_SUMMARY_FALLBACK_CHARS = 300
+
+async def generate_ultra_summaries(memories: List[Tuple[str, str]]) -> Dict[str, str]:
+    """
+    Compresses several memories (id, text) into 50-100 word summaries with one structured JSON call.
+    Ids the model skips, or a failed call, fall back to truncated text.
+    """
+    summaries = {mem_id: (text or "")[:ULTRA_SUMMARY_FALLBACK_CHARS] for mem_id, text in memories}
     try:
+        items = "\n".join(json.dumps({"id": mem_id, "text": text}, ensure_ascii=False) for mem_id, text in memories)
         prompt = (
-            "Compress the following memory into an ultra-short summary (50-100 words) "
-            "that captures only the most essential facts for long-term archival.\n\n"
-            f"Original Memory:\n{text}"
+            "Compress each of the following memories into an ultra-short summary (50-100 words) "
+            "that captures only the most essential facts for long-term archival.\n"
+            "Return JSON: {\"summaries\": [{\"id\": \"...\", \"summary\": \"...\"}]} with one entry per id.\n\n"
+            f"Memories (one JSON object per line):\n{items}"
         )
-        summary = await ai_service.get_chat_completion([
-            {"role": "system", "content": "You are a memory compression agent. Be concise."},
+        resp = await ai_service.get_chat_completion([
+            {"role": "system", "content": "You are a memory compression agent. Be concise. Output JSON only."},
             {"role": "user", "content": prompt}
-        ])
-        return summary
+        ], response_format="json_object")
+        data = json.loads(ResponseParser.clean_json(resp))
+        for entry in data.get("summaries", []):
+            if entry.get("id") in summaries and entry.get("summary"):
+                summaries[entry["id"]] = entry["summary"]
     except Exception as e:
-        logger.error(f"Failed to generate ultra-summary: {e}")
-        return text[:300] # Fallback to truncated text
+        logger.error(f"Failed to generate ultra-summaries for {len(memories)} memories: {e}")
+    return summaries
+
+async def _archive_chunk(chunk: List[Tuple[str, str]], shard: int = 0) -> int:
+    """One LLM call and one short transaction per chunk."""
+    summaries = await generate_ultra_summaries(chunk)
+    table = LongTermMemory.__table__
+    async with AsyncSessionLocal(shard=shard) as session:
+        await session.execute(
+            update(table)
+            .where(table.c.id == bindparam("b_id"), table.c.is_archived == False)
+            .values(archived_summary=bindparam("b_summary"), is_archived=True),
+            [{"b_id": mem_id, "b_summary": summaries[mem_id]} for mem_id, _ in chunk],
+        )
+        await session.commit()
+    return len(chunk)
+
+async def archive_memories(soft_filter, shard: int = 0) -> int:
+    """
+    Soft-archives matching memories of one shard with ultra-summaries.
+    Candidates are read in keyset pages (by id) of ARCHIVE_MEMORIES_PER_CALL * ARCHIVE_CONCURRENCY;
+    each page is split into chunks compressed concurrently and committed separately,
+    so no lock or transaction spans the whole backlog.
+    """
+    per_call = settings.ARCHIVE_MEMORIES_PER_CALL
+    page_size = per_call * settings.ARCHIVE_CONCURRENCY
+    last_id = ""
+    archived = 0
+    while True:
+        async with AsyncSessionLocal(shard=shard) as session:
+            res = await session.execute(
+                select(LongTermMemory.id, LongTermMemory.summary_text)
+                .where(soft_filter, LongTermMemory.id > last_id)
+                .order_by(LongTermMemory.id)
+                .limit(page_size)
+            )
+            page = [(row[0], row[1]) for row in res.all()]
+        if not page:
+            break
+        last_id = page[-1][0]
+
+        chunks = [page[i:i + per_call] for i in range(0, len(page), per_call)]
+        results = await asyncio.gather(*[_archive_chunk(c, shard) for c in chunks], return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Archive chunk failed: {result}") # its rows stay unarchived for the next run
+            else:
+                archived += result
+        if len(page) < page_size:
+            break
+    return archived
 
 async def run_cleanup():
     """
@@ -33,78 +97,69 @@ async def run_cleanup():
     2. Soft Archiving: 
        - Records older than 180 days.
        - Records with very low importance (< 3.0) regardless of age (if > 30 days).
+    Per shard, deletes run in one short transaction; archiving commits per chunk (see archive_memories).
     """
-    async with AsyncSessionLocal() as session:
-        now = datetime.now(timezone.utc)
-        
-        # 1. Hard Delete (Strictly > 365 days)
-        hard_cutoff = now - timedelta(days=365)
-        hard_stmt = delete(LongTermMemory).where(LongTermMemory.created_at < hard_cutoff)
-        hard_res = await session.execute(hard_stmt)
-        hard_count = hard_res.rowcount
-        
-        # 2. Soft Archive (Soft Forgetting)
-        # Conditions: (age > 180 days) OR (score < 3.0 AND age > 30 days)
-        soft_cutoff_age = now - timedelta(days=180)
-        soft_cutoff_low_score = now - timedelta(days=30)
-        
-        soft_query = select(LongTermMemory).where(
-            LongTermMemory.is_archived == False,
-            (LongTermMemory.created_at < soft_cutoff_age) | 
-            ((LongTermMemory.importance_score < 3.0) & (LongTermMemory.created_at < soft_cutoff_low_score))
-        )
-        soft_targets_res = await session.execute(soft_query)
-        soft_targets = soft_targets_res.scalars().all()
-        
-        archived_count = 0
-        for mem in soft_targets:
-            # Compression: generate ultra-summary before archiving
-            mem.archived_summary = await generate_ultra_summary(mem.summary_text)
-            mem.is_archived = True
-            archived_count += 1
-            
-            
-        # 3. Notes cleanup (Standard deletion for medium-term storage)
-        note_cutoff = now - timedelta(days=90)
-        note_stmt = delete(Note).where(
-            Note.importance_score < 4,
-            Note.created_at < note_cutoff
-        )
-        note_res = await session.execute(note_stmt)
-        
-        # 4. Graph Cleanup (Requirement: TTL 180 days, Weak relations)
-        # Delete relations older than 180 days
-        rel_ttl_cutoff = now - timedelta(days=180)
-        rel_ttl_stmt = delete(NoteRelation).where(NoteRelation.created_at < rel_ttl_cutoff)
-        rel_ttl_res = await session.execute(rel_ttl_stmt)
-
-        # Delete weak relations (strength < 0.5) if older than 30 days
-        rel_weak_cutoff = now - timedelta(days=30)
-        rel_weak_stmt = delete(NoteRelation).where(
-            NoteRelation.strength < 0.5,
-            NoteRelation.created_at < rel_weak_cutoff
-        )
-        rel_weak_res = await session.execute(rel_weak_stmt)
-
-        # 5. Enforce Max Degree (10) - Opportunistic Cleanup
-        # Find nodes with > 10 relations
-        # This is expensive to do for all, so we can pick a strategy or do nothing here as 
-        # insertion logic (in reflection) already checks it.
-        # But let's delete lowest strength if > 10.
-        # (Omitted here for performance, relying on insertion checks)
-        
-        await session.commit()
-        
-        # Monitoring
-        total_notes = (await session.execute(select(func.count(Note.id)))).scalar()
-        total_rels = (await session.execute(select(func.count(NoteRelation.id)))).scalar()
-        monitor.update_graph_metrics(total_notes, total_rels)
-        
-        logger.info(
-            f"Cleanup: Hard {hard_count}, Arch {archived_count}, Notes {note_res.rowcount}, "
-            f"RelTTL {rel_ttl_res.rowcount}, RelWeak {rel_weak_res.rowcount}"
-        )
-        return hard_count, archived_count
+    now = datetime.now(timezone.utc)
+    # 5. Soft Archive (Soft Forgetting)
+    # Conditions: (age > 180 days) OR (score < 3.0 AND age > 30 days)
+    soft_cutoff_age = now - timedelta(days=180)
+    soft_cutoff_low_score = now - timedelta(days=30)
+    soft_filter = and_(
+        LongTermMemory.is_archived == False,
+        (LongTermMemory.created_at < soft_cutoff_age) |
+        ((LongTermMemory.importance_score < 3.0) & (LongTermMemory.created_at < soft_cutoff_low_score))
+    )
+
+    hard_count = archived_count = notes_count = rel_ttl_count = rel_weak_count = 0
+    for shard in range(ring.shard_count):
+        async with AsyncSessionLocal(shard=shard) as session:
+            # 1. Hard Delete (Strictly > 365 days)
+            hard_cutoff = now - timedelta(days=365)
+            hard_stmt = delete(LongTermMemory).where(LongTermMemory.created_at < hard_cutoff)
+            hard_res = await session.execute(hard_stmt)
+            hard_count += hard_res.rowcount
+
+            # 2. Notes cleanup (Standard deletion for medium-term storage)
+            note_cutoff = now - timedelta(days=90)
+            note_stmt = delete(Note).where(
+                Note.importance_score < 4,
+                Note.created_at < note_cutoff
+            )
+            note_res = await session.execute(note_stmt)
+            notes_count += note_res.rowcount
+
+            # 3. Graph Cleanup (Requirement: TTL 180 days, Weak relations)
+            # Delete relations older than 180 days
+            rel_ttl_cutoff = now - timedelta(days=180)
+            rel_ttl_stmt = delete(NoteRelation).where(NoteRelation.created_at < rel_ttl_cutoff)
+            rel_ttl_res = await session.execute(rel_ttl_stmt)
+            rel_ttl_count += rel_ttl_res.rowcount
+
+            # Delete weak relations (strength < 0.5) if older than 30 days
+            rel_weak_cutoff = now - timedelta(days=30)
+            rel_weak_stmt = delete(NoteRelation).where(
+                NoteRelation.strength < 0.5,
+                NoteRelation.created_at < rel_weak_cutoff
+            )
+            rel_weak_res = await session.execute(rel_weak_stmt)
+            rel_weak_count += rel_weak_res.rowcount
+
+            # 4. Enforce Max Degree (10) - Opportunistic Cleanup
+            # Find nodes with > 10 relations
+            # This is expensive to do for all, so we can pick a strategy or do nothing here as 
+            # insertion logic (in reflection) already checks it.
+            # But let's delete lowest strength if > 10.
+            # (Omitted here for performance, relying on insertion checks)
+
+            await session.commit()
+
+        archived_count += await archive_memories(soft_filter, shard)
+
+    logger.info(
+        f"Cleanup: Hard {hard_count}, Arch {archived_count}, Notes {notes_count}, "
+        f"RelTTL {rel_ttl_count}, RelWeak {rel_weak_count}"
+    )
+    return hard_count, archived_count
 
 @shared_task(name="cleanup_memory")
 def cleanup_memory():
@@ -0,0 +1,41 @@
+from celery import shared_task
+from sqlalchemy.future import select
+from loguru import logger
+from asgiref.sync import async_to_sync
+
+from infrastructure.database import AsyncSessionLocal, fan_out
+from app.models import NoteRelation
+from app.core.graph_service import graph_service
+
+async def _compact_relations_async() -> dict:
+    """
+    One-off compaction of duplicate NoteRelation edges, one user per transaction.
+    Run it before the uq_note_relations_edge migration on large tables so the
+    migration's own set-based pass has nothing left to merge.
+    """
+    async def shard_user_ids(db):
+        res = await db.execute(select(NoteRelation.user_id).where(NoteRelation.user_id.isnot(None)).distinct())
+        return [uid for (uid,) in res.all()]
+
+    user_ids = [uid for shard_ids in await fan_out(shard_user_ids) for uid in shard_ids]
+
+    totals = {"users": 0, "merged": 0, "deleted": 0}
+    for user_id in user_ids:
+        async with AsyncSessionLocal(user_id=user_id) as db:
+            try:
+                merged, deleted = await graph_service.compact_user_relations(db, user_id)
+                await db.commit()
+            except Exception as e:
+                logger.error(f"Relation compaction failed for {user_id}: {e}")
+                await db.rollback()
+                continue
+        totals["users"] += 1
+        totals["merged"] += merged
+        totals["deleted"] += deleted
+
+    logger.info(f"Relation compaction: {totals['merged']} edges merged, {totals['deleted']} duplicates removed across {totals['users']} users")
+    return totals
+
+@shared_task(name="graph.compact_relations")
+def compact_relations():
+    return async_to_sync(_compact_relations_async)()
@@ -0,0 +1,71 @@
+from celery import shared_task
+from sqlalchemy import text, func, bindparam, String
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import ARRAY
+from loguru import logger
+from typing import Dict, List
+from asgiref.sync import async_to_sync
+
+from infrastructure.database import AsyncSessionLocal, ring
+from infrastructure.monitoring import monitor
+from infrastructure.metrics import MEMORY_GRAPH_NODES, MEMORY_GRAPH_EDGES
+from app.models import Note, NoteRelation
+
+GRAPH_TABLES = {"nodes": Note, "edges": NoteRelation}
+
+# Planner estimates maintained by ANALYZE/autovacuum. A partitioned parent has no rows of
+# its own, so its estimate is the sum over child partitions.
+# reltuples is -1 for a table that has never been analyzed.
+ESTIMATE_SQL = text("""
+    SELECT p.relname,
+           p.reltuples,
+           count(c.oid) AS partitions,
+           coalesce(sum(greatest(c.reltuples, 0)), 0) AS partition_rows
+    FROM pg_class p
+    LEFT JOIN pg_inherits i ON i.inhparent = p.oid
+    LEFT JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE p.relname = ANY(:names)
+      AND p.relkind IN ('r', 'p')
+      AND pg_table_is_visible(p.oid)
+    GROUP BY p.relname, p.reltuples
+""").bindparams(bindparam("names", type_=ARRAY(String)))
+
+async def estimate_row_counts(db, table_names: List[str]) -> Dict[str, int]:
+    """
+    Approximate row counts from pg_class, without scanning the tables.
+    Tables with no statistics yet are left out of the result.
+    """
+    res = await db.execute(ESTIMATE_SQL, {"names": list(table_names)})
+    estimates = {}
+    for relname, reltuples, partitions, partition_rows in res.all():
+        if partitions:
+            estimates[relname] = int(partition_rows)
+        elif reltuples is not None and reltuples >= 0:
+            estimates[relname] = int(reltuples)
+    return estimates
+
+async def _collect_graph_metrics_async() -> Dict[str, int]:
+    tables = {kind: model.__tablename__ for kind, model in GRAPH_TABLES.items()}
+    sizes = {kind: 0 for kind in tables}
+    for shard in range(ring.shard_count):
+        async with AsyncSessionLocal(shard=shard) as db:
+            estimates = await estimate_row_counts(db, list(tables.values()))
+
+            for kind, table in tables.items():
+                if table in estimates:
+                    sizes[kind] += estimates[table]
+                    continue
+                # Never analyzed, so still small: an exact count is cheap and only runs here
+                logger.warning(f"No planner statistics for {table} on shard {shard}, counting rows")
+                model = GRAPH_TABLES[kind]
+                sizes[kind] += (await db.execute(select(func.count()).select_from(model))).scalar() or 0
+
+    monitor.update_graph_metrics(sizes["nodes"], sizes["edges"])
+    MEMORY_GRAPH_NODES.set(sizes["nodes"])
+    MEMORY_GRAPH_EDGES.set(sizes["edges"])
+    return sizes
+
+@shared_task(name="metrics.collect_graph_size")
+def collect_graph_metrics():
+    """Refreshes the graph size gauges; per-user jobs no longer count the global tables."""
+    return async_to_sync(_collect_graph_metrics_async)()
@@ -0,0 +1,113 @@
+from celery import shared_task
+from sqlalchemy.future import select
+from sqlalchemy import delete, insert
+from loguru import logger
+from typing import Dict, List, Tuple
+import datetime
+from asgiref.sync import async_to_sync
+
+from infrastructure.database import AsyncSessionLocal, fan_out
+from app.models import Note, NoteRelation, NoteGraphScore
+
+RELATION_TTL_DAYS = 180
+
+def personalized_pagerank(edges: List[Tuple[str, str, float]], personalization: Dict[str, float],
+                          alpha: float = 0.85, tol: float = 1e-6, max_iter: int = 100) -> Dict[str, float]:
+    """
+    Personalized PageRank over an undirected weighted edge list, by sparse power iteration.
+    Teleport mass follows `personalization` (e.g. note importance); missing nodes get the mean weight.
+    Returns scores normalized so the top node is 1.0.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    nodes = sorted({n for a, b, _ in edges for n in (a, b)})
+    if not nodes:
+        return {}
+    index = {n: i for i, n in enumerate(nodes)}
+    size = len(nodes)
+
+    rows = np.fromiter((index[a] for a, _, _ in edges), dtype=np.int64, count=len(edges))
+    cols = np.fromiter((index[b] for _, b, _ in edges), dtype=np.int64, count=len(edges))
+    weights = np.fromiter((max(w or 0.0, 0.0) for _, _, w in edges), dtype=np.float64, count=len(edges))
+
+    # Symmetric adjacency; duplicate edges sum their weights
+    adj = sparse.coo_matrix(
+        (np.concatenate([weights, weights]), (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+        shape=(size, size)
+    ).tocsr()
+
+    # Column-stochastic transition matrix: walk from j to i with probability w_ij / deg(j)
+    degree = np.asarray(adj.sum(axis=0)).ravel()
+    inv_degree = np.divide(1.0, degree, out=np.zeros_like(degree), where=degree > 0)
+    transition = adj @ sparse.diags(inv_degree)
+    dangling = degree == 0
+
+    teleport = np.array([personalization.get(n, np.nan) for n in nodes], dtype=np.float64)
+    fill = np.nanmean(teleport) if not np.all(np.isnan(teleport)) else 1.0
+    teleport = np.clip(np.nan_to_num(teleport, nan=fill), 0.0, None)
+    teleport = teleport / teleport.sum() if teleport.sum() > 0 else np.full(size, 1.0 / size)
+
+    rank = teleport.copy()
+    for _ in range(max_iter):
+        new_rank = alpha * (transition @ rank + rank[dangling].sum() * teleport) + (1 - alpha) * teleport
+        converged = np.abs(new_rank - rank).sum() < tol
+        rank = new_rank
+        if converged:
+            break
+
+    top = rank.max()
+    return {n: float(rank[i] / top) for i, n in enumerate(nodes)} if top > 0 else {}
+
+async def _compute_graph_scores_async(user_id: str) -> int:
+    """Recomputes the user's note PageRank and replaces their rows in note_graph_scores."""
+    async with AsyncSessionLocal(user_id=user_id) as db:
+        ttl_cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=RELATION_TTL_DAYS)
+        edge_res = await db.execute(
+            select(NoteRelation.note_id1, NoteRelation.note_id2, NoteRelation.strength, NoteRelation.confidence)
+            .where(NoteRelation.user_id == user_id, NoteRelation.created_at >= ttl_cutoff)
+        )
+        edges = [
+            (n1, n2, (strength or 0.0) * (confidence if confidence is not None else 1.0))
+            for n1, n2, strength, confidence in edge_res.all()
+            if n1 and n2 and n1 != n2
+        ]
+
+        personalization: Dict[str, float] = {}
+        if edges:
+            node_ids = list({n for a, b, _ in edges for n in (a, b)})
+            imp_res = await db.execute(
+                select(Note.id, Note.importance_score).where(Note.user_id == user_id, Note.id.in_(node_ids))
+            )
+            personalization = {nid: imp for nid, imp in imp_res.all() if imp is not None}
+
+        scores = personalized_pagerank(edges, personalization)
+
+        await db.execute(delete(NoteGraphScore).where(NoteGraphScore.user_id == user_id))
+        if scores:
+            await db.execute(
+                insert(NoteGraphScore),
+                [{"user_id": user_id, "note_id": nid, "score": s} for nid, s in scores.items()]
+            )
+        await db.commit()
+        logger.info(f"Graph scores updated for {user_id}: {len(scores)} notes, {len(edges)} edges")
+        return len(scores)
+
+@shared_task(name="graph.compute_scores")
+def compute_graph_scores(user_id: str):
+    return async_to_sync(_compute_graph_scores_async)(user_id)
+
+async def _trigger_graph_scores_async():
+    logger.info("Triggering graph score computation...")
+    async def shard_user_ids(db):
+        res = await db.execute(select(NoteRelation.user_id).where(NoteRelation.user_id.isnot(None)).distinct())
+        return [uid for (uid,) in res.all()]
+
+    user_ids = [uid for shard_ids in await fan_out(shard_user_ids, read=True) for uid in shard_ids]
+    logger.info(f"Queueing graph scores for {len(user_ids)} users.")
+    for uid in user_ids:
+        compute_graph_scores.delay(uid)
+
+@shared_task(name="graph.trigger_scores")
+def trigger_graph_scores():
+    async_to_sync(_trigger_graph_scores_async)()
@@ -0,0 +1,40 @@
+from celery import shared_task
+from loguru import logger
+from typing import Dict, List
+from asgiref.sync import async_to_sync
+import datetime
+
+from infrastructure.database import engine
+from infrastructure.config import settings
+from infrastructure.partitions import MonthlyPartitionPolicy, ensure_partitions, retire_partitions
+
+def monthly_policies() -> List[MonthlyPartitionPolicy]:
+    return [
+        MonthlyPartitionPolicy(
+            "integration_logs",
+            retention_months=settings.INTEGRATION_LOG_RETENTION_MONTHS,
+            premake_months=settings.PARTITION_PREMAKE_MONTHS,
+        ),
+    ]
+
+async def _maintain_partitions_async() -> Dict[str, Dict[str, List[str]]]:
+    """Creates upcoming monthly partitions and drops expired ones, one policy at a time."""
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    report = {}
+    async with engine.connect() as conn:
+        # DDL per statement; DETACH ... CONCURRENTLY cannot run inside a transaction block
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for policy in monthly_policies():
+            try:
+                created = await ensure_partitions(conn, policy, today)
+                dropped = await retire_partitions(conn, policy, today)
+                report[policy.table] = {"created": created, "dropped": dropped}
+                logger.info(f"Partitions of {policy.table}: created {created}, dropped {dropped}")
+            except Exception as e:
+                logger.error(f"Partition maintenance failed for {policy.table}: {e}")
+    return report
+
+@shared_task(name="partitions.maintain")
+def maintain_partitions():
+    """Daily: partitions for the coming months exist before rows arrive; retention is a DROP, not a DELETE."""
+    return async_to_sync(_maintain_partitions_async)()
@@ -1,115 +1,159 @@
 from asgiref.sync import async_to_sync
 from celery import shared_task
 from sqlalchemy.future import select
-from sqlalchemy import desc, and_
+from sqlalchemy import desc, and_, func
 from loguru import logger
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+import asyncio
 import datetime
 import json
 
-from infrastructure.database import AsyncSessionLocal
+from infrastructure.database import AsyncSessionLocal, ring
+from infrastructure.config import settings
 from app.models import User, LongTermMemory, Note, NoteRelation
 from app.services.ai_service import ai_service
-from app.core.bot import bot
+from app.core.bot import bot, TelegramSendQueue
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+ITEMS_PER_USER = 5 # Memories / relations per user in the prompt
+
+def _top_per_user(model, filters, order_by, limit: int = ITEMS_PER_USER):
+    """Top-`limit` rows per user for all candidate users in one query (row_number window)."""
+    ranked = (
+        select(model.id, func.row_number().over(partition_by=model.user_id, order_by=order_by).label("rn"))
+        .where(*filters)
+        .subquery()
+    )
+    return select(model).join(ranked, model.id == ranked.c.id).where(ranked.c.rn <= limit)
+
+def _group_by_user(rows) -> Dict[str, List[Any]]:
+    grouped: Dict[str, List[Any]] = defaultdict(list)
+    for row in rows:
+        grouped[row.user_id].append(row)
+    return grouped
+
+async def _score_user(user: User, memories: List[LongTermMemory], relations: List[NoteRelation]) -> Optional[str]:
+    """One LLM call: the follow-up question if last week's context is relevant enough, else None."""
+    context_parts = [f"Memory: {m.summary_text} (Score: {m.importance_score})" for m in memories]
+    context_parts += [f"Link: {r.relation_type} (strength {r.strength})" for r in relations]
+
+    prompt = (
+        "You are a 'Proactive Memory' agent. Review these notes from the user's life exactly 7 days ago.\n"
+        "Goal: Identify if there is a highly relevant, unresolved, or meaningful topic to follow up on.\n"
+        "Output a JSON object: {\"question\": \"...\", \"relevance_score\": 0-10}.\n"
+        "Criteria: relevance_score should be high (8-10) only if it's a critical task or emotional event. "
+        "If mostly mundane, score low.\n"
+        "Language: Russian.\n"
+        f"Context:\n" + "\n".join(context_parts)
+    )
+
+    response_json = await ai_service.get_chat_completion([
+        {"role": "system", "content": "You are a proactive life-assistant. Output JSON only."},
+        {"role": "user", "content": prompt}
+    ], response_format="json_object")
+
+    try:
+        data = json.loads(response_json)
+        question = data.get("question")
+        score = data.get("relevance_score", 0)
+    except:
+        logger.warning("Failed to parse proactive JSON")
+        return None
+
+    # Requirement: Relevance > 7
+    if score <= 7:
+        logger.info(f"Skipping proactive for user {user.id}: Low relevance {score}")
+        return None
+    return question
+
 async def _trigger_proactive_reminders_async():
-    """Daily task to scan memories/graph and send proactive follow-ups."""
+    """
+    Daily task to scan memories/graph and send proactive follow-ups.
+    Memories and relations for all candidate users are prefetched in two set-based queries per shard,
+    relevance is scored with bounded LLM concurrency and messages go through a rate-limited queue.
+    """
     logger.info("Starting proactive reminders scan...")
-    async with AsyncSessionLocal() as db:
-        # 1. Identify active users with Telegram
-        threshold_date = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=14)
-        user_res = await db.execute(
-            select(User).where(and_(User.telegram_chat_id != None, User.last_note_date >= threshold_date))
-        )
-        users = user_res.scalars().all()
-        
-        for user in users:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    # Time window: roughly 7 days ago
+    start_window = now - datetime.timedelta(days=8)
+    end_window = now - datetime.timedelta(days=6)
+
+    threshold_date = now - datetime.timedelta(days=14)
+    users: List[User] = []
+    memories: Dict[str, List[Any]] = {}
+    relations: Dict[str, List[Any]] = {}
+    for shard in range(ring.shard_count):
+        async with AsyncSessionLocal(shard=shard) as db:
+            # 1. Identify active users with Telegram
+            user_res = await db.execute(
+                select(User).where(and_(User.telegram_chat_id != None, User.last_note_date >= threshold_date))
+            )
+            # Check User Global Setting before touching memories
+            shard_users = [u for u in user_res.scalars().all() if (u.adaptive_preferences or {}).get("enable_proactive", True)]
+            if not shard_users:
+                continue
+            user_ids = [u.id for u in shard_users]
+
+            # 2. Meaningful memories and strongest relations, top-N per user
+            mem_res = await db.execute(_top_per_user(
+                LongTermMemory,
+                [
+                    LongTermMemory.user_id.in_(user_ids),
+                    LongTermMemory.created_at >= start_window,
+                    LongTermMemory.created_at <= end_window,
+                    LongTermMemory.importance_score >= 6.0,
+                ],
+                desc(LongTermMemory.importance_score),
+            ))
+            memories.update(_group_by_user(mem_res.scalars().all()))
+
+            graph_res = await db.execute(_top_per_user(
+                NoteRelation,
+                [
+                    NoteRelation.user_id.in_(user_ids),
+                    NoteRelation.created_at >= start_window.replace(tzinfo=None), # naive utcnow column
+                    NoteRelation.created_at <= end_window.replace(tzinfo=None),
+                ],
+                desc(NoteRelation.strength),
+            ))
+            relations.update(_group_by_user(graph_res.scalars().all()))
+        users.extend(shard_users)
+    if not users:
+        return
+
+    # 3. Relevance scoring, bounded concurrency
+    llm_slots = asyncio.Semaphore(settings.PROACTIVE_LLM_CONCURRENCY)
+
+    async def score(user: User) -> Optional[str]:
+        if not memories.get(user.id) and not relations.get(user.id):
+            return None
+        async with llm_slots:
             try:
-                # 2. Time window: roughly 7 days ago
-                start_window = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=8)
-                end_window = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=6)
-                
-                # Fetch meaningful memories
-                mem_res = await db.execute(
-                    select(LongTermMemory)
-                    .where(and_(
-                        LongTermMemory.user_id == user.id,
-                        LongTermMemory.created_at >= start_window,
-                        LongTermMemory.created_at <= end_window,
-                        LongTermMemory.importance_score >= 6.0
-                    ))
-                    .limit(5)
-                )
-                memories = mem_res.scalars().all()
-                
-                # Fetch graph relations for context
-                graph_res = await db.execute(
-                    select(NoteRelation)
-                    .where(and_(
-                        NoteRelation.created_at >= start_window,
-                        NoteRelation.created_at <= end_window
-                    ))
-                    .order_by(desc(NoteRelation.strength))
-                    .limit(5)
-                )
-                relations = graph_res.scalars().all()
-                
-                if not memories and not relations:
-                    continue
-                
-                # Check User Global Setting
-                prefs = user.adaptive_preferences or {}
-                if not prefs.get("enable_proactive", True):
-                    continue
-
-                # 3. Compile context for DeepSeek
-                context_parts = [f"Memory: {m.summary_text} (Score: {m.importance_score})" for m in memories]
-                
-                prompt = (
-                    "You are a 'Proactive Memory' agent. Review these notes from the user's life exactly 7 days ago.\n"
-                    "Goal: Identify if there is a highly relevant, unresolved, or meaningful topic to follow up on.\n"
-                    "Output a JSON object: {\"question\": \"...\", \"relevance_score\": 0-10}.\n"
-                    "Criteria: relevance_score should be high (8-10) only if it's a critical task or emotional event. "
-                    "If mostly mundane, score low.\n"
-                    "Language: Russian.\n"
-                    f"Context:\n" + "\n".join(context_parts)
-                )
-                
-                response_json = await ai_service.get_chat_completion([
-                    {"role": "system", "content": "You are a proactive life-assistant. Output JSON only."},
-                    {"role": "user", "content": prompt}
-                ], response_format="json_object")
-                
-                try:
-                    data = json.loads(response_json)
-                    question = data.get("question")
-                    score = data.get("relevance_score", 0)
-                except:
-                    logger.warning("Failed to parse proactive JSON")
-                    continue
-                
-                # Requirement: Relevance > 7
-                if score <= 7:
-                    logger.info(f"Skipping proactive for user {user.id}: Low relevance {score}")
-                    continue
-
-                # Requirement: Limit 5/day. (Implicitly met as this job runs once daily and sends 1 msg)
-                
-                # 4. Notify via Telegram
-                if bot and user.telegram_chat_id:
-                    kb = InlineKeyboardMarkup(inline_keyboard=[
-                        [
-                            InlineKeyboardButton(text="✅ Да, давай", callback_data=f"proactive_yes:{user.id}"),
-                            InlineKeyboardButton(text="❌ Нет, позже", callback_data="proactive_no")
-                        ]
-                    ])
-                    
-                    final_msg = f"💡 **Вспомнилось из прошлой недели:**\n\n{question}"
-                    await bot.send_message(chat_id=user.telegram_chat_id, text=final_msg, parse_mode="Markdown", reply_markup=kb)
-                    logger.info(f"Proactive reminder sent to {user.email}")
-                    
+                return await _score_user(user, memories.get(user.id, []), relations.get(user.id, []))
             except Exception as e:
                 logger.error(f"Error in proactive reminder for {user.id}: {e}")
+                return None
+
+    questions = await asyncio.gather(*[score(u) for u in users])
+
+    # 4. Notify via Telegram
+    # Requirement: Limit 5/day. (Implicitly met as this job runs once daily and sends 1 msg)
+    if not bot:
+        return
+    async with TelegramSendQueue(bot, rate=settings.PROACTIVE_SEND_RATE) as outbox:
+        for user, question in zip(users, questions):
+            if not question:
+                continue
+            kb = InlineKeyboardMarkup(inline_keyboard=[
+                [
+                    InlineKeyboardButton(text="✅ Да, давай", callback_data=f"proactive_yes:{user.id}"),
+                    InlineKeyboardButton(text="❌ Нет, позже", callback_data="proactive_no")
+                ]
+            ])
+            final_msg = f"💡 **Вспомнилось из прошлой недели:**\n\n{question}"
+            outbox.put(chat_id=user.telegram_chat_id, text=final_msg, parse_mode="Markdown", reply_markup=kb)
+    logger.info(f"Proactive reminders: {outbox.sent} sent, {outbox.failed} failed")
 
 @shared_task(name="proactive_reminders_daily")
 def proactive_reminders():
@@ -1,10 +1,9 @@
 from celery import shared_task
 from sqlalchemy.future import select
-from sqlalchemy import desc, func, delete
+from sqlalchemy import desc, delete
 from loguru import logger
 import datetime
 import json
-import math
 from asgiref.sync import async_to_sync
 
 from infrastructure.database import AsyncSessionLocal
@@ -12,6 +11,9 @@ from app.models import User, Note, LongTermMemory, NoteRelation
 from app.services.ai_service import ai_service
 from infrastructure.monitoring import monitor
 from infrastructure.config import settings
+from infrastructure.redis_client import graph_adjacency_cache
+from app.core.graph_service import graph_service
+from common import vector_ops
 
 def _calculate_composite_importance(base_score: float, ref_count: int, note_count: int, has_actions: bool, avg_days: float) -> float:
     """
@@ -42,11 +44,8 @@ async def _process_reflection_async(user_id: str):
     Final: Importance Calculation & Save
     """
     logger.info(f"Starting multi-step reflection for user {user_id}")
-    async with AsyncSessionLocal() as db:
-        # Monitoring
-        total_notes = (await db.execute(select(func.count(Note.id)))).scalar()
-        total_rels = (await db.execute(select(func.count(NoteRelation.id)))).scalar()
-        monitor.update_graph_metrics(total_notes, total_rels)
+    async with AsyncSessionLocal(user_id=user_id) as db:
+        # Monitoring (graph size gauges are refreshed by metrics.collect_graph_size)
         monitor.update_hit_rate()
 
         # Fetch user
@@ -166,15 +165,8 @@ async def _process_reflection_async(user_id: str):
             elif new_identity:
                 # Calculate similarity
                 new_emb = await ai_service.generate_embedding(new_identity)
-                if user.identity_embedding:
-                    # Cosine Sim
-                    def cosine_sim(v1, v2):
-                         dot = sum(a*b for a, b in zip(v1, v2))
-                         norm1 = math.sqrt(sum(a*a for a in v1))
-                         norm2 = math.sqrt(sum(b*b for b in v2))
-                         return dot / (norm1 * norm2) if norm1 > 0 and norm2 > 0 else 0
-                    
-                    sim = cosine_sim(user.identity_embedding, new_emb)
+                if user.identity_embedding is not None and len(user.identity_embedding) > 0:
+                    sim = vector_ops.cosine(user.identity_embedding, new_emb)
                     logger.info(f"Identity Similarity: {sim}")
                     
                     if sim < 0.85: # Threshold
@@ -216,29 +208,29 @@ async def _process_reflection_async(user_id: str):
                     delete(NoteRelation).where(NoteRelation.created_at < ttl_cutoff)
                 )
                 
+                new_edges = []
                 for r in relations:
                     n1 = r.get("note1_id")
                     n2 = r.get("note2_id")
                     if not n1 or not n2: continue
-                    
-                    # 2. Max Degree Check (Limit 10 per node)
-                    # Check n1
-                    c1 = (await db.execute(select(func.count(NoteRelation.id)).where((NoteRelation.note_id1 == n1) | (NoteRelation.note_id2 == n1)))).scalar()
-                    if c1 >= 10: continue
-                    
-                    # Check n2
-                    c2 = (await db.execute(select(func.count(NoteRelation.id)).where((NoteRelation.note_id1 == n2) | (NoteRelation.note_id2 == n2)))).scalar()
-                    if c2 >= 10: continue
+                    new_edges.append({
+                        "note_id1": n1,
+                        "note_id2": n2,
+                        "relation_type": r.get("relation_type", "related"),
+                        "strength": float(r.get("strength", 1.0)),
+                        "confidence": float(r.get("confidence", 1.0)),
+                        "source": r.get("source", "inferred")
+                    })
 
-                    db.add(NoteRelation(
-                        note_id1=n1,
-                        note_id2=n2,
-                        relation_type=r.get("relation_type", "related"),
-                        strength=float(r.get("strength", 1.0)),
-                        confidence=float(r.get("confidence", 1.0)),
-                        source=r.get("source", "inferred")
-                    ))
-                    new_rels_count += 1
+                # 2. Max Degree Check (Limit 10 per node): one grouped degree query, enforced in memory.
+                #    Re-proposed edges already count in the degrees, so they don't take a new slot.
+                candidate_ids = [n for e in new_edges for n in (e["note_id1"], e["note_id2"])]
+                degrees = await graph_service.get_degrees(db, user_id, candidate_ids)
+                existing = await graph_service.get_existing_keys(db, user_id, new_edges)
+                new_edges = graph_service.enforce_degree_cap(new_edges, degrees, max_degree=10, existing=existing)
+
+                # 3. Deduplicating upsert on the canonical edge key
+                new_rels_count = await graph_service.upsert_relations(db, user_id, new_edges)
             except Exception as e:
                 logger.error(f"Reflection Step 3 failed: {e}")
 
@@ -266,52 +258,12 @@ async def _process_reflection_async(user_id: str):
 
         await db.commit()
 
-@shared_task(name="reflection_daily")
-def reflection_daily(user_id: str):
-    async_to_sync(_process_reflection_async)(user_id)
-
-async def _process_batch_wrapper(user_ids: list[str]):
-    """Process a batch of users concurrently"""
-    import asyncio
-    # Semaphore to limit concurrency within the batch if needed, e.g. 5
-    sem = asyncio.Semaphore(5)
-    
-    async def bound_reflection(uid):
-        async with sem:
+        if new_rels_count and settings.RAG_GRAPH_ADJACENCY_CACHE:
             try:
-                await _process_reflection_async(uid)
+                await graph_adjacency_cache.invalidate(user_id)
             except Exception as e:
-                logger.error(f"Error processing user {uid} in batch: {e}")
-
-    await asyncio.gather(*[bound_reflection(uid) for uid in user_ids])
+                logger.warning(f"Adjacency cache invalidation failed for {user_id}: {e}")
 
-@shared_task(name="reflection.batch_reflection")
-def reflection_batch(user_ids: list[str]):
-    """Batched reflection task."""
-    logger.info(f"Processing batch of {len(user_ids)} users")
-    async_to_sync(_process_batch_wrapper)(user_ids)
-
-async def _trigger_batched_async():
-    logger.info("Triggering batched daily reflection...")
-    seven_days_ago = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=7)
-    
-    async with AsyncSessionLocal() as db:
-        # Fetch active users (e.g. active in last 7 days)
-        # Note: 'last_note_date' might be naive or tz-aware. Ensure comparison works.
-        result = await db.execute(select(User).where(User.last_note_date >= seven_days_ago, User.is_active == True))
-        active_users = result.scalars().all()
-        
-        user_ids = [u.id for u in active_users]
-        logger.info(f"Found {len(user_ids)} active users.")
-        
-        # Chunk into 50
-        batch_size = 50
-        chunks = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
-        
-        for chunk in chunks:
-            logger.info(f"Queueing batch of {len(chunk)} users")
-            reflection_batch.delay(chunk)
-
-@shared_task(name="reflection.trigger_batched")
-def trigger_batched_reflection():
-    async_to_sync(_trigger_batched_async)()
+@shared_task(name="reflection_daily")
+def reflection_daily(user_id: str):
+    async_to_sync(_process_reflection_async)(user_id)
@@ -7,13 +7,15 @@ from loguru import logger
 import json
 import datetime
 
-from infrastructure.database import AsyncSessionLocal
+from infrastructure.database import AsyncSessionLocal, fan_out
 from app.models import User, LongTermMemory, NoteRelation
 from app.services.ai_service import ai_service
+from app.core.memory_dedup import candidate_groups
+from infrastructure.config import settings
 
 async def _process_improvement_async(user_id: str):
     logger.info(f"Starting memory self-improvement for user {user_id}")
-    async with AsyncSessionLocal() as db:
+    async with AsyncSessionLocal(user_id=user_id) as db:
         # 1. Fetch all LongTermMemory
         mem_res = await db.execute(select(LongTermMemory).where(LongTermMemory.user_id == user_id, LongTermMemory.is_archived == False))
         memories = mem_res.scalars().all()
@@ -21,27 +23,50 @@ async def _process_improvement_async(user_id: str):
         if len(memories) < 2:
             return
 
-        # 2. Extract context
-        mem_data = [{"id": m.id, "text": m.summary_text} for m in memories]
-        
-        # 3. Prompt DeepSeek
-        prompt = (
-            "Analyze these long-term memory records. Identify duplicates to merge, contradictions to remove, and new logical connections to propose.\n"
-            "Return JSON: {\n"
-            "  'merged_groups': [[id1, id2, ...], ...], \n"
-            "  'contradictions_to_remove': [id3, id4], \n"
-            "  'new_relations': [{'note_id1': '...', 'note_id2': '...', 'type': 'related', 'strength': 0.8}]\n"
-            "}\n"
-            "For merged groups, I will create a new memory and archive the old ones.\n\n"
-            f"Memories:\n{json.dumps(mem_data, ensure_ascii=False)}"
+        # 2. Candidate groups of near-duplicates (NumPy pre-clustering); the rest never reaches the LLM
+        groups = candidate_groups(
+            [m.embedding for m in memories],
+            threshold=settings.MEMORY_DEDUP_THRESHOLD,
+            max_group_size=settings.MEMORY_DEDUP_MAX_GROUP,
         )
+        if not groups:
+            logger.info(f"No duplicate candidates among {len(memories)} memories for {user_id}")
+            return
         
         try:
-            resp = await ai_service.get_chat_completion([
-                {"role": "system", "content": "You are a memory optimization agent. Return valid JSON only."},
-                {"role": "user", "content": prompt}
-            ])
-            data = json.loads(ai_service.clean_json_response(resp))
+            # 3. Prompt DeepSeek, a few groups at a time
+            data = {"merged_groups": [], "contradictions_to_remove": []}
+            per_prompt = settings.MEMORY_DEDUP_GROUPS_PER_PROMPT
+            for start in range(0, len(groups), per_prompt):
+                chunk = groups[start:start + per_prompt]
+                allowed = {memories[i].id for group in chunk for i in group}
+                mem_groups = [[{"id": memories[i].id, "text": memories[i].summary_text} for i in group] for group in chunk]
+                prompt = (
+                    "Analyze these groups of similar long-term memory records. Within each group, identify duplicates to merge and contradictions to remove.\n"
+                    "Return JSON: {\n"
+                    "  'merged_groups': [[id1, id2, ...], ...], \n"
+                    "  'contradictions_to_remove': [id3, id4]\n"
+                    "}\n"
+                    "For merged groups, I will create a new memory and archive the old ones.\n\n"
+                    f"Memory groups:\n{json.dumps(mem_groups, ensure_ascii=False)}"
+                )
+                try:
+                    resp = await ai_service.get_chat_completion([
+                        {"role": "system", "content": "You are a memory optimization agent. Return valid JSON only."},
+                        {"role": "user", "content": prompt}
+                    ])
+                    chunk_data = json.loads(ai_service.clean_json_response(resp))
+                except Exception as e:
+                    # One bad chunk only loses its own groups
+                    logger.error(f"Memory improvement chunk failed for {user_id}: {e}")
+                    continue
+                # Decisions may only touch memories shown in this prompt
+                data["merged_groups"].extend(
+                    [mid for mid in group if mid in allowed] for group in chunk_data.get("merged_groups", [])
+                )
+                data["contradictions_to_remove"].extend(
+                    mid for mid in chunk_data.get("contradictions_to_remove", []) if mid in allowed
+                )
             
             # --- EXECUTE ACTIONS ---
             
@@ -111,10 +136,12 @@ def self_improve_memory(user_id: str):
 
 async def _trigger_weekly_improvement_async():
     logger.info("Triggering weekly memory improvement...")
-    async with AsyncSessionLocal() as db:
-        users = (await db.execute(select(User).where(User.is_active == True))).scalars().all()
-        for u in users:
-            self_improve_memory.delay(u.id)
+    async def shard_active_users(db):
+        return [u.id for u in (await db.execute(select(User).where(User.is_active == True))).scalars().all()]
+
+    for shard_ids in await fan_out(shard_active_users, read=True):
+        for user_id in shard_ids:
+            self_improve_memory.delay(user_id)
 
 @shared_task(name="memory.trigger_weekly_improvement")
 def trigger_weekly_improvement():
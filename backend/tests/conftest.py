@@ -91,7 +91,7 @@ import asyncio
 import pytest
 from httpx import AsyncClient
 from app.main import app
-from infrastructure.database import Base, get_db
+from infrastructure.database import Base, get_db, get_read_db
 
 @pytest.fixture(autouse=True)
 def mock_db_session_factory(monkeypatch, db_session):
@@ -107,7 +107,6 @@ def mock_db_session_factory(monkeypatch, db_session):
     monkeypatch.setattr("infrastructure.database.AsyncSessionLocal", get_mock_session)
     monkeypatch.setattr("workers.reflection_tasks.AsyncSessionLocal", get_mock_session)
     monkeypatch.setattr("workers.maintenance_tasks.AsyncSessionLocal", get_mock_session)
-    monkeypatch.setattr("app.services.pipeline.orchestrator.AsyncSessionLocal", get_mock_session)
     
     return get_mock_session
 
@@ -177,6 +176,7 @@ async def client(db_session, test_user):
         return test_user
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     app.dependency_overrides[get_current_user] = override_get_user
     
     from app.api.middleware.rate_limit import RateLimitMiddleware
@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from infrastructure.concurrency import AdaptiveLimiter
+from workers.reflection_tasks import _process_batch_wrapper
+
+def test_limiter_grows_while_healthy_and_backs_off_on_latency():
+    changes = []
+    limiter = AdaptiveLimiter(initial=5, max_limit=7, target_p95=10.0, window=10, on_change=changes.append)
+
+    for _ in range(10):
+        limiter.record(2.0)
+    assert limiter.limit == 6
+
+    for _ in range(30):
+        limiter.record(2.0)
+    assert limiter.limit == 7 # capped at max_limit
+
+    # p95 over target: one slow call in ten is enough
+    for latency in [2.0] * 9 + [15.0]:
+        limiter.record(latency)
+    assert limiter.limit == 4 # floor(7 * 0.7)
+    assert changes == [5, 6, 7, 4]
+
+def test_limiter_backs_off_on_429_streak_before_window_fills():
+    limiter = AdaptiveLimiter(initial=10, window=20, max_429_rate=0.05)
+    limiter.record(1.0, rate_limited=True)
+    assert limiter.limit == 10
+    limiter.record(1.0, rate_limited=True)
+    assert limiter.limit == 7
+
+    for _ in range(10):
+        limiter.record(1.0, rate_limited=True)
+        limiter.record(1.0, rate_limited=True)
+    assert limiter.limit == 1 # never below min_limit
+
+@pytest.mark.asyncio
+async def test_limiter_slot_enforces_limit():
+    limiter = AdaptiveLimiter(initial=2)
+    peak = 0
+
+    async def job():
+        nonlocal peak
+        async with limiter.slot():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*[job() for _ in range(6)])
+    assert peak == 2
+    assert limiter.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_batch_wrapper_exports_concurrency_and_throughput():
+    from app.services.ai_service import ai_service
+
+    with patch("workers.reflection_tasks._process_reflection_async", new_callable=AsyncMock) as mock_process, \
+         patch("workers.reflection_tasks.monitor") as mock_monitor:
+        await _process_batch_wrapper(["u1", "u2", "u3"])
+
+    assert mock_process.await_count == 3
+    mock_monitor.update_reflection_concurrency.assert_called_with(5)
+    assert mock_monitor.update_reflection_throughput.call_count == 3
+    assert mock_monitor.update_reflection_throughput.call_args[0][0] > 0
+    assert ai_service.client.observers == [] # feedback hook removed after the batch
+
+@pytest.mark.asyncio
+async def test_llm_client_reports_rate_limits_to_observers():
+    import httpx
+    from openai import RateLimitError
+    from app.services.ai_service.llm_client import LLMClient
+
+    client = LLMClient()
+    client.deepseek_key = "key"
+    client.deepseek_client = MagicMock()
+    response = httpx.Response(429, request=httpx.Request("POST", "https://api.deepseek.com"))
+    client.deepseek_client.chat.completions.create = AsyncMock(
+        side_effect=RateLimitError("slow down", response=response, body=None)
+    )
+    samples = []
+    client.observers.append(lambda latency, limited: samples.append(limited))
+
+    with pytest.raises(RateLimitError):
+        await client.get_completion([{"role": "user", "content": "hi"}])
+    assert samples == [True]
@@ -24,6 +24,10 @@ async def test_hierarchical_context_integration(mock_db_session):
          # Mock hierarchical context return
          expected_context = "Short-term: ...\nRecent: ...\nLong-term: ..."
          mock_rag.build_hierarchical_context = AsyncMock(return_value=expected_context)
+         mock_ai.generate_embedding = AsyncMock(return_value=[0.1]*1536)
+         miss = MagicMock()
+         miss.scalars.return_value.first.return_value = None
+         mock_db_session.execute.return_value = miss
          
          # Mock AI response
          mock_ai.analyze_text = AsyncMock(return_value={
@@ -53,18 +57,18 @@ async def test_hierarchical_context_integration(mock_db_session):
          assert kwargs['previous_context'] == expected_context
 
 @pytest.mark.asyncio
-async def test_build_hierarchical_context(mock_db_session):
+async def test_build_hierarchical_context(mock_db_session, db_session):
     """Test the RAG service logic directly."""
     from app.core.rag_service import rag_service
     
     note = Note(id="curr", user_id="u1", transcription_text="Query")
     
     # Mock DB for Short Term (Last 5)
-    mock_notes = [Note(title=f"Old {i}", summary="Sum", created_at=datetime.datetime.now()) for i in range(5)]
+    mock_notes = [Note(id=f"old{i}", title=f"Old {i}", summary="Sum", created_at=datetime.datetime.now()) for i in range(5)]
     mock_res = MagicMock()
-    mock_res.scalars = MagicMock()
-    mock_res.scalars.return_value.all.return_value = mock_notes
-    mock_db_session.execute.return_value = mock_res
+    mock_res.all.return_value = [(n.id, n.created_at, n.summary) for n in mock_notes]
+    # Short-term runs on its own pooled session (AsyncSessionLocal -> db_session fixture)
+    db_session.execute = AsyncMock(return_value=mock_res)
     
     # Mock medium/long term internals if needed, or rely on empty returns if not mocked?
     # RAG service class methods `get_medium_term_context` and `get_long_term_memory` call DB too.
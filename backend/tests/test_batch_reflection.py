@@ -20,7 +20,7 @@ async def test_trigger_batches():
     mock_db.execute.return_value = mock_user_res
     
     # 2. Patch trigger task and Celery delay
-    with patch("workers.reflection_tasks.AsyncSessionLocal") as mock_session_cls, \
+    with patch("infrastructure.database.AsyncSessionLocal") as mock_session_cls, \
          patch("workers.reflection_tasks.batch_reflection.delay") as mock_delay:
          
          mock_session_cls.return_value.__aenter__.return_value = mock_db
@@ -7,7 +7,7 @@ from workers.maintenance_tasks import cleanup_memory_task
 @patch("app.services.pipeline.pipeline.process")
 def test_transcribe_task_wrapper(mock_pipeline):
     process_transcribe("note_123")
-    mock_pipeline.assert_called_once_with("note_123")
+    mock_pipeline.assert_called_once_with("note_123", None)
 
 @patch("app.services.pipeline.pipeline.process")
 def test_analyze_task_wrapper(mock_pipeline):
@@ -36,7 +36,7 @@ async def test_context_truncation_logic():
     ]
 
     with patch("workers.analyze_tasks.ai_service") as mock_ai, \
-         patch("workers.analyze_tasks.AsyncSessionLocal", return_value=db_mock), \
+         patch("infrastructure.database.AsyncSessionLocal", return_value=db_mock), \
          patch("workers.analyze_tasks.rag_service") as mock_rag, \
          patch("workers.analyze_tasks.track_cache_miss"), \
          patch("workers.analyze_tasks.logger") as mock_logger:
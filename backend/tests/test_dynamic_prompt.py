@@ -35,7 +35,7 @@ async def test_dynamic_prompt_injections():
     ]
 
     with patch("workers.analyze_tasks.ai_service") as mock_ai, \
-         patch("workers.analyze_tasks.AsyncSessionLocal", return_value=db_mock), \
+         patch("infrastructure.database.AsyncSessionLocal", return_value=db_mock), \
          patch("workers.analyze_tasks.short_term_memory"), \
          patch("workers.analyze_tasks.track_cache_miss"), \
          patch("workers.analyze_tasks.rag_service") as mock_rag:
@@ -74,7 +74,7 @@ async def test_cache_hit_skips_ai():
     ]
 
     with patch("workers.analyze_tasks.ai_service") as mock_ai, \
-         patch("workers.analyze_tasks.AsyncSessionLocal", return_value=db_mock), \
+         patch("infrastructure.database.AsyncSessionLocal", return_value=db_mock), \
          patch("workers.analyze_tasks.track_cache_hit"):
         
         mock_ai.generate_embedding.return_value = [0.1]*1536
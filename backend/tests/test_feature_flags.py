@@ -58,7 +58,7 @@ async def test_sync_service_skips_disabled_provider(mock_db):
             await service.sync_note(note, mock_db)
             
             mock_readwise_worker.delay.assert_not_called()
-            mock_email_worker.delay.assert_called_with(note.id, "gmail")
+            mock_email_worker.delay.assert_called_with(note.id, "gmail", user_id=note.user_id)
 
 @pytest.mark.asyncio
 async def test_sync_service_skips_all(mock_db):
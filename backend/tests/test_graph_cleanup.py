@@ -23,9 +23,8 @@ async def test_graph_cleanup_constraints():
     mock_db_ctx.__aenter__.return_value = mock_session
     mock_db_ctx.__aexit__.return_value = None
     
-    with patch("tasks.cleanup_memory.AsyncSessionLocal", return_value=mock_db_ctx), \
-         patch("tasks.cleanup_memory.monitor"):
-        
+    with patch("tasks.cleanup_memory.AsyncSessionLocal", return_value=mock_db_ctx):
+
         await run_cleanup()
          
         # Verify sql execution
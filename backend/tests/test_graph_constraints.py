@@ -55,28 +55,21 @@ async def test_graph_limit_logic():
     # If n1 count >= 10, skip.
     
     # Let's mock side_effect to return 10 then 2.
-    # BUT, there are other count calls (total_notes, total_rels) at start.
-    # start: count(Note), count(NoteRelation) -> monitor
-    # loop: count(n1), count(n2)
+    # Graph size gauges come from metrics.collect_graph_size, so there are no global counts.
     
     # Sequence:
-    # 1. Total Notes (monitor) -> 100
-    # 2. Total Rels (monitor) -> 100
-    # 3. User
-    # 4. Notes
+    # 1. User
+    # 2. Notes
     # ... AI Steps ...
-    # 5. Delete (TTL)
-    # 6. Count n1
-    # 7. Count n2 (if n1 < 10)
+    # 3. Delete (TTL)
+    # 4. Grouped degrees for n1, n2
     
     ex_results = [
-        MagicMock(scalar=lambda: 100), # Total Notes
-        MagicMock(scalar=lambda: 100), # Total Rels
         m_user_res, # User
         m_notes_res, # Notes
         MagicMock(), # Delete result
-        MagicMock(scalar=lambda: 10), # Count n1=10 -> SKIP
-        # No more calls expected for this relation
+        MagicMock(all=lambda: [("n1", 10), ("n2", 2)]), # Grouped degrees: n1=10 -> SKIP
+        MagicMock(), # Upsert (nothing survives the cap)
     ]
     
     itr = iter(ex_results)
@@ -106,3 +99,7 @@ async def test_graph_limit_logic():
         # Verify NO relation added
         added = [c[0][0] for c in db_mock.add.call_args_list if isinstance(c[0][0], NoteRelation)]
         assert len(added) == 0
+        # Degrees came from one grouped query, not a COUNT per endpoint
+        degree_sql = str(db_mock.execute.call_args_list[3][0][0]).lower()
+        assert "group by" in degree_sql
+        assert not any("insert" in str(c[0][0]).lower() for c in db_mock.execute.call_args_list)
@@ -1,4 +1,5 @@
 import pytest
+import datetime
 from unittest.mock import AsyncMock, patch, MagicMock
 from tasks.reflection import _process_reflection_async
 from app.models import Note, NoteRelation, User
@@ -54,27 +55,24 @@ async def test_rag_traversal_strength_limit():
     # Vector results
     n_vector = Note(id="n_v", title="Vector Note", summary="V summary")
     v_res = MagicMock()
-    v_res.scalars.return_value.all.return_value = [n_vector]
+    v_res.all.return_value = [(n_vector.id, n_vector.title, n_vector.summary, datetime.datetime.now(datetime.timezone.utc), 5.0)]
     
-    # Relations result: one strong, one weak
+    # Relations result: weak edges are filtered by the query, so only the strong one comes back
     r_strong = NoteRelation(note_id1="n_v", note_id2="n_strong", strength=0.9)
-    r_weak = NoteRelation(note_id1="n_v", note_id2="n_weak", strength=0.3)
-    rel_res = MagicMock()
-    rel_res.scalars.return_value.all.return_value = [r_strong, r_weak]
-    
-    # Neighbor note result
+    # Reached neighbor note is joined into the walk rows
     n_neighbor = Note(id="n_strong", title="Strong Neighbor", summary="Strong summary")
-    nb_res = MagicMock()
-    nb_res.scalars.return_value.all.return_value = [n_neighbor]
+    rel_res = MagicMock()
+    rel_res.all.return_value = [
+        (r_strong.note_id2, r_strong.strength, n_neighbor.title, n_neighbor.summary, 0.1),
+    ]
     
     # Rag execution mocks
-    db_mock.execute.side_effect = [v_res, rel_res, nb_res]
+    db_mock.execute.side_effect = [v_res, rel_res]
     
     with patch("app.core.rag_service.ai_service") as mock_ai:
-        mock_ai.generate_embedding.return_value = [0.1]*1536
+        mock_ai.generate_embedding = AsyncMock(return_value=[0.1]*1536)
         
         context = await rag_service.get_medium_term_context(user_id, "id1", "query", db_mock)
         
-        # Should contain strong but not weak
         assert "Strong summary" in context["graph"]
-        assert "n_weak" not in str(db_mock.execute.call_args_list[-1]) # Checking if weak note was fetched
+        assert "note_relations.strength >" in str(db_mock.execute.call_args_list[-1][0][0]) # Weak edges filtered in SQL
@@ -0,0 +1,45 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from tasks.graph_rank import personalized_pagerank, _compute_graph_scores_async
+
+def test_pagerank_hub_ranks_highest():
+    """In a star graph the hub collects the most mass and is normalized to 1.0."""
+    edges = [("hub", f"leaf{i}", 1.0) for i in range(4)]
+    scores = personalized_pagerank(edges, {})
+
+    assert scores["hub"] == pytest.approx(1.0)
+    assert all(scores[f"leaf{i}"] < 1.0 for i in range(4))
+    assert scores["leaf0"] == pytest.approx(scores["leaf3"])
+
+def test_pagerank_personalization_and_weights():
+    """Teleport follows note importance; stronger edges carry more mass."""
+    edges = [("a", "b", 1.0), ("b", "c", 1.0)]
+    plain = personalized_pagerank(edges, {})
+    biased = personalized_pagerank(edges, {"a": 10.0, "b": 1.0, "c": 1.0})
+    assert biased["a"] > plain["a"]
+
+    weighted = personalized_pagerank([("x", "y", 0.9), ("x", "z", 0.1)], {})
+    assert weighted["y"] > weighted["z"]
+
+def test_pagerank_empty_graph():
+    assert personalized_pagerank([], {"a": 5.0}) == {}
+
+@pytest.mark.asyncio
+async def test_compute_graph_scores_replaces_user_rows(db_session):
+    edges = MagicMock()
+    edges.all.return_value = [("n1", "n2", 0.9, 0.8), ("n2", "n3", 0.8, 1.0)]
+    importance = MagicMock()
+    importance.all.return_value = [("n1", 8.0), ("n2", 5.0), ("n3", 5.0)]
+    db_session.execute = AsyncMock(side_effect=[edges, importance, MagicMock(), MagicMock()])
+
+    with patch("tasks.graph_rank.AsyncSessionLocal", return_value=db_session):
+        count = await _compute_graph_scores_async("u1")
+
+    assert count == 3
+    delete_stmt = db_session.execute.call_args_list[2][0][0]
+    assert "DELETE FROM note_graph_scores" in str(delete_stmt)
+    rows = db_session.execute.call_args_list[3][0][1]
+    assert {r["note_id"] for r in rows} == {"n1", "n2", "n3"}
+    assert all(r["user_id"] == "u1" for r in rows)
+    assert max(r["score"] for r in rows) == pytest.approx(1.0)
+    db_session.commit.assert_awaited_once()
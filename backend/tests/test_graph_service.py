@@ -0,0 +1,119 @@
+import pytest
+import datetime
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.dialects import postgresql
+from app.core.graph_service import graph_service
+
+def test_canonical_key_is_orientation_free():
+    assert graph_service.canonical_key("b", "a", "caused") == ("a", "b", "caused")
+    assert graph_service.canonical_key("a", "b", None) == ("a", "b", "related")
+
+def test_merge_edges_collapses_duplicates():
+    merged = graph_service.merge_edges([
+        {"note_id1": "b", "note_id2": "a", "relation_type": "related", "strength": 0.8, "confidence": 0.5},
+        {"note_id1": "a", "note_id2": "b", "relation_type": "related", "strength": 0.9, "confidence": 0.5},
+        {"note_id1": "a", "note_id2": "b", "relation_type": "caused", "strength": 0.7, "confidence": 0.9},
+    ])
+    assert len(merged) == 2
+    edge = merged[("a", "b", "related")]
+    assert edge["strength"] == 0.9
+    assert edge["confidence"] == 0.5 # re-proposals don't inflate confidence
+
+@pytest.mark.asyncio
+async def test_upsert_relations_uses_on_conflict():
+    db = AsyncMock()
+    count = await graph_service.upsert_relations(db, "u1", [
+        {"note_id1": "n2", "note_id2": "n1", "strength": 0.8, "confidence": 0.9},
+        {"note_id1": "n1", "note_id2": "n2", "strength": 0.9, "confidence": 0.5},
+        {"note_id1": "n3", "note_id2": "n3", "strength": 1.0}, # self-loop dropped
+    ])
+
+    assert count == 1
+    db.execute.assert_awaited_once()
+    compiled = db.execute.call_args[0][0].compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+    assert "ON CONFLICT (note_id1, note_id2, relation_type) DO UPDATE" in sql
+    assert "greatest(note_relations.strength, excluded.strength)" in sql
+    assert "greatest(coalesce(note_relations.confidence" in sql
+    assert compiled.params["note_id1_m0"] == "n1" and compiled.params["note_id2_m0"] == "n2"
+    assert compiled.params["user_id_m0"] == "u1"
+
+@pytest.mark.asyncio
+async def test_upsert_relations_noop_without_edges():
+    db = AsyncMock()
+    assert await graph_service.upsert_relations(db, "u1", []) == 0
+    db.execute.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_compact_user_relations_merges_onto_lowest_id():
+    t_old = datetime.datetime(2025, 1, 1)
+    t_new = datetime.datetime(2025, 6, 1)
+    rows = MagicMock()
+    rows.all.return_value = [
+        (1, "b", "a", "related", 0.8, 0.5, t_old),
+        (2, "a", "b", "related", 0.9, 0.5, t_new),
+        (3, "a", "c", "related", 0.9, 0.9, t_old), # already canonical and unique
+        (4, "d", "c", "related", 0.9, 0.9, t_old), # unique but reversed
+    ]
+    db = AsyncMock()
+    db.execute.side_effect = [rows, MagicMock(), MagicMock()]
+
+    merged, deleted = await graph_service.compact_user_relations(db, "u1")
+
+    assert (merged, deleted) == (2, 1)
+    delete_stmt = db.execute.call_args_list[1][0][0]
+    assert delete_stmt.compile(dialect=postgresql.dialect()).params["id_1"] == [2]
+    rewrites = db.execute.call_args_list[2][0][1]
+    survivor = next(r for r in rewrites if r["id"] == 1)
+    assert (survivor["note_id1"], survivor["note_id2"]) == ("a", "b")
+    assert survivor["strength"] == 0.9
+    assert survivor["confidence"] == 0.5
+    assert survivor["created_at"] == t_new
+    reoriented = next(r for r in rewrites if r["id"] == 4)
+    assert (reoriented["note_id1"], reoriented["note_id2"]) == ("c", "d")
+
+@pytest.mark.asyncio
+async def test_get_degrees_single_grouped_query():
+    db = AsyncMock()
+    res = MagicMock()
+    res.all.return_value = [("n1", 10), ("n2", 3)]
+    db.execute.return_value = res
+
+    degrees = await graph_service.get_degrees(db, "u1", ["n1", "n2", "n1"])
+
+    assert degrees == {"n1": 10, "n2": 3}
+    db.execute.assert_awaited_once()
+    sql = str(db.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+    assert "UNION ALL" in sql and "GROUP BY" in sql
+
+def test_enforce_degree_cap_counts_accepted_edges():
+    edges = [{"note_id1": "hub", "note_id2": f"t{i}"} for i in range(4)]
+    edges.append({"note_id1": "t0", "note_id2": "hub"}) # same pair again: merges, no extra degree
+    edges.append({"note_id1": "full", "note_id2": "t1"})
+
+    kept = graph_service.enforce_degree_cap(edges, {"hub": 7, "full": 10}, max_degree=10)
+
+    assert [e["note_id2"] for e in kept] == ["t0", "t1", "t2", "hub"]
+
+def test_enforce_degree_cap_keeps_updates_of_existing_edges():
+    # hub is at the cap: a re-proposed existing edge is an update and must not take a slot
+    edges = [{"note_id1": "t9", "note_id2": "hub"}, {"note_id1": "hub", "note_id2": "new"}]
+
+    kept = graph_service.enforce_degree_cap(edges, {"hub": 10}, max_degree=10, existing={("hub", "t9", "related")})
+
+    assert kept == [edges[0]]
+
+@pytest.mark.asyncio
+async def test_get_existing_keys_single_query():
+    db = AsyncMock()
+    res = MagicMock()
+    res.all.return_value = [("a", "b", "related")]
+    db.execute.return_value = res
+
+    existing = await graph_service.get_existing_keys(db, "u1", [
+        {"note_id1": "b", "note_id2": "a"}, {"note_id1": "a", "note_id2": "c"},
+    ])
+
+    assert existing == {("a", "b", "related")}
+    db.execute.assert_awaited_once()
+    assert await graph_service.get_existing_keys(db, "u1", []) == set()
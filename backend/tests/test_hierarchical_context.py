@@ -9,8 +9,14 @@ def mock_db_session():
     session = AsyncMock()
     return session
 
+def _route_by_table(st_res, lt_res):
+    """Sections run concurrently on separate sessions, so route results by statement."""
+    async def execute(stmt, *args, **kwargs):
+        return lt_res if "long_term_memories" in str(stmt) else st_res
+    return execute
+
 @pytest.mark.asyncio
-async def test_hierarchical_context_content(mock_db_session):
+async def test_hierarchical_context_content(mock_db_session, db_session):
     """Test standard hierarchical context content without complex logic."""
     note = Note(id="current", user_id="u1", transcription_text="Hello", created_at=datetime.utcnow())
     
@@ -18,7 +24,7 @@ async def test_hierarchical_context_content(mock_db_session):
     # 1. Short Term (Notes)
     st_notes = [Note(id="n1", summary="ShortTerm1", created_at=datetime(2025, 1, 1))]
     mock_st_res = MagicMock()
-    mock_st_res.scalars().all.return_value = st_notes
+    mock_st_res.all.return_value = [(n.id, n.created_at, n.summary) for n in st_notes]
     
     # 2. Medium Term (Vector Search) 
     # This is called inside get_medium_term_context. 
@@ -27,11 +33,11 @@ async def test_hierarchical_context_content(mock_db_session):
     # 3. Long Term (LTM)
     lt_mems = [LongTermMemory(summary_text="LongTerm1", importance_score=9.0)]
     mock_lt_res = MagicMock()
-    mock_lt_res.scalars().all.return_value = lt_mems
+    mock_lt_res.all.return_value = [(m.summary_text, m.importance_score) for m in lt_mems]
     
-    # Mock DB Execute Sequence for build_hierarchical_context main logic (Short and Long).
+    # Short and Long term run on pooled sessions (AsyncSessionLocal -> db_session fixture).
     # Medium is mocked away.
-    mock_db_session.execute.side_effect = [mock_st_res, mock_lt_res]
+    db_session.execute = AsyncMock(side_effect=_route_by_table(mock_st_res, mock_lt_res))
     
     with patch.object(rag_service, 'get_medium_term_context', new_callable=AsyncMock) as mock_medium:
         mock_medium.return_value = {"vector": "MediumTerm1", "graph": ""}
@@ -47,3 +53,81 @@ async def test_hierarchical_context_content(mock_db_session):
         assert "Short-term context" in context
         assert "Recent context" in context
         assert "Long-term knowledge" in context
+
+        # Medium-term stays on the caller's session; nothing else touches it
+        assert mock_medium.call_args[0][3] is mock_db_session
+        mock_db_session.execute.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_fetch_hierarchical_context_sections_and_timings(mock_db_session, db_session):
+    """Sections come back separately, with per-section timings and a single shared embedding."""
+    note = Note(id="current", user_id="u1", transcription_text="Hello")
+    empty = MagicMock()
+    empty.all.return_value = []
+    db_session.execute = AsyncMock(return_value=empty)
+
+    with patch.object(rag_service, 'get_medium_term_context', new_callable=AsyncMock) as mock_medium, \
+         patch("app.core.rag_service.ai_service.generate_embedding", new_callable=AsyncMock) as mock_emb:
+        mock_medium.return_value = {"vector": "V", "graph": "G"}
+        mock_emb.return_value = [0.1] * 1536
+
+        ctx = await rag_service.fetch_hierarchical_context(note, mock_db_session)
+
+        assert ctx.vector == "V"
+        assert ctx.graph == "G"
+        assert ctx.short_term == "No recent notes."
+        assert ctx.long_term == "No long-term knowledge recorded yet."
+        for section in ("embedding", "short_term", "long_term", "total"):
+            assert section in ctx.timings
+        # Query embedding computed once and shared by vector + long-term search
+        mock_emb.assert_awaited_once()
+        assert mock_medium.call_args.kwargs["query_vector"] == [0.1] * 1536
+
+@pytest.mark.asyncio
+async def test_short_term_served_from_ring_buffer(mock_db_session, db_session):
+    """A warm Redis buffer replaces the short-term SQL query; the current note and retried duplicates are skipped."""
+    note = Note(id="current", user_id="u1", transcription_text="Hello")
+    buffer = [
+        {"note_id": "current", "date": "2025-01-03", "snippet": "Self"},
+        {"note_id": "n2", "date": "2025-01-02", "snippet": "Buffered2"},
+        {"note_id": "n2", "date": "2025-01-02", "snippet": "Buffered2"},
+        {"note_id": "n1", "date": "2025-01-01", "snippet": "Buffered1"},
+    ]
+
+    with patch("app.core.rag_service.short_term_memory.get_recent_notes", new_callable=AsyncMock, return_value=buffer):
+        ctx = await rag_service.get_cached_short_term_context(note.user_id, note.id)
+
+    assert ctx == "- 2025-01-02: Buffered2\n- 2025-01-01: Buffered1"
+    db_session.execute.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_short_term_cold_start_falls_back_and_warms(db_session):
+    """On a cold buffer the DB query runs and its rows warm the buffer."""
+    st_res = MagicMock()
+    st_res.all.return_value = [("n1", datetime(2025, 1, 1), "FromDb")]
+    db_session.execute = AsyncMock(return_value=st_res)
+
+    with patch("app.core.rag_service.short_term_memory.get_recent_notes", new_callable=AsyncMock, return_value=None), \
+         patch("app.core.rag_service.short_term_memory.warm_recent_notes", new_callable=AsyncMock) as mock_warm, \
+         patch.object(rag_service, 'get_medium_term_context', new_callable=AsyncMock, return_value={"vector": "", "graph": ""}), \
+         patch.object(rag_service, 'get_long_term_memory', new_callable=AsyncMock, return_value=""), \
+         patch("app.core.rag_service.ai_service.generate_embedding", new_callable=AsyncMock, return_value=[0.1]):
+        ctx = await rag_service.fetch_hierarchical_context(Note(id="current", user_id="u1", transcription_text="Hi"), AsyncMock())
+
+    assert ctx.short_term == "- 2025-01-01: FromDb"
+    mock_warm.assert_awaited_once_with("u1", [{"note_id": "n1", "date": "2025-01-01", "snippet": "FromDb"}])
+
+@pytest.mark.asyncio
+async def test_edited_or_deleted_note_evicts_ring_buffer():
+    """A buffer holding the note is dropped (rebuilt from the DB on the next read); others stay."""
+    import json
+    from infrastructure.redis_client import ShortTermMemory
+    memory = ShortTermMemory.__new__(ShortTermMemory)
+    memory._redis = AsyncMock()
+    memory._redis.lrange.return_value = [json.dumps({"note_id": "n2"}), json.dumps({"note_id": "n1"})]
+
+    assert await memory.evict_recent_notes("u1", ["n9"]) is False
+    memory._redis.delete.assert_not_called()
+
+    assert await memory.evict_recent_notes("u1", ["n1"]) is True
+    memory._redis.delete.assert_awaited_once_with("user:u1:recent_notes")
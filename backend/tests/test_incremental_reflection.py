@@ -1,47 +1,252 @@
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
-from workers.reflection_tasks import reflection_incremental
+from workers.reflection_tasks import reflection_incremental, _dispatch_due_async, INCREMENTAL_PAGE_NOTES
+from infrastructure.redis_client import ReflectionScheduler
 
-@pytest.mark.asyncio
-async def test_reflection_incremental_lock():
-    """Test that incremental reflection honors the Redis lock."""
+def test_reflection_incremental_drains_burst_under_run_lock():
+    """One settled run pages through everything past the watermark, holding the user's run lock."""
     user_id = "test_user"
     
-    with patch("redis.from_url") as mock_redis_factory:
-        mock_redis = MagicMock()
-        mock_redis_factory.return_value = mock_redis
-        
-        # 1. Mock lock exists
-        mock_redis.get.return_value = "1"
+    with patch("workers.reflection_tasks.reflection_scheduler") as mock_scheduler, \
+         patch("workers.reflection_tasks._process_reflection_async", new_callable=AsyncMock) as mock_process:
+        mock_scheduler.acquire_run = AsyncMock(return_value="token")
+        mock_scheduler.release_run = AsyncMock()
+        mock_process.side_effect = [INCREMENTAL_PAGE_NOTES, INCREMENTAL_PAGE_NOTES, 3]
+        reflection_incremental(user_id)
         
-        with patch("workers.reflection_tasks._process_reflection_async") as mock_process:
-            reflection_incremental(user_id)
-            
-            # Should NOT call process
-            mock_process.assert_not_called()
-            # Should NOT set lock again
-            mock_redis.setex.assert_not_called()
+        assert mock_process.await_count == 3
+        mock_process.assert_awaited_with(user_id, limit=INCREMENTAL_PAGE_NOTES)
+        mock_scheduler.release_run.assert_awaited_once_with(user_id, "token")
+
+def test_reflection_incremental_reschedules_while_running():
+    """A run for a user who is already being reflected reschedules instead of overlapping."""
+    with patch("workers.reflection_tasks.reflection_scheduler") as mock_scheduler, \
+         patch("workers.reflection_tasks._process_reflection_async", new_callable=AsyncMock) as mock_process:
+        mock_scheduler.acquire_run = AsyncMock(return_value=None)
+        mock_scheduler.schedule = AsyncMock(return_value=1120.0)
+        reflection_incremental("u1")
+
+        mock_process.assert_not_called()
+        mock_scheduler.schedule.assert_awaited_once_with("u1")
 
 @pytest.mark.asyncio
-async def test_reflection_incremental_trigger():
-    """Test that incremental reflection triggers correctly if no lock."""
-    user_id = "test_user"
+async def test_scheduler_debounces_burst_on_redis():
+    """Triggers keep postponing the run until the burst is quiet; it is claimed exactly once."""
+    import fakeredis
+    scheduler = ReflectionScheduler(fakeredis.FakeAsyncRedis(decode_responses=True))
+
+    with patch("infrastructure.redis_client.settings") as mock_settings:
+        mock_settings.REFLECTION_DEBOUNCE_SECONDS = 120
+        mock_settings.REFLECTION_MAX_WAIT_SECONDS = 900
+        assert await scheduler.schedule("u1", now=1000.0) == 1120.0
+        assert await scheduler.schedule("u1", now=1100.0) == 1220.0 # extended by the next note
+
+        assert await scheduler.claim_due(now=1150.0) == [] # still inside the quiet period
+        assert await scheduler.claim_due(now=1221.0) == ["u1"]
+        assert await scheduler.claim_due(now=1300.0) == [] # claimed once
+
+        # A continuous burst is capped at burst start + max wait
+        for t in range(2000, 3000, 100):
+            due = await scheduler.schedule("u2", now=float(t))
+        assert due == 2900.0
+        assert await scheduler.claim_due(now=2900.0) == ["u2"]
+
+@pytest.mark.asyncio
+async def test_scheduler_run_lock_on_redis():
+    """Only the holder can release the per-user run lock."""
+    import fakeredis
+    scheduler = ReflectionScheduler(fakeredis.FakeAsyncRedis(decode_responses=True))
+
+    token = await scheduler.acquire_run("u1")
+    assert token and await scheduler.acquire_run("u1") is None
+    await scheduler.release_run("u1", "someone-else")
+    assert await scheduler.acquire_run("u1") is None
+    await scheduler.release_run("u1", token)
+    assert await scheduler.acquire_run("u1")
+
+@pytest.mark.asyncio
+async def test_scheduler_pushes_deadline_with_max_wait():
+    """Each trigger re-schedules with the debounce window and the burst cap."""
+    client = AsyncMock()
+    client.eval.return_value = "1120.0"
+    scheduler = ReflectionScheduler(client)
     
-    with patch("redis.from_url") as mock_redis_factory:
-        mock_redis = MagicMock()
-        mock_redis_factory.return_value = mock_redis
-        
-        # 1. Mock lock NOT exists
-        mock_redis.get.return_value = None
+    with patch("infrastructure.redis_client.settings") as mock_settings:
+        mock_settings.REFLECTION_DEBOUNCE_SECONDS = 120
+        mock_settings.REFLECTION_MAX_WAIT_SECONDS = 900
+        due = await scheduler.schedule("u1", now=1000.0)
+    
+    assert due == 1120.0
+    script, numkeys, *args = client.eval.call_args[0]
+    assert "HSETNX" in script and "ZADD" in script and "math.min" in script
+    assert numkeys == 2
+    assert args == [ReflectionScheduler.SCHEDULE_KEY, ReflectionScheduler.BURST_KEY, "u1", 1000.0, 120, 900]
+
+@pytest.mark.asyncio
+async def test_dispatch_due_runs_each_settled_user_once():
+    """Due users are claimed atomically and dispatched; nothing due means nothing queued."""
+    with patch("workers.reflection_tasks.reflection_scheduler") as mock_scheduler, \
+         patch("workers.reflection_tasks.reflection_incremental") as mock_task:
+        mock_scheduler.claim_due = AsyncMock(return_value=["u1", "u2"])
+        assert await _dispatch_due_async() == 2
+        assert [c.args[0] for c in mock_task.delay.call_args_list] == ["u1", "u2"]
         
-        with patch("workers.reflection_tasks._process_reflection_async") as mock_process:
-            reflection_incremental(user_id)
-            
-            # Should set lock for 5 mins (300s)
-            mock_redis.setex.assert_called_with(f"reflection_lock:{user_id}", 300, "1")
-            
-            # Should call process with limit=11
-            mock_process.assert_called_once()
-            args, kwargs = mock_process.call_args
-            assert args[0] == user_id
-            assert kwargs["limit"] == 11
+        mock_task.delay.reset_mock()
+        mock_scheduler.claim_due = AsyncMock(return_value=[])
+        assert await _dispatch_due_async() == 0
+        mock_task.delay.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_analysis_schedules_instead_of_running_reflection():
+    """A burst of analyses only moves the deadline; no reflection is queued directly."""
+    from workers.analyze_tasks import _process_analyze_async
+    from app.models import Note
+
+    db = AsyncMock()
+    db.__aenter__.return_value = db
+    note_res = MagicMock()
+    note_res.scalars.return_value.first.return_value = Note(id="n1", user_id="u1")
+    db.execute.return_value = note_res
+
+    with patch("infrastructure.database.AsyncSessionLocal", return_value=db), \
+         patch("workers.analyze_tasks.analyze_core") as mock_core, \
+         patch("workers.analyze_tasks.reflection_scheduler") as mock_scheduler, \
+         patch("workers.reflection_tasks.reflection_incremental") as mock_task:
+        mock_core.analyze_note_by_id = AsyncMock()
+        mock_scheduler.schedule = AsyncMock(return_value=1120.0)
+        for _ in range(3):
+            await _process_analyze_async("n1")
+
+        assert mock_scheduler.schedule.await_count == 3
+        mock_task.delay.assert_not_called()
+
+def _watermark_db(state, new_notes, anchors=(), cached=None):
+    """Session mock for: watermark, new notes, identity version, cache lookup, [anchors], upsert."""
+    db = MagicMock()
+    db.execute = AsyncMock()
+    db.commit = AsyncMock()
+    state_res = MagicMock()
+    state_res.scalars.return_value.first.return_value = state
+    notes_res = MagicMock()
+    notes_res.scalars.return_value.all.return_value = new_notes
+    id_res = MagicMock()
+    id_res.first.return_value = MagicMock(identity_updated_at=None)
+    cache_res = MagicMock()
+    cache_res.scalars.return_value.first.return_value = cached
+    anchor_res = MagicMock()
+    anchor_res.all.return_value = list(anchors)
+    db.execute.side_effect = [state_res, notes_res, id_res, cache_res, anchor_res, MagicMock()]
+    return db
+
+@pytest.mark.asyncio
+async def test_reflection_sends_only_notes_after_watermark():
+    """Only new notes and the rolling summary reach the LLM; the watermark advances to the last one."""
+    import datetime
+    from app.models import Note, ReflectionState
+    from workers.reflection_tasks import _process_reflection_async
+
+    t0 = datetime.datetime(2026, 10, 1, tzinfo=datetime.timezone.utc)
+    state = ReflectionState(user_id="u1", last_note_id="old", last_note_at=t0, rolling_summary="Rolling state")
+    new_notes = [
+        Note(id="n1", user_id="u1", transcription_text="First new", completed_at=t0 + datetime.timedelta(hours=1)),
+        Note(id="n2", user_id="u1", transcription_text="Second new", completed_at=t0 + datetime.timedelta(hours=2)),
+    ]
+    db = _watermark_db(state, new_notes, anchors=[("old", "Old note")])
+
+    reflection = '{"summary": "S", "rolling_summary": "Updated state", "importance_score": 5}'
+    relations = '[{"note1_id": "n1", "note2_id": "old"}, {"note1_id": "old", "note2_id": "older"}]'
+    with patch("workers.reflection_tasks.AsyncSessionLocal") as mock_session_cls, \
+         patch("workers.reflection_tasks.ai_service") as mock_ai, \
+         patch("workers.reflection_tasks.graph_service.upsert_relations", new_callable=AsyncMock) as mock_upsert, \
+         patch("workers.reflection_tasks.track_cache_miss"):
+        mock_session_cls.return_value.__aenter__.return_value = db
+        mock_ai.generate_embedding = AsyncMock(return_value=[0.1] * 1536)
+        mock_ai.get_embedding = AsyncMock(return_value=[0.1] * 1536)
+        mock_ai.get_chat_completion = AsyncMock(side_effect=[reflection, relations])
+        mock_ai.clean_json_response = MagicMock(side_effect=lambda x: x)
+
+        await _process_reflection_async("u1")
+
+        notes_sql = str(db.execute.call_args_list[1][0][0])
+        assert "(notes.completed_at, notes.id) >" in notes_sql
+
+        prompt = mock_ai.get_chat_completion.call_args_list[0][0][0][1]["content"]
+        assert "Rolling state" in prompt
+        assert "First new" in prompt and "Second new" in prompt
+
+        assert state.last_note_id == "n2"
+        assert state.last_note_at == new_notes[-1].completed_at
+        assert state.rolling_summary == "Updated state"
+
+        # Links between two already-reflected notes are not re-extracted
+        edges = mock_upsert.call_args[0][2]
+        assert [(e["note_id1"], e["note_id2"]) for e in edges] == [("n1", "old")]
+        db.commit.assert_awaited()
+
+@pytest.mark.asyncio
+async def test_note_completed_after_watermark_is_reflected_despite_older_creation():
+    """A note created before the watermark but transcribed after it is still picked up."""
+    import datetime
+    from app.models import Note, ReflectionState
+    from workers.reflection_tasks import _prepare_reflection
+
+    t0 = datetime.datetime(2026, 10, 1, tzinfo=datetime.timezone.utc)
+    state = ReflectionState(user_id="u1", last_note_id="reflected", last_note_at=t0)
+    late = Note(id="late", user_id="u1", transcription_text="Slow upload",
+                created_at=t0 - datetime.timedelta(hours=3), completed_at=t0 + datetime.timedelta(minutes=5))
+    db = _watermark_db(state, [late])
+
+    with patch("workers.reflection_tasks.track_cache_miss"):
+        job = await _prepare_reflection(db, "u1", embed=False)
+
+    notes_sql = str(db.execute.call_args_list[1][0][0])
+    assert "(notes.completed_at, notes.id) >" in notes_sql and "notes.created_at" not in notes_sql.split("WHERE")[1]
+    anchor_sql = str(db.execute.call_args_list[4][0][0])
+    assert "notes.completed_at <=" in anchor_sql
+    assert job["note_ids"] == ["late"]
+    assert job["last_note_at"] == late.completed_at # not its creation time, which is behind the watermark
+
+@pytest.mark.asyncio
+async def test_reflection_skips_without_new_notes():
+    """Nothing past the watermark means no LLM call at all."""
+    import datetime
+    from app.models import ReflectionState
+    from workers.reflection_tasks import _process_reflection_async
+
+    state = ReflectionState(user_id="u1", last_note_id="n9", last_note_at=datetime.datetime.now(datetime.timezone.utc))
+    db = _watermark_db(state, [])
+    with patch("workers.reflection_tasks.AsyncSessionLocal") as mock_session_cls, \
+         patch("workers.reflection_tasks.ai_service") as mock_ai:
+        mock_session_cls.return_value.__aenter__.return_value = db
+        mock_ai.get_chat_completion = AsyncMock()
+
+        await _process_reflection_async("u1")
+
+        mock_ai.get_chat_completion.assert_not_called()
+        assert db.execute.call_count == 2
+
+@pytest.mark.asyncio
+async def test_reflection_cache_hit_still_advances_watermark():
+    """A smart-cache hit skips the LLM but moves past the notes, so the next run sees new input."""
+    import datetime
+    from app.models import CachedAnalysis, Note, ReflectionState
+    from workers.reflection_tasks import _process_reflection_async
+
+    t0 = datetime.datetime(2026, 10, 1, tzinfo=datetime.timezone.utc)
+    state = ReflectionState(user_id="u1", last_note_id="old", last_note_at=t0, rolling_summary="Rolling state")
+    new_notes = [Note(id="n1", user_id="u1", transcription_text="New", completed_at=t0 + datetime.timedelta(hours=1))]
+    cached = CachedAnalysis(result={"summary": "S", "rolling_summary": "Cached state"}, scope="analysis_only")
+    db = _watermark_db(state, new_notes, cached=cached)
+
+    with patch("workers.reflection_tasks.AsyncSessionLocal") as mock_session_cls, \
+         patch("workers.reflection_tasks.ai_service") as mock_ai, \
+         patch("workers.reflection_tasks.track_cache_hit"):
+        mock_session_cls.return_value.__aenter__.return_value = db
+        mock_ai.get_chat_completion = AsyncMock()
+
+        await _process_reflection_async("u1")
+
+        mock_ai.get_chat_completion.assert_not_called()
+        assert (state.last_note_id, state.last_note_at) == ("n1", new_notes[0].completed_at)
+        assert state.rolling_summary == "Cached state"
+        db.commit.assert_awaited_once()
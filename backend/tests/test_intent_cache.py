@@ -5,8 +5,8 @@ from app.core.analyze_core import analyze_core
 from app.models import Note, User, CachedIntent
 
 @pytest.mark.asyncio
-async def test_intent_cache_hit():
-    """Test that a simple intent command uses the cache without AI."""
+async def test_intent_cache_hit(db_session):
+    """Test that a simple intent command uses the cache without AI or RAG."""
     db_mock = AsyncMock()
     user = User(id="u1", stable_identity="")
     note = Note(id="n1", user_id="u1", transcription_text="Запиши задачу: Купить хлеб")
@@ -22,21 +22,31 @@ async def test_intent_cache_hit():
     entry_mock = CachedIntent(action_json=cached_action)
     res_mock = MagicMock()
     res_mock.scalars.return_value.first.return_value = entry_mock
-    db_mock.execute.return_value = res_mock
+    # Intent lookup runs on its own pooled session (AsyncSessionLocal -> db_session fixture)
+    db_session.execute = AsyncMock(return_value=res_mock)
+
+    # Semantic lookup runs concurrently on the caller's session and misses
+    res_semantic = MagicMock()
+    res_semantic.scalars.return_value.first.return_value = None
+    db_mock.execute.return_value = res_semantic
+
+    mock_ai = AsyncMock()
+    mock_ai.generate_embedding.return_value = [0.1]*1536
     
-    with patch("app.core.analyze_core.rag_service.build_hierarchical_context", return_value="ctx"), \
-         patch("app.core.analyze_core.ai_service") as mock_ai:
+    with patch("app.core.analyze_core.rag_service.build_hierarchical_context", new_callable=AsyncMock) as mock_rag, \
+         patch("app.core.analyze_core.ai_service", mock_ai):
         
         analysis, cache_hit = await analyze_core.analyze_step(note, user, db_mock, MagicMock())
         
         assert cache_hit is True
         assert analysis["intent"] == "create_task"
         assert note.title == "Buy Bread"
-        # DeepSeek (analyze_text) should NOT be called
+        # DeepSeek (analyze_text) should NOT be called, and no context is built
         mock_ai.analyze_text.assert_not_called()
+        mock_rag.assert_not_called()
 
 @pytest.mark.asyncio
-async def test_intent_cache_miss_and_save():
+async def test_intent_cache_miss_and_save(db_session):
     """Test that a new simple intent command is saved to cache after AI call."""
     db_mock = AsyncMock()
     user = User(id="u1", stable_identity="")
@@ -50,7 +60,8 @@ async def test_intent_cache_miss_and_save():
     res_semantic = MagicMock()
     res_semantic.scalars.return_value.first.return_value = None
     
-    db_mock.execute.side_effect = [res_intent, res_semantic, MagicMock()] # Lookup, Lookup, Update User
+    db_session.execute = AsyncMock(return_value=res_intent) # Intent lookup (pooled session)
+    db_mock.execute.side_effect = [res_semantic, MagicMock()] # Semantic lookup, Update User
     
     mock_ai = AsyncMock()
     mock_ai.generate_embedding.return_value = [0.1]*1536
@@ -60,13 +71,15 @@ async def test_intent_cache_miss_and_save():
         "summary": "Task to buy milk"
     }
     
-    with patch("app.core.analyze_core.rag_service.build_hierarchical_context", return_value="ctx"), \
+    with patch("app.core.analyze_core.rag_service.build_hierarchical_context", new_callable=AsyncMock, return_value="ctx") as mock_rag, \
          patch("app.core.analyze_core.ai_service", mock_ai):
         
         await analyze_core.analyze_step(note, user, db_mock, MagicMock())
         
-        # Verify AI called
+        # Verify AI called, context built on miss with the lookup embedding reused
         mock_ai.analyze_text.assert_called_once()
+        mock_ai.generate_embedding.assert_called_once()
+        assert mock_rag.call_args.kwargs["query_vector"] == [0.1]*1536
         
         # Verify CachedIntent was added to DB
         added_objects = [call.args[0] for call in db_mock.add.call_args_list]
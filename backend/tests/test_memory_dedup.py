@@ -0,0 +1,35 @@
+import numpy as np
+from unittest.mock import patch
+from app.core.memory_dedup import candidate_groups
+
+def test_candidate_groups_links_similar_and_skips_missing():
+    embeddings = [
+        [1.0, 0.0, 0.0],
+        [0.0, 1.0, 0.0],
+        [0.99, 0.05, 0.0], # near 0
+        None,
+        [0.0, 0.98, 0.1], # near 1
+        [0.0, 0.0, 0.0], # zero vector
+        [0.0, 0.0, 1.0], # alone
+    ]
+    groups = candidate_groups(embeddings, threshold=0.9)
+    assert sorted(sorted(g) for g in groups) == [[0, 2], [1, 4]]
+
+def test_candidate_groups_across_blocks_and_transitive():
+    # Chain a~b~c across block boundaries joins one component
+    embeddings = [[1.0, 0.0], [0.0, 1.0], [0.95, 0.31], [0.81, 0.59]]
+    with patch("app.core.memory_dedup.SIMILARITY_BLOCK_ROWS", 1):
+        groups = candidate_groups(embeddings, threshold=0.94)
+    assert sorted(sorted(g) for g in groups) == [[0, 2, 3]]
+
+def test_candidate_groups_splits_large_components():
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=16)
+    embeddings = [list(base + rng.normal(scale=0.01, size=16)) for _ in range(10)]
+    groups = candidate_groups(embeddings, threshold=0.9, max_group_size=4)
+    assert [len(g) for g in groups] == [4, 4, 2]
+    assert sorted(i for g in groups for i in g) == list(range(10))
+
+def test_candidate_groups_needs_two_vectors():
+    assert candidate_groups([]) == []
+    assert candidate_groups([[1.0, 0.0], None]) == []
@@ -1,39 +1,68 @@
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from tasks.reflection import _process_reflection_async
+from tasks.graph_metrics import _collect_graph_metrics_async
 from infrastructure.monitoring import monitor
 
 @pytest.mark.asyncio
 async def test_memory_monitoring_update():
-    """Test that graph metrics and hit rate are updated during reflection."""
+    """Reflection no longer counts the global tables; it only refreshes the hit rate."""
     user_id = "u1"
     db_mock = AsyncMock()
-    
-    # Mock counts
-    # select(func.count(Note.id))
-    # select(func.count(NoteRelation.id))
-    # select(User)
-    # select(Note)
-    count_notes = MagicMock()
-    count_notes.scalar.return_value = 100
-    
-    count_rels = MagicMock()
-    count_rels.scalar.return_value = 50
+    db_mock.__aenter__.return_value = db_mock
     
     user_res = MagicMock()
     user_res.scalars.return_value.first.return_value = None # Stop early after metrics
-    
-    db_mock.execute.side_effect = [count_notes, count_rels, user_res]
+    db_mock.execute.side_effect = [user_res]
     
     with patch("tasks.reflection.AsyncSessionLocal", return_value=db_mock), \
+         patch("tasks.reflection.monitor") as mock_monitor:
+        
+        await _process_reflection_async(user_id)
+        
+        mock_monitor.update_graph_metrics.assert_not_called()
+        mock_monitor.update_hit_rate.assert_called_once()
+        assert "count(" not in str(db_mock.execute.call_args_list[0][0][0]).lower()
+
+@pytest.mark.asyncio
+async def test_graph_size_collector_uses_estimates():
+    """Graph gauges come from pg_class estimates; partitioned tables sum their partitions."""
+    db_mock = AsyncMock()
+    db_mock.__aenter__.return_value = db_mock
+    est_res = MagicMock()
+    est_res.all.return_value = [("notes", -1.0, 3, 1200.0), ("note_relations", 450.0, 0, 0)]
+    db_mock.execute.side_effect = [est_res]
+    
+    with patch("tasks.graph_metrics.AsyncSessionLocal", return_value=db_mock), \
          patch("infrastructure.monitoring.memory_graph_nodes") as mock_nodes, \
          patch("infrastructure.monitoring.memory_graph_edges") as mock_edges:
         
-        await _process_reflection_async(user_id)
+        sizes = await _collect_graph_metrics_async()
+        
+        assert sizes == {"nodes": 1200, "edges": 450}
+        mock_nodes.set.assert_called_with(1200)
+        mock_edges.set.assert_called_with(450)
+        assert db_mock.execute.call_count == 1
+        assert "pg_class" in str(db_mock.execute.call_args_list[0][0][0])
+
+@pytest.mark.asyncio
+async def test_graph_size_collector_counts_unanalyzed_table():
+    """A table without statistics yet falls back to an exact count."""
+    db_mock = AsyncMock()
+    db_mock.__aenter__.return_value = db_mock
+    est_res = MagicMock()
+    est_res.all.return_value = [("notes", 80.0, 0, 0), ("note_relations", -1.0, 0, 0)]
+    count_res = MagicMock()
+    count_res.scalar.return_value = 7
+    db_mock.execute.side_effect = [est_res, count_res]
+    
+    with patch("tasks.graph_metrics.AsyncSessionLocal", return_value=db_mock), \
+         patch("tasks.graph_metrics.monitor"):
+        
+        sizes = await _collect_graph_metrics_async()
         
-        # Verify Prometheus metrics were updated
-        mock_nodes.set.assert_called_with(100)
-        mock_edges.set.assert_called_with(50)
+        assert sizes == {"nodes": 80, "edges": 7}
+        assert "note_relations" in str(db_mock.execute.call_args_list[1][0][0])
 
 def test_hit_rate_calculation():
     """Test the hit rate math in MemoryMonitor."""
@@ -0,0 +1,121 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from infrastructure.partition_rebalance import (
+    HashPartitionRebalancer, copy_batch_sql, cutover_sql, index_sql, sync_trigger_sql
+)
+
+PK = ["note_id", "user_id"]
+
+class FakeConn:
+    """Answers the catalog / checkpoint queries and records everything executed."""
+
+    def __init__(self, state=None, partitions=(), batches=()):
+        self.state = state
+        self.partitions = list(partitions)
+        self.batches = list(batches)
+        self.statements = []
+
+    async def execute(self, stmt, params=None):
+        sql = str(stmt)
+        self.statements.append((sql, params))
+        res = MagicMock()
+        if "FROM partition_rebalances" in sql:
+            res.mappings.return_value.first.return_value = dict(self.state) if self.state else None
+        elif "INSERT INTO partition_rebalances" in sql:
+            self.state = {k: params[k] for k in ("phase", "last_key", "copied_rows")}
+            self.state["target_modulus"] = params["modulus"]
+        elif "indisprimary" in sql:
+            res.all.return_value = [(c,) for c in PK]
+        elif "pg_inherits" in sql and "relname" in sql:
+            res.all.return_value = [(p,) for p in self.partitions]
+        elif "reltuples" in sql:
+            res.scalar.return_value = 4
+        elif "WITH batch" in sql:
+            res.first.return_value = self.batches.pop(0)
+        else:
+            res.all.return_value = []
+        return res
+
+    def executed(self, prefix):
+        return [(sql, params) for sql, params in self.statements if sql.strip().startswith(prefix)]
+
+def _engine(conn):
+    engine = MagicMock()
+    engine.begin.return_value.__aenter__ = AsyncMock(return_value=conn)
+    engine.begin.return_value.__aexit__ = AsyncMock(return_value=False)
+    return engine
+
+def test_sql_generation():
+    trigger = sync_trigger_sql("note_embeddings", "note_embeddings_next", "sync_fn", PK)
+    assert 'DELETE FROM "note_embeddings_next" WHERE "note_id" = OLD."note_id" AND "user_id" = OLD."user_id"' in trigger[0]
+    assert trigger[1].startswith('CREATE TRIGGER "sync_fn" AFTER INSERT OR UPDATE OR DELETE ON "note_embeddings"')
+
+    batch = copy_batch_sql("note_embeddings", "note_embeddings_next", PK, resume=True)
+    assert 'WHERE ("note_id", "user_id") > (:k0, :k1)' in batch and "FOR SHARE" in batch
+    assert "WHERE" not in copy_batch_sql("note_embeddings", "note_embeddings_next", PK, resume=False)
+
+    assert index_sql(
+        "CREATE INDEX ix_ltm_score ON ONLY public.long_term_memories USING btree (importance_score)",
+        "ix_ltm_score_next", "long_term_memories_next",
+    ) == 'CREATE INDEX "ix_ltm_score_next" ON "long_term_memories_next" USING btree (importance_score)'
+
+    assert cutover_sql("t", "t_next", "t_retired", "fn", ["t_p0"], ["t_next_p0", "t_next_p1"]) == [
+        'DROP TRIGGER "fn" ON "t"',
+        'ALTER TABLE "t" RENAME TO "t_retired"',
+        'ALTER TABLE "t_p0" RENAME TO "t_retired_p0"',
+        'ALTER TABLE "t_next" RENAME TO "t"',
+        'ALTER TABLE "t_next_p0" RENAME TO "t_p0"',
+        'ALTER TABLE "t_next_p1" RENAME TO "t_p1"',
+    ]
+
+@pytest.mark.asyncio
+async def test_prepare_builds_target_and_enables_dual_write():
+    conn = FakeConn(partitions=[f"note_embeddings_p{i}" for i in range(10)])
+    state = await HashPartitionRebalancer(_engine(conn), "note_embeddings", 16).prepare()
+
+    assert state["phase"] == "copying" and conn.state["phase"] == "copying"
+    assert len(conn.executed('CREATE TABLE "note_embeddings_next_p')) == 16
+    assert "MODULUS 16, REMAINDER 15" in conn.executed('CREATE TABLE "note_embeddings_next_p')[-1][0]
+    assert len(conn.executed("CREATE TRIGGER")) == 1
+
+@pytest.mark.asyncio
+async def test_prepare_rejects_lower_modulus():
+    conn = FakeConn(partitions=[f"note_embeddings_p{i}" for i in range(10)])
+    with pytest.raises(ValueError):
+        await HashPartitionRebalancer(_engine(conn), "note_embeddings", 8).prepare()
+    assert conn.executed("CREATE") == []
+
+@pytest.mark.asyncio
+async def test_copy_resumes_from_checkpoint_and_finishes():
+    conn = FakeConn(
+        state={"target_modulus": 16, "phase": "copying", "last_key": ["n5", "u1"], "copied_rows": 5},
+        batches=[(2, "n7", "u1"), None],
+    )
+    rebalancer = HashPartitionRebalancer(_engine(conn), "note_embeddings", 16, batch_rows=2, pause_seconds=0)
+    with patch("infrastructure.partition_rebalance.asyncio.sleep", new=AsyncMock()) as mock_sleep:
+        state = await rebalancer.copy()
+
+    batches = conn.executed("WITH batch")
+    assert batches[0][1] == {"limit": 2, "k0": "n5", "k1": "u1"}
+    assert batches[1][1] == {"limit": 2, "k0": "n7", "k1": "u1"}
+    assert state["phase"] == "copied" and conn.state["copied_rows"] == 7
+    mock_sleep.assert_awaited_once() # throttled between batches
+
+@pytest.mark.asyncio
+async def test_cutover_only_after_backfill():
+    conn = FakeConn(state={"target_modulus": 16, "phase": "copying", "last_key": None, "copied_rows": 0})
+    assert (await HashPartitionRebalancer(_engine(conn), "note_embeddings", 16).cutover())["phase"] == "copying"
+    assert conn.executed("LOCK TABLE") == []
+
+    conn = FakeConn(state={"target_modulus": 16, "phase": "copied", "last_key": ["n7", "u1"], "copied_rows": 7})
+    state = await HashPartitionRebalancer(_engine(conn), "note_embeddings", 16).cutover()
+    sql = [s for s, _ in conn.statements]
+    assert state["phase"] == "cut_over"
+    assert sql.index("SET LOCAL lock_timeout = '3000ms'") < sql.index('LOCK TABLE "note_embeddings" IN ACCESS EXCLUSIVE MODE')
+    assert 'ALTER TABLE "note_embeddings_next" RENAME TO "note_embeddings"' in sql
+
+@pytest.mark.asyncio
+async def test_other_modulus_in_progress_is_refused():
+    conn = FakeConn(state={"target_modulus": 32, "phase": "copying", "last_key": None, "copied_rows": 0})
+    with pytest.raises(ValueError):
+        await HashPartitionRebalancer(_engine(conn), "note_embeddings", 16).run()
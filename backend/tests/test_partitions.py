@@ -0,0 +1,67 @@
+import datetime
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from infrastructure.partitions import (
+    MonthlyPartitionPolicy, add_months, create_partition_sql, ensure_partitions,
+    expired_partitions, partition_month, retire_partitions
+)
+
+POLICY = MonthlyPartitionPolicy("integration_logs", retention_months=6, premake_months=2)
+TODAY = datetime.date(2026, 10, 19)
+
+def _conn(partitions):
+    conn = AsyncMock()
+    listing = MagicMock()
+    listing.all.return_value = [(name,) for name in partitions]
+    conn.execute.side_effect = lambda stmt, params=None: listing if params else MagicMock()
+    return conn
+
+def _ddl(conn):
+    return [str(c[0][0]) for c in conn.execute.call_args_list if len(c[0]) == 1]
+
+def test_month_arithmetic_and_naming():
+    assert add_months(datetime.date(2026, 11, 1), 3) == datetime.date(2027, 2, 1)
+    assert add_months(datetime.date(2026, 1, 1), -1) == datetime.date(2025, 12, 1)
+    assert partition_month("integration_logs", "integration_logs_p202604") == datetime.date(2026, 4, 1)
+    assert partition_month("integration_logs", "integration_logs_default") is None
+    assert create_partition_sql("integration_logs", datetime.date(2026, 12, 1)) == (
+        'CREATE TABLE IF NOT EXISTS "integration_logs_p202612" PARTITION OF "integration_logs" '
+        "FOR VALUES FROM ('2026-12-01 00:00:00+00') TO ('2027-01-01 00:00:00+00')"
+    )
+
+def test_expired_partitions_keep_whole_retention_window():
+    names = ["integration_logs_p202603", "integration_logs_p202604", "integration_logs_p202605", "integration_logs_default"]
+    # Cutoff 2026-04-01: March is entirely older than six months, April is not
+    assert expired_partitions(POLICY, names, TODAY) == ["integration_logs_p202603"]
+
+@pytest.mark.asyncio
+async def test_ensure_creates_only_missing_future_months():
+    conn = _conn(["integration_logs_p202610"])
+    created = await ensure_partitions(conn, POLICY, TODAY)
+    assert created == ["integration_logs_p202611", "integration_logs_p202612"]
+    assert all("CREATE TABLE IF NOT EXISTS" in sql for sql in _ddl(conn))
+
+@pytest.mark.asyncio
+async def test_retire_detaches_then_drops():
+    conn = _conn(["integration_logs_p202602", "integration_logs_p202609"])
+    assert await retire_partitions(conn, POLICY, TODAY) == ["integration_logs_p202602"]
+    assert _ddl(conn) == [
+        'ALTER TABLE "integration_logs" DETACH PARTITION "integration_logs_p202602" CONCURRENTLY',
+        'DROP TABLE "integration_logs_p202602"',
+    ]
+
+@pytest.mark.asyncio
+async def test_maintenance_task_uses_autocommit_connection():
+    from tasks.partition_maintenance import _maintain_partitions_async
+    conn = _conn([])
+    raw = AsyncMock()
+    raw.execution_options.return_value = conn
+    engine = MagicMock()
+    engine.connect.return_value.__aenter__.return_value = raw
+
+    with patch("tasks.partition_maintenance.engine", engine):
+        report = await _maintain_partitions_async()
+
+    raw.execution_options.assert_awaited_once_with(isolation_level="AUTOCOMMIT")
+    assert len(report["integration_logs"]["created"]) == 4 # current month + 3 ahead
+    assert report["integration_logs"]["dropped"] == []
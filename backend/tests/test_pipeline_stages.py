@@ -45,3 +45,26 @@ async def test_analyze_stage_success():
         assert note.status == NoteStatus.ANALYZED
         assert note.ai_analysis["_cache_hit"] is True
         assert db_mock.commit.called
+
+@pytest.mark.asyncio
+async def test_analyze_stage_pushes_recent_note():
+    """Completed analysis feeds the short-term ring buffer used by RAG."""
+    from datetime import datetime
+    db_mock = AsyncMock()
+    note = Note(id="note_1", user_id="user_1", created_at=datetime(2025, 3, 1), ai_analysis={})
+
+    user_res = MagicMock()
+    user_res.scalars.return_value.first.return_value = None
+    db_mock.execute.return_value = user_res
+
+    async def analyze_step(n, *args):
+        n.context_snippet = "Snippet"
+        return {"intent": "note"}, False
+
+    with patch("app.services.pipeline.stages.analyze_core.analyze_step", side_effect=analyze_step), \
+         patch("app.services.pipeline.stages.short_term_memory.push_recent_note", new_callable=AsyncMock) as mock_push:
+        await PipelineStages.analyze(note, db_mock)
+
+        mock_push.assert_awaited_once_with(
+            "user_1", {"note_id": "note_1", "date": "2025-03-01", "snippet": "Snippet"}
+        )
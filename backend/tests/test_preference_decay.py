@@ -52,19 +52,15 @@ async def test_preference_decay():
     mock_user_res.scalars.return_value.first.return_value = user
     
     # Setup Sequence
-    # Call 1: Monitor Node Count
-    # Call 2: Monitor Edge Count
-    # Call 3: Notes Fetch
-    # Call 4: Cache Lookup
-    # Call 5: User Fetch
-    
-    mock_nodes_res = MagicMock()
-    mock_nodes_res.scalar.return_value = 0
-    mock_edges_res = MagicMock()
-    mock_edges_res.scalar.return_value = 0
+    # Call 1: Reflection watermark (none yet)
+    # Call 2: Notes Fetch
+    # Call 3: Cache Lookup
+    # Call 4: User Fetch
+    mock_state_res = MagicMock()
+    mock_state_res.scalars.return_value.first.return_value = None
 
     mock_db.execute.side_effect = [
-        mock_nodes_res, mock_edges_res, # Monitoring
+        mock_state_res,
         mock_note_res, # Notes
         mock_cache_res, # Cache
         mock_user_res, # User fetch
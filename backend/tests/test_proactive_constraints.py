@@ -123,3 +123,37 @@ async def test_proactive_disabled_setting():
          # Result: AI not called, Sent not called
          mock_ai.assert_not_called()
          mock_bot.send_message.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_proactive_prefetches_context_for_all_users_in_set_queries():
+    """Two users cost three queries in total, relations are user-scoped and scoring is per user."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    users = [User(id=u, telegram_chat_id=f"chat_{u}", adaptive_preferences={}, last_note_date=now) for u in ("u1", "u2")]
+    mems = [LongTermMemory(id="m1", user_id="u1", summary_text="Exam on Friday", importance_score=9.0),
+            LongTermMemory(id="m2", user_id="u2", summary_text="Bought milk", importance_score=6.0)]
+
+    mock_db = MagicMock()
+    mock_db.execute = AsyncMock()
+    results = [MagicMock(), MagicMock(), MagicMock()]
+    results[0].scalars.return_value.all.return_value = users
+    results[1].scalars.return_value.all.return_value = mems
+    results[2].scalars.return_value.all.return_value = []
+    mock_db.execute.side_effect = results
+
+    async def score(messages, response_format=None):
+        relevant = "Exam" in messages[1]["content"]
+        return json.dumps({"question": "Как экзамен?" if relevant else "Молоко?", "relevance_score": 9 if relevant else 3})
+
+    with patch("tasks.proactive.AsyncSessionLocal") as mock_session_cls, \
+         patch("tasks.proactive.ai_service.get_chat_completion", new=AsyncMock(side_effect=score)) as mock_ai, \
+         patch("tasks.proactive.bot") as mock_bot:
+        mock_session_cls.return_value.__aenter__.return_value = mock_db
+        mock_bot.send_message = AsyncMock()
+        await _trigger_proactive_reminders_async()
+
+    assert mock_db.execute.await_count == 3
+    rel_sql = str(mock_db.execute.call_args_list[2][0][0])
+    assert "note_relations.user_id IN" in rel_sql and "row_number() OVER (PARTITION BY note_relations.user_id" in rel_sql
+    assert mock_ai.await_count == 2
+    mock_bot.send_message.assert_awaited_once()
+    assert mock_bot.send_message.call_args[1]["chat_id"] == "chat_u1"
@@ -2,7 +2,7 @@ import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from tasks.reflection import _process_reflection_async
 from app.core.rag_service import rag_service
-from app.models import LongTermMemory, NoteRelation
+from app.models import LongTermMemory
 
 @pytest.mark.asyncio
 async def test_reflection_provenance():
@@ -58,7 +58,8 @@ async def test_reflection_provenance():
     
     with patch("tasks.reflection.AsyncSessionLocal", return_value=db_mock), \
          patch("tasks.reflection.ai_service", mock_ai), \
-         patch("tasks.reflection.monitor"):
+         patch("tasks.reflection.monitor"), \
+         patch("tasks.reflection.graph_service.upsert_relations", new_callable=AsyncMock, return_value=1) as mock_upsert:
          
         await _process_reflection_async(user_id)
         
@@ -68,11 +69,11 @@ async def test_reflection_provenance():
         assert ltm_calls[0].confidence == 0.9
         assert ltm_calls[0].source == "fact"
         
-        # Verify NoteRelation save
-        rel_calls = [c[0][0] for c in db_mock.add.call_args_list if isinstance(c[0][0], NoteRelation)]
+        # Verify NoteRelation save (deduplicating upsert)
+        rel_calls = mock_upsert.call_args[0][2]
         assert len(rel_calls) == 1
-        assert rel_calls[0].confidence == 0.8
-        assert rel_calls[0].source == "inferred"
+        assert rel_calls[0]["confidence"] == 0.8
+        assert rel_calls[0]["source"] == "inferred"
 
 @pytest.mark.asyncio
 async def test_rag_confidence_filter():
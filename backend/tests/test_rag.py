@@ -49,18 +49,17 @@ async def test_medium_term_retrieval(db_session, test_user, mock_ai_service):
     await db_session.commit()
     
     # configure mock to return these for vector search and graph search
+    # RAG selects projected rows: (id, title, snippet, created_at, importance_score)
     mock_result_vector = MagicMock()
-    mock_result_vector.scalars.return_value.all.return_value = [n1]
+    mock_result_vector.all.return_value = [(n1.id, n1.title, n1.summary, n1.created_at, n1.importance_score)]
 
+    # Graph walk rows: (node_id, path score, title, snippet, cosine_distance)
     mock_result_graph = MagicMock()
-    mock_result_graph.scalars.return_value.all.return_value = [rel]
-
-    mock_result_neighbor = MagicMock()
-    mock_result_neighbor.scalars.return_value.all.return_value = [n2]
+    mock_result_graph.all.return_value = [(rel.note_id2, rel.strength * rel.confidence, n2.title, n2.summary, 0.1)]
     
     # We need to handle multiple execute calls
-    # 1. Vector Search, 2. Graph Relations, 3. Neighbor Notes fetch
-    db_session.execute.side_effect = [mock_result_vector, mock_result_graph, mock_result_neighbor]
+    # 1. Vector Search, 2. Graph walk + Neighbor distances (single round-trip)
+    db_session.execute.side_effect = [mock_result_vector, mock_result_graph]
     
     mock_ai_service["embedding"].return_value = [0.1] * 1536
     
@@ -96,15 +95,36 @@ async def test_long_term_memory_retrieval(db_session, test_user, mock_ai_service
     await db_session.commit()
     
     # configure mock to return these
+    # Rows come back already ranked by the SQL temporal score
     mock_result = MagicMock()
-    mock_result.scalars.return_value.all.return_value = [m1, m2]
+    mock_result.all.return_value = [(m.summary_text, m.importance_score) for m in (m1, m2)]
     db_session.execute = AsyncMock(return_value=mock_result)
     
     # Search with high relevance to m2 but m1 has higher importance
     mock_ai_service["embedding"].return_value = [0.9] * 1536
     
-    # get_long_term_memory sorts by (importance_score, created_at) after initial top 50 relevance
     context = await rag_service.get_long_term_memory(test_user.id, db_session, query_text="topic")
     
     assert "Crucial info" in context
     assert "Score: 10.0" in context
+
+def test_build_context_snippet():
+    from app.core.rag_service import CONTEXT_SNIPPET_CHARS
+    assert rag_service.build_context_snippet("Short summary", "Long transcript") == "Short summary"
+    assert rag_service.build_context_snippet(None, "x" * 1000) == "x" * CONTEXT_SNIPPET_CHARS
+    assert rag_service.build_context_snippet("", None) is None
+
+@pytest.mark.asyncio
+async def test_medium_term_selects_projected_columns(db_session, mock_ai_service):
+    """RAG must not load transcripts or analysis JSON for candidates."""
+    empty = MagicMock()
+    empty.all.return_value = []
+    db_session.execute = AsyncMock(return_value=empty)
+
+    await rag_service.get_medium_term_context("u1", "current", "query", db_session)
+
+    stmt = db_session.execute.call_args_list[0][0][0]
+    selected = [c.name for c in stmt.selected_columns]
+    assert "snippet" in selected
+    assert "transcription_text" not in selected
+    assert "ai_analysis" not in selected
@@ -31,17 +31,22 @@ async def test_temporal_weighting_logic():
         new_mem.importance_score = 5.0
         new_mem.created_at = now - datetime.timedelta(days=1)
         
-        # Mock DB results
+        # New memory should rank first because:
+        # Score(New) = 5 * exp(-1/30) ~= 4.8
+        # Score(Old) = 10 * exp(-60/30) ~= 1.35
+        assert rag._calculate_temporal_score(new_mem.importance_score, new_mem.created_at) > \
+            rag._calculate_temporal_score(old_mem.importance_score, old_mem.created_at)
+        
+        # Ranking is done by the DB; rows come back in final order
         mock_result = MagicMock()
-        mock_result.scalars.return_value.all.return_value = [old_mem, new_mem]
+        mock_result.all.return_value = [(m.summary_text, m.importance_score) for m in (new_mem, old_mem)]
         db_mock.execute.return_value = mock_result
         
         # Call without query_text (general summary retrieval)
         result_text = await rag.get_long_term_memory(user_id, db_mock)
         
-        # New memory should be first because:
-        # Score(New) = 5 * exp(-1/30) ~= 4.8
-        # Score(Old) = 10 * exp(-60/30) ~= 1.35
+        sql = str(db_mock.execute.call_args[0][0]).lower()
+        assert "exp(" in sql
         
         assert "New moderate memory" in result_text
         # Verify order in the returned string (if we can infer it)
@@ -59,7 +64,8 @@ async def test_temporal_weighting_hybrid():
          patch("app.core.rag_service.ai_service") as mock_ai:
         
         mock_settings.RAG_TEMPORAL_DECAY_DAYS = 30
-        mock_ai.generate_embedding.return_value = [0.1] * 1536
+        mock_settings.RAG_CANDIDATE_POOL = 200
+        mock_ai.generate_embedding = AsyncMock(return_value=[0.1] * 1536)
         
         now = datetime.datetime.now(datetime.timezone.utc)
         
@@ -76,11 +82,14 @@ async def test_temporal_weighting_hybrid():
         new_mem.created_at = now
         
         mock_result = MagicMock()
-        mock_result.scalars.return_value.all.return_value = [old_mem, new_mem]
+        mock_result.all.return_value = [(m.summary_text, m.importance_score) for m in (new_mem, old_mem)]
         db_mock.execute.return_value = mock_result
         
         result_text = await rag.get_long_term_memory("user", db_mock, query_text="help")
         
         # Score Fresh = 3 * exp(0) = 3
         # Score Ancient = 10 * exp(-3) ~= 10 * 0.05 = 0.5
+        # The hybrid score (similarity * temporal) is computed over the ANN pool in SQL
+        sql = str(db_mock.execute.call_args[0][0]).lower()
+        assert "memory_pool" in sql and "exp(" in sql
         assert "Fresh News" in result_text.split("\n")[0]
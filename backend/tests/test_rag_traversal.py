@@ -22,7 +22,7 @@ async def test_traversal_constraints():
     # 1. Vector Search Mock (Returns n1)
     n1 = Note(id="n1", user_id=user_id, transcription_text="n1", created_at=now, importance_score=5)
     mock_vec_res = MagicMock()
-    mock_vec_res.scalars.return_value.all.return_value = [n1]
+    mock_vec_res.all.return_value = [(n1.id, n1.title, n1.transcription_text, n1.created_at, n1.importance_score)]
     
     # 2. Graph Relations Mock
     # Create 12 relations from n1. 
@@ -46,29 +46,17 @@ async def test_traversal_constraints():
         )
         relations.append(rel)
         
+    # 3. Neighbor distances are joined into the walk rows (single round-trip).
+    # The degree cap runs in SQL, so the walk only returns `target_0` to `target_9`.
     mock_graph_res = MagicMock()
-    mock_graph_res.scalars.return_value.all.return_value = relations
-    
-    # 3. Neighbor Fetch Mock
-    # We need neighbors to be fetched.
-    # Logic: map neighbors -> select(Note).where(id.in_(keys))
-    # We expect `target_0` to `target_9` (10 items). `target_10` dropped.
-    
-    target_notes = []
-    for i in range(11): # If logic fails, it asks for 11. If works, asks for 10.
-        target_notes.append(
-            (Note(id=f"target_{i}", title=f"T{i}"), 0.1) # Dist 0.1 -> Sim 0.9
-        )
-            
-    mock_nb_res = MagicMock()
-    # We will check call_args to verify only 10 IDs were requested!
-    # But return value can include all just in case.
-    mock_nb_res.all.return_value = target_notes
+    mock_graph_res.all.return_value = [
+        (r.note_id2, r.strength * r.confidence, f"T{i}", None, 0.1) # Dist 0.1 -> Sim 0.9
+        for i, r in enumerate(relations[:10])
+    ]
     
     mock_db.execute.side_effect = [
         mock_vec_res, # vector search
-        mock_graph_res, # graph search
-        mock_nb_res # neighbor fetch
+        mock_graph_res, # graph search + neighbor distances
     ]
     
     with patch("app.core.rag_service.ai_service.generate_embedding", new_callable=AsyncMock) as mock_emb:
@@ -99,49 +87,69 @@ async def test_traversal_constraints():
     # I trust the logic if I see correct behavior in logs? No.
     # I can use a mock side effect for DB that checks the IDs requested in step 3.
     
+def _compiled(stmt):
+    from sqlalchemy.dialects import postgresql
+    return stmt.compile(dialect=postgresql.dialect())
+
+def test_graph_walk_sql_constraints():
+    """k-hop walk is user-scoped, capped per node via LATERAL ... LIMIT, and never re-enters the seed set."""
+    from sqlalchemy import select
+    walk = rag_service._graph_walk("u1", {"n1", "n2"}, hops=2)
+    compiled = _compiled(select(walk))
+    sql = str(compiled)
+
+    assert "WITH RECURSIVE graph_walk" in sql
+    assert "JOIN LATERAL" in sql
+    assert "note_relations.user_id =" in sql
+    assert "note_relations.strength >" in sql and "note_relations.confidence >" in sql
+    assert "!= ALL (graph_walk.path)" in sql # No cycles
+    params = compiled.params
+    assert params["param_5"] == rag_service.GRAPH_MAX_DEGREE
+    assert params["depth_2"] == 2 # hops
+    assert sorted(params["neighbor_id_1"]) == ["n1", "n2"]
+
 @pytest.mark.asyncio
 async def test_degree_limit_logic():
-    # Unit test logic flow by mocking DB to return specific set
+    """Cached adjacency: max degree 10 drops t10..t14 even though they would score higher."""
     user_id = "u1"
-    
-    # ... (Setup similar to above)
-    relations = [
-        NoteRelation(note_id1="n1", note_id2=f"t{i}", strength=0.9, confidence=0.9, created_at=datetime.datetime.now(datetime.timezone.utc))
-        for i in range(15) 
-    ]
-    # Sort them? Logic expects pre-sorted by query.
-    # Our list is uniform.
-    
+    adjacency = {"n1": [[f"t{i}", 0.9, 0.9] for i in range(15)]}
+
     mock_db = MagicMock()
     mock_db.execute = AsyncMock()
     mock_db.execute.side_effect = [
-        MagicMock(scalars=MagicMock(return_value=MagicMock(all=lambda: [Note(id="n1", user_id="u1", created_at=datetime.datetime.now(datetime.timezone.utc), importance_score=5)]))), # Vector
-        MagicMock(scalars=MagicMock(return_value=MagicMock(all=lambda: relations))), # Graph
-        MagicMock(all=lambda: []) # Neighbors (empty to avoid error)
+        MagicMock(all=lambda: [("n1", None, None, datetime.datetime.now(datetime.timezone.utc), 5)]), # Vector
+        # Reached notes: t0..t9 are weak matches (far)
+        MagicMock(all=lambda: [(f"t{i}", f"Title{i}", None, 0.9) for i in range(10)]),
     ]
-    
-    with patch("app.core.rag_service.ai_service.generate_embedding", new_callable=AsyncMock) as m_emb:
+
+    with patch("app.core.rag_service.ai_service.generate_embedding", new_callable=AsyncMock) as m_emb, \
+         patch("app.core.rag_service.settings.RAG_GRAPH_ADJACENCY_CACHE", True), \
+         patch("app.core.rag_service.graph_adjacency_cache.get_neighbors", new_callable=AsyncMock) as m_nb:
         m_emb.return_value = [0.1]*1536
-        
-        # We want to intercept the IDs sent to step 3.
-        # But step 3 is db.execute.
-        # We can spy on it.
-        
-        await rag_service.get_medium_term_context(user_id, "cur", "text", mock_db)
-        
-        # Assertions
-        # 3rd call to execute.
-        call_args = mock_db.execute.call_args_list[2]
-        sql_obj = call_args[0][0]
-        # Inspecting compiled parameters is hard in mock.
-        # But wait! If we rely on code review, I implemented "if current_degree >= 10: continue".
-        # This is deterministic.
-        
-        # Let's test Scoring: Strength * Confidence
-        # R1: str=1.0, conf=0.5 -> Score=0.5
-        # R2: str=0.6, conf=1.0 -> Score=0.6
-        # R2 should win.
-        pass
+        m_nb.return_value = adjacency
+
+        res = await rag_service.get_medium_term_context(user_id, "cur", "text", mock_db)
+
+        # Adjacency from Redis, one DB statement for the reached notes
+        assert mock_db.execute.await_count == 2
+        fetched = str(_compiled(mock_db.execute.call_args_list[-1][0][0]).params)
+        for i in range(10, 15):
+            assert f"'t{i}'" not in fetched
+        assert "Title0" in res["graph"]
+
+@pytest.mark.asyncio
+async def test_cold_adjacency_cache_builds_from_db():
+    """A cold Redis adjacency is rebuilt from one user-scoped relations query and stored."""
+    rel_rows = MagicMock(all=lambda: [("n1", "t1", 0.9, 0.9)])
+    mock_db = MagicMock()
+    mock_db.execute = AsyncMock(side_effect=[rel_rows, MagicMock(all=lambda: [("t1", "T1", None, 0.2)])])
+
+    with patch("app.core.rag_service.graph_adjacency_cache.get_neighbors", new_callable=AsyncMock, return_value=None), \
+         patch("app.core.rag_service.graph_adjacency_cache.store", new_callable=AsyncMock) as m_store:
+        rows = await rag_service._expand_graph_cached("u1", {"n1"}, 2, [0.1], mock_db)
+
+    m_store.assert_awaited_once_with("u1", {"n1": [["t1", 0.9, 0.9]], "t1": [["n1", 0.9, 0.9]]})
+    assert rows == [("t1", pytest.approx(0.81), "T1", None, 0.2)]
 
 @pytest.mark.asyncio
 async def test_scoring_logic():
@@ -158,10 +166,6 @@ async def test_scoring_logic():
     r1 = NoteRelation(note_id1="n1", note_id2="t1", strength=0.9, confidence=0.5, created_at=now)
     r2 = NoteRelation(note_id1="n1", note_id2="t2", strength=0.8, confidence=0.9, created_at=now)
     
-    # We sort by strength DESC, confidence DESC in SQL.
-    # 0.9 vs 0.8 -> r1 comes first.
-    relations = [r1, r2]
-    
     # Result targets
     t1 = Note(id="t1", title="WeakConf")
     t2 = Note(id="t2", title="StrongConf")
@@ -171,11 +175,13 @@ async def test_scoring_logic():
     
     # Setup Returns
     mock_db.execute.side_effect = [
-        MagicMock(scalars=MagicMock(return_value=MagicMock(all=lambda: [n1]))), # Vec
-        MagicMock(scalars=MagicMock(return_value=MagicMock(all=lambda: relations))), # Graph
-        # Neighbors: return dict-like list of tuples (Note, distance)
+        MagicMock(all=lambda: [(n1.id, n1.title, None, n1.created_at, n1.importance_score)]), # Vec
+        # Walk rows carry the path score and neighbor projection (title, snippet, distance)
         # We say distance 0 (Sim 1.0) to isolate graph score impact
-        MagicMock(all=lambda: [(t1, 0.0), (t2, 0.0)]) 
+        MagicMock(all=lambda: [
+            (r1.note_id2, r1.strength * r1.confidence, t1.title, None, 0.0),
+            (r2.note_id2, r2.strength * r2.confidence, t2.title, None, 0.0),
+        ]),
     ]
     
     with patch("app.core.rag_service.ai_service.generate_embedding", new_callable=AsyncMock) as m_emb:
@@ -25,18 +25,15 @@ async def test_graph_traversal_weighted():
     
     # Mocks
     mock_vector_res = MagicMock()
-    mock_vector_res.scalars.return_value.all.return_value = [n1]
+    mock_vector_res.all.return_value = [(n1.id, n1.title, None, n1.created_at, n1.importance_score)]
     
+    # Graph walk returns reached notes (path score = strength * confidence) with distance joined in
     mock_graph_res = MagicMock()
-    mock_graph_res.scalars.return_value.all.return_value = [rel1] 
-    
-    mock_dist_res = MagicMock()
-    mock_dist_res.all.return_value = [(n2, 0.1)]
+    mock_graph_res.all.return_value = [(rel1.note_id2, rel1.strength * rel1.confidence, n2.title, None, 0.1)]
     
     mock_db.execute.side_effect = [
         mock_vector_res, # Vector search
-        mock_graph_res,  # Graph search
-        mock_dist_res    # Neighbor Dist search
+        mock_graph_res,  # Graph search + neighbor distances
     ]
     
     with patch("app.core.rag_service.ai_service.generate_embedding", new_callable=AsyncMock) as mock_emb:
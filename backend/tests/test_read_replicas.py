@@ -0,0 +1,96 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+import infrastructure.database as database
+from infrastructure.database import ReplicaPool
+
+def _engine(lag=None, error=None):
+    conn = AsyncMock()
+    conn.__aenter__.return_value = conn
+    if error:
+        conn.scalar.side_effect = error
+    else:
+        conn.scalar.return_value = lag
+    engine = MagicMock()
+    engine.connect.return_value = conn
+    return engine
+
+@pytest.mark.asyncio
+async def test_pick_rotates_over_fresh_replicas():
+    r1, r2 = _engine(lag=0.1), _engine(lag=0.0)
+    pool = ReplicaPool(MagicMock(name="primary"), [r1, r2])
+    assert [await pool.pick() for _ in range(3)] == [r1, r2, r1]
+    assert r1.connect.call_count == 1 # lag sample reused within REPLICA_LAG_CHECK_SECONDS
+
+@pytest.mark.asyncio
+async def test_lagging_or_down_replicas_fall_back_to_primary():
+    primary = MagicMock(name="primary")
+    pool = ReplicaPool(primary, [_engine(lag=60.0), _engine(error=OSError("connection refused"))])
+    assert await pool.pick() is primary
+
+    fresh = _engine(lag=1.0)
+    pool = ReplicaPool(primary, [_engine(lag=60.0), fresh])
+    assert await pool.pick() is fresh
+
+@pytest.mark.asyncio
+async def test_disconnected_replica_is_not_fresh():
+    """Without a streaming WAL receiver the lag is unknown (NULL), not 0: reads go to the primary."""
+    primary = MagicMock(name="primary")
+    pool = ReplicaPool(primary, [_engine(lag=None)])
+    assert await pool.pick() is primary
+    assert "pg_stat_wal_receiver" in str(database.REPLICA_LAG_SQL)
+
+@pytest.mark.asyncio
+async def test_read_your_writes_keeps_recent_writer_on_primary():
+    primary, replica = MagicMock(name="primary"), _engine(lag=0.0)
+    pool = ReplicaPool(primary, [replica])
+    binds = []
+    def factory(user_id=None, shard=None, bind=None):
+        binds.append(bind)
+        session = AsyncMock()
+        session.__aenter__.return_value = session
+        return session
+    request = SimpleNamespace(state=SimpleNamespace(owner_id="u-1"))
+
+    with patch.object(database, "read_pools", [pool]), \
+         patch.object(database, "AsyncSessionLocal", side_effect=factory), \
+         patch.object(database, "recent_writes") as marker:
+        marker.wrote_recently = AsyncMock(side_effect=[False, True])
+        for _ in range(2):
+            async for _ in database.get_read_db(request):
+                pass
+        marker.mark = AsyncMock()
+        await database.note_write("u-1")
+
+    assert binds == [replica, primary]
+    marker.mark.assert_awaited_once_with("u-1")
+
+@pytest.mark.asyncio
+async def test_without_replicas_redis_is_not_consulted():
+    with patch.object(database, "recent_writes") as marker:
+        marker.wrote_recently = AsyncMock()
+        marker.mark = AsyncMock()
+        assert await database.wrote_recently("u-1") is False
+        await database.note_write("u-1")
+    marker.wrote_recently.assert_not_awaited()
+    marker.mark.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_successful_write_requests_mark_the_caller():
+    import jwt
+    import structlog
+    from app.api.middleware.auth import AuthMiddleware
+    from infrastructure.config import settings
+    middleware = AuthMiddleware(app=MagicMock())
+    token = jwt.encode({"sub": "a@example.com", "uid": "u-9"}, "test-key", algorithm="HS256")
+
+    def request(method):
+        return SimpleNamespace(method=method, headers={"Authorization": f"Bearer {token}"}, state=SimpleNamespace())
+
+    with patch.object(settings, "SECRET_KEY", "test-key"), \
+         patch("app.api.middleware.auth.note_write", new=AsyncMock()) as mock_note_write:
+        for method, status in [("POST", 201), ("GET", 200), ("PUT", 422)]:
+            await middleware.dispatch(request(method), AsyncMock(return_value=SimpleNamespace(status_code=status)))
+    structlog.contextvars.clear_contextvars()
+
+    mock_note_write.assert_awaited_once_with("u-9")
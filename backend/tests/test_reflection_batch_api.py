@@ -0,0 +1,178 @@
+import json
+import httpx
+import pytest
+from unittest.mock import AsyncMock, patch, MagicMock
+from app.models import ReflectionState, ReflectionBatch
+from app.services.ai_service.batch_client import OpenAIBatchBackend
+from workers.reflection_tasks import (
+    _submit_reflection_batch_async, _poll_reflection_batches_async, _apply_batch_result, _trigger_batched_async
+)
+
+def _session(*results):
+    db = AsyncMock()
+    db.__aenter__.return_value = db
+    db.add = MagicMock()
+    db.execute.side_effect = list(results)
+    return db
+
+def _state_res(state):
+    res = MagicMock()
+    res.scalars.return_value.first.return_value = state
+    return res
+
+def _backend(handler, llm=None):
+    return OpenAIBatchBackend(llm or MagicMock(), "sk-test", "batch-model", transport=httpx.MockTransport(handler))
+
+@pytest.mark.asyncio
+async def test_openai_batch_backend_submits_over_rest():
+    """Uploads the JSONL file, then creates the batch; requests without a model use the configured one."""
+    calls = []
+    def handler(request):
+        calls.append(request)
+        if request.url.path == "/v1/files":
+            return httpx.Response(200, json={"id": "file-in"})
+        return httpx.Response(200, json={"id": "batch_1", "status": "validating"})
+
+    batch_id = await _backend(handler).submit(
+        [{"custom_id": "u1:summary", "messages": [{"role": "user", "content": "S"}]}], metadata={"kind": "reflection"}
+    )
+
+    assert batch_id == "batch_1"
+    upload, create = calls
+    assert upload.headers["Authorization"] == "Bearer sk-test"
+    body = upload.read().decode()
+    assert 'name="purpose"' in body and "batch" in body
+    assert '"model": "batch-model"' in body and '"custom_id": "u1:summary"' in body
+    assert create.url.path == "/v1/batches"
+    assert json.loads(create.read()) == {
+        "input_file_id": "file-in", "endpoint": "/v1/chat/completions",
+        "completion_window": "24h", "metadata": {"kind": "reflection"},
+    }
+
+@pytest.mark.asyncio
+async def test_openai_batch_backend_parses_output_file():
+    """Output lines map back to custom_id; per-request errors yield None."""
+    llm = MagicMock()
+    llm._track_usage = AsyncMock()
+    ok = {"custom_id": "u1:summary", "response": {"status_code": 200, "body": {
+        "choices": [{"message": {"content": "{\"summary\": \"S\"}"}}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}}}}
+    failed = {"custom_id": "u1:relations", "response": {"status_code": 429, "body": {}}}
+    def handler(request):
+        if request.url.path == "/v1/batches/batch_1":
+            return httpx.Response(200, json={"id": "batch_1", "status": "completed", "output_file_id": "file-out"})
+        assert request.url.path == "/v1/files/file-out/content"
+        return httpx.Response(200, text=json.dumps(ok) + "\n" + json.dumps(failed))
+
+    backend = _backend(handler, llm)
+    assert await backend.status("batch_1") == "completed"
+    results = await backend.results("batch_1")
+
+    assert results == {"u1:summary": "{\"summary\": \"S\"}", "u1:relations": None}
+    llm._track_usage.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_submit_writes_both_requests_per_user_and_records_watermark():
+    job = {
+        "user_id": "u1", "state": None, "base_note_id": None, "base_note_at": None,
+        "note_ids": ["n1"], "last_note_id": "n1", "last_note_at": None, "smart_key": "k",
+        "context_embedding": None, "messages": [{"role": "user", "content": "S"}],
+        "rel_messages": [{"role": "user", "content": "R"}],
+    }
+    db = _session()
+    backend = MagicMock()
+    backend.submit = AsyncMock(return_value="batch_1")
+    with patch("workers.reflection_tasks.AsyncSessionLocal", return_value=db), \
+         patch("workers.reflection_tasks._prepare_reflection", new_callable=AsyncMock, side_effect=[job, None]) as mock_prepare, \
+         patch("workers.reflection_tasks.ai_service") as mock_ai:
+        mock_ai.batch = backend
+        assert await _submit_reflection_batch_async(["u1", "u2"]) == "batch_1"
+
+    assert all(c.kwargs["embed"] is False for c in mock_prepare.call_args_list)
+    requests = backend.submit.call_args[0][0]
+    assert [r["custom_id"] for r in requests] == ["u1:summary", "u1:relations"]
+    batch = db.add.call_args[0][0]
+    assert isinstance(batch, ReflectionBatch)
+    assert batch.provider_batch_id == "batch_1"
+    assert batch.jobs == {"u1": {"base_note_id": None, "base_note_at": None, "note_ids": ["n1"], "last_note_id": "n1", "last_note_at": None, "smart_key": "k"}}
+
+@pytest.mark.asyncio
+async def test_apply_batch_result_is_idempotent():
+    """A result applies only on the watermark it was built from, so a replay is a no-op."""
+    meta = {"base_note_id": "n0", "note_ids": ["n1"], "last_note_id": "n1",
+            "last_note_at": "2026-10-19T01:00:00+00:00", "smart_key": "k"}
+    summary = '{"summary": "S", "rolling_summary": "R"}'
+    state = ReflectionState(user_id="u1", last_note_id="n0")
+
+    with patch("workers.reflection_tasks.AsyncSessionLocal", side_effect=[_session(_state_res(state)), _session(_state_res(state))]), \
+         patch("workers.reflection_tasks._apply_reflection", new_callable=AsyncMock) as mock_apply, \
+         patch("workers.reflection_tasks.ai_service") as mock_ai:
+        mock_ai.clean_json_response = MagicMock(side_effect=lambda x: x)
+        async def apply(db, job, data, rel):
+            job["state"].last_note_id = job["last_note_id"]
+            return True
+        mock_apply.side_effect = apply
+
+        assert await _apply_batch_result("u1", meta, summary, "[]") is True
+        assert await _apply_batch_result("u1", meta, summary, "[]") is False
+
+    assert mock_apply.await_count == 1
+    job = mock_apply.call_args[0][1]
+    assert job["last_note_at"].isoformat() == "2026-10-19T01:00:00+00:00"
+
+@pytest.mark.asyncio
+async def test_poll_applies_completed_and_leaves_running_batches():
+    done = ReflectionBatch(id="b1", provider_batch_id="p1", status="submitted", jobs={"u1": {"base_note_id": None}})
+    running = ReflectionBatch(id="b2", provider_batch_id="p2", status="submitted", jobs={"u2": {"base_note_id": None}})
+    list_res = MagicMock()
+    list_res.scalars.return_value.all.return_value = [done, running]
+    list_db, mark_db = _session(list_res), _session(MagicMock())
+
+    backend = MagicMock()
+    backend.status = AsyncMock(side_effect=lambda pid: "completed" if pid == "p1" else "in_progress")
+    backend.results = AsyncMock(return_value={"u1:summary": "{}", "u1:relations": "[]"})
+    with patch("workers.reflection_tasks.AsyncSessionLocal", side_effect=[list_db, mark_db]), \
+         patch("workers.reflection_tasks._apply_batch_result", new_callable=AsyncMock, return_value=True) as mock_apply, \
+         patch("workers.reflection_tasks.ai_service") as mock_ai:
+        mock_ai.batch = backend
+        assert await _poll_reflection_batches_async() == 1
+
+    mock_apply.assert_awaited_once_with("u1", {"base_note_id": None}, "{}", "[]")
+    backend.results.assert_awaited_once_with("p1")
+    mark_sql = str(mark_db.execute.call_args[0][0])
+    assert "UPDATE reflection_batches" in mark_sql
+
+@pytest.mark.asyncio
+async def test_trigger_uses_batch_api_in_batch_mode():
+    user = MagicMock(id="u1")
+    users_res = MagicMock()
+    users_res.scalars.return_value.all.return_value = [user]
+    with patch("infrastructure.database.AsyncSessionLocal", return_value=_session(users_res)), \
+         patch("workers.reflection_tasks.settings") as mock_settings, \
+         patch("workers.reflection_tasks.ai_service"), \
+         patch("workers.reflection_tasks.submit_reflection_batch") as mock_submit, \
+         patch("workers.reflection_tasks.batch_reflection") as mock_live:
+        mock_settings.REFLECTION_BATCH_MODE = True
+        await _trigger_batched_async()
+
+    mock_submit.delay.assert_called_once_with(["u1"])
+    mock_live.delay.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_trigger_runs_live_without_batch_provider():
+    """Batch mode without a provider reflects live instead of pretending to batch."""
+    user = MagicMock(id="u1")
+    users_res = MagicMock()
+    users_res.scalars.return_value.all.return_value = [user]
+    with patch("infrastructure.database.AsyncSessionLocal", return_value=_session(users_res)), \
+         patch("workers.reflection_tasks.settings") as mock_settings, \
+         patch("workers.reflection_tasks.ai_service") as mock_ai, \
+         patch("workers.reflection_tasks.submit_reflection_batch") as mock_submit, \
+         patch("workers.reflection_tasks.batch_reflection") as mock_live:
+        mock_settings.REFLECTION_BATCH_MODE = True
+        mock_ai.batch = None
+        await _trigger_batched_async()
+        assert await _poll_reflection_batches_async() == 0
+
+    mock_submit.delay.assert_not_called()
+    mock_live.delay.assert_called_once_with(["u1"])
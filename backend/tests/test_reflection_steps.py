@@ -15,19 +15,11 @@ async def test_multi_step_reflection_logic():
     n1 = Note(id="n1", transcription_text="Met John today.", importance_score=8.5, user_id=user_id)
     
     # Setup DB Result Mocks
-    # 1. Count Notes
-    res_count_notes = MagicMock()
-    res_count_notes.scalar.return_value = 1
-    
-    # 2. Count Rels
-    res_count_rels = MagicMock()
-    res_count_rels.scalar.return_value = 0
-    
-    # 3. User Fetch
+    # 1. User Fetch
     res_user = MagicMock()
     res_user.scalars.return_value.first.return_value = user
     
-    # 4. Notes Fetch
+    # 2. Notes Fetch
     res_notes = MagicMock()
     res_notes.scalars.return_value.all.return_value = [n1]
     
@@ -35,8 +27,6 @@ async def test_multi_step_reflection_logic():
     db_mock = AsyncMock()
     # Configure execute to return the mocks sequentially
     db_mock.execute.side_effect = [
-        res_count_notes,
-        res_count_rels,
         res_user,
         res_notes
     ]
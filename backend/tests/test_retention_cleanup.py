@@ -0,0 +1,58 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from workers.maintenance_tasks import _cleanup_old_notes_async
+
+def _page(rows):
+    res = MagicMock()
+    res.all.return_value = rows
+    return res
+
+def _session(*results):
+    db = AsyncMock()
+    db.__aenter__.return_value = db
+    db.execute.side_effect = list(results)
+    return db
+
+@pytest.mark.asyncio
+async def test_retention_streams_chunks_with_set_based_deletes():
+    free_page1 = [("a1", "k1"), ("a2", None)]
+    free_page2 = [("a3", "k3")]
+    pro_page1 = [("b1", "k4")]
+    db = _session(
+        _page(free_page1), MagicMock(), _page(free_page2), MagicMock(), _page([]),
+        _page(pro_page1), MagicMock(), _page([]),
+    )
+    with patch("workers.maintenance_tasks.AsyncSessionLocal", return_value=db), \
+         patch("workers.maintenance_tasks.storage_client") as mock_storage, \
+         patch("workers.maintenance_tasks.monitor") as mock_monitor:
+        mock_storage.delete_files = AsyncMock(return_value=[])
+        result = await _cleanup_old_notes_async()
+
+    assert result["deleted"] == {"free": 3, "pro": 1}
+    assert result["complete"] is True
+    assert [c[0][0] for c in mock_storage.delete_files.call_args_list] == [["k1"], ["k3"], ["k4"]]
+    assert db.commit.await_count == 3 # one per chunk
+
+    calls = db.execute.call_args_list
+    assert "notes.id > " in str(calls[2][0][0]) and calls[2][0][0].compile().params["id_1"] == "a2" # keyset
+    delete_stmt = calls[1][0][0]
+    assert "DELETE FROM notes WHERE notes.id = ANY" in str(delete_stmt)
+    assert delete_stmt.compile().params["ids"] == ["a1", "a2"]
+    mock_monitor.update_retention_throughput.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_retention_stops_at_time_budget_and_resumes_later():
+    db = _session(_page([("a1", None)]), MagicMock())
+    with patch("workers.maintenance_tasks.AsyncSessionLocal", return_value=db), \
+         patch("workers.maintenance_tasks.storage_client"), \
+         patch("workers.maintenance_tasks.monitor"), \
+         patch("workers.maintenance_tasks.settings") as mock_settings, \
+         patch("workers.maintenance_tasks.time") as mock_time:
+        mock_settings.RETENTION_CHUNK_SIZE = 1
+        mock_settings.RETENTION_MAX_SECONDS = 10
+        mock_time.monotonic.side_effect = [0.0, 1.0, 11.0, 12.0]
+        result = await _cleanup_old_notes_async()
+
+    assert result["complete"] is False
+    assert result["deleted"] == {"free": 1}
+    db.commit.assert_awaited_once() # the finished chunk is durable
@@ -14,9 +14,10 @@ async def test_self_improvement_logic():
     mock_ctx.__aexit__.return_value = None
     
     # Mock data
-    m1 = LongTermMemory(id="1", summary_text="I like cats.", importance_score=5.0)
-    m2 = LongTermMemory(id="2", summary_text="I love felines.", importance_score=6.0)
-    m3 = LongTermMemory(id="3", summary_text="I hate animals.", importance_score=2.0)
+    # Similar embeddings: all three land in one candidate group
+    m1 = LongTermMemory(id="1", summary_text="I like cats.", importance_score=5.0, embedding=[1.0, 0.1, 0.0])
+    m2 = LongTermMemory(id="2", summary_text="I love felines.", importance_score=6.0, embedding=[0.95, 0.15, 0.0])
+    m3 = LongTermMemory(id="3", summary_text="I hate animals.", importance_score=2.0, embedding=[0.9, 0.3, 0.05])
     
     # Select returns proper scalar
     mock_res = MagicMock()
@@ -64,3 +65,58 @@ async def test_self_improvement_logic():
         
         # Verify CONTRADICTION REMOVAL
         assert m3.is_archived == True
+        
+        # Only the candidate group was sent
+        logic_prompt = mock_ai.get_chat_completion.call_args_list[0][0][0][1]["content"]
+        assert "I like cats." in logic_prompt and "I hate animals." in logic_prompt
+
+@pytest.mark.asyncio
+async def test_self_improvement_skips_llm_without_candidates():
+    """Memories with no near-duplicate never reach the LLM."""
+    mock_db = AsyncMock()
+    mock_ctx = MagicMock()
+    mock_ctx.__aenter__.return_value = mock_db
+    
+    m1 = LongTermMemory(id="1", summary_text="I like cats.", embedding=[1.0, 0.0, 0.0])
+    m2 = LongTermMemory(id="2", summary_text="Quarterly taxes are due.", embedding=[0.0, 1.0, 0.0])
+    mock_res = MagicMock()
+    mock_res.scalars.return_value.all.return_value = [m1, m2]
+    mock_db.execute.return_value = mock_res
+    
+    with patch("tasks.self_improve.AsyncSessionLocal", return_value=mock_ctx), \
+         patch("tasks.self_improve.ai_service", new_callable=AsyncMock) as mock_ai:
+        await _process_improvement_async("user1")
+        
+        mock_ai.get_chat_completion.assert_not_called()
+        mock_db.commit.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_self_improvement_survives_a_bad_chunk():
+    """An unparseable chunk is skipped; the other chunks' decisions are still applied."""
+    mock_db = AsyncMock()
+    mock_ctx = MagicMock()
+    mock_ctx.__aenter__.return_value = mock_db
+    
+    # Two separate candidate groups, one per prompt
+    m1 = LongTermMemory(id="1", summary_text="I like cats.", importance_score=5.0, embedding=[1.0, 0.0, 0.0])
+    m2 = LongTermMemory(id="2", summary_text="I love felines.", importance_score=6.0, embedding=[0.99, 0.05, 0.0])
+    m3 = LongTermMemory(id="3", summary_text="Taxes due in April.", importance_score=5.0, embedding=[0.0, 1.0, 0.0])
+    m4 = LongTermMemory(id="4", summary_text="Taxes are due in May.", importance_score=5.0, embedding=[0.0, 0.99, 0.05])
+    mock_res = MagicMock()
+    mock_res.scalars.return_value.all.return_value = [m1, m2, m3, m4]
+    mock_db.execute.return_value = mock_res
+    
+    with patch("tasks.self_improve.AsyncSessionLocal", return_value=mock_ctx), \
+         patch("tasks.self_improve.settings") as mock_settings, \
+         patch("tasks.self_improve.ai_service", new_callable=AsyncMock) as mock_ai:
+        mock_settings.MEMORY_DEDUP_THRESHOLD = 0.9
+        mock_settings.MEMORY_DEDUP_MAX_GROUP = 10
+        mock_settings.MEMORY_DEDUP_GROUPS_PER_PROMPT = 1
+        mock_ai.clean_json_response = MagicMock(side_effect=lambda x: x)
+        mock_ai.get_chat_completion.side_effect = ["not json", '{"contradictions_to_remove": ["3"]}']
+        
+        await _process_improvement_async("user1")
+        
+        assert m3.is_archived == True
+        assert not m1.is_archived and not m2.is_archived
+        mock_db.commit.assert_awaited_once()
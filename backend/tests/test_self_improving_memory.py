@@ -9,23 +9,27 @@ async def test_self_improve_memory_flow():
     """Test that self-improvement correctly merges and archives memories."""
     user_id = "user123"
     db_mock = AsyncMock()
+    db_mock.__aenter__.return_value = db_mock
     
     # Mock memories
     m1 = MagicMock(spec=LongTermMemory)
     m1.id = "id1"
     m1.summary_text = "I like apples"
     m1.importance_score = 5.0
+    m1.embedding = [1.0, 0.0]
     
     m2 = MagicMock(spec=LongTermMemory)
     m2.id = "id2"
     m2.summary_text = "Apples are my favorite fruit"
     m2.importance_score = 6.0
+    m2.embedding = [0.98, 0.1]
     
     # Contradiction
     m3 = MagicMock(spec=LongTermMemory)
     m3.id = "id3"
     m3.summary_text = "I hate apples"
     m3.importance_score = 4.0
+    m3.embedding = [0.9, 0.2]
 
     mock_result = MagicMock()
     mock_result.scalars.return_value.all.return_value = [m1, m2, m3, MagicMock(), MagicMock()] # 5 items to pass minimum check
@@ -40,9 +44,9 @@ async def test_self_improve_memory_flow():
     with patch("workers.reflection_tasks.ai_service") as mock_ai, \
          patch("workers.reflection_tasks.AsyncSessionLocal", return_value=db_mock):
         
-        mock_ai.get_chat_completion.return_value = ai_resp
+        mock_ai.get_chat_completion = AsyncMock(return_value=ai_resp)
         mock_ai.clean_json_response.return_value = ai_resp
-        mock_ai.get_embedding.return_value = [0.1] * 1536
+        mock_ai.get_embedding = AsyncMock(return_value=[0.1] * 1536)
         
         await _self_improve_memory_async(user_id)
         
@@ -51,3 +55,7 @@ async def test_self_improve_memory_flow():
         assert db_mock.execute.call_count >= 3 # fetch + 2 updates
         assert db_mock.add.call_count == 1 # 1 new merged memory
         db_mock.commit.assert_called_once()
+        # Only the similar group (not the unrelated memories) went to the LLM, once
+        mock_ai.get_chat_completion.assert_awaited_once()
+        prompt = mock_ai.get_chat_completion.call_args[0][0][1]["content"]
+        assert "Group 1" in prompt and "id1" in prompt and "id3" in prompt
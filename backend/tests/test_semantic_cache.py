@@ -42,12 +42,21 @@ async def test_semantic_cache_hit():
         user = User(id="user-1")
 
         # Run
+        from infrastructure.monitoring import rag_work_avoided
+        avoided = rag_work_avoided.labels(cache="semantic", kind="db_queries")
+        before = avoided._value.get()
+
         core = AnalyzeCore()
-        analysis = await core.analyze_step(note, user, mock_db, mock_memory_service)
+        with patch("app.core.analyze_core.rag_service.build_hierarchical_context", new_callable=AsyncMock) as mock_rag:
+            analysis, cache_hit = await core.analyze_step(note, user, mock_db, mock_memory_service)
 
         # Assertions
+        assert cache_hit is True
         assert analysis["title"] == "Cached Title"
         mock_ai.analyze_text.assert_not_called()
+        # Lazy context: a hit never pays for RAG retrieval
+        mock_rag.assert_not_called()
+        assert avoided._value.get() - before == 4
         # Verify Log (implicitly via logic flow or capturing logs, but unit test focuses on result)
         
         # Verify NO new save to cache (db.add should not be called for cache, only for embedding/note updates if any)
@@ -92,9 +101,11 @@ async def test_semantic_cache_miss():
 
         # Run
         core = AnalyzeCore()
-        analysis = await core.analyze_step(note, user, mock_db, mock_memory_service)
+        with patch("app.core.analyze_core.rag_service.build_hierarchical_context", new_callable=AsyncMock, return_value="ctx"):
+            analysis, cache_hit = await core.analyze_step(note, user, mock_db, mock_memory_service)
 
         # Assertions
+        assert cache_hit is False
         assert analysis["title"] == "Fresh AI Title"
         mock_ai.analyze_text.assert_called_once()
         
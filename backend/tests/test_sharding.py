@@ -0,0 +1,213 @@
+import pytest
+from collections import Counter
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+import infrastructure.database as database
+from infrastructure.database import ShardRing
+
+USER_IDS = [f"user-{i}" for i in range(2000)]
+
+def test_ring_spreads_users_and_is_stable():
+    ring = ShardRing(4)
+    owners = {u: ring.shard_for(u) for u in USER_IDS}
+    assert owners == {u: ShardRing(4).shard_for(u) for u in USER_IDS} # deterministic across processes
+    counts = Counter(owners.values())
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > len(USER_IDS) / 4 * 0.6
+    assert ring.shard_for(None) == 0
+
+def test_adding_a_shard_only_moves_users_onto_it():
+    before, after = ShardRing(4), ShardRing(5)
+    moved = [u for u in USER_IDS if before.shard_for(u) != after.shard_for(u)]
+    assert all(after.shard_for(u) == 4 for u in moved)
+    assert 0 < len(moved) < len(USER_IDS) * 0.35 # ~1/5, nowhere near a full reshuffle
+
+def test_session_factory_routes_by_user_and_shard():
+    makers = [MagicMock(name="shard0"), MagicMock(name="shard1")]
+    ring = ShardRing(2)
+    owned_by_1 = next(u for u in USER_IDS if ring.shard_for(u) == 1)
+    factory = database.ShardedSessionFactory()
+    with patch.object(database, "_session_makers", makers), patch.object(database, "ring", ring):
+        assert factory() is makers[0].return_value
+        assert factory(user_id=owned_by_1) is makers[1].return_value
+        assert factory(shard=1) is makers[1].return_value
+
+@pytest.mark.asyncio
+async def test_get_db_uses_owner_from_verified_token():
+    opened = []
+    def factory(user_id=None, shard=None):
+        opened.append(user_id)
+        session = AsyncMock()
+        session.__aenter__.return_value = session
+        return session
+    request = SimpleNamespace(state=SimpleNamespace(owner_id="u-42"))
+    with patch.object(database, "AsyncSessionLocal", side_effect=factory):
+        async for _ in database.get_db(request):
+            pass
+        async for _ in database.get_db(SimpleNamespace(state=SimpleNamespace())):
+            pass
+    assert opened == ["u-42", None]
+
+@pytest.mark.asyncio
+async def test_fan_out_queries_every_shard():
+    sessions = [AsyncMock(), AsyncMock()]
+    for i, s in enumerate(sessions):
+        s.__aenter__.return_value = s
+        s.scalar.return_value = (i + 1) * 10
+    with patch.object(database, "ring", ShardRing(2)), \
+         patch.object(database, "AsyncSessionLocal", side_effect=lambda shard=None, **kw: sessions[shard]):
+        assert await database.fan_out(lambda db: db.scalar("count")) == [10, 20]
+
+@pytest.mark.asyncio
+async def test_session_where_finds_the_shard_holding_the_row():
+    sessions = [AsyncMock(), AsyncMock()]
+    for s, hit in zip(sessions, [None, "u-7"]):
+        s.__aenter__.return_value = s
+        s.scalar.return_value = hit
+    picked = []
+    def factory(user_id=None, shard=None):
+        picked.append((user_id, shard))
+        return sessions[shard if shard is not None else 0]
+    with patch.object(database, "ring", ShardRing(2)), patch.object(database, "AsyncSessionLocal", side_effect=factory):
+        async with database.session_where(AsyncMock(), "select id", fallback_user_id="new") as db:
+            assert db is sessions[1]
+    assert picked[-1] == ("new", 1)
+
+@pytest.mark.asyncio
+async def test_admin_stats_sum_over_shards(client, db_session, test_user):
+    from app.models import Plan
+    test_user.role = "admin"
+    shard_counts = [
+        {"users": 3, "pro": 1, "premium": 0, "notes": 40, "integrations": 2},
+        {"users": 5, "pro": 2, "premium": 1, "notes": 60, "integrations": None},
+    ]
+    plans = MagicMock()
+    plans.scalars.return_value.all.return_value = [Plan(id="pro", price_monthly_rub=500), Plan(id="premium", price_monthly_rub=900)]
+    db_session.execute.return_value = plans
+
+    with patch("app.api.routers.v1.admin.fan_out", AsyncMock(return_value=shard_counts)):
+        response = await client.get("/admin/stats")
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "active_integrations": 2,
+        "total_users": 8,
+        "total_mrr_cents": 3 * 500 + 1 * 900,
+        "total_notes_processed": 100,
+    }
+
+@pytest.mark.asyncio
+async def test_legacy_token_without_uid_is_routed_by_email():
+    """Tokens issued before the `uid` claim are resolved to their owner before get_db runs."""
+    import jwt
+    import structlog
+    from app.api.middleware.auth import AuthMiddleware
+    from infrastructure.config import settings
+    token = jwt.encode({"sub": "a@example.com"}, "test-key", algorithm="HS256")
+    request = SimpleNamespace(method="GET", headers={"Authorization": f"Bearer {token}"}, state=SimpleNamespace())
+
+    with patch.object(settings, "SECRET_KEY", "test-key"), \
+         patch("app.api.middleware.auth.owner_id_for", new=AsyncMock(return_value="u-7")) as mock_lookup:
+        await AuthMiddleware(app=MagicMock()).dispatch(request, AsyncMock(return_value=SimpleNamespace(status_code=200)))
+    structlog.contextvars.clear_contextvars()
+
+    mock_lookup.assert_awaited_once_with("a@example.com")
+    assert request.state.owner_id == "u-7"
+
+@pytest.mark.asyncio
+async def test_owner_id_for_searches_every_shard():
+    sessions = [AsyncMock(), AsyncMock()]
+    for s, hit in zip(sessions, [None, "u-7"]):
+        s.__aenter__.return_value = s
+        s.scalar.return_value = hit
+    with patch.object(database, "ring", ShardRing(2)), \
+         patch.object(database, "AsyncSessionLocal", side_effect=lambda shard=None, **kw: sessions[shard]):
+        assert await database.owner_id_for("a@example.com") == "u-7"
+    assert await database.owner_id_for("a@example.com") is None # single shard: nothing to route
+
+@pytest.mark.asyncio
+async def test_admin_user_list_merges_users_without_created_at(client, db_session, test_user):
+    import datetime
+    from app.models import User
+    test_user.role = "admin"
+    dated = User(id="u1", email="a@example.com", created_at=datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc))
+    undated = User(id="u2", email="b@example.com", created_at=None)
+
+    with patch("app.api.routers.v1.admin.fan_out", AsyncMock(return_value=[[dated], [undated]])):
+        response = await client.get("/admin/users")
+
+    assert response.status_code == 200
+    assert [u["id"] for u in response.json()] == ["u1", "u2"]
+
+@pytest.mark.asyncio
+async def test_note_session_uses_owner_or_finds_the_note():
+    sessions = [AsyncMock(), AsyncMock()]
+    for s, hit in zip(sessions, [None, "n1"]):
+        s.__aenter__.return_value = s
+        s.scalar.return_value = hit
+    ring = ShardRing(2)
+    owned_by_0 = next(u for u in USER_IDS if ring.shard_for(u) == 0)
+    def factory(user_id=None, shard=None):
+        return sessions[ring.shard_for(user_id) if shard is None else shard]
+    with patch.object(database, "ring", ring), patch.object(database, "AsyncSessionLocal", side_effect=factory):
+        async with database.note_session("n1", owned_by_0) as db:
+            assert db is sessions[0]
+        async with database.note_session("n1") as db: # queued before tasks carried the owner
+            assert db is sessions[1]
+
+@pytest.mark.asyncio
+async def test_beat_jobs_queue_users_of_every_shard():
+    from workers.maintenance_tasks import _cluster_notes_trigger_async
+    with patch("workers.maintenance_tasks.fan_out", AsyncMock(return_value=[["u1"], ["u2", "u3"]])), \
+         patch("workers.maintenance_tasks.cluster_notes_task") as mock_task:
+        assert await _cluster_notes_trigger_async() == 3
+    assert [c[0][0] for c in mock_task.delay.call_args_list] == ["u1", "u2", "u3"]
+
+@pytest.mark.asyncio
+async def test_dev_upgrade_finds_user_on_other_shard(client, db_session, test_user):
+    from app.models import UserTier
+    shards = [AsyncMock(), AsyncMock()]
+    for s, hit in zip(shards, [None, test_user.id]):
+        s.__aenter__.return_value = s
+        s.scalar.return_value = hit
+    found = MagicMock()
+    found.scalars.return_value.first.return_value = test_user
+    shards[1].execute.return_value = found
+
+    with patch.object(database, "ring", ShardRing(2)), \
+         patch.object(database, "AsyncSessionLocal", side_effect=lambda user_id=None, shard=None, **kw: shards[shard or 0]), \
+         patch("infrastructure.config.settings.ENVIRONMENT", "development"):
+        response = await client.post("/payment/dev/upgrade?email=test@example.com&tier=premium")
+
+    assert response.json()["status"] == "upgraded"
+    assert test_user.tier == UserTier.PREMIUM
+    shards[1].commit.assert_awaited_once()
+    db_session.execute.assert_not_called() # the anonymous request's default-shard session
+
+@pytest.mark.asyncio
+async def test_payment_webhook_upgrades_user_on_other_shard(client, db_session, test_user):
+    import hashlib, hmac
+    from app.models import Plan, UserTier
+    shards = [AsyncMock(), AsyncMock()]
+    for s, hit in zip(shards, [None, test_user.id]):
+        s.__aenter__.return_value = s
+        s.scalar.return_value = hit
+    found = MagicMock()
+    found.scalars.return_value.first.return_value = test_user
+    shards[1].execute.return_value = found
+    plan = MagicMock()
+    plan.scalars.return_value.first.return_value = Plan(id="pro", price_monthly_rub=1000.0)
+    db_session.execute.return_value = plan
+
+    data = {"customer_email": "test@example.com", "payment_status": "success", "sum": "1000.0",
+            "#tier": "pro", "#period": "monthly", "#currency": "RUB"}
+    data["Sign"] = hmac.new(b"key", "".join(data[k] for k in sorted(data)).encode(), hashlib.sha256).hexdigest()
+
+    with patch.object(database, "ring", ShardRing(2)), \
+         patch.object(database, "AsyncSessionLocal", side_effect=lambda user_id=None, shard=None, **kw: shards[shard or 0]), \
+         patch("infrastructure.config.settings.PRODAMUS_KEY", "key"):
+        response = await client.post("/payment/webhook", data=data)
+
+    assert response.json()["status"] == "ok"
+    assert test_user.tier == UserTier.PRO
+    shards[1].commit.assert_awaited_once()
@@ -27,11 +27,6 @@ async def test_smart_cache_hit():
     mock_db = MagicMock()
     mock_db.execute = AsyncMock()
     
-    mock_nodes_res = MagicMock()
-    mock_nodes_res.scalar.return_value = 0
-    mock_edges_res = MagicMock()
-    mock_edges_res.scalar.return_value = 0
-    
     mock_note_res = MagicMock()
     mock_note_res.scalars.return_value.all.return_value = [n1]
     
@@ -46,8 +41,11 @@ async def test_smart_cache_hit():
     mock_cache_res = MagicMock()
     mock_cache_res.scalars.return_value.first.return_value = cached_entry
     
+    mock_state_res = MagicMock()
+    mock_state_res.scalars.return_value.first.return_value = None # no watermark yet
+    
     mock_db.execute.side_effect = [
-        mock_nodes_res, mock_edges_res, # monitor
+        mock_state_res, # reflection watermark
         mock_note_res, # notes
         mock_user_info_res, # identity ver (NEW CALL)
         mock_cache_res, # cache check
@@ -79,10 +77,6 @@ async def test_smart_cache_miss():
     mock_db = MagicMock()
     mock_db.execute = AsyncMock()
     
-    mock_nodes_res = MagicMock()
-    mock_nodes_res.scalar.return_value = 0
-    mock_edges_res = MagicMock()
-    mock_edges_res.scalar.return_value = 0
     mock_note_res = MagicMock()
     mock_note_res.scalars.return_value.all.return_value = [n1]
     
@@ -97,8 +91,11 @@ async def test_smart_cache_miss():
     mock_user_res = MagicMock()
     mock_user_res.scalars.return_value.first.return_value = MagicMock()
 
+    mock_state_res = MagicMock()
+    mock_state_res.scalars.return_value.first.return_value = None
+    
     mock_db.execute.side_effect = [
-        mock_nodes_res, mock_edges_res,
+        mock_state_res,
         mock_note_res,
         mock_user_info_res,
         mock_cache_res, # miss
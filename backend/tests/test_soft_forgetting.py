@@ -1,51 +1,65 @@
+import json
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
-from datetime import datetime, timedelta, timezone
 from tasks.cleanup_memory import run_cleanup
 from app.models import LongTermMemory
 from app.core.rag_service import rag_service
 
+def _session(*results):
+    db = AsyncMock()
+    db.__aenter__.return_value = db
+    db.execute.side_effect = list(results)
+    return db
+
+def _rowcount(n):
+    res = MagicMock()
+    res.rowcount = n
+    return res
+
+def _page(rows):
+    res = MagicMock()
+    res.all.return_value = rows
+    return res
+
 @pytest.mark.asyncio
 async def test_soft_forgetting_logic():
-    """Test that records are soft-archived with ultra-summary."""
-    db_mock = AsyncMock()
-    
-    # Mock hard delete result
-    mock_hard = MagicMock()
-    mock_hard.rowcount = 1
-    
-    # Mock soft archive targets
-    now = datetime.now(timezone.utc)
-    old_low_score = LongTermMemory(
-        id="m1", 
-        summary_text="Deep technical details about something", 
-        importance_score=3.0,
-        created_at=now - timedelta(days=200),
-        is_archived=False
-    )
-    
-    mock_soft_targets = MagicMock()
-    mock_soft_targets.scalars.return_value.all.return_value = [old_low_score]
-    
-    # Mock notes cleanup result
-    mock_notes = MagicMock()
-    mock_notes.rowcount = 0
-    
-    db_mock.execute.side_effect = [mock_hard, mock_soft_targets, mock_notes]
-    
+    """Records are soft-archived with ultra-summaries, several per LLM call, one commit per chunk."""
+    deletes_db = _session(_rowcount(1), _rowcount(0), _rowcount(0), _rowcount(0))
+    page = [(f"m{i}", f"Deep technical details {i}") for i in range(5)]
+    page_db = _session(_page(page))
+    chunk_dbs = [_session(MagicMock()), _session(MagicMock())]
+
+    async def compress(messages, response_format=None):
+        ids = [line.split('"id": "')[1].split('"')[0] for line in messages[1]["content"].splitlines() if '"id": "' in line]
+        return json.dumps({"summaries": [{"id": i, "summary": f"Compressed {i}"} for i in ids if i != "m4"]})
+
     mock_ai = AsyncMock()
-    mock_ai.get_chat_completion.return_value = "Compressed summary"
-    
-    with patch("tasks.cleanup_memory.AsyncSessionLocal", return_value=db_mock), \
-         patch("tasks.cleanup_memory.ai_service", mock_ai):
-        
+    mock_ai.get_chat_completion.side_effect = compress
+
+    with patch("tasks.cleanup_memory.AsyncSessionLocal", side_effect=[deletes_db, page_db] + chunk_dbs), \
+         patch("tasks.cleanup_memory.ai_service", mock_ai), \
+         patch("tasks.cleanup_memory.settings") as mock_settings:
+        mock_settings.ARCHIVE_MEMORIES_PER_CALL = 3
+        mock_settings.ARCHIVE_CONCURRENCY = 2
+
         hard, archived = await run_cleanup()
-        
-        assert hard == 1
-        assert archived == 1
-        assert old_low_score.is_archived is True
-        assert old_low_score.archived_summary == "Compressed summary"
-        db_mock.commit.assert_called_once()
+
+    assert hard == 1
+    assert archived == 5
+    assert mock_ai.get_chat_completion.await_count == 2
+    assert mock_ai.get_chat_completion.call_args.kwargs["response_format"] == "json_object"
+    deletes_db.commit.assert_awaited_once()
+    for db in chunk_dbs:
+        db.commit.assert_awaited_once()
+
+    stmt, params = chunk_dbs[0].execute.call_args[0]
+    assert "UPDATE long_term_memories" in str(stmt) and "is_archived = false" in str(stmt).lower()
+    assert params == [{"b_id": f"m{i}", "b_summary": f"Compressed m{i}"} for i in range(3)]
+    # The model skipped m4: truncated text instead
+    assert chunk_dbs[1].execute.call_args[0][1][1] == {"b_id": "m4", "b_summary": "Deep technical details 4"}
+    # Short page: no second keyset read
+    assert page_db.execute.await_count == 1
+    assert "long_term_memories.id >" in str(page_db.execute.call_args[0][0])
 
 @pytest.mark.asyncio
 async def test_restore_archived_memory():
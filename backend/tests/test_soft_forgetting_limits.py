@@ -35,7 +35,7 @@ async def test_rag_filters_archived():
     m_archived = LongTermMemory(id="archived", summary_text="I am archived", is_archived=True)
     
     res = MagicMock()
-    res.scalars.return_value.all.return_value = [m_active] # RAG should only get active
+    res.all.return_value = [(m_active.summary_text, m_active.importance_score)] # RAG should only get active
     db_mock.execute.return_value = res
     
     with patch("app.core.rag_service.ai_service") as mock_ai:
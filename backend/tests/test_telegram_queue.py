@@ -0,0 +1,28 @@
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from aiogram.exceptions import TelegramRetryAfter
+from app.core.bot import TelegramSendQueue
+
+@pytest.mark.asyncio
+async def test_queue_paces_messages_to_rate():
+    bot = MagicMock()
+    bot.send_message = AsyncMock()
+    start = time.monotonic()
+    async with TelegramSendQueue(bot, rate=50.0) as outbox:
+        for i in range(6):
+            outbox.put(chat_id=i, text="hi")
+    assert time.monotonic() - start >= 5 / 50.0 * 0.9
+    assert [c.kwargs["chat_id"] for c in bot.send_message.call_args_list] == list(range(6))
+    assert outbox.sent == 6
+
+@pytest.mark.asyncio
+async def test_queue_honours_retry_after_and_counts_failures():
+    bot = MagicMock()
+    flood = TelegramRetryAfter(method=MagicMock(), message="Too Many Requests", retry_after=0)
+    bot.send_message = AsyncMock(side_effect=[flood, None, RuntimeError("blocked by user")])
+    async with TelegramSendQueue(bot, rate=1000.0) as outbox:
+        outbox.put(chat_id=1, text="a")
+        outbox.put(chat_id=2, text="b")
+    assert bot.send_message.await_count == 3 # first message retried once
+    assert (outbox.sent, outbox.failed) == (1, 1)
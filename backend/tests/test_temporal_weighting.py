@@ -3,7 +3,6 @@ import datetime
 import math
 from unittest.mock import AsyncMock, patch, MagicMock
 from app.core.rag_service import rag_service
-from app.models import Note, LongTermMemory
 
 @pytest.mark.asyncio
 async def test_temporal_weighting_calculation():
@@ -19,51 +18,62 @@ async def test_temporal_weighting_calculation():
     assert score_old < 4.0
     assert score_old > 3.6
 
+def _compiled(stmt):
+    from sqlalchemy.dialects import postgresql
+    return stmt.compile(dialect=postgresql.dialect())
+
 @pytest.mark.asyncio
 async def test_rag_prioritizes_fresh_notes():
-    """Test that RAG retrieval prioritizes fresher notes over older high-importance ones if the decay is significant."""
+    """Temporal ranking happens in SQL: ORDER BY similarity * importance * exp(-age/decay)."""
     db_mock = AsyncMock()
     user_id = "u1"
     
     now = datetime.datetime.now(datetime.timezone.utc)
-    # n1: 60 days old, score 10
-    # n2: 1 day old, score 6
-    n1 = Note(id="old", title="Old High", importance_score=10.0, created_at=now - datetime.timedelta(days=60))
-    n2 = Note(id="new", title="New Med", importance_score=6.0, created_at=now - datetime.timedelta(days=1))
-    
-    # Mock vector results fetching both
+    # DB already returns the true top-k by final score
     v_res = MagicMock()
-    v_res.scalars.return_value.all.return_value = [n1, n2]
-    db_mock.execute.return_value = v_res
+    v_res.all.return_value = [
+        ("new", "New Med", None, now - datetime.timedelta(days=1), 6.0),
+        ("old", "Old High", None, now - datetime.timedelta(days=60), 10.0),
+    ]
+    g_res = MagicMock()
+    g_res.all.return_value = [] # no graph neighbors
+    db_mock.execute.side_effect = [v_res, g_res]
     
-    with patch("app.core.rag_service.ai_service") as mock_ai:
-        mock_ai.generate_embedding.return_value = [0.1]*1536
+    with patch("app.core.rag_service.ai_service") as mock_ai, \
+         patch("app.core.rag_service.settings") as mock_settings:
+        mock_ai.generate_embedding = AsyncMock(return_value=[0.1]*1536)
+        mock_settings.RAG_TEMPORAL_DECAY_DAYS = 45
+        mock_settings.RAG_CANDIDATE_POOL = 200
+        mock_settings.RAG_GRAPH_HOPS = 1
+        mock_settings.RAG_GRAPH_ADJACENCY_CACHE = False
+        mock_settings.RAG_GRAPH_IMPORTANCE_WEIGHT = 0.5
         
         context = await rag_service.get_medium_term_context(user_id, "id-current", "query", db_mock)
         
-        # New Med (6 * e^-0.03 ~ 5.8) should be higher than Old High (10 * e^-2 ~ 1.35)
-        # So New Med should appear first in the formatted list if the re-ranking worked.
-        # Check that 'New Med' is before 'Old High' in the string
+        compiled = _compiled(db_mock.execute.call_args_list[0][0][0])
+        sql = str(compiled).lower()
+        assert "order by" in sql and "exp(" in sql
+        assert "vector_pool" in sql # ANN candidate pool, scored outside
+        assert compiled.params["decay_days"] == 45.0
+        assert compiled.params["param_1"] == 200 # pool size
+        assert compiled.params["graph_weight"] == 0.5
+        assert "note_graph_scores" in sql # PageRank boost joined, not walked
+        
         vector_str = context["vector"]
         assert vector_str.index("New Med") < vector_str.index("Old High")
 
 @pytest.mark.asyncio
 async def test_long_term_temporal_weighting():
-    """Test re-ranking in long-term memory."""
+    """Long-term memories are ranked by importance * freshness in SQL, no Python re-sort."""
     db_mock = AsyncMock()
-    now = datetime.datetime.now(datetime.timezone.utc)
-    
-    m1 = LongTermMemory(summary_text="Old Knowledge", importance_score=10.0, created_at=now - datetime.timedelta(days=100))
-    m2 = LongTermMemory(summary_text="Recent News", importance_score=5.0, created_at=now - datetime.timedelta(days=2))
     
     res = MagicMock()
-    res.scalars.return_value.all.return_value = [m1, m2]
+    res.all.return_value = [("Recent News", 5.0), ("Old Knowledge", 10.0)]
     db_mock.execute.return_value = res
     
     context = await rag_service.get_long_term_memory("u1", db_mock)
     
-    # Recent News should be higher score
-    # 5 * e^(-2/30) vs 10 * e^(-100/30)
-    # 5 * 0.93 = 4.65
-    # 10 * 0.035 = 0.35
+    sql = str(_compiled(db_mock.execute.call_args[0][0])).lower()
+    assert "exp(" in sql and "decay_days" in sql
+    assert "limit" in sql
     assert context.index("Recent News") < context.index("Old Knowledge")
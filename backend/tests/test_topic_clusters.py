@@ -0,0 +1,92 @@
+import datetime
+import numpy as np
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.models import Note, TopicCentroid, TopicClusterState
+from app.core.topic_clusters import update_centroids
+from workers.maintenance_tasks import _cluster_notes_async
+
+def _blobs(rng, centres, n, dim=16):
+    return np.vstack([c + rng.normal(scale=0.05, size=(n, dim)) for c in centres]).astype(np.float32)
+
+def test_update_centroids_bootstraps_then_folds_in_new_points_only():
+    rng = np.random.default_rng(0)
+    a, b = rng.normal(size=16), rng.normal(size=16)
+    centroids, counts, labels = update_centroids(_blobs(rng, [a, b], 40), max_clusters=2)
+    assert counts.tolist() == [40, 40]
+    assert len(set(labels[:40])) == 1 and len(set(labels[40:])) == 1
+
+    # A few new notes barely move a centroid that already summarizes 40
+    new = _blobs(rng, [a], 4)
+    updated, new_counts, new_labels = update_centroids(new, centroids, counts)
+    assert new_labels.tolist() == [labels[0]] * 4
+    assert new_counts.tolist()[labels[0]] == 44
+    assert np.abs(updated - centroids).max() < 0.01
+    assert updated.dtype == np.float32 and updated.flags["C_CONTIGUOUS"]
+
+class _Stream:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def partitions(self, size):
+        for i in range(0, len(self.rows), size):
+            yield self.rows[i:i + size]
+
+@pytest.mark.asyncio
+async def test_cluster_notes_streams_only_new_embeddings_and_advances_watermark():
+    rng = np.random.default_rng(1)
+    base = rng.normal(size=1536)
+    existing = [TopicCentroid(user_id="u1", label=0, centroid=base.tolist(), count=10),
+                TopicCentroid(user_id="u1", label=1, centroid=(-base).tolist(), count=10)]
+    state = TopicClusterState(user_id="u1", last_note_id="n0", last_note_at=datetime.datetime(2026, 10, 1))
+    t = datetime.datetime(2026, 10, 18)
+    rows = [SimpleNamespace(note_id=f"n{i}", embedding=np.float32(sign) * base.astype(np.float32), completed_at=t)
+            for i, sign in enumerate([1, -1, 1], start=1)]
+
+    state_res, centroid_res, count_res = MagicMock(), MagicMock(), MagicMock()
+    state_res.scalars.return_value.first.return_value = state
+    centroid_res.scalars.return_value.all.return_value = existing
+    count_res.scalar.return_value = len(rows)
+    db = AsyncMock()
+    db.__aenter__.return_value = db
+    db.add = MagicMock()
+    db.execute.side_effect = [state_res, centroid_res, count_res, MagicMock(), MagicMock()]
+    db.stream.return_value = _Stream(rows)
+
+    with patch("workers.maintenance_tasks.AsyncSessionLocal", return_value=db), \
+         patch("workers.maintenance_tasks.settings") as mock_settings:
+        mock_settings.TOPIC_STREAM_CHUNK = 2
+        mock_settings.TOPIC_MAX_CLUSTERS = 5
+        mock_settings.TOPIC_SETTLE_SECONDS = 60
+        assert await _cluster_notes_async("u1") == 3
+
+    # Watermarked on completion: a note that was in flight while newer ones were clustered still qualifies
+    count_sql = str(db.execute.call_args_list[2][0][0])
+    assert "(notes.completed_at, notes.id) >" in count_sql
+    assert "notes.completed_at < now() -" in count_sql
+    assert [c.count for c in existing] == [12, 11]
+    updates = {str(c[0][0].compile(compile_kwargs={"literal_binds": True})) for c in db.execute.call_args_list[3:]}
+    assert any("'topic_0'" in u and "'n1'" in u and "'n3'" in u for u in updates)
+    assert any("'topic_1'" in u and "'n2'" in u for u in updates)
+    assert (state.last_note_at, state.last_note_id) == (t, "n3")
+    db.commit.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_embed_note_assigns_nearest_topic():
+    from app.core.rag_service import rag_service
+    note = Note(id="n1", user_id="u1", title="T", summary="S", transcription_text="X", tags=[])
+    existing_res, topic_res = MagicMock(), MagicMock()
+    existing_res.scalars.return_value.first.return_value = None
+    topic_res.scalars.return_value.first.return_value = 3
+    db = AsyncMock()
+    db.add = MagicMock()
+    db.execute.side_effect = [existing_res, topic_res]
+
+    with patch("app.core.rag_service.ai_service") as mock_ai:
+        mock_ai.generate_embedding = AsyncMock(return_value=[0.1] * 1536)
+        await rag_service.embed_note(note, db)
+
+    assert note.cluster_id == "topic_3"
+    topic_sql = str(db.execute.call_args_list[1][0][0])
+    assert "topic_centroids" in topic_sql and "<=>" in topic_sql and "LIMIT" in topic_sql
@@ -0,0 +1,48 @@
+import math
+import numpy as np
+from common import vector_ops
+
+def _py_cosine(v1, v2):
+    dot = sum(a * b for a, b in zip(v1, v2))
+    n1, n2 = math.sqrt(sum(a * a for a in v1)), math.sqrt(sum(b * b for b in v2))
+    return dot / (n1 * n2) if n1 > 0 and n2 > 0 else 0
+
+def test_cosine_matches_reference_and_handles_zero_vectors():
+    rng = np.random.default_rng(0)
+    a, b = rng.normal(size=1536).tolist(), rng.normal(size=1536).tolist()
+    assert math.isclose(vector_ops.cosine(a, b), _py_cosine(a, b), abs_tol=1e-5)
+    assert vector_ops.cosine([0.0, 0.0], [1.0, 0.0]) == 0.0
+    assert vector_ops.cosine(np.array([1.0, 0.0]), [1.0, 0.0]) == 1.0
+
+def test_matrix_helpers_are_contiguous_float32():
+    m = vector_ops.as_matrix([[1, 2], [3, 4]])
+    assert m.dtype == np.float32 and m.flags["C_CONTIGUOUS"]
+    n = vector_ops.normalize([[3.0, 4.0], [0.0, 0.0]])
+    np.testing.assert_allclose(n, [[0.6, 0.8], [0.0, 0.0]], atol=1e-6)
+
+def test_cosine_many_and_matrix_agree():
+    rng = np.random.default_rng(1)
+    matrix = rng.normal(size=(50, 16))
+    sims = vector_ops.cosine_many(matrix[3], matrix)
+    np.testing.assert_allclose(sims, vector_ops.cosine_matrix(matrix)[3], atol=1e-5)
+    assert math.isclose(float(sims[3]), 1.0, abs_tol=1e-5)
+    np.testing.assert_allclose(vector_ops.dot_many([1.0, 1.0], [[1, 2], [3, 4]]), [3.0, 7.0])
+
+def test_top_k_and_nearest():
+    scores = np.array([0.1, 0.9, 0.5, 0.9, -1.0])
+    assert vector_ops.top_k(scores, 3).tolist() == [1, 3, 2]
+    assert vector_ops.top_k(scores, 10).tolist() == [1, 3, 2, 0, 4]
+    assert vector_ops.top_k(scores, 0).tolist() == []
+    assert vector_ops.nearest([0.0, 1.0], [[1.0, 0.0], [0.1, 1.0]])[0] == 1
+
+def test_pairs_above_is_blockwise_exact():
+    rng = np.random.default_rng(2)
+    base = rng.normal(size=(5, 8))
+    matrix = vector_ops.normalize(np.vstack([base, base + 1e-3]))
+    rows, cols = vector_ops.pairs_above(matrix, 0.99, block_rows=3)
+    assert sorted(zip(rows.tolist(), cols.tolist())) == [(i, i + 5) for i in range(5)]
+
+def test_stack_valid_skips_missing_and_zero_vectors():
+    matrix, index = vector_ops.stack_valid([None, [1.0, 0.0], [], [0.0, 0.0], [0.0, 2.0]])
+    assert index.tolist() == [1, 4]
+    assert matrix.shape == (2, 2)
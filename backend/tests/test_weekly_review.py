@@ -0,0 +1,99 @@
+import asyncio
+import datetime
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.models import Note
+from workers.maintenance_tasks import (
+    _generate_weekly_review_async, _generate_weekly_review_chunk_async, _weekly_review_text
+)
+
+def _session(*results):
+    db = AsyncMock()
+    db.__aenter__.return_value = db
+    db.add = MagicMock()
+    db.execute.side_effect = list(results)
+    return db
+
+def _rows(day_counts, summary="s"):
+    start = datetime.datetime(2026, 10, 12, 9, tzinfo=datetime.timezone.utc)
+    return [SimpleNamespace(title=f"n{d}-{i}", summary=summary, created_at=start + datetime.timedelta(days=d))
+            for d, count in enumerate(day_counts) for i in range(count)]
+
+@pytest.mark.asyncio
+async def test_weekly_review_fans_out_user_chunks():
+    users = MagicMock()
+    users.scalars.return_value.all.return_value = [f"u{i}" for i in range(5)]
+    db = _session(users)
+    with patch("infrastructure.database.AsyncSessionLocal", return_value=db), \
+         patch("workers.maintenance_tasks.settings") as mock_settings, \
+         patch("workers.maintenance_tasks.generate_weekly_review_chunk_task") as mock_chunk:
+        mock_settings.WEEKLY_REVIEW_USERS_PER_TASK = 2
+        assert await _generate_weekly_review_async() == 3
+
+    assert [c[0][0] for c in mock_chunk.delay.call_args_list] == [["u0", "u1"], ["u2", "u3"], ["u4"]]
+    sql = str(db.execute.call_args[0][0])
+    assert "GROUP BY notes.user_id" in sql and "HAVING count(notes.id) >=" in sql
+
+@pytest.mark.asyncio
+async def test_small_week_is_a_single_prompt():
+    with patch("workers.maintenance_tasks.ai_service") as mock_ai:
+        mock_ai.analyze_weekly_notes = AsyncMock(return_value="review")
+        assert await _weekly_review_text(_rows([2, 1]), asyncio.Semaphore(2)) == "review"
+    mock_ai.summarize_notes_day.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_large_week_is_map_reduced_per_day_with_bounded_prompts():
+    rows = _rows([3, 0, 4], summary="x" * 40)
+    with patch("workers.maintenance_tasks.ai_service") as mock_ai, \
+         patch("workers.maintenance_tasks.settings") as mock_settings:
+        mock_settings.WEEKLY_REVIEW_PROMPT_MAX_CHARS = 110 # two notes per part
+        mock_ai.summarize_notes_day = AsyncMock(side_effect=lambda text, day: f"digest {text.count('- ')}")
+        mock_ai.analyze_weekly_notes = AsyncMock(return_value="review")
+        assert await _weekly_review_text(rows, asyncio.Semaphore(2)) == "review"
+
+    days = [c[0][1] for c in mock_ai.summarize_notes_day.call_args_list]
+    assert days == ["2026-10-12", "2026-10-12", "2026-10-14", "2026-10-14"]
+    assert all(len(c[0][0]) <= 110 for c in mock_ai.summarize_notes_day.call_args_list)
+    reduce_prompt = mock_ai.analyze_weekly_notes.call_args[0][0]
+    assert reduce_prompt.splitlines() == ["2026-10-12: digest 2", "2026-10-12: digest 1", "2026-10-14: digest 2", "2026-10-14: digest 2"]
+
+@pytest.mark.asyncio
+async def test_heavy_week_digests_are_reduced_again_until_they_fit():
+    """Many parts per day: the digests themselves exceed the limit and get another reduce round."""
+    rows = _rows([12] * 7, summary="x" * 40)
+    with patch("workers.maintenance_tasks.ai_service") as mock_ai, \
+         patch("workers.maintenance_tasks.settings") as mock_settings:
+        mock_settings.WEEKLY_REVIEW_PROMPT_MAX_CHARS = 110
+        mock_ai.summarize_notes_day = AsyncMock(side_effect=lambda text, span: "d" * 30)
+        mock_ai.analyze_weekly_notes = AsyncMock(return_value="review")
+        assert await _weekly_review_text(rows, asyncio.Semaphore(4)) == "review"
+
+    prompts = [c[0][0] for c in mock_ai.summarize_notes_day.call_args_list]
+    assert len(prompts) > 42 # 42 day parts, then the re-reduce rounds
+    assert all(len(p) <= 110 for p in prompts)
+    spans = [c[0][1] for c in mock_ai.summarize_notes_day.call_args_list[42:]]
+    assert spans[0] == "2026-10-12" and "2026-10-12..2026-10-13" in spans # same-day groups first, then spans
+    assert len(mock_ai.analyze_weekly_notes.call_args[0][0]) <= 110
+
+@pytest.mark.asyncio
+async def test_chunk_isolates_failures_and_skips_existing_reviews():
+    def user_session(user_id):
+        dup = MagicMock()
+        dup.scalars.return_value.first.return_value = "existing" if user_id == "u_done" else None
+        notes = MagicMock()
+        notes.all.return_value = _rows([3])
+        if user_id == "u_bad":
+            return _session(dup, RuntimeError("db down"))
+        return _session(dup, notes)
+
+    sessions = {uid: user_session(uid) for uid in ["u_ok", "u_done", "u_bad"]}
+    with patch("workers.maintenance_tasks.AsyncSessionLocal", side_effect=[sessions[u] for u in ["u_ok", "u_done", "u_bad"]]), \
+         patch("workers.maintenance_tasks.http_client"), \
+         patch("workers.maintenance_tasks.ai_service") as mock_ai:
+        mock_ai.analyze_weekly_notes = AsyncMock(return_value="review")
+        assert await _generate_weekly_review_chunk_async(["u_ok", "u_done", "u_bad"], "2026-10-12T00:00:00+00:00") == 1
+
+    review = sessions["u_ok"].add.call_args[0][0]
+    assert isinstance(review, Note) and review.title == "Weekly Review: 2026-10-12"
+    sessions["u_done"].add.assert_not_called()
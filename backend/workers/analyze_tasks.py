@@ -8,13 +8,14 @@ import datetime
 from app.celery_app import celery
 from app.services.ai_service import ai_service
 from app.models import Note, User, CachedAnalysis, NoteStatus
-from infrastructure.database import AsyncSessionLocal
+from infrastructure.database import note_session
 from infrastructure.metrics import track_cache_hit, track_cache_miss
+from infrastructure.redis_client import short_term_memory, reflection_scheduler
 from app.core.analyze_core import rag_service, analyze_core
 
-async def _process_analyze_async(note_id: str) -> None:
+async def _process_analyze_async(note_id: str, user_id: Optional[str] = None) -> None:
     logger.info(f"Starting analysis for note {note_id} (dynamic)")
-    async with AsyncSessionLocal() as db:
+    async with note_session(note_id, user_id) as db:
         # Business logic fully encapsulated in analyze_core
         # We fetch the note once here to get the user_id for the subsequent task
         res_note = await db.execute(select(Note).where(Note.id == note_id))
@@ -23,11 +24,16 @@ async def _process_analyze_async(note_id: str) -> None:
 
         await analyze_core.analyze_note_by_id(note_id, db, short_term_memory)
         
-        # Trigger follow-up Reflection (requires user_id)
-        from workers.reflection_tasks import reflection_incremental
-        reflection_incremental.delay(note.user_id)
+        # Follow-up Reflection: each note pushes the user's debounced deadline back,
+        # so a burst of notes is reflected once, after it settles
+        try:
+            await reflection_scheduler.schedule(note.user_id)
+        except Exception as e:
+            logger.warning(f"Reflection scheduling failed, running now: {e}")
+            from workers.reflection_tasks import reflection_incremental
+            reflection_incremental.delay(note.user_id)
 
 @celery.task(name="analyze.process_note", autoretry_for=(Exception,), retry_backoff=True, max_retries=3)
-def process_analyze(note_id: str):
-    async_to_sync(_process_analyze_async)(note_id)
+def process_analyze(note_id: str, user_id: Optional[str] = None):
+    async_to_sync(_process_analyze_async)(note_id, user_id)
     return {"status": "completed", "note_id": note_id}
@@ -2,12 +2,12 @@ from typing import Optional
 from loguru import logger
 from sqlalchemy.future import select
 from app.models import Note, User
-from app.core.database import AsyncSessionLocal
+from infrastructure.database import note_session
 
 async def handle_note_failure(note_id: str, error_msg: str) -> None:
     """Centralized failure handler for note processing stages."""
     try:
-        async with AsyncSessionLocal() as db:
+        async with note_session(note_id) as db:
             result = await db.execute(select(Note).where(Note.id == note_id))
             note = result.scalars().first()
             
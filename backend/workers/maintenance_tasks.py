@@ -1,83 +1,238 @@
 import os
+import time
+import asyncio
 from typing import List, Dict, Optional, Any
 from datetime import datetime, timedelta, timezone
 from loguru import logger
 from asgiref.sync import async_to_sync
+import numpy as np
 from sqlalchemy.future import select
+from sqlalchemy import func, tuple_, update, delete, any_, bindparam, String
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.celery_app import celery
-from app.models import Note, User, NoteEmbedding, UserTier
-from infrastructure.database import AsyncSessionLocal
+from app.models import Note, User, NoteEmbedding, UserTier, NoteStatus, TopicCentroid, TopicClusterState
+from infrastructure.database import AsyncSessionLocal, fan_out, ring
 from infrastructure.storage import storage_client
 from app.services.ai_service import ai_service
 from infrastructure.http_client import http_client
 from infrastructure.config import settings
+from infrastructure.monitoring import monitor
+
+EMBEDDING_DIM = 1536 # NoteEmbedding.embedding is VECTOR(1536)
+WEEKLY_REVIEW_MIN_NOTES = 3
 
 @celery.task(name="cluster_notes")
 def cluster_notes_task(user_id: str):
     async_to_sync(_cluster_notes_async)(user_id)
     return {"status": "success", "user_id": user_id}
 
-async def _cluster_notes_async(user_id: str) -> None:
+async def _stream_new_embeddings(db: AsyncSession, user_id: str, state: Optional[TopicClusterState]):
+    """
+    Embeddings of notes completed after the clustering watermark, in completion order.
+    The watermark is on completion time, not creation time: a note still in the pipeline
+    while newer ones are clustered is picked up once it completes. Notes completed within
+    TOPIC_SETTLE_SECONDS are left for the next run, so a slow commit can't land behind it.
+    Rows are streamed TOPIC_STREAM_CHUNK at a time straight into one preallocated
+    contiguous float32 array instead of materializing ORM objects.
+    Returns (matrix, note_ids, (completed_at, id) of the last row or None).
+    """
+    filters = [
+        NoteEmbedding.user_id == user_id, # partition key
+        Note.user_id == user_id,
+        Note.status == NoteStatus.COMPLETED,
+        Note.completed_at < func.now() - timedelta(seconds=settings.TOPIC_SETTLE_SECONDS),
+        NoteEmbedding.embedding.isnot(None),
+    ]
+    if state and state.last_note_at:
+        filters.append(tuple_(Note.completed_at, Note.id) > tuple_(state.last_note_at, state.last_note_id or ""))
+
+    count_res = await db.execute(
+        select(func.count()).select_from(NoteEmbedding).join(Note, Note.id == NoteEmbedding.note_id).where(*filters)
+    )
+    total = count_res.scalar() or 0
+    X = np.empty((total, EMBEDDING_DIM), dtype=np.float32)
+    note_ids: List[str] = []
+    last = None
+    if not total:
+        return X, note_ids, last
+
+    chunk = settings.TOPIC_STREAM_CHUNK
+    stmt = (
+        select(NoteEmbedding.note_id, NoteEmbedding.embedding, Note.completed_at)
+        .join(Note, Note.id == NoteEmbedding.note_id)
+        .where(*filters)
+        .order_by(Note.completed_at, Note.id)
+        .limit(total) # rows that arrive after the count wait for the next run
+        .execution_options(yield_per=chunk)
+    )
+    result = await db.stream(stmt)
+    async for rows in result.partitions(chunk):
+        X[len(note_ids):len(note_ids) + len(rows)] = [r.embedding for r in rows]
+        note_ids.extend(r.note_id for r in rows)
+        last = (rows[-1].completed_at, rows[-1].note_id)
+    return X[:len(note_ids)], note_ids, last
+
+async def _cluster_notes_async(user_id: str) -> int:
+    """
+    Incremental topic clustering: only notes added since the last run are streamed in and
+    folded into the persisted centroids; existing notes keep their labels.
+    Returns the number of notes processed.
+    """
     logger.info(f"Clustering for user: {user_id}")
-    db = AsyncSessionLocal()
     try:
-        result = await db.execute(select(Note).join(NoteEmbedding).where(Note.user_id == user_id, Note.status == 'COMPLETED'))
-        notes = list(result.scalars().all())
-        if len(notes) < 3: return
-
-        import numpy as np
-        from sklearn.cluster import KMeans
-        embeddings = [n.embedding_data.embedding for n in notes if n.embedding_data]
-        if not embeddings: return
-
-        X = np.array(embeddings)
-        n_clusters = max(2, min(5, len(notes) // 2))
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-        labels = kmeans.fit_predict(X)
-        
-        for i, note in enumerate(notes):
-            note.cluster_id = f"topic_{labels[i]}"
-        await db.commit()
-    except Exception as e: logger.error(f"Clustering error: {e}")
-    finally: await db.close()
+        async with AsyncSessionLocal(user_id=user_id) as db:
+            state_res = await db.execute(select(TopicClusterState).where(TopicClusterState.user_id == user_id))
+            state = state_res.scalars().first()
+            centroid_res = await db.execute(
+                select(TopicCentroid).where(TopicCentroid.user_id == user_id).order_by(TopicCentroid.label)
+            )
+            rows = list(centroid_res.scalars().all())
+
+            X, note_ids, last = await _stream_new_embeddings(db, user_id, state)
+            if not note_ids or (not rows and len(note_ids) < 3):
+                return 0 # nothing new, or too few notes to bootstrap; the watermark stays put
+
+            from app.core.topic_clusters import update_centroids, topic_label
+            centroids, counts, labels = update_centroids(
+                X,
+                [r.centroid for r in rows] if rows else None,
+                [r.count or 0 for r in rows] if rows else None,
+                max_clusters=settings.TOPIC_MAX_CLUSTERS,
+            )
+
+            by_label = {r.label: r for r in rows}
+            for label, (centroid, count) in enumerate(zip(centroids, counts)):
+                row = by_label.get(label)
+                if row is None:
+                    db.add(TopicCentroid(user_id=user_id, label=label, centroid=centroid.tolist(), count=int(count)))
+                else:
+                    row.centroid = centroid.tolist()
+                    row.count = int(count)
+
+            # One UPDATE per topic rather than per note
+            for label in set(labels.tolist()):
+                ids = [note_ids[i] for i in np.flatnonzero(labels == label)]
+                await db.execute(update(Note).where(Note.id.in_(ids)).values(cluster_id=topic_label(label)))
+
+            if state is None:
+                state = TopicClusterState(user_id=user_id)
+                db.add(state)
+            state.last_note_at, state.last_note_id = last
+            await db.commit()
+            logger.info(f"Clustered {len(note_ids)} new notes into {len(centroids)} topics for user {user_id}")
+            return len(note_ids)
+    except Exception as e:
+        logger.error(f"Clustering error: {e}")
+        return 0
+
+@celery.task(name="cluster_notes_trigger")
+def cluster_notes_trigger_task():
+    async_to_sync(_cluster_notes_trigger_async)()
+
+async def _cluster_notes_trigger_async() -> int:
+    """Queues the centroid update for users with notes completed past their clustering watermark."""
+    async def shard_user_ids(db: AsyncSession) -> List[str]:
+        res = await db.execute(
+            select(Note.user_id)
+            .outerjoin(TopicClusterState, TopicClusterState.user_id == Note.user_id)
+            .where(
+                Note.status == NoteStatus.COMPLETED,
+                Note.completed_at < func.now() - timedelta(seconds=settings.TOPIC_SETTLE_SECONDS),
+                (TopicClusterState.last_note_at.is_(None)) | (Note.completed_at > TopicClusterState.last_note_at),
+            )
+            .distinct()
+        )
+        return list(res.scalars().all())
+
+    user_ids = [uid for shard_ids in await fan_out(shard_user_ids, read=True) for uid in shard_ids]
+    for user_id in user_ids:
+        cluster_notes_task.delay(user_id)
+    logger.info(f"Queued topic clustering for {len(user_ids)} users")
+    return len(user_ids)
 
 @celery.task(name="cleanup_old_notes")
 def cleanup_old_notes_task():
-    async_to_sync(_cleanup_old_notes_async)()
+    return async_to_sync(_cleanup_old_notes_async)()
 
-async def _cleanup_old_notes_async() -> None:
-    from datetime import datetime, timedelta, timezone
-    
+async def _delete_expired_chunk(db: AsyncSession, tier: str, cutoff: datetime, after_id: str) -> List[str]:
+    """Deletes the next keyset page of expired notes for a tier: storage first, then rows. Returns the ids."""
+    res = await db.execute(
+        select(Note.id, Note.storage_key)
+        .join(User, User.id == Note.user_id)
+        .where(User.tier == tier, Note.created_at < cutoff, Note.id > after_id)
+        .order_by(Note.id)
+        .limit(settings.RETENTION_CHUNK_SIZE)
+    )
+    rows = res.all()
+    if not rows:
+        return []
+
+    # Storage before rows: a crash in between leaves rows whose (idempotent) file delete is retried next run
+    keys = [key for _, key in rows if key]
+    if keys:
+        failed = await storage_client.delete_files(keys)
+        if failed:
+            logger.warning(f"Failed to delete {len(failed)} files, e.g. {failed[0]}")
+
+    ids = [note_id for note_id, _ in rows]
+    await db.execute(
+        delete(Note).where(Note.id == any_(bindparam("ids", ids, type_=ARRAY(String)))),
+        execution_options={"synchronize_session": False},
+    )
+    await db.commit()
+    return ids
+
+async def _cleanup_old_notes_async() -> Dict[str, Any]:
+    """
+    Retention cleanup streamed in keyset-paginated chunks of RETENTION_CHUNK_SIZE ids, shard by shard.
+    Each chunk bulk-deletes its storage objects, runs one DELETE ... WHERE id = ANY(...) and commits,
+    so progress is durable. Stopping (time budget or crash) is safe: the next run starts again
+    from the remaining expired rows. Reports notes/second.
+    """
     logger.info("Starting retention cleanup...")
-    db: AsyncSession = AsyncSessionLocal()
+    started = time.monotonic()
+    deadline = started + settings.RETENTION_MAX_SECONDS
+    now = datetime.now(timezone.utc)
+    cutoffs = {UserTier.FREE: now - timedelta(days=90), UserTier.PRO: now - timedelta(days=365)}
+    deleted: Dict[str, int] = {}
+    complete = True
+
     try:
-        now: datetime = datetime.now(timezone.utc)
-        cutoff_free: datetime = now - timedelta(days=90)
-        cutoff_pro: datetime = now - timedelta(days=365)
-        
-        async def delete_batch(notes: List[Note]) -> int:
-            count: int = 0
-            for note in notes:
-                key: Optional[str] = note.storage_key
-                if key:
-                    try: await storage_client.delete_file(key)
-                    except Exception as s3_err: logger.warning(f"Failed to delete file {key}: {s3_err}")
-                await db.delete(note)
-                count += 1
-            return count
-
-        res_free = await db.execute(select(Note).join(User).where(User.tier == UserTier.FREE, Note.created_at < cutoff_free))
-        c_free: int = await delete_batch(list(res_free.scalars().all()))
-        
-        res_pro = await db.execute(select(Note).join(User).where(User.tier == UserTier.PRO, Note.created_at < cutoff_pro))
-        c_pro: int = await delete_batch(list(res_pro.scalars().all()))
+        for shard in range(ring.shard_count):
+            async with AsyncSessionLocal(shard=shard) as db:
+                for tier, cutoff in cutoffs.items():
+                    deleted.setdefault(tier, 0)
+                    last_id = ""
+                    while True:
+                        if time.monotonic() > deadline:
+                            complete = False
+                            break
+                        ids = await _delete_expired_chunk(db, tier, cutoff, last_id)
+                        if not ids:
+                            break
+                        last_id = ids[-1]
+                        deleted[tier] += len(ids)
+                        monitor.track_retention_deleted(tier, len(ids))
+                    if not complete:
+                        break
+            if not complete:
+                break
+    except Exception as e:
+        logger.error(f"Cleanup Error: {e}")
+        complete = False
 
-        await db.commit()
-        logger.info(f"Cleanup complete. Deleted {c_free} Free and {c_pro} Pro notes.")
-    except Exception as e: logger.error(f"Cleanup Error: {e}")
-    finally: await db.close()
+    elapsed = time.monotonic() - started
+    total = sum(deleted.values())
+    rate = total / elapsed if elapsed > 0 else 0.0
+    monitor.update_retention_throughput(rate)
+    logger.info(
+        f"Cleanup {'complete' if complete else 'stopped, resumes next run'}. "
+        f"Deleted {deleted.get(UserTier.FREE, 0)} Free and {deleted.get(UserTier.PRO, 0)} Pro notes "
+        f"in {elapsed:.1f}s ({rate:.0f} notes/s)."
+    )
+    return {"deleted": deleted, "seconds": round(elapsed, 2), "notes_per_second": round(rate, 1), "complete": complete}
 
 @celery.task(name="check_subscription_expiry")
 def check_subscription_expiry_task():
@@ -85,28 +240,29 @@ def check_subscription_expiry_task():
 
 async def _check_subscription_expiry_async() -> None:
     from app.services.email import send_email
-    db = AsyncSessionLocal()
-    try:
-        result = await db.execute(select(User).where(User.tier.in_([UserTier.PRO, UserTier.PREMIUM])))
-        users = list(result.scalars().all())
-        now = datetime.now(timezone.utc)
-        notified_count = 0
-        for user in users:
-            if not user.billing_cycle_start: continue
-            cycle_start = user.billing_cycle_start.replace(tzinfo=timezone.utc) if user.billing_cycle_start.tzinfo is None else user.billing_cycle_start
-            period = timedelta(days=365) if user.billing_period == 'yearly' else timedelta(days=30)
-            renewal_date = cycle_start
-            while renewal_date < now: renewal_date += period
-            time_until = renewal_date - now
-            if time_until.days == 3:
-                saved_hours = int(((user.monthly_usage_seconds or 0) * 3) / 3600)
-                subject = f"VoiceBrain Subscription Update"
-                body = f"Hi {user.full_name}, your subscription will renew on {renewal_date.strftime('%B %d, %Y')}."
-                await send_email(user.email, subject, body)
-                notified_count += 1
-        logger.info(f"Expiry check complete. Sent {notified_count} notifications.")
-    except Exception as e: logger.error(f"Expiry Check Error: {e}")
-    finally: await db.close()
+    now = datetime.now(timezone.utc)
+    notified_count = 0
+    for shard in range(ring.shard_count):
+        db = AsyncSessionLocal(shard=shard)
+        try:
+            result = await db.execute(select(User).where(User.tier.in_([UserTier.PRO, UserTier.PREMIUM])))
+            users = list(result.scalars().all())
+            for user in users:
+                if not user.billing_cycle_start: continue
+                cycle_start = user.billing_cycle_start.replace(tzinfo=timezone.utc) if user.billing_cycle_start.tzinfo is None else user.billing_cycle_start
+                period = timedelta(days=365) if user.billing_period == 'yearly' else timedelta(days=30)
+                renewal_date = cycle_start
+                while renewal_date < now: renewal_date += period
+                time_until = renewal_date - now
+                if time_until.days == 3:
+                    saved_hours = int(((user.monthly_usage_seconds or 0) * 3) / 3600)
+                    subject = f"VoiceBrain Subscription Update"
+                    body = f"Hi {user.full_name}, your subscription will renew on {renewal_date.strftime('%B %d, %Y')}."
+                    await send_email(user.email, subject, body)
+                    notified_count += 1
+        except Exception as e: logger.error(f"Expiry Check Error: {e}")
+        finally: await db.close()
+    logger.info(f"Expiry check complete. Sent {notified_count} notifications.")
 
 @celery.task(name="backup_database")
 def backup_database_task():
@@ -138,26 +294,122 @@ async def _backup_database_async() -> None:
 def generate_weekly_review_task():
     async_to_sync(_generate_weekly_review_async)()
 
-async def _generate_weekly_review_async() -> None:
-    db = AsyncSessionLocal()
+async def _generate_weekly_review_async() -> int:
+    """Fan-out: one generate_weekly_review_chunk subtask per WEEKLY_REVIEW_USERS_PER_TASK eligible users."""
+    since = datetime.now(timezone.utc) - timedelta(days=7)
+
+    async def shard_user_ids(db: AsyncSession) -> List[str]:
+        res = await db.execute(
+            select(Note.user_id)
+            .where(Note.created_at >= since, Note.status == NoteStatus.COMPLETED, Note.user_id.isnot(None))
+            .group_by(Note.user_id)
+            .having(func.count(Note.id) >= WEEKLY_REVIEW_MIN_NOTES)
+        )
+        return list(res.scalars().all())
+
+    user_ids = [uid for shard_ids in await fan_out(shard_user_ids, read=True) for uid in shard_ids]
+
+    size = settings.WEEKLY_REVIEW_USERS_PER_TASK
+    chunks = [user_ids[i:i + size] for i in range(0, len(user_ids), size)]
+    for chunk in chunks:
+        generate_weekly_review_chunk_task.delay(chunk, since.isoformat())
+    logger.info(f"Weekly review: {len(user_ids)} users in {len(chunks)} subtasks")
+    return len(chunks)
+
+@celery.task(name="generate_weekly_review_chunk")
+def generate_weekly_review_chunk_task(user_ids: List[str], since: str):
+    return async_to_sync(_generate_weekly_review_chunk_async)(user_ids, since)
+
+async def _generate_weekly_review_chunk_async(user_ids: List[str], since: str) -> int:
+    """Reviews a chunk of users concurrently; each user has its own session, LLM calls share one bound."""
     http_client.start()
-    try:
-        now = datetime.now(timezone.utc)
-        seven_days_ago = now - timedelta(days=7)
-        res = await db.execute(select(Note.user_id).where(Note.created_at >= seven_days_ago).distinct())
-        for user_id in res.scalars().all():
-            if not user_id: continue 
-            notes_res = await db.execute(select(Note).where(Note.user_id == user_id, Note.created_at >= seven_days_ago, Note.status == 'COMPLETED'))
-            notes = list(notes_res.scalars().all())
-            if len(notes) < 3: continue
-            u_res = await db.execute(select(User).where(User.id == user_id))
-            user = u_res.scalars().first()
-            if not user: continue
-            review_text = await ai_service.analyze_weekly_notes("\n".join([f"- {n.title}: {n.summary}" for n in notes if n.summary]))
-            db.add(Note(user_id=user_id, title=f"Weekly Review: {seven_days_ago.date()}", transcription_text="System review", summary=review_text, status="COMPLETED", is_audio_note=False))
+    since_dt = datetime.fromisoformat(since)
+    user_slots = asyncio.Semaphore(settings.WEEKLY_REVIEW_CONCURRENCY)
+    llm_slots = asyncio.Semaphore(settings.WEEKLY_REVIEW_CONCURRENCY)
+
+    async def run(user_id: str) -> bool:
+        async with user_slots:
+            try:
+                return await _weekly_review_for_user(user_id, since_dt, llm_slots)
+            except Exception as e:
+                logger.error(f"Weekly Review Error for user {user_id}: {e}")
+                return False
+
+    results = await asyncio.gather(*[run(uid) for uid in user_ids])
+    created = sum(1 for r in results if r)
+    logger.info(f"Weekly review chunk: {created}/{len(user_ids)} reviews created")
+    return created
+
+async def _weekly_review_for_user(user_id: str, since: datetime, llm_slots: asyncio.Semaphore) -> bool:
+    title = f"Weekly Review: {since.date()}"
+    async with AsyncSessionLocal(user_id=user_id) as db:
+        # A retried subtask must not write a second review
+        dup = await db.execute(select(Note.id).where(Note.user_id == user_id, Note.title == title).limit(1))
+        if dup.scalars().first():
+            return False
+        res = await db.execute(
+            select(Note.title, Note.summary, Note.created_at)
+            .where(Note.user_id == user_id, Note.created_at >= since, Note.status == NoteStatus.COMPLETED)
+            .order_by(Note.created_at)
+        )
+        rows = [r for r in res.all() if r.summary]
+        if len(rows) < WEEKLY_REVIEW_MIN_NOTES:
+            return False
+
+        review_text = await _weekly_review_text(rows, llm_slots)
+        db.add(Note(
+            user_id=user_id, title=title, transcription_text="System review", summary=review_text,
+            status="COMPLETED", completed_at=datetime.now(timezone.utc), is_audio_note=False
+        ))
         await db.commit()
-    except Exception as e: logger.error(f"Weekly Review Error: {e}")
-    finally: await db.close()
+        return True
+
+async def _weekly_review_text(rows: List[Any], llm_slots: asyncio.Semaphore) -> str:
+    """
+    Small weeks go to the LLM as one prompt. Larger ones are map-reduced: each day (split into
+    parts of at most WEEKLY_REVIEW_PROMPT_MAX_CHARS) is summarized concurrently, then the daily
+    digests are reviewed together, so no prompt grows with the number of notes. Digests that
+    still don't fit one prompt are summarized again in groups until they do.
+    """
+    limit = settings.WEEKLY_REVIEW_PROMPT_MAX_CHARS
+    lines = [(r.created_at.date().isoformat(), f"- {r.title}: {r.summary}"[:limit]) for r in rows]
+    if sum(len(line) + 1 for _, line in lines) <= limit:
+        async with llm_slots:
+            return await ai_service.analyze_weekly_notes("\n".join(line for _, line in lines))
+
+    parts: List[tuple] = [] # (day, text), each text <= limit
+    for day, line in lines:
+        if parts and parts[-1][0] == day and len(parts[-1][1]) + len(line) + 1 <= limit:
+            parts[-1] = (day, parts[-1][1] + "\n" + line)
+        else:
+            parts.append((day, line))
+
+    async def summarize(span: str, text: str) -> tuple:
+        async with llm_slots:
+            return span, await ai_service.summarize_notes_day(text, span)
+
+    digests = await asyncio.gather(*[summarize(day, text) for day, text in parts])
+    while len(digests) > 1 and sum(len(f"{span}: {digest}") + 1 for span, digest in digests) > limit:
+        digests = await asyncio.gather(*[summarize(span, text) for span, text in _pack_digests(digests, limit)])
+    async with llm_slots:
+        return await ai_service.analyze_weekly_notes("\n".join(f"{span}: {digest}" for span, digest in digests)[:limit])
+
+def _pack_digests(digests: List[tuple], limit: int) -> List[tuple]:
+    """
+    Packs consecutive (span, digest) lines into prompts of at most `limit` chars for another
+    reduce round. Lines are capped at half the limit, so every prompt but the last takes at
+    least two of them and each round halves the digests. Returns (span, text) per prompt.
+    """
+    packed: List[list] = [] # [first day, last day, text]
+    for span, digest in digests:
+        line = f"{span}: {digest}"[:limit // 2 - 1]
+        first, last = span.split("..")[0], span.split("..")[-1]
+        if packed and len(packed[-1][2]) + len(line) + 1 <= limit:
+            packed[-1][1:] = [last, packed[-1][2] + "\n" + line]
+        else:
+            packed.append([first, last, line])
+    return [(first if first == last else f"{first}..{last}", text) for first, last, text in packed]
+
 @celery.task(name="cleanup_memory")
 def cleanup_memory_task():
     async_to_sync(_cleanup_memory_async)()
@@ -165,57 +417,59 @@ def cleanup_memory_task():
 async def _cleanup_memory_async() -> None:
     from app.models import LongTermMemory
     logger.info("Starting memory cleanup strategy...")
-    db: AsyncSession = AsyncSessionLocal()
-    try:
-        now = datetime.now(timezone.utc)
-        cutoff_notes = now - timedelta(days=90)
-        cutoff_ltm = now - timedelta(days=180)
+    for shard in range(ring.shard_count):
+        db: AsyncSession = AsyncSessionLocal(shard=shard)
+        try:
+            now = datetime.now(timezone.utc)
+            cutoff_notes = now - timedelta(days=90)
+            cutoff_ltm = now - timedelta(days=180)
         
-        # 1. Delete unimportant Notes (Score < 4, > 90 days)
-        # Note: importance_score is default 5.0, so this only deletes explicitly low-scored notes
-        res_notes = await db.execute(select(Note).where(
-            Note.importance_score < 4.0,
-            Note.created_at < cutoff_notes
-        ))
-        notes_to_del = res_notes.scalars().all()
+            # 1. Delete unimportant Notes (Score < 4, > 90 days)
+            # Note: importance_score is default 5.0, so this only deletes explicitly low-scored notes
+            res_notes = await db.execute(select(Note).where(
+                Note.importance_score < 4.0,
+                Note.created_at < cutoff_notes
+            ))
+            notes_to_del = res_notes.scalars().all()
         
-        c_notes = 0
-        for n in notes_to_del:
-            if n.storage_key:
-                try: await storage_client.delete_file(n.storage_key)
-                except Exception: pass
-            db.delete(n)
-            c_notes += 1
+            c_notes = 0
+            for n in notes_to_del:
+                if n.storage_key:
+                    try: await storage_client.delete_file(n.storage_key)
+                    except Exception: pass
+                db.delete(n)
+                c_notes += 1
             
-        # 2. Archive unimportant LongTermMemories (Score < 5, > 180 days) - Task 3: Soft Delete
-        res_mem = await db.execute(select(LongTermMemory).where(
-            LongTermMemory.importance_score < 5.0,
-            LongTermMemory.created_at < cutoff_ltm,
-            LongTermMemory.is_archived == False
-        ))
-        mems_to_archive = res_mem.scalars().all()
+            # 2. Archive unimportant LongTermMemories (Score < 5, > 180 days) - Task 3: Soft Delete
+            res_mem = await db.execute(select(LongTermMemory).where(
+                LongTermMemory.importance_score < 5.0,
+                LongTermMemory.created_at < cutoff_ltm,
+                LongTermMemory.is_archived == False
+            ))
+            mems_to_archive = res_mem.scalars().all()
         
-        c_mems = 0
-        for m in mems_to_archive:
-            m.is_archived = True
-            c_mems += 1
-
-        # 3. Prune Weak Relations (Strength < 0.3)
-        from app.models import NoteRelation
-        res_rel = await db.execute(select(NoteRelation).where(NoteRelation.strength < 0.3))
-        rels_to_del = res_rel.scalars().all()
+            c_mems = 0
+            for m in mems_to_archive:
+                m.is_archived = True
+                c_mems += 1
+
+            # 3. Prune Weak Relations (Strength < 0.3)
+            from app.models import NoteRelation
+            res_rel = await db.execute(select(NoteRelation).where(NoteRelation.strength < 0.3))
+            rels_to_del = res_rel.scalars().all()
         
-        c_rels = 0
-        for r in rels_to_del:
-            db.delete(r)
-            c_rels += 1
+            c_rels = 0
+            for r in rels_to_del:
+                db.delete(r)
+                c_rels += 1
             
-        await db.commit()
-        logger.info(f"Memory Cleanup: Deleted {c_notes} Notes, Archived {c_mems} LTM entries, Deleted {c_rels} Weak Relations.")
-    except Exception as e:
-        logger.error(f"Cleanup Memory Error: {e}")
-    finally:
-        await db.close()
+            await db.commit()
+            logger.info(f"Memory Cleanup: Deleted {c_notes} Notes, Archived {c_mems} LTM entries, Deleted {c_rels} Weak Relations.")
+        except Exception as e:
+            logger.error(f"Cleanup Memory Error: {e}")
+        finally:
+            await db.close()
+
 @celery.task(name="report_cache_stats")
 def report_cache_stats_task():
     async_to_sync(_report_cache_stats_async)()
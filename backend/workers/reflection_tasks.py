@@ -1,292 +1,403 @@
 from asgiref.sync import async_to_sync
 from celery import shared_task
 from sqlalchemy.future import select
-from sqlalchemy import desc
+from sqlalchemy import desc, tuple_, update
 from loguru import logger
+from typing import Any, Dict, Optional
 import datetime
+import hashlib
+import json
+import time
 
-from infrastructure.database import AsyncSessionLocal
-from app.models import User, Note, LongTermMemory
+from infrastructure.database import AsyncSessionLocal, fan_out
+from app.models import User, Note, LongTermMemory, ReflectionState, ReflectionBatch, CachedAnalysis
+from app.services.ai_service.batch_client import TERMINAL_STATUSES
 from app.services.ai_service import ai_service
-from infrastructure.metrics import track_cache_hit, track_cache_miss, MEMORY_GRAPH_NODES, MEMORY_GRAPH_EDGES
-from sqlalchemy import func
+from infrastructure.config import settings
+from infrastructure.redis_client import graph_adjacency_cache, reflection_scheduler
+from app.core.graph_service import graph_service
+from app.core.memory_dedup import candidate_groups
+from infrastructure.metrics import track_cache_hit, track_cache_miss
+from infrastructure.monitoring import monitor
+from infrastructure.concurrency import AdaptiveLimiter
 
-async def _process_reflection_async(user_id: str, limit: int = 50):
-    logger.info(f"Starting reflection for user {user_id}")
-    async with AsyncSessionLocal() as db:
-        # Monitoring: Graph Size (Requirement 1/3)
-        try:
-            from app.models import NoteRelation
-            nodes_count = (await db.execute(select(func.count(Note.id)))).scalar() or 0
-            edges_count = (await db.execute(select(func.count(NoteRelation.id)))).scalar() or 0
-            logger.info(f"Memory Graph stats: {nodes_count} nodes, {edges_count} edges")
-            MEMORY_GRAPH_NODES.set(nodes_count)
-            MEMORY_GRAPH_EDGES.set(edges_count)
-        except Exception as mon_err:
-            logger.warning(f"Failed to fetch graph size: {mon_err}")
-
-        # 1. Fetch last notes (dynamic limit)
-        result = await db.execute(
-            select(Note)
-            .where(Note.user_id == user_id, Note.transcription_text.isnot(None))
-            .order_by(desc(Note.created_at))
-            .limit(limit)
-        )
-        notes = result.scalars().all()
-        
-        if not notes:
-            logger.info("No notes found for reflection.")
-            return
+ROLLING_SUMMARY_MAX_CHARS = 3000 # Compact state carried between runs instead of old transcripts
+LINK_ANCHOR_NOTES = 5 # Already-reflected notes offered as link targets for new notes
+INCREMENTAL_PAGE_NOTES = 50 # Notes per LLM call while an incremental run drains a burst
+BATCH_API_MAX_USERS = 1000 # Users per provider batch file (two requests each)
+REFLECTION_SYSTEM_PROMPT = "You are a helpful assistant. Return ONLY valid JSON in Russian."
+RELATIONS_SYSTEM_PROMPT = "You are a graph database agent. Return ONLY JSON list."
 
-        # 2. Build Cache Key / Context
-        notes_text = "\n\n".join([f"Date: {n.created_at}\nText: {n.transcription_text[:1000]}" for n in notes])
-        
-        # 2.5 Smart Cache Check
-        from app.models import CachedAnalysis
-        import datetime
-        import json
-        import hashlib
-        
-        # Fetch Identity Version
-        user_info_res = await db.execute(select(User.identity_updated_at).where(User.id == user_id))
-        user_info = user_info_res.first()
-        id_ver = user_info.identity_updated_at.isoformat() if user_info and user_info.identity_updated_at else "v0"
-        
-        # Hash (Content + Identity)
-        content_hash = hashlib.sha256(notes_text.encode()).hexdigest()
-        smart_key = hashlib.sha256(f"{content_hash}|{id_ver}".encode()).hexdigest()
-        
-        reflection_cache_hit = False
-        reflection_data = None
-        context_embedding = None
+def _advance_watermark(db, user_id: str, state: Optional[ReflectionState], last_note_id: str,
+                       last_note_at: datetime.datetime, rolling_summary: str):
+    """Moves the user's watermark past the reflected notes (not committed)."""
+    rolling_summary = rolling_summary[:ROLLING_SUMMARY_MAX_CHARS]
+    if state:
+        state.last_note_id = last_note_id
+        state.last_note_at = last_note_at
+        state.rolling_summary = rolling_summary
+    else:
+        db.add(ReflectionState(
+            user_id=user_id,
+            last_note_id=last_note_id,
+            last_note_at=last_note_at,
+            rolling_summary=rolling_summary
+        ))
+
+async def _prepare_reflection(db, user_id: str, limit: int = 50, embed: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Loads the user's watermark and the notes after it and builds both LLM requests.
+    Returns None if there is nothing new. When the smart cache already covers this input the
+    watermark is advanced right away and a job marked `cache_hit` (no requests) is returned.
+    With `embed` the cache embedding is computed now (live runs); batch runs skip it.
+    """
+    # 1. Watermark + notes after it (oldest first, so the watermark never skips a note).
+    # Ordered by completion, not creation: a note created earlier but processed later
+    # would otherwise land behind the watermark and never be reflected.
+    state_res = await db.execute(select(ReflectionState).where(ReflectionState.user_id == user_id))
+    state = state_res.scalars().first()
+    rolling_summary = (state.rolling_summary or "") if state else ""
+
+    notes_stmt = select(Note).where(
+        Note.user_id == user_id, Note.transcription_text.isnot(None), Note.completed_at.isnot(None)
+    )
+    if state and state.last_note_at:
+        notes_stmt = notes_stmt.where(
+            tuple_(Note.completed_at, Note.id) > tuple_(state.last_note_at, state.last_note_id or "")
+        ).order_by(Note.completed_at, Note.id).limit(limit)
+        result = await db.execute(notes_stmt)
+        notes = list(result.scalars().all())
+    else:
+        # First run: bootstrap from the most recently completed notes
+        result = await db.execute(notes_stmt.order_by(desc(Note.completed_at), desc(Note.id)).limit(limit))
+        notes = list(reversed(result.scalars().all()))
+    
+    if not notes:
+        logger.info("No new notes since last reflection.")
+        return None
+
+    # 2. Build Cache Key / Context (new notes only, plus the rolling state)
+    notes_text = "\n\n".join([f"Date: {n.created_at}\nText: {n.transcription_text[:1000]}" for n in notes])
+    state_text = f"{rolling_summary}\n\n{notes_text}" if rolling_summary else notes_text
+    
+    # 2.5 Smart Cache Check
+    # Fetch Identity Version
+    user_info_res = await db.execute(select(User.identity_updated_at).where(User.id == user_id))
+    user_info = user_info_res.first()
+    id_ver = user_info.identity_updated_at.isoformat() if user_info and user_info.identity_updated_at else "v0"
+    
+    # Hash (Content + Identity)
+    content_hash = hashlib.sha256(state_text.encode()).hexdigest()
+    smart_key = hashlib.sha256(f"{content_hash}|{id_ver}".encode()).hexdigest()
+    
+    context_embedding = None
+    try:
+        # Check Smart Key
+        cache_res = await db.execute(
+            select(CachedAnalysis)
+            .where(
+                CachedAnalysis.user_id == user_id,
+                CachedAnalysis.cache_key == smart_key,
+                CachedAnalysis.expires_at > datetime.datetime.now(datetime.timezone.utc),
+                CachedAnalysis.scope == "analysis_only"
+            )
+        )
+        cached_entry = cache_res.scalars().first()
         
-        try:
-            # Check Smart Key
-            cache_res = await db.execute(
-                select(CachedAnalysis)
-                .where(
-                    CachedAnalysis.user_id == user_id,
-                    CachedAnalysis.cache_key == smart_key,
-                    CachedAnalysis.expires_at > datetime.datetime.now(datetime.timezone.utc),
-                    CachedAnalysis.scope == "analysis_only"
-                )
+        if cached_entry:
+            logger.info(f"Cache hit for user reflection {user_id} (Smart Key).")
+            track_cache_hit("reflection")
+            # The cached result's memory already exists; still move past these notes, or every
+            # later run would rebuild the same input and hit the same key forever
+            cached = cached_entry.result or {}
+            _advance_watermark(
+                db, user_id, state, notes[-1].id, notes[-1].completed_at,
+                cached.get("rolling_summary") or cached.get("summary") or rolling_summary
             )
-            cached_entry = cache_res.scalars().first()
+            await db.commit()
+            return {"user_id": user_id, "note_ids": [n.id for n in notes], "cache_hit": True}
+        else:
+            logger.info(f"Cache miss for user reflection {user_id}")
+            track_cache_miss("reflection")
             
-            if cached_entry:
-                logger.info(f"Cache hit for user reflection {user_id} (Smart Key).")
-                track_cache_hit("reflection")
-                return
-            else:
-                logger.info(f"Cache miss for user reflection {user_id}")
-                track_cache_miss("reflection")
-                
-            # If miss, generate embedding for storage later
-            context_embedding = await ai_service.generate_embedding(notes_text[:5000])
+        # If miss, generate embedding for storage later
+        if embed:
+            context_embedding = await ai_service.generate_embedding(state_text[:5000])
 
-        except Exception as e:
-            logger.warning(f"[Reflection Cache] Lookup failed: {e}")
- 
-        prompt = (
-            "Обобщи ключевые события, проекты, стиль общения, привычки, изменения пользователя. "
-            "Сделай краткий summary (200–400 слов). Оцени важность 0–10 (где 10 = критически важное, меняющее жизнь событие). "
-            "Оцени уверенность (confidence) 0.0–1.0 и укажи источник (source): 'fact' (фактическое событие), 'inferred' (вывод), 'user' (мнение пользователя). "
-            "Также определи 'identity_summary': Стиль общения, приоритеты, жаргон, привычки пользователя. Кратко, 100–200 слов. "
-            "Верни JSON: { 'summary': '...', 'identity_summary': '...', 'importance_score': float, 'confidence': float, 'source': str }."
-            f"\n\nПоследние заметки пользователя:\n{notes_text}"
+    except Exception as e:
+        logger.warning(f"[Reflection Cache] Lookup failed: {e}")
+
+    prompt = (
+        "Обобщи ключевые события, проекты, стиль общения, привычки, изменения пользователя в НОВЫХ заметках. "
+        "Сделай краткий summary (200–400 слов). Оцени важность 0–10 (где 10 = критически важное, меняющее жизнь событие). "
+        "Оцени уверенность (confidence) 0.0–1.0 и укажи источник (source): 'fact' (фактическое событие), 'inferred' (вывод), 'user' (мнение пользователя). "
+        "Также определи 'identity_summary': Стиль общения, приоритеты, жаргон, привычки пользователя. Кратко, 100–200 слов. "
+        "Обнови 'rolling_summary': накопленное резюме с учётом новых заметок, не длиннее 300 слов. "
+        "Верни JSON: { 'summary': '...', 'identity_summary': '...', 'rolling_summary': '...', 'importance_score': float, 'confidence': float, 'source': str }."
+    )
+    if rolling_summary:
+        prompt += f"\n\nНакопленное резюме предыдущих заметок:\n{rolling_summary}"
+    prompt += f"\n\nНовые заметки пользователя:\n{notes_text}"
+
+    rel_prompt = (
+        "Генерируй связи строго в JSON list: "
+        "[{'note1_id': str, 'note2_id': str, 'type': 'caused|related|updated|contradicted', 'strength': float 0.5–1.0, 'confidence': float 0.0-1.0, 'source': 'fact|inferred|user'}]. "
+        "Используй ID заметок (UUID), предоставленные ниже. Каждая связь должна включать хотя бы одну новую заметку."
+        f"\n\nНовые заметки:\n"
+    )
+    notes_data = [{"id": n.id, "text": n.transcription_text[:200]} for n in notes]
+    rel_prompt += json.dumps(notes_data, ensure_ascii=False)
+
+    # Earlier notes are link targets only; their mutual links were extracted on previous runs
+    if state and state.last_note_at:
+        anchor_res = await db.execute(
+            select(Note.id, Note.transcription_text)
+            .where(
+                Note.user_id == user_id,
+                Note.transcription_text.isnot(None),
+                Note.completed_at <= notes[0].completed_at,
+                Note.id.notin_([n.id for n in notes])
+            )
+            .order_by(desc(Note.completed_at))
+            .limit(LINK_ANCHOR_NOTES)
         )
+        anchors = [{"id": nid, "text": (text or "")[:200]} for nid, text in anchor_res.all()]
+        if anchors:
+            rel_prompt += "\n\nПредыдущие заметки:\n" + json.dumps(anchors, ensure_ascii=False)
+
+    return {
+        "user_id": user_id,
+        "state": state,
+        "base_note_id": state.last_note_id if state else None,
+        "base_note_at": state.last_note_at if state else None,
+        "note_ids": [n.id for n in notes],
+        "last_note_id": notes[-1].id,
+        "last_note_at": notes[-1].completed_at,
+        "smart_key": smart_key,
+        "context_embedding": context_embedding,
+        "messages": [
+            {"role": "system", "content": REFLECTION_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "rel_messages": [
+            {"role": "system", "content": RELATIONS_SYSTEM_PROMPT},
+            {"role": "user", "content": rel_prompt}
+        ],
+    }
+
+def _parse_reflection(response_text: Optional[str]) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(ai_service.clean_json_response(response_text))
+    except (TypeError, json.JSONDecodeError):
+        logger.error(f"Reflection JSON Decode Error: {response_text}")
+        return None
+
+async def _apply_reflection(db, job: Dict[str, Any], data: Dict[str, Any], rel_resp: Optional[str]) -> bool:
+    """
+    Persists one reflection result: long-term memory, watermark, identity, relations.
+    Commits; returns False if the result carried no summary.
+    """
+    user_id = job["user_id"]
+    state = job["state"]
+
+    # Save to Cache
+    try:
+        if job.get("context_embedding"):
+            ttl = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=7)
+            db.add(CachedAnalysis(
+                user_id=user_id,
+                embedding=job["context_embedding"],
+                result=data,
+                expires_at=ttl,
+                scope="analysis_only",
+                cache_key=job["smart_key"]
+            ))
+    except Exception as cache_save_err:
+        logger.warning(f"[Reflection Cache] Save failed: {cache_save_err}")
+
+    summary = data.get("summary", "")
+    identity = data.get("identity_summary", "")
+    score = float(data.get("importance_score", 5.0))
+    confidence = float(data.get("confidence", 1.0))
+    source = data.get("source", "fact")
+    
+    if not summary:
+        logger.warning("Empty summary from reflection.")
+        return False
+
+    # 4. Save to LongTermMemory
+    embedding = await ai_service.get_embedding(summary)
+    
+    memory = LongTermMemory(
+        user_id=user_id,
+        summary_text=summary,
+        embedding=embedding,
+        importance_score=score,
+        confidence=confidence,
+        source=source
+    )
+    db.add(memory)
+
+    # Advance the watermark; committed together with the memory
+    _advance_watermark(db, user_id, state, job["last_note_id"], job["last_note_at"], data.get("rolling_summary") or summary)
+    
+    print(f"DEBUG: Identity check. identity={identity}")
+    # 5. Update User Identity Logic
+    if identity:
+        user_res = await db.execute(select(User).where(User.id == user_id))
+        user_obj = user_res.scalars().first()
+        print(f"DEBUG: Retrieved user_obj={user_obj}")
+        if user_obj:
+            user_obj.identity_summary = identity
+            user_obj.identity_updated_at = datetime.datetime.now(datetime.timezone.utc)
+
+            # --- Adaptive Preferences Decay ---
+            import math
+            prefs = user_obj.adaptive_preferences or {}
+            new_prefs = {}
+            now = datetime.datetime.now(datetime.timezone.utc)
+            decay_constant = 30.0 # days
+
+            # Structure: key -> {value, confidence, updated_at} OR simple value (legacy)
+            has_changes = False
+
+            for k, v in prefs.items():
+                # Normalized structure
+                if isinstance(v, dict) and "confidence" in v:
+                    obj = v
+                else:
+                    # Legacy migration
+                    obj = {
+                        "value": v, 
+                        "confidence": 1.0, 
+                        "updated_at": now.isoformat()
+                    }
+                    has_changes = True
+
+                last_upd_str = obj.get("updated_at")
+                try:
+                    last_upd = datetime.datetime.fromisoformat(last_upd_str)
+                    if last_upd.tzinfo is None:
+                        last_upd = last_upd.replace(tzinfo=datetime.timezone.utc)
+                except:
+                    last_upd = now
+
+                days = (now - last_upd).total_seconds() / (24 * 3600)
+                current_conf = obj.get("confidence", 1.0)
+
+                # Formula: new_conf = conf * exp(-days / 30)
+                # But wait, if we only apply this on updates, days is 0?
+                # Ah, this logic runs on REFLECTION (periodic).
+                # So even if not updated, we decay it.
+
+                new_conf = current_conf * math.exp(-days / decay_constant)
+
+                if new_conf < 0.4:
+                    logger.info(f"Removing decayed preference: {k} (conf={new_conf:.2f})")
+                    has_changes = True
+                    continue # Drop
+
+                # Update confidence only in the object, don't change updated_at unless value changes
+                # But here we are just decaying.
+                if abs(new_conf - current_conf) > 0.01:
+                    obj["confidence"] = new_conf
+                    # Don't update 'updated_at' here, otherwise days becomes 0 next time
+                    # 'updated_at' refers to when the VALUE was last confirmed/set.
+                    has_changes = True
+
+                new_prefs[k] = obj
+
+            if has_changes:
+                user_obj.adaptive_preferences = new_prefs
+                user_obj.adaptive_updated_at = now
+                # SQLAlchemy tracks json mutation if reassigned
+
+            # --- End Decay ---
+
+    # 6. Graph Relations
+    new_relations_buffer = []
+    try:
+        cleaned_resp = ai_service.clean_json_response(rel_resp) if rel_resp else None
+        if not cleaned_resp:
+            logger.warning("Empty AI response during graph extraction.")
+            raw_data = []
+        else:
+            raw_data = json.loads(cleaned_resp)
+
+        relations = raw_data if isinstance(raw_data, list) else raw_data.get("relations", [])
+        logger.info(f"Graph extraction: generated {len(relations)} connections")
+        
+        new_ids = set(job["note_ids"])
+        for r in relations:
+            n1 = r.get('note1_id') or r.get('id1')
+            n2 = r.get('note2_id') or r.get('id2')
+            r_type = r.get('type') or r.get('relation_type', 'related')
+            try:
+                r_strength = float(r.get('strength', 1.0))
+            except (TypeError, ValueError):
+                r_strength = 1.0
+            
+            if n1 and n2 and (n1 in new_ids or n2 in new_ids):
+                new_relations_buffer.append({
+                    "note_id1": n1,
+                    "note_id2": n2,
+                    "relation_type": r_type,
+                    "strength": r_strength,
+                    "confidence": float(r.get('confidence', 1.0)),
+                    "source": r.get('source', 'inferred')
+                })
         
-        # 3. Call DeepSeek or use Cached
+        if new_relations_buffer:
+            # Single INSERT ... ON CONFLICT: re-linked pairs merge instead of duplicating
+            saved = await graph_service.upsert_relations(db, user_id, new_relations_buffer)
+            logger.debug(f"Upserted {saved} note relations (Batch).")
+                
+    except json.JSONDecodeError:
+        logger.error(f"Failed to decode Graph JSON: {rel_resp[:200]}...")
+    except Exception as rel_err:
+        logger.error(f"Graph extraction failed: {rel_err}")
+
+    await db.commit()
+    if new_relations_buffer and settings.RAG_GRAPH_ADJACENCY_CACHE:
         try:
-             if reflection_cache_hit and reflection_data:
-                 data = reflection_data
-             else:
-                 response_text = await ai_service.get_chat_completion([
-                     {"role": "system", "content": "You are a helpful assistant. Return ONLY valid JSON in Russian."},
-                     {"role": "user", "content": prompt}
-                 ])
-                 
-                 cleaned = ai_service.clean_json_response(response_text)
-                 try:
-                     data = json.loads(cleaned)
-                 except json.JSONDecodeError:
-                     logger.error(f"Reflection JSON Decode Error: {response_text}")
-                     return
-                 
-                 # Save to Cache
-                 try:
-                    if context_embedding:
-                        ttl = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=7)
-                        db.add(CachedAnalysis(
-                            user_id=user_id,
-                            embedding=context_embedding,
-                            result=data,
-                            expires_at=ttl,
-                            scope="analysis_only",
-                            cache_key=smart_key
-                        ))
-                 except Exception as cache_save_err:
-                    logger.warning(f"[Reflection Cache] Save failed: {cache_save_err}")
-
-             summary = data.get("summary", "")
-             identity = data.get("identity_summary", "")
-             score = float(data.get("importance_score", 5.0))
-             confidence = float(data.get("confidence", 1.0))
-             source = data.get("source", "fact")
-             
-             if not summary:
-                 logger.warning("Empty summary from reflection.")
-                 return
-
-             # 4. Save to LongTermMemory
-             embedding = await ai_service.get_embedding(summary)
-             
-             memory = LongTermMemory(
-                 user_id=user_id,
-                 summary_text=summary,
-                 embedding=embedding,
-                 importance_score=score,
-                 confidence=confidence,
-                 source=source
-             )
-             db.add(memory)
-             
-             print(f"DEBUG: Identity check. identity={identity}")
-             # 5. Update User Identity Logic
-             if identity:
-                 user_res = await db.execute(select(User).where(User.id == user_id))
-                 user_obj = user_res.scalars().first()
-                 print(f"DEBUG: Retrieved user_obj={user_obj}")
-                 if user_obj:
-                     user_obj.identity_summary = identity
-                     user_obj.identity_updated_at = datetime.datetime.now(datetime.timezone.utc)
-                     
-                     # --- Adaptive Preferences Decay ---
-                     import math
-                     prefs = user_obj.adaptive_preferences or {}
-                     new_prefs = {}
-                     now = datetime.datetime.now(datetime.timezone.utc)
-                     decay_constant = 30.0 # days
-                     
-                     # Structure: key -> {value, confidence, updated_at} OR simple value (legacy)
-                     has_changes = False
-                     
-                     for k, v in prefs.items():
-                         # Normalized structure
-                         if isinstance(v, dict) and "confidence" in v:
-                             obj = v
-                         else:
-                             # Legacy migration
-                             obj = {
-                                 "value": v, 
-                                 "confidence": 1.0, 
-                                 "updated_at": now.isoformat()
-                             }
-                             has_changes = True
-
-                         last_upd_str = obj.get("updated_at")
-                         try:
-                             last_upd = datetime.datetime.fromisoformat(last_upd_str)
-                             if last_upd.tzinfo is None:
-                                 last_upd = last_upd.replace(tzinfo=datetime.timezone.utc)
-                         except:
-                             last_upd = now
-
-                         days = (now - last_upd).total_seconds() / (24 * 3600)
-                         current_conf = obj.get("confidence", 1.0)
-                         
-                         # Formula: new_conf = conf * exp(-days / 30)
-                         # But wait, if we only apply this on updates, days is 0?
-                         # Ah, this logic runs on REFLECTION (periodic).
-                         # So even if not updated, we decay it.
-                         
-                         new_conf = current_conf * math.exp(-days / decay_constant)
-                         
-                         if new_conf < 0.4:
-                             logger.info(f"Removing decayed preference: {k} (conf={new_conf:.2f})")
-                             has_changes = True
-                             continue # Drop
-                         
-                         # Update confidence only in the object, don't change updated_at unless value changes
-                         # But here we are just decaying.
-                         if abs(new_conf - current_conf) > 0.01:
-                             obj["confidence"] = new_conf
-                             # Don't update 'updated_at' here, otherwise days becomes 0 next time
-                             # 'updated_at' refers to when the VALUE was last confirmed/set.
-                             has_changes = True
-                         
-                         new_prefs[k] = obj
-                     
-                     if has_changes:
-                         user_obj.adaptive_preferences = new_prefs
-                         user_obj.adaptive_updated_at = now
-                         # SQLAlchemy tracks json mutation if reassigned
-                         
-                     # --- End Decay ---
-             
-             # 6. Graph Relations
-             try:
-                 rel_prompt = (
-                     "Генерируй связи строго в JSON list: "
-                     "[{'note1_id': str, 'note2_id': str, 'type': 'caused|related|updated|contradicted', 'strength': float 0.5–1.0, 'confidence': float 0.0-1.0, 'source': 'fact|inferred|user'}]. "
-                     "Используй ID заметок (UUID), предоставленные ниже."
-                     f"\n\nЗаметки:\n"
-                 )
-                 notes_data = [{"id": n.id, "text": n.transcription_text[:200]} for n in notes]
-                 rel_prompt += json.dumps(notes_data, ensure_ascii=False)
-                 
-                 rel_resp = await ai_service.get_chat_completion([
-                     {"role": "system", "content": "You are a graph database agent. Return ONLY JSON list."},
-                     {"role": "user", "content": rel_prompt}
-                 ])
-                 
-                 cleaned_resp = ai_service.clean_json_response(rel_resp)
-                 if not cleaned_resp:
-                     logger.warning("Empty AI response during graph extraction.")
-                     return
-
-                 try:
-                     raw_data = json.loads(cleaned_resp)
-                 except json.JSONDecodeError:
-                     logger.error(f"Failed to decode Graph JSON: {rel_resp[:200]}...")
-                     return
-
-                 relations = raw_data if isinstance(raw_data, list) else raw_data.get("relations", [])
-                 logger.info(f"Graph extraction: generated {len(relations)} connections")
-                 
-                 from app.models import NoteRelation
-                 new_relations_buffer = []
-                 for r in relations:
-                     n1 = r.get('note1_id') or r.get('id1')
-                     n2 = r.get('note2_id') or r.get('id2')
-                     r_type = r.get('type') or r.get('relation_type', 'related')
-                     try:
-                         r_strength = float(r.get('strength', 1.0))
-                     except (TypeError, ValueError):
-                         r_strength = 1.0
-                     
-                     if n1 and n2:
-                         new_relations_buffer.append(NoteRelation(
-                             note_id1=n1,
-                             note_id2=n2,
-                             relation_type=r_type,
-                             strength=r_strength,
-                             confidence=float(r.get('confidence', 1.0)),
-                             source=r.get('source', 'inferred')
-                         ))
-                 
-                 if new_relations_buffer:
-                     db.add_all(new_relations_buffer)
-                     logger.debug(f"Saved {len(new_relations_buffer)} new note relations to DB (Batch).")
-                         
-             except Exception as rel_err:
-                 logger.error(f"Graph extraction failed: {rel_err}")
-
-             await db.commit()
-             logger.info(f"Reflection completed for user {user_id}")
-             
+            await graph_adjacency_cache.invalidate(user_id)
+        except Exception as cache_err:
+            logger.warning(f"Adjacency cache invalidation failed: {cache_err}")
+    logger.info(f"Reflection completed for user {user_id}")
+    return True
+
+async def _process_reflection_async(user_id: str, limit: int = 50) -> int:
+    """
+    Incremental reflection: only notes after the user's watermark are sent to the LLM,
+    together with the rolling summary of everything reflected before.
+    `limit` caps how many new notes one run consumes; the rest are picked up by the next run.
+    Returns how many notes the watermark moved past (0 if nothing was reflected).
+    """
+    logger.info(f"Starting reflection for user {user_id}")
+    async with AsyncSessionLocal(user_id=user_id) as db:
+        # Graph size gauges are refreshed by metrics.collect_graph_size, not per user
+        job = await _prepare_reflection(db, user_id, limit)
+        if not job:
+            return 0
+        if job.get("cache_hit"):
+            return len(job["note_ids"])
+
+        # 3. Call the LLM live
+        try:
+            response_text = await ai_service.get_chat_completion(job["messages"])
+            data = _parse_reflection(response_text)
+            if data is None:
+                return 0
+            try:
+                rel_resp = await ai_service.get_chat_completion(job["rel_messages"])
+            except Exception as rel_err:
+                logger.error(f"Graph extraction failed: {rel_err}")
+                rel_resp = None
+            if await _apply_reflection(db, job, data, rel_resp):
+                return len(job["note_ids"])
         except Exception as e:
             logger.error(f"Reflection failed: {e}")
+        return 0
 
 @shared_task(name="reflection.daily_task")
 def reflection_daily(user_id: str):
@@ -294,21 +405,47 @@ def reflection_daily(user_id: str):
 
 @shared_task(name="reflection.incremental_task")
 def reflection_incremental(user_id: str):
-    """Triggered after note analysis, limited to last 10 notes."""
-    # Check cooldown in Redis (Task 3: 5 minutes)
-    import redis
-    from infrastructure.config import settings
-    r = redis.from_url(settings.REDIS_URL)
-    lock_key = f"reflection_lock:{user_id}"
-    
-    if r.get(lock_key):
-        logger.debug(f"Reflection skipped for {user_id} (cooldown)")
+    """Runs once a user's burst of notes has settled (dispatched by reflection.dispatch_due)."""
+    async_to_sync(_reflect_burst_async)(user_id)
+
+async def _reflect_burst_async(user_id: str):
+    """
+    Reflects over everything past the watermark, one LLM call per page of notes, so a
+    single settled run covers a burst of any size. At most one run per user at a time.
+    """
+    try:
+        token = await reflection_scheduler.acquire_run(user_id)
+    except Exception as e:
+        logger.warning(f"Reflection run lock unavailable for {user_id}, running unlocked: {e}")
+        token = ""
+    if token is None:
+        # The running pass may already be past its last page: look again after the quiet period
+        logger.info(f"Reflection already running for {user_id}, rescheduled")
+        await reflection_scheduler.schedule(user_id)
         return
-    
-    # Set 5 min lock
-    r.setex(lock_key, 300, "1")
-    
-    async_to_sync(_process_reflection_async)(user_id, limit=11) # Current + 10 last
+
+    try:
+        while await _process_reflection_async(user_id, limit=INCREMENTAL_PAGE_NOTES) >= INCREMENTAL_PAGE_NOTES:
+            pass
+    finally:
+        if token:
+            try:
+                await reflection_scheduler.release_run(user_id, token)
+            except Exception as e:
+                logger.warning(f"Reflection run lock release failed for {user_id}: {e}")
+
+async def _dispatch_due_async() -> int:
+    user_ids = await reflection_scheduler.claim_due()
+    for uid in user_ids:
+        reflection_incremental.delay(uid)
+    if user_ids:
+        logger.info(f"Dispatched debounced reflection for {len(user_ids)} users")
+    return len(user_ids)
+
+@shared_task(name="reflection.dispatch_due")
+def dispatch_due_reflections():
+    """Polls the debounce schedule for users whose reflection deadline has passed."""
+    return async_to_sync(_dispatch_due_async)()
 
 @shared_task(name="reflection.trigger_batched")
 def trigger_batched_reflection():
@@ -318,20 +455,147 @@ async def _trigger_batched_async():
     logger.info("Triggering batched daily reflection...")
     seven_days_ago = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=7)
     
-    async with AsyncSessionLocal() as db:
+    async def shard_active_users(db):
         result = await db.execute(select(User).where(User.last_note_date >= seven_days_ago, User.is_active == True))
-        active_users = result.scalars().all()
-        
-        user_ids = [u.id for u in active_users]
-        logger.info(f"Found {len(user_ids)} active users.")
-        
-        # Chunk into 50
-        batch_size = 50
-        chunks = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
-        
+        return [u.id for u in result.scalars().all()]
+
+    user_ids = [uid for shard_ids in await fan_out(shard_active_users, read=True) for uid in shard_ids]
+    logger.info(f"Found {len(user_ids)} active users.")
+
+    if settings.REFLECTION_BATCH_MODE and ai_service.batch is None:
+        logger.warning("REFLECTION_BATCH_MODE is set but no Batch API provider is configured; reflecting live")
+    elif settings.REFLECTION_BATCH_MODE:
+        # One provider batch file per chunk; results are applied by reflection.poll_batches
+        chunks = [user_ids[i:i + BATCH_API_MAX_USERS] for i in range(0, len(user_ids), BATCH_API_MAX_USERS)]
         for chunk in chunks:
-            logger.info(f"Queueing batch of {len(chunk)} users")
-            batch_reflection.delay(chunk)
+            logger.info(f"Queueing Batch API submission for {len(chunk)} users")
+            submit_reflection_batch.delay(chunk)
+        return
+
+    # Chunk into 50
+    batch_size = 50
+    chunks = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+
+    for chunk in chunks:
+        logger.info(f"Queueing batch of {len(chunk)} users")
+        batch_reflection.delay(chunk)
+
+@shared_task(name="reflection.submit_batch")
+def submit_reflection_batch(user_ids: list[str]):
+    """Writes the users' reflection prompts to one provider batch job."""
+    return async_to_sync(_submit_reflection_batch_async)(user_ids)
+
+async def _submit_reflection_batch_async(user_ids: list[str]) -> Optional[str]:
+    requests, jobs = [], {}
+    for uid in user_ids:
+        try:
+            async with AsyncSessionLocal(user_id=uid) as db:
+                job = await _prepare_reflection(db, uid, embed=False)
+        except Exception as e:
+            logger.error(f"Batch reflection prepare failed for {uid}: {e}")
+            continue
+        if not job or job.get("cache_hit"):
+            continue
+        requests.append({"custom_id": f"{uid}:summary", "messages": job["messages"]})
+        requests.append({"custom_id": f"{uid}:relations", "messages": job["rel_messages"]})
+        jobs[uid] = {
+            "base_note_id": job["base_note_id"],
+            "base_note_at": job["base_note_at"].isoformat() if job["base_note_at"] else None,
+            "note_ids": job["note_ids"],
+            "last_note_id": job["last_note_id"],
+            "last_note_at": job["last_note_at"].isoformat() if job["last_note_at"] else None,
+            "smart_key": job["smart_key"],
+        }
+
+    if not requests:
+        logger.info("Batch reflection: no users with new notes.")
+        return None
+
+    provider_batch_id = await ai_service.batch.submit(requests, metadata={"kind": "reflection"})
+    # Batch bookkeeping spans users of every shard; it lives on the default shard
+    async with AsyncSessionLocal() as db:
+        db.add(ReflectionBatch(provider_batch_id=provider_batch_id, status="submitted", jobs=jobs))
+        await db.commit()
+    logger.info(f"Batch reflection submitted: {provider_batch_id} ({len(jobs)} users)")
+    return provider_batch_id
+
+async def _apply_batch_result(user_id: str, meta: Dict[str, Any], summary_text: Optional[str], rel_text: Optional[str]) -> bool:
+    """
+    Applies one user's batch result if the watermark is still where the prompt was built from.
+    Anything else means it was already applied or superseded by a live run, so it is skipped.
+    """
+    if summary_text is None:
+        logger.warning(f"Batch reflection: no result for {user_id}")
+        return False
+    data = _parse_reflection(summary_text)
+    if data is None:
+        return False
+
+    async with AsyncSessionLocal(user_id=user_id) as db:
+        state_res = await db.execute(
+            select(ReflectionState).where(ReflectionState.user_id == user_id).with_for_update()
+        )
+        state = state_res.scalars().first()
+        watermark = (state.last_note_id, state.last_note_at.isoformat() if state.last_note_at else None) if state else (None, None)
+        if watermark != (meta.get("base_note_id"), meta.get("base_note_at")):
+            logger.info(f"Batch reflection for {user_id} skipped: watermark moved")
+            return False
+
+        job = {
+            **meta,
+            "user_id": user_id,
+            "state": state,
+            "last_note_at": datetime.datetime.fromisoformat(meta["last_note_at"]) if meta.get("last_note_at") else None,
+            "context_embedding": None,
+        }
+        return await _apply_reflection(db, job, data, rel_text)
+
+@shared_task(name="reflection.poll_batches")
+def poll_reflection_batches():
+    """Applies results of finished reflection batches."""
+    return async_to_sync(_poll_reflection_batches_async)()
+
+async def _poll_reflection_batches_async() -> int:
+    if ai_service.batch is None:
+        return 0
+    # Default shard: see _submit_reflection_batch_async
+    async with AsyncSessionLocal() as db:
+        res = await db.execute(select(ReflectionBatch).where(ReflectionBatch.status == "submitted"))
+        batches = res.scalars().all()
+
+    applied = 0
+    for batch in batches:
+        try:
+            status = await ai_service.batch.status(batch.provider_batch_id)
+        except Exception as e:
+            logger.warning(f"Batch {batch.provider_batch_id} status check failed: {e}")
+            continue
+        if status not in TERMINAL_STATUSES:
+            continue
+
+        if status == "completed":
+            results = await ai_service.batch.results(batch.provider_batch_id)
+            for uid, meta in (batch.jobs or {}).items():
+                try:
+                    if await _apply_batch_result(uid, meta, results.get(f"{uid}:summary"), results.get(f"{uid}:relations")):
+                        applied += 1
+                except Exception as e:
+                    logger.error(f"Batch reflection apply failed for {uid}: {e}")
+        else:
+            # Watermarks did not move, so these users are simply picked up by the next run
+            logger.warning(f"Batch {batch.provider_batch_id} ended as {status}")
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(ReflectionBatch)
+                .where(ReflectionBatch.id == batch.id)
+                .values(
+                    status="applied" if status == "completed" else status,
+                    completed_at=datetime.datetime.now(datetime.timezone.utc)
+                )
+            )
+            await db.commit()
+    return applied
 
 @shared_task(name="reflection.batch_reflection")
 def batch_reflection(user_ids: list[str]):
@@ -340,19 +604,37 @@ def batch_reflection(user_ids: list[str]):
     async_to_sync(_process_batch_wrapper)(user_ids)
 
 async def _process_batch_wrapper(user_ids: list[str]):
-    """Process a batch of users concurrently"""
+    """
+    Process a batch of users concurrently. Concurrency adapts to the LLM: it grows while
+    p95 latency and the 429 rate stay under target and backs off when they rise.
+    """
     import asyncio
-    # Semaphore to limit concurrency within the batch if needed, e.g. 5 concurrent DB/LLM ops
-    sem = asyncio.Semaphore(5)
+    limiter = AdaptiveLimiter(
+        initial=settings.REFLECTION_CONCURRENCY_INITIAL,
+        max_limit=settings.REFLECTION_CONCURRENCY_MAX,
+        target_p95=settings.REFLECTION_TARGET_P95_SECONDS,
+        max_429_rate=settings.REFLECTION_MAX_429_RATE,
+        on_change=monitor.update_reflection_concurrency,
+    )
+    started = time.monotonic()
+    done = 0
     
     async def bound_reflection(uid):
-        async with sem:
+        nonlocal done
+        async with limiter.slot():
             try:
                 await _process_reflection_async(uid)
             except Exception as e:
                 logger.error(f"Error processing user {uid} in batch: {e}")
+        done += 1
+        monitor.update_reflection_throughput(done / max(time.monotonic() - started, 1e-6) * 60)
 
-    await asyncio.gather(*[bound_reflection(uid) for uid in user_ids])
+    ai_service.client.observers.append(limiter.record)
+    try:
+        await asyncio.gather(*[bound_reflection(uid) for uid in user_ids])
+    finally:
+        ai_service.client.observers.remove(limiter.record)
+    logger.info(f"Batch of {len(user_ids)} users done in {time.monotonic() - started:.1f}s (final concurrency {limiter.limit})")
 
 @shared_task(name="memory.self_improve")
 def self_improve_memory(user_id: str):
@@ -361,78 +643,104 @@ def self_improve_memory(user_id: str):
 async def _self_improve_memory_async(user_id: str):
     """
     Weekly optimization of memory: merges duplicates and removes contradictions.
+    Only groups of similar memories (embedding pre-clustering) are sent to the LLM.
     """
     from sqlalchemy import update
-    import json
     
     logger.info(f"Self-improving memory for user {user_id}")
-    async with AsyncSessionLocal() as db:
+    async with AsyncSessionLocal(user_id=user_id) as db:
         # 1. Fetch active memories
         res_mem = await db.execute(
             select(LongTermMemory)
             .where(LongTermMemory.user_id == user_id, LongTermMemory.is_archived == False)
             .order_by(LongTermMemory.created_at.desc())
-            .limit(100) # Limit to avoid context overflow
+            .limit(settings.MEMORY_IMPROVE_MAX_MEMORIES)
         )
         memories = res_mem.scalars().all()
         if len(memories) < 5:
             logger.info("Not enough memories to optimize.")
             return
 
-        # 2. Contextualize for AI
-        mem_list = [f"ID: {m.id} [Score: {m.importance_score}]: {m.summary_text}" for m in memories]
-        prompt = (
-            "You are a Memory Optimization Agent. Below are long-term memories of a user.\n"
-            "Analyze them and identify:\n"
-            "1. MERGES: Multiple IDs that represent the same concept/event. Write a new, better summary.\n"
-            "2. DELETIONS: Contradictory or obsolete memories (keep the truth).\n"
-            "3. RECOMMENDATIONS: New insights to add.\n\n"
-            "Return JSON:\n"
-            "{\n"
-            "  'merges': [{'ids': ['id1', 'id2'], 'summary': 'Combined text', 'score': 9.0}],\n"
-            "  'deletions': ['id3']\n"
-            "}\n\n"
-            f"Memories:\n" + "\n".join(mem_list)
+        # 2. Candidate groups of near-duplicates; everything else is left alone
+        groups = candidate_groups(
+            [m.embedding for m in memories],
+            threshold=settings.MEMORY_DEDUP_THRESHOLD,
+            max_group_size=settings.MEMORY_DEDUP_MAX_GROUP,
         )
-
-        try:
-            resp = await ai_service.get_chat_completion([
-                {"role": "system", "content": "You are a memory architect. Respond in Russian if context is in Russian. Return ONLY JSON."},
-                {"role": "user", "content": prompt}
-            ])
-            data = json.loads(ai_service.clean_json_response(resp))
-        except Exception as e:
-            logger.error(f"AI memory optimization failed: {e}")
+        if not groups:
+            logger.info(f"No duplicate candidates among {len(memories)} memories.")
             return
+        logger.info(f"{len(memories)} memories -> {len(groups)} candidate groups")
+
+        merges, del_ids = [], []
+        per_prompt = settings.MEMORY_DEDUP_GROUPS_PER_PROMPT
+        for start in range(0, len(groups), per_prompt):
+            chunk = groups[start:start + per_prompt]
+            allowed = {memories[i].id for group in chunk for i in group}
+            group_lists = "\n\n".join(
+                f"Group {g + 1}:\n" + "\n".join(
+                    f"ID: {memories[i].id} [Score: {memories[i].importance_score}]: {memories[i].summary_text}" for i in group
+                )
+                for g, group in enumerate(chunk)
+            )
+            prompt = (
+                "You are a Memory Optimization Agent. Below are groups of similar long-term memories of a user.\n"
+                "Analyze each group separately and identify:\n"
+                "1. MERGES: Multiple IDs that represent the same concept/event. Write a new, better summary.\n"
+                "2. DELETIONS: Contradictory or obsolete memories (keep the truth).\n\n"
+                "Return JSON:\n"
+                "{\n"
+                "  'merges': [{'ids': ['id1', 'id2'], 'summary': 'Combined text', 'score': 9.0}],\n"
+                "  'deletions': ['id3']\n"
+                "}\n\n"
+                f"Memory groups:\n{group_lists}"
+            )
+
+            try:
+                resp = await ai_service.get_chat_completion([
+                    {"role": "system", "content": "You are a memory architect. Respond in Russian if context is in Russian. Return ONLY JSON."},
+                    {"role": "user", "content": prompt}
+                ])
+                data = json.loads(ai_service.clean_json_response(resp))
+            except Exception as e:
+                logger.error(f"AI memory optimization failed: {e}")
+                continue
+
+            # Decisions may only touch memories that were shown in this prompt
+            for m in data.get("merges", []):
+                ids = [i for i in m.get("ids", []) if i in allowed]
+                if len(ids) >= 2 and m.get("summary"):
+                    merges.append({**m, "ids": ids})
+            del_ids.extend(i for i in data.get("deletions", []) if i in allowed)
 
         # 3. Apply Actions
         # Merges
-        for m in data.get("merges", []):
-            ids = m.get("ids", [])
+        for m in merges:
+            ids = m["ids"]
             new_text = m.get("summary")
             new_score = m.get("score", 7.0)
-            if ids and new_text:
-                # Add new
-                emb = await ai_service.get_embedding(new_text)
-                db.add(LongTermMemory(user_id=user_id, summary_text=new_text, importance_score=new_score, embedding=emb))
-                # Archive old
-                await db.execute(update(LongTermMemory).where(LongTermMemory.id.in_(ids)).values(is_archived=True))
+            # Add new
+            emb = await ai_service.get_embedding(new_text)
+            db.add(LongTermMemory(user_id=user_id, summary_text=new_text, importance_score=new_score, embedding=emb))
+            # Archive old
+            await db.execute(update(LongTermMemory).where(LongTermMemory.id.in_(ids)).values(is_archived=True))
 
         # Deletions
-        del_ids = data.get("deletions", [])
         if del_ids:
             await db.execute(update(LongTermMemory).where(LongTermMemory.id.in_(del_ids)).values(is_archived=True))
 
         await db.commit()
-        logger.info(f"Memory optimized for user {user_id}. Applied {len(data.get('merges', []))} merges, deleted {len(del_ids)} items.")
+        logger.info(f"Memory optimized for user {user_id}. Applied {len(merges)} merges, deleted {len(del_ids)} items.")
 
 @shared_task(name="memory.trigger_weekly_improvement")
 def trigger_weekly_memory_improvement():
     async_to_sync(_trigger_weekly_improvement_async)()
 
 async def _trigger_weekly_improvement_async():
-    async with AsyncSessionLocal() as db:
+    async def shard_active_users(db):
         res = await db.execute(select(User).where(User.is_active == True))
-        users = res.scalars().all()
-        for user in users:
-            self_improve_memory.delay(user.id)
+        return [u.id for u in res.scalars().all()]
+
+    for shard_ids in await fan_out(shard_active_users, read=True):
+        for user_id in shard_ids:
+            self_improve_memory.delay(user_id)
@@ -1,21 +1,22 @@
+from typing import Optional
 from asgiref.sync import async_to_sync
 from app.celery_app import celery
-from infrastructure.database import AsyncSessionLocal
+from infrastructure.database import note_session
 from app.core.sync_service import sync_service
 
-async def _process_sync_async(note_id: str) -> None:
+async def _process_sync_async(note_id: str, user_id: Optional[str] = None) -> None:
     from app.services.pipeline import pipeline
-    await pipeline.process(note_id)
+    await pipeline.process(note_id, user_id)
 
 @celery.task(name="sync.process_note")
-def process_sync(note_id: str):
-    async_to_sync(_process_sync_async)(note_id)
+def process_sync(note_id: str, user_id: Optional[str] = None):
+    async_to_sync(_process_sync_async)(note_id, user_id)
     return {"status": "sync_restarted", "note_id": note_id}
 
 # Individual Sync Wrappers (called by SyncService iteration)
 
-async def _perform_sync_wrapper(note_id: str, provider: str, method_name: str = "perform_sync"):
-    async with AsyncSessionLocal() as db:
+async def _perform_sync_wrapper(note_id: str, provider: str, method_name: str = "perform_sync", user_id: Optional[str] = None):
+    async with note_session(note_id, user_id) as db:
         method = getattr(sync_service, method_name)
         # perform_sync takes (note_id, provider, db)
         # specialized ones like perform_sync_readwise take (note_id, db)
@@ -27,41 +28,41 @@ async def _perform_sync_wrapper(note_id: str, provider: str, method_name: str =
              await method(note_id, db)
 
 @celery.task(name="sync.google_maps")
-def sync_google_maps(note_id: str):
-    async_to_sync(_perform_sync_wrapper)(note_id, "google_maps", "perform_sync_maps")
+def sync_google_maps(note_id: str, user_id: Optional[str] = None):
+    async_to_sync(_perform_sync_wrapper)(note_id, "google_maps", "perform_sync_maps", user_id)
     return {"status": "synced_google_maps", "note_id": note_id}
 
 @celery.task(name="sync.yandex_maps")
-def sync_yandex_maps(note_id: str):
-    async_to_sync(_perform_sync_wrapper)(note_id, "yandex_maps", "perform_sync_maps")
+def sync_yandex_maps(note_id: str, user_id: Optional[str] = None):
+    async_to_sync(_perform_sync_wrapper)(note_id, "yandex_maps", "perform_sync_maps", user_id)
     return {"status": "synced_yandex_maps", "note_id": note_id}
 
 @celery.task(name="sync.tasks")
-def sync_tasks(note_id: str, provider: str):
-    async_to_sync(_perform_sync_wrapper)(note_id, provider, "perform_sync_tasks")
+def sync_tasks(note_id: str, provider: str, user_id: Optional[str] = None):
+    async_to_sync(_perform_sync_wrapper)(note_id, provider, "perform_sync_tasks", user_id)
     return {"status": "synced_tasks", "provider": provider, "note_id": note_id}
 
 @celery.task(name="sync.email")
-def sync_email(note_id: str, provider: str):
-    async_to_sync(_perform_sync_wrapper)(note_id, provider, "perform_sync_email")
+def sync_email(note_id: str, provider: str, user_id: Optional[str] = None):
+    async_to_sync(_perform_sync_wrapper)(note_id, provider, "perform_sync_email", user_id)
     return {"status": "synced_email", "provider": provider, "note_id": note_id}
 
 @celery.task(name="sync.readwise")
-def sync_readwise(note_id: str):
-    async_to_sync(_perform_sync_wrapper)(note_id, None, "perform_sync_readwise")
+def sync_readwise(note_id: str, user_id: Optional[str] = None):
+    async_to_sync(_perform_sync_wrapper)(note_id, None, "perform_sync_readwise", user_id)
     return {"status": "synced_readwise", "note_id": note_id}
 
 @celery.task(name="sync.obsidian")
-def sync_obsidian(note_id: str):
-    async_to_sync(_perform_sync_wrapper)(note_id, None, "perform_sync_obsidian")
+def sync_obsidian(note_id: str, user_id: Optional[str] = None):
+    async_to_sync(_perform_sync_wrapper)(note_id, None, "perform_sync_obsidian", user_id)
     return {"status": "synced_obsidian", "note_id": note_id}
 
 @celery.task(name="sync.yandex_tasks")
-def sync_yandex_tasks(note_id: str):
-    async_to_sync(_perform_sync_wrapper)(note_id, None, "perform_sync_yandex_tasks")
+def sync_yandex_tasks(note_id: str, user_id: Optional[str] = None):
+    async_to_sync(_perform_sync_wrapper)(note_id, None, "perform_sync_yandex_tasks", user_id)
     return {"status": "synced_yandex_tasks", "note_id": note_id}
 
 @celery.task(name="sync.maps")
-def sync_maps(note_id: str, provider: str):
-    async_to_sync(_perform_sync_wrapper)(note_id, provider, "perform_sync_maps")
+def sync_maps(note_id: str, provider: str, user_id: Optional[str] = None):
+    async_to_sync(_perform_sync_wrapper)(note_id, provider, "perform_sync_maps", user_id)
     return {"status": "synced_maps", "provider": provider, "note_id": note_id}
@@ -15,11 +15,11 @@ from sqlalchemy.exc import OperationalError
 # But I refactored pipeline to use audio.py.
 # So I can strip this file to be just a wrapper.
 
-async def _process_transcribe_async(note_id: str) -> None:
+async def _process_transcribe_async(note_id: str, user_id: Optional[str] = None) -> None:
     from app.services.pipeline import pipeline
-    await pipeline.process(note_id)
+    await pipeline.process(note_id, user_id)
 
 @celery.task(name="transcribe.process_note", autoretry_for=(OperationalError, OSError), retry_backoff=True, max_retries=3)
-def process_transcribe(note_id: str):
-    async_to_sync(_process_transcribe_async)(note_id)
+def process_transcribe(note_id: str, user_id: Optional[str] = None):
+    async_to_sync(_process_transcribe_async)(note_id, user_id)
     return {"status": "processing_started", "note_id": note_id}